@@ -1,62 +1,244 @@
 #!/usr/bin/env python3
-"""Check what collections exist and their schemas."""
+"""Check what collections exist, their schemas, and how much data they hold.
 
-import requests
-import json
+The default output is a capacity report per collection:
+- record counts (perPage=1 totals, fetched concurrently)
+- sampled average/p50/p95/max size per field (random sample)
+- per-user record distribution with the top-N heaviest users
+- missing-index warnings for the filters the app and hooks rely on
+
+Usage:
+    python3 check_collections.py --email admin@example.com --password secret
+    python3 check_collections.py ... --json capacity.json --top 20
+    python3 check_collections.py ... --fields   # print field lists only
+"""
 
 import argparse
+import json
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-def main():
-    parser = argparse.ArgumentParser(description='Check PocketBase collections and schema fields.')
-    parser.add_argument('--url', default='https://pocket.risc-v.tw', help='PocketBase URL')
-    parser.add_argument('--email', required=True, help='Admin email')
-    parser.add_argument('--password', required=True, help='Admin password')
-    
-    args = parser.parse_args()
-    
-    BASE_URL = args.url
-    EMAIL = args.email
-    PASSWORD = args.password
+import requests
 
-    # Authenticate
-    auth_url = f"{BASE_URL}/api/collections/_superusers/auth-with-password"
-    try:
-        response = requests.post(auth_url, json={"identity": EMAIL, "password": PASSWORD})
-        response.raise_for_status()
-        token = response.json().get("token")
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Authentication failed: {e}")
-        sys.exit(1)
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from pb_client import PocketBaseClient  # noqa: E402
 
-    print(f"✅ Authenticated\n")
+OUR_COLLECTIONS = [
+    "settings", "progress", "bookmarks", "ai_notes", "ai_profiles", "books", "crash_reports",
+    "crash_fingerprints", "qdrant_sync_logs", "qdrant_sync_log_rollups", "documents", "chunks", "embeddings",
+    "mail_queue", "translations", "timed_captions", "ai_note_digests",
+]
 
-    # Get all collections
-    collections_url = f"{BASE_URL}/api/collections"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(collections_url, headers=headers)
-    data = response.json()
+# Fields known to carry large payloads; always shown in the size table.
+SUSPECT_FIELDS = {"vectorJson", "messages", "locatorJson", "stackTrace"}
+
+# Filters issued by the app, hooks and scripts. Each tuple must be a prefix of some index.
+EXPECTED_INDEXES = {
+    "ai_notes": [("user",), ("createdAt",)],
+    "ai_note_digests": [("user", "day", "timezone"), ("day",)],
+    "bookmarks": [("user", "bookId")],
+    "progress": [("user", "bookId")],
+    "books": [("user", "bookId")],
+    "ai_profiles": [("user",)],
+    "crash_reports": [("timestamp",), ("fingerprint",)],
+    "crash_fingerprints": [("fingerprint",), ("lastSeen",)],
+    "qdrant_sync_logs": [("timestamp",), ("user",)],
+    "qdrant_sync_log_rollups": [("day",)],
+    "mail_queue": [("user", "createdAt")],
+    "translations": [("cache_key",)],
+    "timed_captions": [("video_id",)],
+}
+
+REQUEST_TIMEOUT = 60
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def index_columns(index_sql):
+    match = re.search(r"\(([^)]*)\)", index_sql or "")
+    if not match:
+        return ()
+    return tuple(c.strip().strip("`").split()[0] for c in match.group(1).split(",") if c.strip())
+
+
+def missing_index_warnings(collection, total_items):
+    name = collection.get("name")
+    fields = collection.get("fields") or collection.get("schema") or []
+    field_names = {f.get("name") for f in fields}
+    indexes = [index_columns(sql) for sql in collection.get("indexes") or []]
+
+    def covered(columns):
+        return any(idx[:len(columns)] == columns for idx in indexes)
+
+    expected = list(EXPECTED_INDEXES.get(name, []))
+    # Owner-scoped list rules make every client list call filter by user.
+    owner_scoped = "user = @request.auth.id" in (collection.get("listRule") or "")
+    if owner_scoped and not any(cols[0] == "user" for cols in expected):
+        expected.append(("user",))
+
+    warnings = []
+    for columns in expected:
+        if not set(columns) <= field_names or covered(columns):
+            continue
+        warnings.append(f"no index starting with ({', '.join(columns)}) on {total_items} records")
+    return warnings
+
+
+def count_records(client, name):
+    listing = client.list_records(name, per_page=1, fields="id")
+    return int(listing.get("totalItems") or 0)
+
+
+def sample_records(client, name, sample_size):
+    listing = client.list_records(name, per_page=sample_size, sort="@random", skip_total=True)
+    return listing.get("items") or []
+
+
+def field_size_stats(records, field_names):
+    stats = {}
+    totals = sorted(value_size(r) for r in records)
+    for field in field_names:
+        sizes = sorted(value_size(r.get(field)) for r in records)
+        if not sizes:
+            continue
+        stats[field] = {
+            "avg": round(sum(sizes) / len(sizes), 1),
+            "p50": percentile(sizes, 50),
+            "p95": percentile(sizes, 95),
+            "max": sizes[-1],
+        }
+    if totals:
+        stats["<record>"] = {
+            "avg": round(sum(totals) / len(totals), 1),
+            "p50": percentile(totals, 50),
+            "p95": percentile(totals, 95),
+            "max": totals[-1],
+        }
+    return stats
+
+
+def user_distribution(client, name, total_items, max_scan, workers):
+    """Count records per user by paging through `fields=user` projections concurrently."""
+    per_page = 1000
+    scan = min(total_items, max_scan)
+    pages = (scan + per_page - 1) // per_page
+
+    def fetch(page):
+        listing = client.list_records(
+            name, page=page, per_page=per_page, fields="user", sort="+id", skip_total=True
+        )
+        return [str(item.get("user") or "") for item in listing.get("items") or []]
 
-    # Response might be a dict with 'items' key or a list
-    if isinstance(data, dict):
-        collections = data.get('items', [])
-    else:
-        collections = data
+    counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for users in pool.map(fetch, range(1, pages + 1)):
+            for user in users:
+                counts[user] = counts.get(user, 0) + 1
+    return counts, scan < total_items
 
-    # Filter for our collections
-    our_collections = ["settings", "progress", "bookmarks", "ai_notes", "ai_profiles", "books", "crash_reports"]
 
+def build_report(client, collections, args):
+    by_name = {c.get("name"): c for c in collections}
+    names = [n for n in (args.collections or OUR_COLLECTIONS) if n in by_name]
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        totals = dict(zip(names, pool.map(lambda n: count_records(client, n), names)))
+        samples = dict(
+            zip(names, pool.map(lambda n: sample_records(client, n, args.sample) if totals[n] else [], names))
+        )
+
+    report = {"baseUrl": client.base_url, "collections": {}}
+    for name in names:
+        collection = by_name[name]
+        field_names = [
+            f.get("name") for f in (collection.get("fields") or collection.get("schema") or [])
+            if f.get("name") and f.get("name") not in ("id", "password", "tokenKey")
+        ]
+        entry = {
+            "totalItems": totals[name],
+            "sampled": len(samples[name]),
+            "fieldSizes": field_size_stats(samples[name], field_names),
+            "indexWarnings": missing_index_warnings(collection, totals[name]),
+        }
+        if "user" in field_names and totals[name] and not args.skip_users:
+            counts, truncated = user_distribution(client, name, totals[name], args.max_user_scan, args.workers)
+            ranked = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+            values = sorted(counts.values())
+            entry["users"] = {
+                "distinctUsers": len(counts),
+                "truncated": truncated,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "top": [{"user": user or "<none>", "records": n} for user, n in ranked[:args.top]],
+            }
+        report["collections"][name] = entry
+    return report
+
+
+def print_report(report, show_all_fields):
+    print(f"{'collection':<18} {'records':>9} {'avg_rec_B':>10} {'p95_rec_B':>10} {'users':>6} {'top_user_share':>15}")
+    print("-" * 72)
+    for name, entry in report["collections"].items():
+        rec = entry["fieldSizes"].get("<record>", {})
+        users = entry.get("users") or {}
+        top = (users.get("top") or [{}])[0].get("records", 0)
+        share = f"{100.0 * top / entry['totalItems']:.1f}%" if entry["totalItems"] and users else "-"
+        print(
+            f"{name:<18} {entry['totalItems']:>9} {rec.get('avg', 0):>10} {rec.get('p95', 0):>10} "
+            f"{users.get('distinctUsers', '-'):>6} {share:>15}"
+        )
+
+    print("\nField sizes (bytes, sampled):")
+    for name, entry in report["collections"].items():
+        for field, s in entry["fieldSizes"].items():
+            if field == "<record>" or (not show_all_fields and field not in SUSPECT_FIELDS):
+                continue
+            print(f"   {(name + '.' + field):<32} avg={s['avg']:<10} p50={s['p50']:<8} p95={s['p95']:<8} max={s['max']}")
+
+    print("\nHeaviest users:")
+    for name, entry in report["collections"].items():
+        users = entry.get("users")
+        if not users or not users["top"]:
+            continue
+        top = ", ".join(f"{u['user']}={u['records']}" for u in users["top"])
+        suffix = " (scan truncated)" if users["truncated"] else ""
+        print(f"   {name}: p50={users['p50']} p95={users['p95']} top: {top}{suffix}")
+
+    warnings = [(n, w) for n, e in report["collections"].items() for w in e["indexWarnings"]]
+    if warnings:
+        print("\n⚠️  Missing indexes:")
+        for name, warning in warnings:
+            print(f"   {name}: {warning}")
+
+
+def print_fields(collections, names):
     for collection in collections:
         name = collection.get("name")
-        if name in our_collections:
+        if name in names:
             print(f"📦 Collection: {name}")
             print(f"   ID: {collection.get('id')}")
             print(f"   Type: {collection.get('type')}")
-            
+
             # API returns 'fields' not 'schema'
             fields = collection.get('fields', [])
             print(f"   Fields: {len(fields)}")
-            
+
             # Print field names
             if fields:
                 print(f"   Field list:")
@@ -67,8 +249,73 @@ def main():
                     print(f"      - {field_name} ({field_type}) [required: {required}]")
             else:
                 print(f"   ⚠️  WARNING: No fields found!")
-            
+
             print()
 
+
+def main():
+    parser = argparse.ArgumentParser(description='Check PocketBase collections, schema fields and capacity.')
+    parser.add_argument('--url', default='https://pocket.risc-v.tw', help='PocketBase URL')
+    parser.add_argument('--email', required=True, help='Admin email')
+    parser.add_argument('--password', required=True, help='Admin password')
+    parser.add_argument('--fields', action='store_true', help='Only print field lists (previous behaviour)')
+    parser.add_argument('--collections', nargs='*', help='Collections to report (default: app collections)')
+    parser.add_argument('--sample', type=int, default=200, help='Records sampled per collection for sizes')
+    parser.add_argument('--top', type=int, default=10, help='Heaviest users to list per collection')
+    parser.add_argument('--max-user-scan', type=int, default=200000, help='Max records scanned for per-user counts')
+    parser.add_argument('--skip-users', action='store_true', help='Skip the per-user distribution scan')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests')
+    parser.add_argument('--all-fields', action='store_true', help='Show size stats for every field, not just suspects')
+    parser.add_argument('--json', dest='json_path', help="Write the report as JSON ('-' for stdout only)")
+
+    args = parser.parse_args()
+    if args.sample <= 0 or args.workers <= 0 or args.top <= 0:
+        print("❌ --sample, --workers and --top must be > 0")
+        sys.exit(2)
+    args.sample = min(args.sample, 1000)  # PocketBase perPage cap
+
+    BASE_URL = args.url.rstrip("/")
+    EMAIL = args.email
+    PASSWORD = args.password
+
+    # One keep-alive connection per worker, reused across every report request.
+    client = PocketBaseClient(BASE_URL, timeout=REQUEST_TIMEOUT, pool_size=args.workers)
+
+    # Authenticate
+    try:
+        token = client.auth_admin(EMAIL, PASSWORD)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Authentication failed: {e}")
+        sys.exit(1)
+    if not token:
+        print("❌ Authentication failed with both superuser and admin endpoints")
+        sys.exit(1)
+
+    quiet = args.json_path == "-"
+    if not quiet:
+        print(f"✅ Authenticated\n")
+
+    # Get all collections
+    collections = client.list_collections()
+
+    if args.fields:
+        print_fields(collections, args.collections or OUR_COLLECTIONS)
+        return
+
+    try:
+        report = build_report(client, collections, args)
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        print(f"❌ Capacity report failed: {e}")
+        sys.exit(1)
+
+    if args.json_path == "-":
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print_report(report, args.all_fields)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 Report written to {args.json_path}")
+
 if __name__ == "__main__":
     main()
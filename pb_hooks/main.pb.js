@@ -2753,9 +2753,13 @@ cronAdd(
       if (!isFinite(maxNotes) || maxNotes <= 0) maxNotes = 30;
       if (maxNotes > 100) maxNotes = 100;
 
+      // The UTC calendar day that ended last, on the client createdAt (Unix ms): the same
+      // window, field and order scripts/build_ai_note_digests.py uses for the digests.
       var now = new Date();
-      var dayEnd = now;
-      var dayStart = new Date(now.getTime() - 24 * 60 * 60 * 1000);
+      var dayEnd = new Date(Date.UTC(now.getUTCFullYear(), now.getUTCMonth(), now.getUTCDate()));
+      var dayStart = new Date(dayEnd.getTime() - 24 * 60 * 60 * 1000);
+      var startMs = dayStart.getTime();
+      var endMs = dayEnd.getTime();
       var dayLabel = dayStart.toISOString().slice(0, 10) + " to " + dayEnd.toISOString().slice(0, 10);
       var startIso = dayStart.toISOString();
       var endIso = dayEnd.toISOString();
@@ -2789,6 +2793,32 @@ cronAdd(
         if (eid) existingMap[eid] = true;
       }
 
+      // Report bodies precomputed by scripts/build_ai_note_digests.py for this UTC day, by user:
+      // mailBody covers the "done" notes only, like the query below; empty means none.
+      // Users without a digest fall back to the per-user ai_notes query.
+      var digestMap = {};
+      var digests = [];
+      try {
+        digests = $app.findRecordsByFilter(
+          "ai_note_digests",
+          'day = "' + esc(dayStart.toISOString().slice(0, 10)) + '" && timezone = "UTC"',
+          "",
+          10000,
+          0
+        );
+      } catch (_) {
+        digests = [];
+      }
+      for (var di = 0; di < digests.length; di++) {
+        var dv = digests[di].get("user");
+        var du = "";
+        if (Array.isArray(dv)) du = String(dv[0] || "");
+        else if (dv && typeof dv === "object") du = String(dv.id || "");
+        else du = String(dv || "");
+        du = du.trim();
+        if (du) digestMap[du] = String(digests[di].get("mailBody") || "").trim();
+      }
+
       var users = [];
       try {
         users = $app.findRecordsByFilter("users", "", "id", 10000, 0);
@@ -2797,6 +2827,7 @@ cronAdd(
       }
       var stats = {
         users: Array.isArray(users) ? users.length : 0,
+        fromDigest: 0,
         queued: 0,
         skippedExisting: 0,
         skippedInvalidEmail: 0,
@@ -2820,44 +2851,53 @@ cronAdd(
             continue;
           }
 
-          var noteFilter =
-            'user = "' +
-            esc(userId) +
-            '" && status = "done" && created >= "' +
-            esc(startIso) +
-            '" && created < "' +
-            esc(endIso) +
-            '"';
-          var notes = [];
-          try {
-            notes = $app.findRecordsByFilter("ai_notes", noteFilter, "-created", maxNotes, 0);
-          } catch (_) {
-            notes = [];
-          }
-          if (!Array.isArray(notes) || notes.length === 0) {
-            stats.skippedNoNotes += 1;
-            continue;
-          }
+          var body = "";
+          if (Object.prototype.hasOwnProperty.call(digestMap, userId)) {
+            if (!digestMap[userId]) {
+              stats.skippedNoNotes += 1;
+              continue;
+            }
+            body = "AI Note Daily Report (" + dayLabel + ")\n\n" + digestMap[userId];
+            stats.fromDigest += 1;
+          } else {
+            var noteFilter =
+              'user = "' +
+              esc(userId) +
+              '" && status = "done" && createdAt >= ' +
+              String(startMs) +
+              " && createdAt < " +
+              String(endMs);
+            var notes = [];
+            try {
+              notes = $app.findRecordsByFilter("ai_notes", noteFilter, "-createdAt,-id", maxNotes, 0);
+            } catch (_) {
+              notes = [];
+            }
+            if (!Array.isArray(notes) || notes.length === 0) {
+              stats.skippedNoNotes += 1;
+              continue;
+            }
 
-          var lines = [];
-          lines.push("AI Note Daily Report (" + dayLabel + ")");
-          lines.push("");
-          lines.push("Total notes: " + String(notes.length));
-          lines.push("");
-          for (var n = 0; n < notes.length; n++) {
-            var r = notes[n];
-            var title = String((r && r.get && r.get("bookTitle")) || "").trim();
-            var originalText = String((r && r.get && r.get("originalText")) || "").trim();
-            var aiResponse = String((r && r.get && r.get("aiResponse")) || "").trim();
-            if (!title) title = "Untitled";
-            if (originalText.length > 180) originalText = originalText.slice(0, 180) + "...";
-            if (aiResponse.length > 260) aiResponse = aiResponse.slice(0, 260) + "...";
-            lines.push((n + 1) + ". " + title);
-            if (originalText) lines.push("   Note: " + originalText);
-            if (aiResponse) lines.push("   AI: " + aiResponse);
+            var lines = [];
+            lines.push("AI Note Daily Report (" + dayLabel + ")");
             lines.push("");
+            lines.push("Total notes: " + String(notes.length));
+            lines.push("");
+            for (var n = 0; n < notes.length; n++) {
+              var r = notes[n];
+              var title = String((r && r.get && r.get("bookTitle")) || "").trim();
+              var originalText = String((r && r.get && r.get("originalText")) || "").trim();
+              var aiResponse = String((r && r.get && r.get("aiResponse")) || "").trim();
+              if (!title) title = "Untitled";
+              if (originalText.length > 180) originalText = originalText.slice(0, 180) + "...";
+              if (aiResponse.length > 260) aiResponse = aiResponse.slice(0, 260) + "...";
+              lines.push((n + 1) + ". " + title);
+              if (originalText) lines.push("   Note: " + originalText);
+              if (aiResponse) lines.push("   AI: " + aiResponse);
+              lines.push("");
+            }
+            body = lines.join("\n").trim();
           }
-          var body = lines.join("\n").trim();
 
           var collection = null;
           try {
@@ -2905,6 +2945,8 @@ cronAdd(
           String(stats.users),
           "queued",
           String(stats.queued),
+          "fromDigest",
+          String(stats.fromDigest),
           "skippedExisting",
           String(stats.skippedExisting),
           "skippedInvalidEmail",
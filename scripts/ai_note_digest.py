@@ -0,0 +1,219 @@
+"""
+Daily AI-note digests: the Python side of the app's AiNoteDailySummaryBuilder.
+
+build_digest() turns one user's ai_notes of one day into an ai_note_digests
+record. It extracts the same things as the Kotlin builder:
+- "project/topic/项目:", "person/人物:" and "era/时代:" labels, their values
+  split on , ， 、 / | ； ; (at most 12 per label, 2+ characters each),
+- era keywords (唐朝, 文艺复兴, ...), "18世纪" / "1920年代" / "1644年" /
+  "18th century" mentions and the words modern / ancient / medieval,
+- the distinct book titles,
+and renders the same mail body: the counts, the entity lists and one
+"[HH:mm] title / Q / A" entry per note with previews cut to 140 characters.
+Original text and answer fall back to the `messages` JSON the way
+AiNoteSerialization does. Reading time lives on the device, so the body has no
+"Total Reading Time" line.
+
+Like the app, the digest covers notes of every status. The daily_ai_note_report
+cron only mails status "done" notes, so build_mail_body() renders its body
+separately (mailBody, without the "AI Note Daily Report (...)" line, which
+the cron adds): newest createdAt first (ties by id, like its "-createdAt,-id"
+sort), at most max_notes, note and answer cut to 180 and 260 characters as the
+cron does.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+PREVIEW_MAX_LENGTH = 140
+ENTITY_LIST_MAX = 12
+TURN_SEPARATOR = "\n\n---\nQ: "
+QA_SEPARATOR = "\n\n"
+SUBJECT_FORMAT = "AI Note Daily Summary {day} ({count})"
+MAIL_MAX_NOTES = 30
+MAIL_ORIGINAL_MAX_LENGTH = 180
+MAIL_RESPONSE_MAX_LENGTH = 260
+
+ERA_KEYWORDS = (
+    "先秦", "秦朝", "汉朝", "三国", "魏晋", "南北朝", "隋朝", "唐朝", "宋朝", "元朝", "明朝", "清朝",
+    "民国", "近代", "现代", "当代", "古代", "中世纪", "文艺复兴", "工业革命", "冷战", "春秋", "战国",
+)
+# [0-9] rather than \d: Java's \d, used by the Kotlin builder, is ASCII only.
+PROJECT_LABEL_RE = re.compile(r"(?:项目|專案|計畫|计划|project|topic|主題)\s*[:：]\s*([^\n。；;]+)", re.IGNORECASE)
+PERSON_LABEL_RE = re.compile(r"(?:人物|角色|人名|person|people)\s*[:：]\s*([^\n。；;]+)", re.IGNORECASE)
+ERA_LABEL_RE = re.compile(r"(?:时代|時代|朝代|年代|era|period)\s*[:：]\s*([^\n。；;]+)", re.IGNORECASE)
+ERA_RE = re.compile(r"([0-9]{1,2}世纪|[0-9]{4}年代|[0-9]{3,4}年|\b[0-9]{1,2}(st|nd|rd|th)\s+century\b)", re.IGNORECASE)
+TAG_SEPARATOR_RE = re.compile(r"[,，、/|；;]")
+
+
+def parse_messages(messages: object) -> List[dict]:
+    if isinstance(messages, list):
+        return messages
+    try:
+        parsed = json.loads(str(messages or ""))
+    except ValueError:
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def content_of(message: object, role: Optional[str] = None) -> str:
+    if not isinstance(message, dict) or (role and message.get("role") != role):
+        return ""
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def original_text(note: dict) -> str:
+    text = str(note.get("originalText") or "")
+    if text.strip():
+        return text
+    messages = parse_messages(note.get("messages"))
+    return content_of(messages[0]) if messages and content_of(messages[0]).strip() else ""
+
+
+def ai_response(note: dict) -> str:
+    text = str(note.get("aiResponse") or "")
+    if text.strip():
+        return text
+    messages = parse_messages(note.get("messages"))
+    parts: List[str] = []
+    first = content_of(messages[1], "assistant") if len(messages) > 1 else ""
+    if first.strip():
+        parts.append(first)
+    for i in range(2, len(messages), 2):
+        question = content_of(messages[i], "user")
+        answer = content_of(messages[i + 1], "assistant") if i + 1 < len(messages) else ""
+        if question.strip():
+            parts.append(TURN_SEPARATOR + question)
+            if answer.strip():
+                parts.append(QA_SEPARATOR + answer)
+    joined = "".join(parts)
+    return joined if joined.strip() else ""
+
+
+def shorten(text: str) -> str:
+    if not text.strip():
+        return "(empty)"
+    normalized = re.sub(r"\s+", " ", text.replace("\n", " ")).strip()
+    if len(normalized) <= PREVIEW_MAX_LENGTH:
+        return normalized
+    return normalized[:PREVIEW_MAX_LENGTH].rstrip() + "..."
+
+
+def collect_entities(pattern: re.Pattern, text: str, target: Dict[str, None]) -> None:
+    if not text.strip():
+        return
+    for match in pattern.finditer(text):
+        values = [part.strip().strip(".。:：") for part in TAG_SEPARATOR_RE.split(match.group(1) or "")]
+        for value in [v for v in values if len(v) >= 2][:ENTITY_LIST_MAX]:
+            target[value] = None
+
+
+def collect_era_keywords(text: str, target: Dict[str, None]) -> None:
+    if not text.strip():
+        return
+    lower = text.lower()
+    for keyword in ERA_KEYWORDS:
+        if keyword in text:
+            target[keyword] = None
+    for match in ERA_RE.finditer(text):
+        target[match.group(0).strip()] = None
+    for word in ("modern", "ancient", "medieval"):
+        if word in lower:
+            target[word] = None
+
+
+def format_entities(values: Dict[str, None]) -> str:
+    return ", ".join(list(values)[:ENTITY_LIST_MAX]) if values else "N/A"
+
+
+def build_mail_body(notes: List[dict], max_notes: int = MAIL_MAX_NOTES) -> Tuple[str, int]:
+    """(body, note count) of the cron's report over the "done" notes; ("", 0) when there are none."""
+    done = [note for note in notes if note.get("status") == "done"]
+    done = sorted(
+        done, key=lambda note: (int(note.get("createdAt") or 0), str(note.get("id") or "")), reverse=True
+    )[:max_notes]
+    if not done:
+        return "", 0
+    lines = [f"Total notes: {len(done)}", ""]
+    for index, note in enumerate(done, start=1):
+        title = str(note.get("bookTitle") or "").strip() or "Untitled"
+        original = str(note.get("originalText") or "").strip()
+        response = str(note.get("aiResponse") or "").strip()
+        if len(original) > MAIL_ORIGINAL_MAX_LENGTH:
+            original = original[:MAIL_ORIGINAL_MAX_LENGTH] + "..."
+        if len(response) > MAIL_RESPONSE_MAX_LENGTH:
+            response = response[:MAIL_RESPONSE_MAX_LENGTH] + "..."
+        lines.append(f"{index}. {title}")
+        if original:
+            lines.append(f"   Note: {original}")
+        if response:
+            lines.append(f"   AI: {response}")
+        lines.append("")
+    return "\n".join(lines).strip(), len(done)
+
+
+def build_digest(
+    user: str, notes: List[dict], day: str, timezone_name: str, mail_max_notes: int = MAIL_MAX_NOTES
+) -> dict:
+    """The ai_note_digests record (without id) for `user`'s notes of `day` in `timezone_name`."""
+    mail_body, mail_note_count = build_mail_body(notes, mail_max_notes)
+    tz = ZoneInfo(timezone_name)
+    ordered = sorted(notes, key=lambda note: int(note.get("createdAt") or 0))
+    projects: Dict[str, None] = {}
+    people: Dict[str, None] = {}
+    eras: Dict[str, None] = {}
+    books: Dict[str, None] = {}
+    entries: List[str] = []
+    for index, note in enumerate(ordered, start=1):
+        original = original_text(note)
+        response = ai_response(note)
+        combined = "\n".join(text for text in (original, response) if text.strip())
+        collect_entities(PROJECT_LABEL_RE, combined, projects)
+        collect_entities(PERSON_LABEL_RE, combined, people)
+        collect_entities(ERA_LABEL_RE, combined, eras)
+        collect_era_keywords(combined, eras)
+        title = str(note.get("bookTitle") or "")
+        if title.strip():
+            books[title.strip()] = None
+        time_label = datetime.fromtimestamp(int(note.get("createdAt") or 0) / 1000, tz).strftime("%H:%M")
+        entries.append(
+            f"{index}. [{time_label}] {title if title.strip() else 'Untitled'}\n"
+            f"   Q: {shorten(original)}\n"
+            f"   A: {shorten(response)}"
+        )
+    lines = [
+        "AI Note Daily Summary",
+        f"Date: {day}",
+        f"Total Notes: {len(ordered)}",
+        f"Books: {len(books)}",
+        f"Projects: {len(projects)} ({format_entities(projects)})",
+        f"People: {len(people)} ({format_entities(people)})",
+        f"Eras: {len(eras)} ({format_entities(eras)})",
+        "",
+        "Details",
+        *entries,
+    ]
+    return {
+        "user": user,
+        "day": day,
+        "timezone": timezone_name,
+        "subject": SUBJECT_FORMAT.format(day=day, count=len(ordered)),
+        "body": "\n".join(lines).strip(),
+        "noteCount": len(ordered),
+        "bookCount": len(books),
+        "books": list(books),
+        "projects": list(projects),
+        "people": list(people),
+        "eras": list(eras),
+        "noteIds": [str(note.get("id")) for note in ordered],
+        "firstNoteAt": int(ordered[0].get("createdAt") or 0) if ordered else 0,
+        "lastNoteAt": int(ordered[-1].get("createdAt") or 0) if ordered else 0,
+        "mailBody": mail_body,
+        "mailNoteCount": mail_note_count,
+    }
@@ -0,0 +1,291 @@
+"""
+Record archives written by export_user_data.py: one file per collection (or id-range shard).
+
+Formats:
+- jsonl:   one JSON object per line (keys sorted, compact), compressed with
+           zstd (needs `pip install zstandard`), gzip or none. "auto" picks zstd
+           when available, else gzip.
+- parquet: needs pyarrow. Columns are inferred from the first page: bool or
+           number (float64) when every value is one, else string, with
+           lists/objects stored as JSON text. A later record that does not fit
+           is an error (use jsonl for such collections). Rows are buffered into
+           row groups of ROW_GROUP_ROWS.
+
+Writers stream: memory stays at one page of records (one row group for parquet)
+whatever the collection size. They write to FILE.part and rename on close, so
+an interrupted export never leaves a file that looks complete. Each closed
+file reports its record count, size, the sha256 of the file and the sha256 of
+the uncompressed JSONL content (independent of compression level/library).
+
+manifest.json ties the files together:
+  {"format_version": 1, "created": ..., "source": ..., "collections":
+     {"ai_notes": {"records": N, "server_total": N, "files": [{"path": ..., "records": ...,
+                   "bytes": ..., "sha256": ..., "content_sha256": ..., "shard": ...}]}}}
+
+iter_records(path) reads any of these files back (parquet rows come back with
+JSON-text columns still as text).
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+FORMATS = ("jsonl", "parquet")
+COMPRESSIONS = ("auto", "zstd", "gzip", "none")
+SUFFIXES = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz", "none": ".jsonl"}
+# Everything an export writes besides the manifest, including leftovers of an interrupted one.
+ARCHIVE_SUFFIXES = (*SUFFIXES.values(), ".parquet", ".part")
+DEFAULT_LEVEL = {"zstd": 6, "gzip": 6, "none": 0}
+ROW_GROUP_ROWS = 20000
+
+
+def has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def resolve_compression(name: str) -> str:
+    """Map auto to zstd/gzip; raises RuntimeError when zstd is asked for but missing."""
+    if name == "auto":
+        return "zstd" if has_module("zstandard") else "gzip"
+    if name == "zstd" and not has_module("zstandard"):
+        raise RuntimeError("zstd compression needs the zstandard package: pip install zstandard")
+    return name
+
+
+def record_line(record: Dict[str, object]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class _HashingFile:
+    """Write-only file wrapper that hashes and counts what reaches the disk."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+class ArchiveWriter:
+    """Base class: FILE.part handling, counters and the manifest entry."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.part = path.with_name(path.name + ".part")
+        self.records = 0
+        self.content_sha256 = hashlib.sha256()
+        self._raw = open(self.part, "wb")
+        self._file = _HashingFile(self._raw)
+
+    def write(self, records: List[Dict[str, object]]) -> None:
+        raise NotImplementedError
+
+    def _finish(self) -> None:
+        """Flush the format's trailer into self._file."""
+
+    def close(self) -> Dict[str, object]:
+        self._finish()
+        self._raw.close()
+        os.replace(self.part, self.path)
+        return {
+            "path": self.path.name,
+            "records": self.records,
+            "bytes": self._file.bytes,
+            "sha256": self._file.sha256.hexdigest(),
+            "content_sha256": self.content_sha256.hexdigest(),
+        }
+
+    def abort(self) -> None:
+        try:
+            self._raw.close()
+        finally:
+            self.part.unlink(missing_ok=True)
+
+
+class JsonlWriter(ArchiveWriter):
+    def __init__(self, path: Path, compression: str, level: Optional[int] = None):
+        super().__init__(path)
+        level = DEFAULT_LEVEL[compression] if level is None else level
+        if compression == "zstd":
+            import zstandard
+
+            self._stream = zstandard.ZstdCompressor(level=level).stream_writer(self._file, closefd=False)
+        elif compression == "gzip":
+            # mtime=0: the same records always give the same bytes.
+            self._stream = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=level, mtime=0)
+        else:
+            self._stream = self._file
+
+    def write(self, records: List[Dict[str, object]]) -> None:
+        data = b"".join(record_line(record) for record in records)
+        self.content_sha256.update(data)
+        self._stream.write(data)
+        self.records += len(records)
+
+    def _finish(self) -> None:
+        if self._stream is not self._file:
+            self._stream.close()
+
+
+class ParquetWriter(ArchiveWriter):
+    def __init__(self, path: Path, compression: str, level: Optional[int] = None):
+        import pyarrow  # noqa: F401 - fail before the first page, not after it
+
+        super().__init__(path)
+        # pyarrow writes the file itself; it is hashed once closed.
+        self._raw.close()
+        self.compression = "zstd" if compression == "auto" else compression
+        self.level = level
+        self._columns: Optional[Dict[str, str]] = None
+        self._rows: List[Dict[str, object]] = []
+        self._writer = None
+
+    @staticmethod
+    def column_kind(value: object) -> str:
+        if isinstance(value, bool):
+            return "bool"
+        if isinstance(value, (int, float)):
+            return "number"
+        return "string"
+
+    def _cell(self, name: str, kind: str, value: object) -> object:
+        if value is None:
+            return None
+        if kind == "string":
+            return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, sort_keys=True)
+        if self.column_kind(value) != kind:
+            raise RuntimeError(f"{self.path.name}: column {name!r} holds {kind} and {type(value).__name__} values; use --format jsonl")
+        return value
+
+    def write(self, records: List[Dict[str, object]]) -> None:
+        for record in records:
+            self.content_sha256.update(record_line(record))
+        if self._columns is None and records:
+            kinds: Dict[str, set] = {}
+            for record in records:
+                for key, value in record.items():
+                    kinds.setdefault(key, set())
+                    if value is not None:
+                        kinds[key].add("string" if isinstance(value, (list, dict)) else self.column_kind(value))
+            # A column is bool/number only when every sampled value is; anything mixed is text.
+            self._columns = {key: found.pop() if len(found) == 1 else "string" for key, found in sorted(kinds.items())}
+        for record in records:
+            if not record.keys() <= self._columns.keys():
+                extra = sorted(record.keys() - self._columns.keys())
+                raise RuntimeError(f"{self.path.name}: new field(s) {', '.join(extra)} after the first page; use --format jsonl")
+        self._rows.extend(records)
+        self.records += len(records)
+        if len(self._rows) >= ROW_GROUP_ROWS:
+            self._flush_rows()
+
+    def _flush_rows(self, final: bool = False) -> None:
+        if self._columns is None:
+            if not final:
+                return
+            self._columns = {"id": "string"}  # no records: still a valid (empty) parquet file
+        if not self._rows and not (final and self._writer is None):
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"bool": pa.bool_(), "number": pa.float64(), "string": pa.string()}
+        schema = pa.schema([(name, types[kind]) for name, kind in self._columns.items()])
+        table = pa.Table.from_pydict(
+            {name: [self._cell(name, kind, row.get(name)) for row in self._rows] for name, kind in self._columns.items()},
+            schema=schema,
+        )
+        if self._writer is None:
+            options = {"compression_level": self.level} if self.level is not None and self.compression != "none" else {}
+            self._writer = pq.ParquetWriter(str(self.part), schema, compression=self.compression, **options)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self) -> Dict[str, object]:
+        self._flush_rows(final=True)
+        self._writer.close()
+        os.replace(self.part, self.path)
+        return {
+            "path": self.path.name,
+            "records": self.records,
+            "bytes": self.path.stat().st_size,
+            "sha256": file_sha256(self.path),
+            "content_sha256": self.content_sha256.hexdigest(),
+        }
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self.part.unlink(missing_ok=True)
+
+
+def open_writer(directory: Path, stem: str, fmt: str, compression: str, level: Optional[int] = None) -> ArchiveWriter:
+    """A writer for DIRECTORY/STEM plus the suffix of the format; compression must be resolved already."""
+    if fmt == "parquet":
+        return ParquetWriter(directory / f"{stem}.parquet", compression, level)
+    return JsonlWriter(directory / f"{stem}{SUFFIXES[compression]}", compression, level)
+
+
+def iter_records(path: Path) -> Iterator[Dict[str, object]]:
+    name = path.name
+    if name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(str(path))
+        for group in range(parquet.num_row_groups):
+            for row in parquet.read_row_group(group).to_pylist():
+                yield {key: value for key, value in row.items() if value is not None}
+        return
+    if name.endswith(".zst"):
+        import io
+
+        import zstandard
+
+        with open(path, "rb") as raw:
+            stream = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8")
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_manifest(directory: Path, manifest: Dict[str, object]) -> Path:
+    path = directory / MANIFEST_NAME
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+def read_manifest(directory: Path) -> Dict[str, object]:
+    manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+    if int(manifest.get("format_version") or 0) > FORMAT_VERSION:
+        raise RuntimeError(f"{directory / MANIFEST_NAME}: format_version {manifest.get('format_version')} is newer than supported")
+    return manifest
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -9,10 +9,33 @@ What it does:
 4) Calls Alibaba DashScope embedding API (OpenAI-compatible endpoint)
 5) Upserts points into Qdrant in batches
 
+With --async-inflight N the same steps run on the asyncio engine (pb_async.py):
+up to N embedding calls are in flight at once, the next PocketBase page is
+fetched while the current one is embedded, and Ctrl-C cancels the in-flight
+calls but still upserts every vector already computed.
+
+Each embedding call gets a deadline adapted to the recent latencies (hedging.py):
+a call that hangs is cut off and re-sent instead of stalling the run for the
+full --embed-timeout. With --hedge a duplicate request is sent once a call runs
+past the recent p95, capped by --hedge-budget; the first answer wins.
+
+Embeddings come from a pluggable backend (embedding_backends.py), --embed-batch
+texts per call: the OpenAI-compatible API (default), or a local CPU backend on
+a process pool, `hashing` (no model) or `onnx` (--onnx-model DIR). The end-of-run
+summary reports the backend's throughput in texts/s.
+
 Usage examples:
   python3 scripts/backfill_ai_notes_to_qdrant.py --dry-run
   python3 scripts/backfill_ai_notes_to_qdrant.py --limit 500 --batch-size 64
   python3 scripts/backfill_ai_notes_to_qdrant.py --only-done true
+  python3 scripts/backfill_ai_notes_to_qdrant.py --async-inflight 200 \
+      --host-limit dashscope-intl.aliyuncs.com=100 --host-limit 127.0.0.1=8
+  python3 scripts/backfill_ai_notes_to_qdrant.py --hedge --hedge-budget 0.05 --embed-timeout 60
+  python3 scripts/backfill_ai_notes_to_qdrant.py --embedding-backend onnx --onnx-model models/all-MiniLM-L6-v2 \
+      --dimensions 384 --collection ai_notes_minilm --embed-processes 4
+  python3 scripts/backfill_ai_notes_to_qdrant.py --progress-sec 30 --metrics-json /tmp/backfill-metrics.json
+  python3 scripts/backfill_ai_notes_to_qdrant.py \
+      --metrics-textfile /var/lib/node_exporter/textfile/booxreader_qdrant_backfill.prom --metrics-port 9465
 
 Optional env/.env keys:
   POCKETBASE_URL
@@ -25,11 +48,10 @@ Optional env/.env keys:
 from __future__ import annotations
 
 import argparse
+import asyncio
 import hashlib
 import json
-import os
 import sys
-import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -37,6 +59,41 @@ from urllib.parse import quote
 
 import requests
 
+import http_trace
+from embedding_backends import (
+    BACKENDS,
+    DEFAULT_EMBED_TIMEOUT_SEC,
+    EmbeddingBackend,
+    ServiceError,
+    make_backend,
+)
+from hedging import (
+    DEFAULT_DEADLINE_FACTOR,
+    DEFAULT_HEDGE_BUDGET,
+    DEFAULT_HEDGE_QUANTILE,
+    DEFAULT_MIN_DEADLINE_SEC,
+    Hedger,
+)
+from openmetrics import exporter_from_args
+from pb_async import (
+    AsyncHttpClient,
+    AsyncPocketBase,
+    TaskWindow,
+    list_ai_notes_page_async,
+    parse_host_limits,
+    run_cancellable,
+)
+from pb_client import (
+    DEFAULT_POOL_SIZE,
+    PocketBaseClient,
+    list_ai_notes_page,
+    load_env_file,
+    login,
+    parse_bool,
+    resolve_value,
+)
+from run_metrics import RunMetrics, add_run_args, failure_reason, timed, validate_run_args
+
 
 DEFAULT_EMBEDDING_URL = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1/embeddings"
 DEFAULT_MODEL = "text-embedding-v4"
@@ -44,32 +101,6 @@ DEFAULT_DIMENSIONS = 1024
 DEFAULT_COLLECTION = "ai_notes"
 
 
-def load_env_file(path: Path) -> Dict[str, str]:
-    env: Dict[str, str] = {}
-    if not path.exists():
-        return env
-    for raw in path.read_text(encoding="utf-8").splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#") or "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        key = key.strip()
-        value = value.strip().strip('"').strip("'")
-        if key:
-            env[key] = value
-    return env
-
-
-def resolve_value(explicit: Optional[str], env_key: str, file_env: Dict[str, str]) -> Optional[str]:
-    if explicit:
-        return explicit
-    return os.getenv(env_key) or file_env.get(env_key)
-
-
-def parse_bool(value: str) -> bool:
-    return value.strip().lower() in {"1", "true", "yes", "y", "on"}
-
-
 def point_id_from_pb_id(pb_id: str) -> str:
     digest = hashlib.md5(pb_id.encode("utf-8")).hexdigest()
     return f"{digest[0:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:32]}"
@@ -89,135 +120,55 @@ def build_text_to_embed(record: Dict[str, object], max_chars: int) -> str:
     return merged
 
 
-def pb_headers(token: str) -> Dict[str, str]:
-    return {"Authorization": f"Bearer {token}"}
-
-
-def try_admin_auth(base_url: str, email: str, password: str, verify_ssl: bool) -> Optional[str]:
-    candidates = (
-        "/api/collections/_superusers/auth-with-password",
-        "/api/admins/auth-with-password",
-    )
-    payload = {"identity": email, "password": password}
-    for path in candidates:
-        url = f"{base_url}{path}"
-        try:
-            resp = requests.post(url, json=payload, timeout=30, verify=verify_ssl)
-        except requests.RequestException:
-            continue
-        if resp.status_code == 200:
-            body = resp.json() if resp.text else {}
-            token = (body.get("token") or "").strip()
-            if token:
-                return token
-    return None
-
-
-def user_auth(base_url: str, email: str, password: str, verify_ssl: bool) -> Tuple[str, str]:
-    endpoint = f"{base_url}/api/collections/users/auth-with-password"
-    payloads = (
-        {"identity": email, "password": password},
-        {"email": email, "password": password},
-    )
-    last_err = ""
-    for payload in payloads:
-        resp = requests.post(endpoint, json=payload, timeout=30, verify=verify_ssl)
-        if resp.status_code == 200:
-            body = resp.json() if resp.text else {}
-            token = (body.get("token") or "").strip()
-            user_id = str((body.get("record") or {}).get("id") or "").strip()
-            if token and user_id:
-                return token, user_id
-            last_err = "token or user id missing"
-            continue
-        last_err = f"{resp.status_code} {resp.text[:400]}"
-    raise RuntimeError(f"user auth failed: {last_err}")
-
-
-def list_ai_notes_page(
-    base_url: str,
-    token: str,
-    page: int,
-    per_page: int,
-    verify_ssl: bool,
-    only_done: bool,
-    user_id: Optional[str],
-) -> Dict[str, object]:
-    endpoint = f"{base_url}/api/collections/ai_notes/records"
-    filters: List[str] = []
-    if only_done:
-        filters.append("status='done'")
-    if user_id:
-        filters.append(f"user='{user_id}'")
-    params = {"page": page, "perPage": per_page, "sort": "+id"}
-    if filters:
-        params["filter"] = "(" + "&&".join(filters) + ")"
-    resp = requests.get(
-        endpoint,
-        params=params,
-        headers=pb_headers(token),
-        timeout=60,
-        verify=verify_ssl,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"list ai_notes failed: {resp.status_code} {resp.text[:500]}")
-    return resp.json() if resp.text else {}
-
-
-def fetch_embedding(
-    api_key: str,
-    embedding_url: str,
-    model: str,
-    dimensions: int,
-    text: str,
+def upsert_points(
+    session: requests.Session,
+    qdrant_url: str,
+    collection: str,
+    points: List[Dict[str, object]],
     verify_ssl: bool,
-) -> List[float]:
-    resp = requests.post(
-        embedding_url,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": model,
-            "input": text,
-            "dimensions": dimensions,
-            "encoding_format": "float",
-        },
-        timeout=120,
-        verify=verify_ssl,
-    )
+    metrics: Optional[RunMetrics] = None,
+) -> None:
+    if not points:
+        return
+    endpoint = f"{qdrant_url}/collections/{quote(collection)}/points?wait=true"
+    with timed(metrics, "upsert_encode"):
+        body = json.dumps({"points": points})
+    with timed(metrics, "qdrant_upsert"):
+        resp = session.put(
+            endpoint,
+            headers={"Content-Type": "application/json"},
+            data=body,
+            timeout=60,
+            verify=verify_ssl,
+        )
     if resp.status_code != 200:
-        raise RuntimeError(f"embedding API failed: {resp.status_code} {resp.text[:500]}")
-    body = resp.json() if resp.text else {}
-    vector = ((body.get("data") or [{}])[0] or {}).get("embedding")
-    if not isinstance(vector, list):
-        raise RuntimeError("embedding missing")
-    if len(vector) != dimensions:
-        raise RuntimeError(f"embedding dim mismatch: {len(vector)} != {dimensions}")
-    if any((not isinstance(v, (int, float)) or not float(v) == float(v) or float(v) in (float("inf"), float("-inf"))) for v in vector):
-        raise RuntimeError("embedding contains non-finite values")
-    return [float(v) for v in vector]
+        raise ServiceError(f"qdrant upsert failed: {resp.status_code} {resp.text[:500]}", resp.status_code)
+    if metrics is not None:
+        metrics.observe_value("upsert_batch_size", len(points))
+        metrics.success()
 
 
-def upsert_points(
+async def upsert_points_async(
+    http: AsyncHttpClient,
     qdrant_url: str,
     collection: str,
     points: List[Dict[str, object]],
-    verify_ssl: bool,
+    metrics: Optional[RunMetrics] = None,
 ) -> None:
     if not points:
         return
     endpoint = f"{qdrant_url}/collections/{quote(collection)}/points?wait=true"
-    resp = requests.put(
-        endpoint,
-        headers={"Content-Type": "application/json"},
-        data=json.dumps({"points": points}),
-        timeout=60,
-        verify=verify_ssl,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"qdrant upsert failed: {resp.status_code} {resp.text[:500]}")
+    with timed(metrics, "upsert_encode"):
+        body = json.dumps({"points": points}).encode("utf-8")
+    with timed(metrics, "qdrant_upsert"):
+        resp = await http.request(
+            "PUT", endpoint, data=body, headers={"Content-Type": "application/json"}, timeout=60
+        )
+    if resp.status != 200:
+        raise ServiceError(f"qdrant upsert failed: {resp.status} {resp.text[:500]}", resp.status)
+    if metrics is not None:
+        metrics.observe_value("upsert_batch_size", len(points))
+        metrics.success()
 
 
 @dataclass
@@ -230,6 +181,198 @@ class Counters:
     failed: int = 0
 
 
+def prepare_note(
+    record: Dict[str, object], max_chars: int, counters: Counters, metrics: Optional[RunMetrics] = None
+) -> Optional[Tuple[str, str, Dict[str, object]]]:
+    """Return (pb_id, text to embed, point payload), or None after counting why the note is skipped."""
+    pb_id = str(record.get("id") or "").strip()
+    if not pb_id:
+        counters.failed += 1
+        if metrics is not None:
+            metrics.failure("missing_id")
+        return None
+
+    ai_response = str(record.get("aiResponse") or "")
+    if len(ai_response.strip()) < 2:
+        counters.skipped_short_answer += 1
+        return None
+
+    text_to_embed = build_text_to_embed(record, max_chars=max_chars)
+    if not text_to_embed.strip():
+        counters.skipped_empty_text += 1
+        return None
+
+    point_payload = {
+        "pb_id": pb_id,
+        "user_id": str(record.get("user") or ""),
+        "book_id": str(record.get("bookId") or ""),
+    }
+    return pb_id, text_to_embed, point_payload
+
+
+def embed_texts(backend: EmbeddingBackend, hedger: Hedger, texts: List[str]) -> List[List[float]]:
+    """Remote backends go through the hedger (adaptive deadline, hedging); local ones run as is."""
+    if backend.remote:
+        return hedger.call(lambda deadline: backend.embed(texts, timeout=deadline))
+    return backend.embed(texts)
+
+
+async def embed_texts_async(backend: EmbeddingBackend, hedger: Hedger, texts: List[str]) -> List[List[float]]:
+    if backend.remote:
+        return await hedger.call_async(lambda deadline: backend.embed_async(texts, timeout=deadline))
+    return await backend.embed_async(texts)
+
+
+def batch_failed(
+    batch: List[Tuple[str, str, Dict[str, object]]], exc: BaseException, counters: Counters, metrics: RunMetrics
+) -> None:
+    counters.failed += len(batch)
+    for _ in batch:
+        metrics.failure(failure_reason("embed", exc))
+    ids = ", ".join(pb_id for pb_id, _, _ in batch[:3]) + (", ..." if len(batch) > 3 else "")
+    print(f"[WARN] embedding of {len(batch)} notes failed (pb_id={ids}): {exc}", file=sys.stderr)
+    metrics.done(len(batch))
+
+
+async def backfill_async(
+    client: PocketBaseClient,
+    args: argparse.Namespace,
+    qdrant_url: str,
+    only_done: bool,
+    filter_user_id: Optional[str],
+    counters: Counters,
+    metrics: RunMetrics,
+    backend: EmbeddingBackend,
+    hedger: Hedger,
+) -> bool:
+    """
+    Asyncio variant of the main loop; returns False when interrupted.
+
+    Up to --async-inflight embedding batches run at once (each host further
+    capped by --host-limit), full upsert batches are sent by the call that fills them, and
+    the next page is listed while the current one is embedded. On cancellation
+    the in-flight calls are dropped and every vector already computed is still
+    upserted before returning.
+    """
+    http = AsyncHttpClient(
+        default_limit=args.async_inflight,
+        limits=parse_host_limits(args.host_limit),
+        verify_ssl=not args.insecure,
+    )
+    pb = AsyncPocketBase(client, http)
+    backend.use_async_client(http)
+    metrics.add_probe("connection_replays", lambda: http.stats["replays"])
+    window = TaskWindow(args.async_inflight)
+    upsert_batch: List[Dict[str, object]] = []
+    pending: List[Tuple[str, str, Dict[str, object]]] = []
+    next_page: Optional[asyncio.Future] = None
+    interrupted = False
+
+    async def flush() -> None:
+        """Upsert the first --batch-size queued points; the rest stay queued."""
+        points = upsert_batch[: args.batch_size]
+        del upsert_batch[: len(points)]
+        if not points:
+            return
+        try:
+            await upsert_points_async(http, qdrant_url, args.collection, points, metrics=metrics)
+        except asyncio.CancelledError:
+            upsert_batch[:0] = points
+            raise
+        except Exception as exc:  # noqa: BLE001
+            counters.failed += len(points)
+            metrics.failure(failure_reason("upsert", exc))
+            print(f"[WARN] upsert of {len(points)} points failed: {exc}", file=sys.stderr)
+            return
+        counters.upserted += len(points)
+        print(f"upserted {counters.upserted} points")
+
+    async def embed_batch(batch: List[Tuple[str, str, Dict[str, object]]]) -> None:
+        try:
+            with http_trace.note(",".join(pb_id for pb_id, _, _ in batch)), metrics.stage("embed_call"):
+                vectors = await embed_texts_async(backend, hedger, [text for _, text, _ in batch])
+        except Exception as exc:  # noqa: BLE001
+            batch_failed(batch, exc, counters, metrics)
+            return
+        metrics.observe_value("embed_batch_size", len(batch))
+        counters.embedded += len(batch)
+        for (pb_id, _, point_payload), vector in zip(batch, vectors):
+            upsert_batch.append({"id": point_id_from_pb_id(pb_id), "vector": vector, "payload": point_payload})
+        metrics.done(len(batch))
+        while len(upsert_batch) >= args.batch_size:
+            await flush()
+
+    async def timed_list(page: int) -> Dict[str, object]:
+        with metrics.stage("pb_list"):
+            return await list_ai_notes_page_async(
+                pb, page=page, per_page=args.per_page, only_done=only_done, user_id=filter_user_id
+            )
+
+    def list_page(page: int) -> asyncio.Future:
+        return asyncio.ensure_future(timed_list(page))
+
+    try:
+        page = 1
+        next_page = list_page(page)
+        while True:
+            listing = await next_page
+            next_page = None
+            if page == 1:
+                total_items = int(listing.get("totalItems") or 0)
+                print(f"Total candidate notes (server hint): {total_items}")
+                metrics.set_total(min(total_items, args.limit) if args.limit > 0 else total_items)
+            items = listing.get("items") or []
+            if not items:
+                break
+            next_page = list_page(page + 1)
+
+            for record in items:
+                counters.seen += 1
+                if args.limit > 0 and counters.seen > args.limit:
+                    break
+                with metrics.stage("prepare"):
+                    prepared = prepare_note(record, args.max_chars, counters, metrics)
+                if prepared is None:
+                    metrics.done()
+                    continue
+                if args.dry_run:
+                    counters.embedded += 1
+                    counters.upserted += 1
+                    if counters.upserted % 50 == 0:
+                        print(f"[dry-run] processed {counters.upserted} notes")
+                    metrics.done()
+                    continue
+                pending.append(prepared)
+                if len(pending) < backend.batch_size:
+                    continue
+                await window.submit(embed_batch(pending[:]))
+                pending.clear()
+                metrics.gauge("inflight", len(window.running))
+                metrics.gauge("upsert_batch", len(upsert_batch))
+
+            if args.limit > 0 and counters.seen >= args.limit:
+                break
+            page += 1
+        if pending:
+            await window.submit(embed_batch(pending[:]))
+            pending.clear()
+        await window.drain()
+    except asyncio.CancelledError:
+        interrupted = True
+    finally:
+        await window.cancel()
+        if next_page is not None:
+            next_page.cancel()
+            await asyncio.gather(next_page, return_exceptions=True)
+        try:
+            while upsert_batch:
+                await flush()
+        finally:
+            await http.close()
+    print(f"async engine: {http.stats['connections']} connections, peak in-flight {http.peak_inflight}")
+    return not interrupted
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Backfill PocketBase ai_notes embeddings into Qdrant."
@@ -240,9 +383,22 @@ def main() -> int:
     parser.add_argument("--email", help="PocketBase users collection email (fallback auth)")
     parser.add_argument("--password", help="PocketBase users collection password (fallback auth)")
     parser.add_argument("--dashscope-api-key", help="Alibaba DashScope API key")
+    parser.add_argument(
+        "--embedding-backend",
+        choices=BACKENDS,
+        default="openai",
+        help="openai: OpenAI-compatible API; hashing: local feature hashing; onnx: local ONNX sentence model",
+    )
     parser.add_argument("--embedding-url", default=DEFAULT_EMBEDDING_URL, help="Embedding API URL")
     parser.add_argument("--model", default=DEFAULT_MODEL, help="Embedding model")
     parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS, help="Embedding dimensions")
+    parser.add_argument(
+        "--embed-batch", type=int, default=0, help="Texts per embedding call (0: backend default, 10 for openai)"
+    )
+    parser.add_argument("--onnx-model", help="onnx backend: directory with model.onnx and tokenizer.json")
+    parser.add_argument(
+        "--embed-processes", type=int, default=0, help="Local backends: worker processes (0: CPU count)"
+    )
     parser.add_argument("--qdrant-url", help="Qdrant base URL, e.g. http://127.0.0.1:6333")
     parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Qdrant collection")
     parser.add_argument("--per-page", type=int, default=100, help="PocketBase page size")
@@ -257,6 +413,49 @@ def main() -> int:
     parser.add_argument("--user-id", help="Process only one user id (optional)")
     parser.add_argument("--dry-run", action="store_true", help="Do not call embedding/Qdrant, only count")
     parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="Keep-alive connections per host")
+    parser.add_argument(
+        "--async-inflight",
+        type=int,
+        default=0,
+        help="Run on the asyncio engine with up to N requests in flight (0: sequential loop)",
+    )
+    parser.add_argument(
+        "--host-limit",
+        action="append",
+        default=[],
+        metavar="HOST=N",
+        help="Async engine: max connections to HOST (repeatable; default: --async-inflight)",
+    )
+    add_run_args(parser)
+    parser.add_argument(
+        "--embed-timeout",
+        type=float,
+        default=DEFAULT_EMBED_TIMEOUT_SEC,
+        help="Upper bound of the per-request embedding deadline, seconds",
+    )
+    parser.add_argument(
+        "--deadline-factor",
+        type=float,
+        default=DEFAULT_DEADLINE_FACTOR,
+        help="Adaptive embedding deadline = factor x recent p99, at least --min-deadline (0: fixed --embed-timeout)",
+    )
+    parser.add_argument(
+        "--min-deadline", type=float, default=DEFAULT_MIN_DEADLINE_SEC, help="Lower bound of the adaptive deadline, seconds"
+    )
+    parser.add_argument("--embed-retries", type=int, default=1, help="Re-sends of an embedding call cut off at its deadline")
+    parser.add_argument(
+        "--hedge", action="store_true", help="Send a duplicate embedding request when one runs past --hedge-quantile"
+    )
+    parser.add_argument(
+        "--hedge-quantile", type=float, default=DEFAULT_HEDGE_QUANTILE, help="Recent latency quantile that triggers a hedge"
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        type=float,
+        default=DEFAULT_HEDGE_BUDGET,
+        help="Max duplicate requests as a fraction of embedding calls",
+    )
     args = parser.parse_args()
 
     file_env = load_env_file(Path(".env"))
@@ -288,21 +487,44 @@ def main() -> int:
         print("Error: --per-page must be > 0", file=sys.stderr)
         return 2
 
-    # Auth
-    token: Optional[str] = None
-    auth_mode = ""
-    filter_user_id: Optional[str] = args.user_id
-    if admin_email and admin_password:
-        token = try_admin_auth(base_url, admin_email, admin_password, verify_ssl=verify_ssl)
-        if token:
-            auth_mode = "admin"
-    if not token and user_email and user_password:
-        token, user_id = user_auth(base_url, user_email, user_password, verify_ssl=verify_ssl)
-        auth_mode = "user"
-        if not filter_user_id:
-            filter_user_id = user_id
-
-    if not token:
+    if args.pool_size <= 0:
+        print("Error: --pool-size must be > 0", file=sys.stderr)
+        return 2
+    if args.async_inflight < 0:
+        print("Error: --async-inflight must be >= 0", file=sys.stderr)
+        return 2
+    try:
+        parse_host_limits(args.host_limit)
+    except ValueError as exc:
+        print(f"Error: --host-limit: {exc}", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+    if args.embed_timeout <= 0 or args.min_deadline <= 0 or args.deadline_factor < 0:
+        print("Error: --embed-timeout/--min-deadline must be > 0 and --deadline-factor >= 0", file=sys.stderr)
+        return 2
+    if args.embed_batch < 0 or args.embed_processes < 0:
+        print("Error: --embed-batch/--embed-processes must be >= 0", file=sys.stderr)
+        return 2
+    if args.embed_retries < 0:
+        print("Error: --embed-retries must be >= 0", file=sys.stderr)
+        return 2
+    if not 0 < args.hedge_quantile < 1 or not 0 <= args.hedge_budget <= 1:
+        print("Error: --hedge-quantile must be in (0, 1) and --hedge-budget in [0, 1]", file=sys.stderr)
+        return 2
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="backfill_ai_notes_to_qdrant")
+
+    # Auth; the same pooled session also carries the DashScope and Qdrant calls.
+    client = PocketBaseClient(base_url, verify_ssl=verify_ssl, pool_size=args.pool_size)
+    session = client.session
+    auth_mode, user_id = login(client, admin_email, admin_password, user_email, user_password)
+    filter_user_id: Optional[str] = args.user_id or user_id
+
+    if not auth_mode:
         print(
             "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
             "or user creds (--email/--password).",
@@ -310,36 +532,147 @@ def main() -> int:
         )
         return 2
 
-    if not args.dry_run and not api_key:
+    if args.embedding_backend == "openai" and not args.dry_run and not api_key:
         print("Error: missing DashScope API key. Use --dashscope-api-key or DASHSCOPE_API_KEY.", file=sys.stderr)
         return 2
 
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    try:
+        backend = make_backend(
+            args.embedding_backend,
+            dimensions,
+            batch_size=args.embed_batch,
+            processes=args.embed_processes,
+            url=args.embedding_url,
+            api_key=api_key or "",
+            model=args.model,
+            onnx_model=args.onnx_model or "",
+            session=session,
+            verify_ssl=verify_ssl,
+            metrics=metrics,
+        )
+    except (ValueError, RuntimeError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    if backend.dimensions != dimensions:
+        backend.close()
+        print(
+            f"Error: {backend.describe()} produces {backend.dimensions}-dim vectors; pass --dimensions {backend.dimensions}",
+            file=sys.stderr,
+        )
+        return 2
+
     print(
         f"Start backfill: pb={base_url}, qdrant={qdrant_url}, collection={args.collection}, "
-        f"auth={auth_mode}, only_done={only_done}, user_filter={filter_user_id or '<none>'}, "
-        f"dry_run={args.dry_run}"
+        f"auth={auth_mode}/{client.auth_source}, only_done={only_done}, user_filter={filter_user_id or '<none>'}, "
+        f"dry_run={args.dry_run}, async_inflight={args.async_inflight or '<off>'}, embedding={backend.describe()}"
     )
 
-    counters = Counters()
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    hedger = Hedger(
+        max_deadline=args.embed_timeout,
+        deadline_factor=args.deadline_factor,
+        min_deadline=args.min_deadline,
+        retries=args.embed_retries,
+        hedge=args.hedge,
+        hedge_quantile=args.hedge_quantile,
+        hedge_budget=args.hedge_budget,
+    )
+    metrics.add_probe("embed_hedges", lambda: hedger.stats["hedges"])
+    metrics.add_probe("embed_hedge_wins", lambda: hedger.stats["hedge_wins"])
+    metrics.add_probe("embed_deadline_cutoffs", lambda: hedger.stats["cutoffs"])
+    metrics.add_finish_hook(hedger.close)
+    metrics.add_finish_hook(backend.close)
+    if not args.dry_run:
+        metrics.add_finish_hook(lambda: print(f"  {backend.throughput_line()}"))
+        if backend.remote:
+            metrics.add_finish_hook(lambda: print(f"  embedding tail control: {hedger.summary()}"))
+    try:
+        exporter_from_args(metrics, "backfill_ai_notes_to_qdrant", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+    if args.async_inflight > 0:
+        try:
+            completed = run_cancellable(
+                backfill_async(
+                    client, args, qdrant_url, only_done, filter_user_id, counters, metrics, backend, hedger
+                )
+            )
+        except Exception as exc:  # noqa: BLE001
+            print(f"Fatal error: {exc}", file=sys.stderr)
+            return metrics.finish_run("Failed.", counters, 1, args.metrics_json, script="backfill_ai_notes_to_qdrant")
+        if completed:
+            return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="backfill_ai_notes_to_qdrant")
+        return metrics.finish_run(
+            "Interrupted; vectors computed so far were upserted.",
+            counters,
+            130,
+            args.metrics_json,
+            script="backfill_ai_notes_to_qdrant",
+        )
+
     page = 1
     total_items_hint = None
     upsert_batch: List[Dict[str, object]] = []
-    start_ts = time.time()
+    pending: List[Tuple[str, str, Dict[str, object]]] = []
+
+    def upsert_full_batch() -> None:
+        """Upsert the first --batch-size queued points; the rest stay queued."""
+        points = upsert_batch[: args.batch_size]
+        upsert_points(
+            session,
+            qdrant_url=qdrant_url,
+            collection=args.collection,
+            points=points,
+            verify_ssl=verify_ssl,
+            metrics=metrics,
+        )
+        counters.upserted += len(points)
+        print(f"upserted {counters.upserted} points")
+        del upsert_batch[: len(points)]
+
+    def embed_pending() -> None:
+        batch = pending[:]
+        pending.clear()
+        try:
+            with http_trace.note(",".join(pb_id for pb_id, _, _ in batch)), metrics.stage("embed_call"):
+                vectors = embed_texts(backend, hedger, [text for _, text, _ in batch])
+        except Exception as exc:  # noqa: BLE001
+            batch_failed(batch, exc, counters, metrics)
+            return
+        metrics.observe_value("embed_batch_size", len(batch))
+        counters.embedded += len(batch)
+        for (pb_id, _, point_payload), vector in zip(batch, vectors):
+            upsert_batch.append({"id": point_id_from_pb_id(pb_id), "vector": vector, "payload": point_payload})
+        metrics.done(len(batch))
+        while len(upsert_batch) >= args.batch_size:
+            try:
+                upsert_full_batch()
+            except Exception as exc:  # noqa: BLE001
+                # The points stay queued and go out with the next full batch.
+                counters.failed += 1
+                metrics.failure(failure_reason("upsert", exc))
+                queued = min(len(upsert_batch), args.batch_size)
+                print(f"[WARN] upsert of {queued} points failed: {exc}", file=sys.stderr)
+                break
+        metrics.gauge("upsert_batch", len(upsert_batch))
 
     try:
         while True:
-            listing = list_ai_notes_page(
-                base_url=base_url,
-                token=token,
-                page=page,
-                per_page=args.per_page,
-                verify_ssl=verify_ssl,
-                only_done=only_done,
-                user_id=filter_user_id,
-            )
+            with metrics.stage("pb_list"):
+                listing = list_ai_notes_page(
+                    client,
+                    page=page,
+                    per_page=args.per_page,
+                    only_done=only_done,
+                    user_id=filter_user_id,
+                )
             if total_items_hint is None:
                 total_items_hint = int(listing.get("totalItems") or 0)
                 print(f"Total candidate notes (server hint): {total_items_hint}")
+                metrics.set_total(min(total_items_hint, args.limit) if args.limit > 0 else total_items_hint)
 
             items = listing.get("items") or []
             if not items:
@@ -350,93 +683,37 @@ def main() -> int:
                 if args.limit > 0 and counters.seen > args.limit:
                     break
 
-                pb_id = str(record.get("id") or "").strip()
-                if not pb_id:
-                    counters.failed += 1
-                    continue
-
-                ai_response = str(record.get("aiResponse") or "")
-                if len(ai_response.strip()) < 2:
-                    counters.skipped_short_answer += 1
-                    continue
-
-                text_to_embed = build_text_to_embed(record, max_chars=args.max_chars)
-                if not text_to_embed.strip():
-                    counters.skipped_empty_text += 1
+                with metrics.stage("prepare"):
+                    prepared = prepare_note(record, args.max_chars, counters, metrics)
+                if prepared is None:
+                    metrics.done()
                     continue
 
-                point_payload = {
-                    "pb_id": pb_id,
-                    "user_id": str(record.get("user") or ""),
-                    "book_id": str(record.get("bookId") or ""),
-                }
-
                 if args.dry_run:
                     counters.embedded += 1
                     counters.upserted += 1
                     if counters.upserted % 50 == 0:
                         print(f"[dry-run] processed {counters.upserted} notes")
+                    metrics.done()
                     continue
 
-                try:
-                    vector = fetch_embedding(
-                        api_key=api_key or "",
-                        embedding_url=args.embedding_url,
-                        model=args.model,
-                        dimensions=dimensions,
-                        text=text_to_embed,
-                        verify_ssl=verify_ssl,
-                    )
-                    counters.embedded += 1
-                    upsert_batch.append(
-                        {
-                            "id": point_id_from_pb_id(pb_id),
-                            "vector": vector,
-                            "payload": point_payload,
-                        }
-                    )
-                    if len(upsert_batch) >= args.batch_size:
-                        upsert_points(
-                            qdrant_url=qdrant_url,
-                            collection=args.collection,
-                            points=upsert_batch,
-                            verify_ssl=verify_ssl,
-                        )
-                        counters.upserted += len(upsert_batch)
-                        print(f"upserted {counters.upserted} points")
-                        upsert_batch.clear()
-                except Exception as exc:  # noqa: BLE001
-                    counters.failed += 1
-                    print(f"[WARN] pb_id={pb_id} failed: {exc}", file=sys.stderr)
+                pending.append(prepared)
+                if len(pending) >= backend.batch_size:
+                    embed_pending()
 
             if args.limit > 0 and counters.seen >= args.limit:
                 break
             page += 1
 
-        if upsert_batch and not args.dry_run:
-            upsert_points(
-                qdrant_url=qdrant_url,
-                collection=args.collection,
-                points=upsert_batch,
-                verify_ssl=verify_ssl,
-            )
-            counters.upserted += len(upsert_batch)
-            print(f"upserted {counters.upserted} points")
-            upsert_batch.clear()
+        if pending:
+            embed_pending()
+        while upsert_batch and not args.dry_run:
+            upsert_full_batch()
     except Exception as exc:  # noqa: BLE001
         print(f"Fatal error: {exc}", file=sys.stderr)
-        return 1
-
-    elapsed = time.time() - start_ts
-    print("Done.")
-    print(f"  seen={counters.seen}")
-    print(f"  embedded={counters.embedded}")
-    print(f"  upserted={counters.upserted}")
-    print(f"  skipped_short_answer={counters.skipped_short_answer}")
-    print(f"  skipped_empty_text={counters.skipped_empty_text}")
-    print(f"  failed={counters.failed}")
-    print(f"  elapsed_sec={elapsed:.1f}")
-    return 0
+        return metrics.finish_run("Failed.", counters, 1, args.metrics_json, script="backfill_ai_notes_to_qdrant")
+
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="backfill_ai_notes_to_qdrant")
 
 
 if __name__ == "__main__":
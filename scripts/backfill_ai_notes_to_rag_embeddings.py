@@ -11,11 +11,16 @@ How it works:
 Notes:
 - This triggers all ai_notes update hooks (including existing Qdrant sync, if enabled).
 - Use --dry-run first to verify candidate counts.
+- --async-inflight N keeps N PATCHes in flight on the asyncio engine (pb_async.py).
+  Every PATCH runs the RAG hook server-side, so raise N gradually.
 
 Usage examples:
   python3 scripts/backfill_ai_notes_to_rag_embeddings.py --dry-run
   python3 scripts/backfill_ai_notes_to_rag_embeddings.py --limit 500
   python3 scripts/backfill_ai_notes_to_rag_embeddings.py --only-done true
+  python3 scripts/backfill_ai_notes_to_rag_embeddings.py --async-inflight 32
+  python3 scripts/backfill_ai_notes_to_rag_embeddings.py --metrics-json /tmp/rag-backfill-metrics.json
+  python3 scripts/backfill_ai_notes_to_rag_embeddings.py --metrics-port 9466
 
 Optional env/.env keys:
   POCKETBASE_URL
@@ -28,143 +33,30 @@ Optional env/.env keys:
 from __future__ import annotations
 
 import argparse
-import os
+import asyncio
 import sys
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional
 
-import requests
+import http_trace
+from pb_async import AsyncHttpClient, AsyncPocketBase, TaskWindow, list_ai_notes_page_async, run_cancellable
+from pb_client import (
+    DEFAULT_POOL_SIZE,
+    PocketBaseClient,
+    list_ai_notes_page,
+    load_env_file,
+    login,
+    parse_bool,
+    resolve_value,
+)
+from openmetrics import exporter_from_args
+from run_metrics import RunMetrics, add_run_args, failure_reason, validate_run_args
 
 
-def load_env_file(path: Path) -> Dict[str, str]:
-    env: Dict[str, str] = {}
-    if not path.exists():
-        return env
-    for raw in path.read_text(encoding="utf-8").splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#") or "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        key = key.strip()
-        value = value.strip().strip('"').strip("'")
-        if key:
-            env[key] = value
-    return env
-
-
-def resolve_value(explicit: Optional[str], env_key: str, file_env: Dict[str, str]) -> Optional[str]:
-    if explicit:
-        return explicit
-    return os.getenv(env_key) or file_env.get(env_key)
-
-
-def parse_bool(value: str) -> bool:
-    return value.strip().lower() in {"1", "true", "yes", "y", "on"}
-
-
-def pb_headers(token: str) -> Dict[str, str]:
-    return {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-
-
-def try_admin_auth(base_url: str, email: str, password: str, verify_ssl: bool) -> Optional[str]:
-    candidates = (
-        "/api/collections/_superusers/auth-with-password",
-        "/api/admins/auth-with-password",
-    )
-    payloads = (
-        {"identity": email, "password": password},
-        {"email": email, "password": password},
-    )
-    for path in candidates:
-        url = f"{base_url}{path}"
-        for payload in payloads:
-            try:
-                resp = requests.post(url, json=payload, timeout=30, verify=verify_ssl)
-            except requests.RequestException:
-                continue
-            if resp.status_code == 200:
-                body = resp.json() if resp.text else {}
-                token = str(body.get("token") or "").strip()
-                if token:
-                    return token
-    return None
-
-
-def user_auth(base_url: str, email: str, password: str, verify_ssl: bool) -> Tuple[str, str]:
-    endpoint = f"{base_url}/api/collections/users/auth-with-password"
-    payloads = (
-        {"identity": email, "password": password},
-        {"email": email, "password": password},
-    )
-    last_err = ""
-    for payload in payloads:
-        resp = requests.post(endpoint, json=payload, timeout=30, verify=verify_ssl)
-        if resp.status_code == 200:
-            body = resp.json() if resp.text else {}
-            token = str(body.get("token") or "").strip()
-            user_id = str((body.get("record") or {}).get("id") or "").strip()
-            if token and user_id:
-                return token, user_id
-            last_err = "token or user id missing"
-            continue
-        last_err = f"{resp.status_code} {resp.text[:400]}"
-    raise RuntimeError(f"user auth failed: {last_err}")
-
-
-def list_ai_notes_page(
-    base_url: str,
-    token: str,
-    page: int,
-    per_page: int,
-    verify_ssl: bool,
-    only_done: bool,
-    user_id: Optional[str],
-) -> Dict[str, object]:
-    endpoint = f"{base_url}/api/collections/ai_notes/records"
-    filters = []
-    if only_done:
-        filters.append("status='done'")
-    if user_id:
-        filters.append(f"user='{user_id}'")
-    params = {"page": page, "perPage": per_page, "sort": "+id"}
-    if filters:
-        params["filter"] = "(" + "&&".join(filters) + ")"
-
-    resp = requests.get(
-        endpoint,
-        params=params,
-        headers=pb_headers(token),
-        timeout=60,
-        verify=verify_ssl,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"list ai_notes failed: {resp.status_code} {resp.text[:500]}")
-    return resp.json() if resp.text else {}
-
-
-def touch_ai_note(
-    base_url: str,
-    token: str,
-    record_id: str,
-    updated_at_ms: int,
-    verify_ssl: bool,
-) -> None:
-    endpoint = f"{base_url}/api/collections/ai_notes/records/{record_id}"
-    payload = {"updatedAt": updated_at_ms}
-    resp = requests.patch(
-        endpoint,
-        json=payload,
-        headers=pb_headers(token),
-        timeout=60,
-        verify=verify_ssl,
-    )
-    if resp.status_code < 200 or resp.status_code >= 300:
-        raise RuntimeError(f"touch failed: {resp.status_code} {resp.text[:500]}")
+def touch_ai_note(client: PocketBaseClient, record_id: str, updated_at_ms: int) -> None:
+    client.update_record("ai_notes", record_id, {"updatedAt": updated_at_ms})
 
 
 @dataclass
@@ -176,6 +68,120 @@ class Counters:
     failed: int = 0
 
 
+def select_note(
+    record: dict, require_ai_response: bool, counters: Counters, metrics: Optional[RunMetrics] = None
+) -> Optional[str]:
+    """Return the record id to touch, or None after counting why the note is skipped."""
+    record_id = str(record.get("id") or "").strip()
+    if not record_id:
+        counters.failed += 1
+        if metrics is not None:
+            metrics.failure("missing_id")
+        return None
+    if require_ai_response and not str(record.get("aiResponse") or "").strip():
+        counters.skipped_no_response += 1
+        return None
+    return record_id
+
+
+async def backfill_async(
+    client: PocketBaseClient,
+    args: argparse.Namespace,
+    only_done: bool,
+    require_ai_response: bool,
+    filter_user_id: Optional[str],
+    counters: Counters,
+    metrics: RunMetrics,
+) -> bool:
+    """
+    Asyncio variant of the main loop: up to --async-inflight PATCHes at once while
+    the next page is listed; --sleep-ms spaces out their start times. Ctrl-C
+    cancels the in-flight PATCHes (the notes they were touching may or may not
+    have been updated); returns False when interrupted.
+    """
+    http = AsyncHttpClient(default_limit=args.async_inflight, verify_ssl=not args.insecure)
+    pb = AsyncPocketBase(client, http)
+    metrics.add_probe("connection_replays", lambda: http.stats["replays"])
+    window = TaskWindow(args.async_inflight)
+    next_page: Optional[asyncio.Future] = None
+    interrupted = False
+
+    async def touch(record_id: str) -> None:
+        try:
+            with metrics.stage("pb_patch"), http_trace.note(record_id):
+                await pb.update_record("ai_notes", record_id, {"updatedAt": int(time.time() * 1000)})
+        except Exception as exc:  # noqa: BLE001
+            counters.failed += 1
+            metrics.failure(failure_reason("pb_patch", exc))
+            print(f"[WARN] note_id={record_id} failed: {exc}", file=sys.stderr)
+            metrics.done()
+            return
+        counters.touched += 1
+        metrics.success()
+        metrics.done()
+        if counters.touched % 50 == 0:
+            print(f"touched {counters.touched} notes")
+
+    async def timed_list(page: int) -> Dict[str, object]:
+        with metrics.stage("pb_list"):
+            return await list_ai_notes_page_async(
+                pb, page=page, per_page=args.per_page, only_done=only_done, user_id=filter_user_id
+            )
+
+    def list_page(page: int) -> asyncio.Future:
+        return asyncio.ensure_future(timed_list(page))
+
+    try:
+        page = 1
+        next_page = list_page(page)
+        while True:
+            listing = await next_page
+            next_page = None
+            if page == 1:
+                total_items = int(listing.get("totalItems") or 0)
+                print(f"Total candidate notes (server hint): {total_items}")
+                metrics.set_total(min(total_items, args.limit) if args.limit > 0 else total_items)
+            items = listing.get("items") or []
+            if not items:
+                break
+            next_page = list_page(page + 1)
+
+            for record in items:
+                counters.seen += 1
+                if args.limit > 0 and counters.selected >= args.limit:
+                    break
+                record_id = select_note(record, require_ai_response, counters, metrics)
+                if record_id is None:
+                    metrics.done()
+                    continue
+                counters.selected += 1
+                if args.dry_run:
+                    if counters.selected % 100 == 0:
+                        print(f"[dry-run] selected {counters.selected} notes")
+                    metrics.done()
+                    continue
+                await window.submit(touch(record_id))
+                metrics.gauge("inflight", len(window.running))
+                if args.sleep_ms > 0:
+                    # Same throttle as the sequential loop: one PATCH started per --sleep-ms.
+                    await asyncio.sleep(args.sleep_ms / 1000.0)
+
+            if args.limit > 0 and counters.selected >= args.limit:
+                break
+            page += 1
+        await window.drain()
+    except asyncio.CancelledError:
+        interrupted = True
+    finally:
+        await window.cancel()
+        if next_page is not None:
+            next_page.cancel()
+            await asyncio.gather(next_page, return_exceptions=True)
+        await http.close()
+    print(f"async engine: {http.stats['connections']} connections, peak in-flight {http.peak_inflight}")
+    return not interrupted
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Trigger ai_notes update hooks to backfill PocketBase-native RAG embeddings."
@@ -198,9 +204,17 @@ def main() -> int:
         help="Skip notes whose aiResponse is blank (true/false). Default: true.",
     )
     parser.add_argument("--user-id", help="Process only one user id (optional)")
-    parser.add_argument("--sleep-ms", type=int, default=0, help="Sleep between updates (throttle)")
+    parser.add_argument("--sleep-ms", type=int, default=0, help="Sleep between updates (throttle); with --async-inflight, between PATCH starts")
     parser.add_argument("--dry-run", action="store_true", help="Do not update records, only count")
     parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="Keep-alive connections per host")
+    parser.add_argument(
+        "--async-inflight",
+        type=int,
+        default=0,
+        help="Run on the asyncio engine with up to N PATCHes in flight (0: sequential loop)",
+    )
+    add_run_args(parser)
     args = parser.parse_args()
 
     file_env = load_env_file(Path(".env"))
@@ -227,20 +241,25 @@ def main() -> int:
         print("Error: --sleep-ms must be >= 0", file=sys.stderr)
         return 2
 
-    token: Optional[str] = None
-    auth_mode = ""
-    filter_user_id: Optional[str] = args.user_id
-    if admin_email and admin_password:
-        token = try_admin_auth(base_url, admin_email, admin_password, verify_ssl=verify_ssl)
-        if token:
-            auth_mode = "admin"
-    if not token and user_email and user_password:
-        token, user_id = user_auth(base_url, user_email, user_password, verify_ssl=verify_ssl)
-        auth_mode = "user"
-        if not filter_user_id:
-            filter_user_id = user_id
-
-    if not token:
+    if args.pool_size <= 0:
+        print("Error: --pool-size must be > 0", file=sys.stderr)
+        return 2
+    if args.async_inflight < 0:
+        print("Error: --async-inflight must be >= 0", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="backfill_ai_notes_to_rag_embeddings")
+
+    client = PocketBaseClient(base_url, verify_ssl=verify_ssl, pool_size=args.pool_size)
+    auth_mode, user_id = login(client, admin_email, admin_password, user_email, user_password)
+    filter_user_id: Optional[str] = args.user_id or user_id
+
+    if not auth_mode:
         print(
             "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
             "or user creds (--email/--password).",
@@ -250,30 +269,56 @@ def main() -> int:
 
     print(
         "Start backfill via ai_notes update hooks: "
-        f"pb={base_url}, auth={auth_mode}, only_done={only_done}, "
+        f"pb={base_url}, auth={auth_mode}/{client.auth_source}, only_done={only_done}, "
         f"require_ai_response={require_ai_response}, user_filter={filter_user_id or '<none>'}, "
-        f"dry_run={args.dry_run}"
+        f"dry_run={args.dry_run}, async_inflight={args.async_inflight or '<off>'}"
     )
 
     counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(
+            metrics, "backfill_ai_notes_to_rag_embeddings", counters, args.metrics_textfile, args.metrics_port
+        )
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+    if args.async_inflight > 0:
+        try:
+            completed = run_cancellable(
+                backfill_async(client, args, only_done, require_ai_response, filter_user_id, counters, metrics)
+            )
+        except Exception as exc:  # noqa: BLE001
+            print(f"Fatal error: {exc}", file=sys.stderr)
+            return metrics.finish_run(
+                "Failed.", counters, 1, args.metrics_json, script="backfill_ai_notes_to_rag_embeddings"
+            )
+        if completed:
+            return metrics.finish_run(
+                "Done.", counters, 0, args.metrics_json, script="backfill_ai_notes_to_rag_embeddings"
+            )
+        return metrics.finish_run(
+            "Interrupted.", counters, 130, args.metrics_json, script="backfill_ai_notes_to_rag_embeddings"
+        )
+
     page = 1
     total_items_hint = None
-    start_ts = time.time()
 
     try:
         while True:
-            listing = list_ai_notes_page(
-                base_url=base_url,
-                token=token,
-                page=page,
-                per_page=args.per_page,
-                verify_ssl=verify_ssl,
-                only_done=only_done,
-                user_id=filter_user_id,
-            )
+            with metrics.stage("pb_list"):
+                listing = list_ai_notes_page(
+                    client,
+                    page=page,
+                    per_page=args.per_page,
+                    only_done=only_done,
+                    user_id=filter_user_id,
+                )
             if total_items_hint is None:
                 total_items_hint = int(listing.get("totalItems") or 0)
                 print(f"Total candidate notes (server hint): {total_items_hint}")
+                metrics.set_total(min(total_items_hint, args.limit) if args.limit > 0 else total_items_hint)
 
             items = listing.get("items") or []
             if not items:
@@ -284,37 +329,34 @@ def main() -> int:
                 if args.limit > 0 and counters.selected >= args.limit:
                     break
 
-                record_id = str(record.get("id") or "").strip()
-                if not record_id:
-                    counters.failed += 1
+                record_id = select_note(record, require_ai_response, counters, metrics)
+                if record_id is None:
+                    metrics.done()
                     continue
 
-                if require_ai_response:
-                    ai_response = str(record.get("aiResponse") or "").strip()
-                    if not ai_response:
-                        counters.skipped_no_response += 1
-                        continue
-
                 counters.selected += 1
                 if args.dry_run:
                     if counters.selected % 100 == 0:
                         print(f"[dry-run] selected {counters.selected} notes")
+                    metrics.done()
                     continue
 
                 try:
-                    touch_ai_note(
-                        base_url=base_url,
-                        token=token,
-                        record_id=record_id,
-                        updated_at_ms=int(time.time() * 1000),
-                        verify_ssl=verify_ssl,
-                    )
+                    with metrics.stage("pb_patch"), http_trace.note(record_id):
+                        touch_ai_note(
+                            client,
+                            record_id=record_id,
+                            updated_at_ms=int(time.time() * 1000),
+                        )
                     counters.touched += 1
+                    metrics.success()
                     if counters.touched % 50 == 0:
                         print(f"touched {counters.touched} notes")
                 except Exception as exc:  # noqa: BLE001
                     counters.failed += 1
+                    metrics.failure(failure_reason("pb_patch", exc))
                     print(f"[WARN] note_id={record_id} failed: {exc}", file=sys.stderr)
+                metrics.done()
 
                 if args.sleep_ms > 0:
                     time.sleep(args.sleep_ms / 1000.0)
@@ -326,19 +368,14 @@ def main() -> int:
 
     except Exception as exc:  # noqa: BLE001
         print(f"Fatal error: {exc}", file=sys.stderr)
-        return 1
-
-    elapsed = time.time() - start_ts
-    print("Done.")
-    print(f"  seen={counters.seen}")
-    print(f"  selected={counters.selected}")
-    print(f"  touched={counters.touched}")
-    print(f"  skipped_no_response={counters.skipped_no_response}")
-    print(f"  failed={counters.failed}")
-    print(f"  elapsed_sec={elapsed:.1f}")
+        return metrics.finish_run(
+            "Failed.", counters, 1, args.metrics_json, script="backfill_ai_notes_to_rag_embeddings"
+        )
+
+    status = metrics.finish_run("Done.", counters, 0, args.metrics_json, script="backfill_ai_notes_to_rag_embeddings")
     if counters.failed == 0:
         print("Tip: check PocketBase logs for '[RAG Sync Update ...]' to verify hook execution.")
-    return 0
+    return status
 
 
 if __name__ == "__main__":
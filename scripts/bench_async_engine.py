@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Benchmark the asyncio engine (pb_async.py) against the threaded approach.
+
+What it does:
+1) Starts scripts/pocketbase_standin.py with --latency-ms (default 50ms) so each
+   request costs a WAN-like round trip, and seeds ai_notes
+2) Runs the rag-embeddings backfill workload (PATCH updatedAt per note) with N
+   requests in flight, in two modes:
+   - threads: ThreadPoolExecutor(N) sharing one pooled PocketBaseClient
+   - async:   one event loop, AsyncPocketBase + TaskWindow(N)
+3) Each mode/level runs in a fresh child process, so its RSS growth is its own;
+   reports req/s, p50/p95 latency, connections opened and RSS per in-flight request
+
+Usage examples:
+  python3 scripts/bench_async_engine.py
+  python3 scripts/bench_async_engine.py --inflight 32,256,512 --requests 4000
+  python3 scripts/bench_async_engine.py --latency-ms 0   # CPU-bound: local loopback only
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from bench_epub_transfer import BENCH_EMAIL, BENCH_PASSWORD, start_standin
+from bench_pb_client import percentile
+from pb_async import AsyncHttpClient, AsyncPocketBase, TaskWindow
+from pb_client import PocketBaseClient
+
+
+DEFAULT_INFLIGHT = "16,64,256"
+DEFAULT_REQUESTS = 2000
+DEFAULT_LATENCY_MS = 50
+MODES = ("threads", "async")
+
+
+@dataclass
+class RunResult:
+    mode: str
+    inflight: int
+    requests: int
+    failed: int
+    elapsed_sec: float
+    p50_ms: float
+    p95_ms: float
+    connections: int
+    rss_base_kb: int
+    rss_peak_kb: int
+
+    @property
+    def per_sec(self) -> float:
+        return self.requests / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+    @property
+    def kb_per_inflight(self) -> float:
+        return max(self.rss_peak_kb - self.rss_base_kb, 0) / self.inflight
+
+
+def current_rss_kb() -> int:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def touch_payload() -> dict:
+    return {"updatedAt": int(time.time() * 1000)}
+
+
+def run_threads(client: PocketBaseClient, ids: List[str], count: int, inflight: int) -> Tuple[List[float], int]:
+    def touch(i: int) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            client.update_record("ai_notes", ids[i % len(ids)], touch_payload())
+        except Exception:  # noqa: BLE001
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=inflight) as pool:
+        results = list(pool.map(touch, range(count)))
+    latencies = [ms for ms in results if ms is not None]
+    return latencies, len(results) - len(latencies)
+
+
+async def run_async(pb: AsyncPocketBase, ids: List[str], count: int, inflight: int) -> Tuple[List[float], int]:
+    latencies: List[float] = []
+    failed = 0
+
+    async def touch(i: int) -> None:
+        nonlocal failed
+        start = time.perf_counter()
+        try:
+            await pb.update_record("ai_notes", ids[i % len(ids)], touch_payload())
+        except Exception:  # noqa: BLE001
+            failed += 1
+            return
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    window = TaskWindow(inflight)
+    for i in range(count):
+        await window.submit(touch(i))
+    await window.drain()
+    await pb.http.close()
+    return latencies, failed
+
+
+def child_main(args: argparse.Namespace) -> int:
+    """One mode at one in-flight level; prints a RunResult as JSON."""
+    mode, level = args.child.split(":")
+    inflight = int(level)
+    ids = json.loads(Path(args.ids_file).read_text(encoding="utf-8"))
+    client = PocketBaseClient(args.base_url, token=args.token, pool_size=inflight, use_token_cache=False)
+    rss_base = current_rss_kb()
+    start = time.perf_counter()
+    if mode == "threads":
+        latencies, failed = run_threads(client, ids, args.requests, inflight)
+        connections = -1
+    else:
+        http = AsyncHttpClient(default_limit=inflight)
+        latencies, failed = asyncio.run(run_async(AsyncPocketBase(client, http), ids, args.requests, inflight))
+        connections = http.stats["connections"]
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    result = RunResult(
+        mode=mode,
+        inflight=inflight,
+        requests=len(latencies),
+        failed=failed,
+        elapsed_sec=round(elapsed, 3),
+        p50_ms=round(percentile(latencies, 50), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        connections=connections,
+        rss_base_kb=rss_base,
+        rss_peak_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+    print(json.dumps(asdict(result)))
+    return 0
+
+
+def standin_connections(base_url: str, reset: bool = False) -> int:
+    import requests
+
+    if reset:
+        requests.post(f"{base_url}/_standin/reset", timeout=10)
+        return 0
+    # The stats request itself opened one connection.
+    return int(requests.get(f"{base_url}/_standin/stats", timeout=10).json().get("connections") or 0) - 1
+
+
+def print_table(results: List[RunResult]) -> None:
+    header = (
+        f"{'mode':<8} {'inflight':>8} {'reqs':>6} {'fail':>5} {'sec':>7} {'req/s':>8} "
+        f"{'p50_ms':>8} {'p95_ms':>8} {'conns':>6} {'rss_MB':>7} {'KB/inflight':>11}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.mode:<8} {r.inflight:>8} {r.requests:>6} {r.failed:>5} {r.elapsed_sec:7.2f} {r.per_sec:8.1f} "
+            f"{r.p50_ms:8.2f} {r.p95_ms:8.2f} {r.connections:>6} {r.rss_peak_kb / 1024:7.1f} {r.kb_per_inflight:11.1f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the asyncio engine with thread pools on a high-latency server.")
+    parser.add_argument("--inflight", default=DEFAULT_INFLIGHT, help="Comma separated in-flight request counts")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="PATCH requests per run")
+    parser.add_argument("--records", type=int, default=200, help="ai_notes records to seed")
+    parser.add_argument("--latency-ms", type=int, default=DEFAULT_LATENCY_MS, help="Stand-in delay per /api request")
+    parser.add_argument("--workdir", help="Where to write stand-in data (default: temp dir)")
+    parser.add_argument("--json", dest="json_path", help="Also write results as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--token", help=argparse.SUPPRESS)
+    parser.add_argument("--ids-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child_main(args)
+
+    try:
+        levels = [int(c) for c in args.inflight.split(",") if c.strip()]
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    if not levels or min(levels) <= 0 or args.requests <= 0 or args.records <= 0 or args.latency_ms < 0:
+        print("Error: --inflight, --requests and --records must be positive", file=sys.stderr)
+        return 2
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-async-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    proc: Optional[subprocess.Popen] = None
+    results: List[RunResult] = []
+    try:
+        proc, base_url = start_standin(workdir / "pb_data", extra_args=["--latency-ms", str(args.latency_ms)])
+        print(f"Benchmark target: {base_url} latency={args.latency_ms}ms (workdir={workdir})")
+
+        setup_client = PocketBaseClient(base_url, pool_size=16, use_token_cache=False)
+        token, user_id = setup_client.auth_user(BENCH_EMAIL, BENCH_PASSWORD)
+        note = {"user": user_id, "bookId": "bench-book", "aiResponse": "answer", "status": "done"}
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            ids = list(pool.map(lambda i: setup_client.create_record("ai_notes", note)["id"], range(args.records)))
+        setup_client.close()
+        ids_file = workdir / "note_ids.json"
+        ids_file.write_text(json.dumps(ids), encoding="utf-8")
+
+        for level in levels:
+            for mode in MODES:
+                print(f"Running mode={mode} inflight={level}")
+                standin_connections(base_url, reset=True)
+                out = subprocess.run(
+                    [
+                        sys.executable, __file__, "--child", f"{mode}:{level}", "--requests", str(args.requests),
+                        "--base-url", base_url, "--token", token, "--ids-file", str(ids_file),
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                result = RunResult(**json.loads(out.strip().splitlines()[-1]))
+                if result.connections < 0:
+                    result.connections = standin_connections(base_url)
+                results.append(result)
+    except subprocess.CalledProcessError as exc:
+        print(f"Fatal error: child run failed:\n{exc.stderr}", file=sys.stderr)
+        return 1
+    except Exception as exc:  # noqa: BLE001
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print()
+    print_table(results)
+    by_key = {(r.mode, r.inflight): r for r in results}
+    print()
+    for level in levels:
+        threads, engine = by_key.get(("threads", level)), by_key.get(("async", level))
+        if not threads or not engine:
+            continue
+        print(
+            f"inflight={level}: async {engine.per_sec / max(threads.per_sec, 1e-9):.2f}x throughput, "
+            f"{engine.kb_per_inflight:.1f} vs {threads.kb_per_inflight:.1f} KB RSS per in-flight request"
+        )
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps([asdict(r) for r in results], indent=2), encoding="utf-8")
+        print(f"\nWrote {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
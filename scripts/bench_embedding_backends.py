@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Benchmark the embedding backends (embedding_backends.py) on the same texts.
+
+What it does:
+1) Builds --texts synthetic notes (or reads one text per line from --texts-file)
+2) Embeds them with every backend in --backends:
+   - openai:  against --embedding-url, or an in-process fake embedding server
+              (fake_services.py) with --latency-ms per request when no URL is given
+   - hashing: local feature hashing, once per --processes level
+   - onnx:    the --onnx-model sentence model, once per --processes level
+3) Sends --batch texts per call, --concurrency calls at a time, after one
+   warm-up call (process pool start-up and model load are not measured)
+4) Reports texts/s, p50/p95 per call and failed calls per backend
+
+Usage examples:
+  python3 scripts/bench_embedding_backends.py
+  python3 scripts/bench_embedding_backends.py --backends hashing --processes 1,2,4,8 --texts 20000
+  python3 scripts/bench_embedding_backends.py --backends openai,onnx --onnx-model models/all-MiniLM-L6-v2 \
+      --dimensions 384 --concurrency 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from bench_pb_client import percentile
+from embedding_backends import BACKENDS, EmbeddingBackend, make_backend
+
+
+DEFAULT_TEXTS = 4000
+DEFAULT_WORDS = 120
+DEFAULT_LATENCY_MS = 50
+DEFAULT_DIMENSIONS = 1024
+WORDS = (
+    "reading chapter margin highlight summary character plot theme author river winter letter memory city "
+    "question answer meaning history science light garden journey silence promise language music island "
+    "village war peace family friend stranger night morning sea mountain road book page note idea"
+).split()
+
+
+@dataclass
+class RunResult:
+    backend: str
+    processes: int
+    batch: int
+    concurrency: int
+    texts: int
+    failed_calls: int
+    elapsed_sec: float
+    p50_ms: float
+    p95_ms: float
+
+    @property
+    def per_sec(self) -> float:
+        return self.texts / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+def synthetic_texts(count: int, words: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count):
+        length = max(1, int(rng.gauss(words, words / 4)))
+        body = " ".join(rng.choice(WORDS) for _ in range(length))
+        texts.append(f"Title: note {i}\n\nContent: {body}")
+    return texts
+
+
+def run_backend(backend: EmbeddingBackend, texts: List[str], concurrency: int) -> Tuple[List[float], int, int, float]:
+    """Embed `texts` in backend.batch_size calls; returns (sorted per-call ms, failed calls, texts embedded, seconds)."""
+    batches = [texts[i : i + backend.batch_size] for i in range(0, len(texts), backend.batch_size)]
+
+    def call(batch: List[str]) -> Optional[Tuple[float, int]]:
+        started = time.perf_counter()
+        try:
+            vectors = backend.embed(batch)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[warn] {backend.name}: call failed: {exc}", file=sys.stderr)
+            return None
+        if len(vectors) != len(batch):
+            return None
+        return (time.perf_counter() - started) * 1000, len(batch)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(call, batches))
+    elapsed = time.perf_counter() - started
+    done = [outcome for outcome in outcomes if outcome is not None]
+    return sorted(ms for ms, _ in done), len(outcomes) - len(done), sum(n for _, n in done), elapsed
+
+
+def print_table(results: List[RunResult]) -> None:
+    header = (
+        f"{'backend':<8} {'procs':>5} {'batch':>5} {'conc':>4} {'texts':>7} {'fail':>5} "
+        f"{'sec':>7} {'texts/s':>9} {'p50_ms':>8} {'p95_ms':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.backend:<8} {r.processes:>5} {r.batch:>5} {r.concurrency:>4} {r.texts:>7} {r.failed_calls:>5} "
+            f"{r.elapsed_sec:7.2f} {r.per_sec:9.1f} {r.p50_ms:8.2f} {r.p95_ms:8.2f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare embedding backend throughput on the same texts.")
+    parser.add_argument("--backends", default="openai,hashing", help=f"Comma separated, from {','.join(BACKENDS)}")
+    parser.add_argument("--texts", type=int, default=DEFAULT_TEXTS, help="Synthetic texts to embed")
+    parser.add_argument("--words", type=int, default=DEFAULT_WORDS, help="Mean words per synthetic text")
+    parser.add_argument("--texts-file", help="Embed these texts instead, one per line")
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS, help="Vector size (onnx: from the model)")
+    parser.add_argument("--batch", type=int, default=0, help="Texts per call (0: backend default)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Calls in flight at once")
+    parser.add_argument(
+        "--processes", default=str(os.cpu_count() or 1), help="Comma separated worker counts for the local backends"
+    )
+    parser.add_argument("--embedding-url", help="openai backend URL (default: in-process fake embedding server)")
+    parser.add_argument("--api-key", default=os.environ.get("DASHSCOPE_API_KEY", ""), help="openai backend API key")
+    parser.add_argument("--model", default="text-embedding-v4", help="openai model / hashing seed")
+    parser.add_argument("--latency-ms", type=int, default=DEFAULT_LATENCY_MS, help="Fake embedding server delay per call")
+    parser.add_argument("--onnx-model", help="onnx backend: directory with model.onnx and tokenizer.json")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic text seed")
+    parser.add_argument("--json", dest="json_path", help="Also write results as JSON")
+    args = parser.parse_args()
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = [name for name in backends if name not in BACKENDS]
+    if not backends or unknown:
+        print(f"Error: --backends must name some of {', '.join(BACKENDS)}", file=sys.stderr)
+        return 2
+    try:
+        levels = [int(c) for c in args.processes.split(",") if c.strip()]
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    if not levels or min(levels) <= 0 or args.texts <= 0 or args.words <= 0 or args.concurrency <= 0:
+        print("Error: --processes, --texts, --words and --concurrency must be positive", file=sys.stderr)
+        return 2
+    if args.batch < 0 or args.dimensions <= 0:
+        print("Error: --batch must be >= 0 and --dimensions > 0", file=sys.stderr)
+        return 2
+
+    if args.texts_file:
+        texts = [line.strip() for line in Path(args.texts_file).read_text(encoding="utf-8").splitlines() if line.strip()]
+        if not texts:
+            print(f"Error: no texts in {args.texts_file}", file=sys.stderr)
+            return 2
+    else:
+        texts = synthetic_texts(args.texts, args.words, args.seed)
+    print(f"[info] {len(texts)} texts, {sum(len(t) for t in texts) / len(texts):.0f} chars on average")
+
+    kit = None
+    results: List[RunResult] = []
+    try:
+        for name in backends:
+            configs = [1] if name == "openai" else levels
+            for processes in configs:
+                options = {}
+                if name == "openai":
+                    import requests
+
+                    url = args.embedding_url
+                    if not url:
+                        if kit is None:
+                            from fake_services import FAKE_API_KEY, FakeServices
+
+                            kit = FakeServices(embed_latency_ms=args.latency_ms, dimensions=args.dimensions, collection="").start()
+                            args.api_key = FAKE_API_KEY
+                            print(f"[info] fake embedding server: {kit.embedding_url} latency={args.latency_ms}ms")
+                        url = kit.embedding_url
+                    options = {"url": url, "api_key": args.api_key, "session": requests.Session()}
+                backend = make_backend(
+                    name,
+                    args.dimensions,
+                    batch_size=args.batch,
+                    processes=processes,
+                    model=args.model,
+                    onnx_model=args.onnx_model or "",
+                    **options,
+                )
+                try:
+                    print(f"Running {backend.describe()} concurrency={args.concurrency}")
+                    backend.embed(texts[: backend.batch_size])  # warm-up: pool start-up, model load
+                    latencies, failed, embedded, elapsed = run_backend(backend, texts, args.concurrency)
+                finally:
+                    backend.close()
+                results.append(
+                    RunResult(
+                        backend=name,
+                        processes=processes if name != "openai" else 0,
+                        batch=backend.batch_size,
+                        concurrency=args.concurrency,
+                        texts=embedded,
+                        failed_calls=failed,
+                        elapsed_sec=elapsed,
+                        p50_ms=percentile(latencies, 50),
+                        p95_ms=percentile(latencies, 95),
+                    )
+                )
+    except (ValueError, RuntimeError) as exc:
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if kit is not None:
+            kit.close()
+
+    print()
+    print_table(results)
+    if args.json_path:
+        Path(args.json_path).write_text(
+            json.dumps([{**asdict(r), "texts_per_sec": r.per_sec} for r in results], indent=2), encoding="utf-8"
+        )
+        print(f"\nWrote {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Benchmark the EPUB upload/download path in verify_epub_upload.py.
+
+What it does:
+1) Starts the PocketBase stand-in (scripts/pocketbase_standin.py) with the
+   repo's pocketbase_collections.json, or uses --url for a running server
+2) Generates valid EPUBs of the requested sizes (incompressible filler)
+3) For each size x concurrency, runs the phases used by the real script:
+   upsert, upload_epub, patch_storage_path, get_file_token, verify_download
+4) Reports MB/s, HTTP request counts and peak traced memory per phase
+
+Usage examples:
+  python3 scripts/bench_epub_transfer.py --sizes 100K,1M,10M --concurrency 1,4
+  python3 scripts/bench_epub_transfer.py --json bench.json
+  python3 scripts/bench_epub_transfer.py --baseline bench.json --max-regression 0.25
+
+Against a real PocketBase (e.g. `pocketbase serve` with setup_pocketbase.py applied):
+  python3 scripts/bench_epub_transfer.py --url http://127.0.0.1:8090 \
+      --email reader@example.com --password secret
+
+With --baseline, exits 1 when a phase's MB/s drops, or its request count
+grows, beyond the allowed regression.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+import verify_epub_upload as epub
+from pb_client import PocketBaseClient
+
+
+DEFAULT_SIZES = "100K,1M,10M,100M,500M"
+DEFAULT_CONCURRENCY = "1,4"
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+BENCH_ADMIN_EMAIL = "bench-admin@example.com"
+PHASES = ("upsert", "upload", "patch_storage_path", "file_token", "download")
+THROUGHPUT_PHASES = {"upload", "download"}
+SIZE_UNITS = {"K": 1024, "M": 1024 * 1024, "G": 1024 * 1024 * 1024}
+
+
+@dataclass
+class PhaseResult:
+    size: int
+    concurrency: int
+    phase: str
+    elapsed_sec: float
+    bytes_moved: int
+    requests: int
+    peak_traced_mb: float
+
+    @property
+    def mb_per_sec(self) -> float:
+        if self.elapsed_sec <= 0 or not self.bytes_moved:
+            return 0.0
+        return self.bytes_moved / (1024 * 1024) / self.elapsed_sec
+
+    def key(self) -> str:
+        return f"{self.size}/{self.concurrency}/{self.phase}"
+
+
+class RequestCounter:
+    """Counts every HTTP request sent through `requests`, whichever API the caller uses."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._lock = threading.Lock()
+        self._original: Optional[Callable] = None
+
+    def install(self) -> None:
+        original = requests.Session.send
+        counter = self
+
+        def counting_send(session, request, **kwargs):
+            with counter._lock:
+                counter.count += 1
+            return original(session, request, **kwargs)
+
+        self._original = original
+        requests.Session.send = counting_send  # type: ignore[method-assign]
+
+    def uninstall(self) -> None:
+        if self._original is not None:
+            requests.Session.send = self._original  # type: ignore[method-assign]
+
+    def take(self) -> int:
+        with self._lock:
+            value, self.count = self.count, 0
+        return value
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", text.upper())
+    if not match:
+        raise ValueError(f"invalid size {text!r}")
+    return int(float(match.group(1)) * SIZE_UNITS.get(match.group(2), 1))
+
+
+def human_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def generate_epub(path: Path, size: int) -> None:
+    """Write a valid EPUB of roughly `size` bytes, padded with a stored random asset."""
+    opf = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0">'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        f"<dc:identifier id=\"id\">bench-{size}</dc:identifier><dc:title>Bench {human_size(size)}</dc:title>"
+        "<dc:creator>bench</dc:creator><dc:language>en</dc:language></metadata>"
+        '<manifest><item id="c1" href="c1.xhtml" media-type="application/xhtml+xml"/>'
+        '<item id="pad" href="pad.bin" media-type="application/octet-stream"/></manifest>'
+        '<spine><itemref idref="c1"/></spine></package>'
+    )
+    container = (
+        '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+        '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+        "</rootfiles></container>"
+    )
+    chapter = "<html xmlns=\"http://www.w3.org/1999/xhtml\"><body><p>bench</p></body></html>"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr("META-INF/container.xml", container, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr("OEBPS/content.opf", opf, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr("OEBPS/c1.xhtml", chapter, compress_type=zipfile.ZIP_DEFLATED)
+        overhead = 1024
+        remaining = max(0, size - overhead - sum(i.compress_size for i in archive.infolist()))
+        pad_info = zipfile.ZipInfo("OEBPS/pad.bin")
+        pad_info.compress_type = zipfile.ZIP_STORED
+        with archive.open(pad_info, "w", force_zip64=remaining > 2**31) as pad:
+            while remaining > 0:
+                chunk = os.urandom(min(epub.READ_CHUNK_SIZE, remaining))
+                pad.write(chunk)
+                remaining -= len(chunk)
+
+
+def start_standin(
+    data_dir: Path, max_file_size: int = 0, extra_args: Sequence[str] = ()
+) -> Tuple[subprocess.Popen, str]:
+    cmd = [
+        sys.executable,
+        str(Path(__file__).resolve().parent / "pocketbase_standin.py"),
+        "--port",
+        "0",
+        "--data-dir",
+        str(data_dir),
+        "--user",
+        f"{BENCH_EMAIL}:{BENCH_PASSWORD}",
+        "--superuser",
+        f"{BENCH_ADMIN_EMAIL}:{BENCH_PASSWORD}",
+        "--max-file-size",
+        str(max_file_size),
+        *extra_args,
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    line = proc.stdout.readline() if proc.stdout else ""
+    match = re.search(r"(https?://\S+)", line)
+    if not match:
+        proc.kill()
+        raise RuntimeError(f"stand-in failed to start: {line.strip()}")
+    return proc, match.group(1)
+
+
+def run_phase(
+    name: str,
+    size: int,
+    concurrency: int,
+    work: Callable[[int], int],
+    counter: RequestCounter,
+    trace_memory: bool,
+) -> PhaseResult:
+    """Run `work(worker_index) -> bytes moved` on all workers at once and measure the phase."""
+    counter.take()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        moved = sum(pool.map(work, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if trace_memory else 0.0
+    return PhaseResult(size, concurrency, name, elapsed, moved, counter.take(), round(peak, 2))
+
+
+def bench_size(
+    client: PocketBaseClient,
+    user_id: str,
+    epub_path: Path,
+    size: int,
+    concurrency: int,
+    target: Optional[epub.UploadTarget],
+    counter: RequestCounter,
+    trace_memory: bool,
+) -> List[PhaseResult]:
+    sha256 = epub.sha256_of_file(epub_path)
+    actual_size = epub_path.stat().st_size
+    record_ids: Dict[int, str] = {}
+    uploaded: Dict[int, str] = {}
+    file_tokens: Dict[int, Optional[str]] = {}
+
+    def upsert(i: int) -> int:
+        record_ids[i] = epub.upsert_book_record(
+            client, user_id, f"bench-{size}-{concurrency}-{i}", f"Bench {human_size(size)}"
+        )
+        return 0
+
+    def upload(i: int) -> int:
+        _, uploaded[i] = epub.upload_epub(client, user_id, record_ids[i], epub_path, target=target)
+        return actual_size
+
+    def storage(i: int) -> int:
+        epub.patch_storage_path(client, record_ids[i], f"{record_ids[i]}/{uploaded[i]}")
+        return 0
+
+    def file_token(i: int) -> int:
+        file_tokens[i] = epub.get_file_token(client)
+        return 0
+
+    def download(i: int) -> int:
+        epub.verify_download(client, record_ids[i], uploaded[i], sha256, file_tokens.get(i))
+        return actual_size
+
+    steps = (upsert, upload, storage, file_token, download)
+    return [
+        run_phase(name, size, concurrency, step, counter, trace_memory) for name, step in zip(PHASES, steps)
+    ]
+
+
+def print_table(results: List[PhaseResult]) -> None:
+    header = f"{'size':>6} {'conc':>4} {'phase':<19} {'sec':>8} {'MB/s':>9} {'reqs':>5} {'peak_MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rate = f"{r.mb_per_sec:9.1f}" if r.phase in THROUGHPUT_PHASES else f"{'-':>9}"
+        print(
+            f"{human_size(r.size):>6} {r.concurrency:>4} {r.phase:<19} {r.elapsed_sec:8.3f} "
+            f"{rate} {r.requests:>5} {r.peak_traced_mb:8.2f}"
+        )
+
+
+def find_regressions(results: List[PhaseResult], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    problems = []
+    for r in results:
+        prev = baseline.get(r.key())
+        if not prev:
+            continue
+        if r.phase in THROUGHPUT_PHASES and prev.get("mb_per_sec"):
+            floor = prev["mb_per_sec"] * (1 - max_regression)
+            if r.mb_per_sec < floor:
+                problems.append(
+                    f"{r.key()}: {r.mb_per_sec:.1f} MB/s < {floor:.1f} (baseline {prev['mb_per_sec']:.1f})"
+                )
+        if r.requests > int(prev.get("requests") or 0):
+            problems.append(f"{r.key()}: {r.requests} requests > baseline {prev.get('requests')}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark EPUB upload/download against PocketBase.")
+    parser.add_argument("--url", help="Use a running PocketBase instead of the stand-in")
+    parser.add_argument("--email", default=BENCH_EMAIL, help="users collection email (with --url)")
+    parser.add_argument("--password", default=BENCH_PASSWORD, help="users collection password (with --url)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma separated sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="Comma separated worker counts")
+    parser.add_argument("--workdir", help="Where to write generated EPUBs and stand-in data (default: temp dir)")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Previous --json output to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed MB/s drop ratio vs baseline")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip per-phase memory tracing (faster)")
+    args = parser.parse_args()
+
+    try:
+        sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+        levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    if not sizes or not levels or min(levels) <= 0:
+        print("Error: --sizes and --concurrency must be non-empty and positive", file=sys.stderr)
+        return 2
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-epub-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    proc: Optional[subprocess.Popen] = None
+    counter = RequestCounter()
+    trace_memory = not args.no_tracemalloc
+    results: List[PhaseResult] = []
+
+    try:
+        schema_client = None
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            # Room for the largest sample; the stand-in otherwise enforces the schema's maxSize.
+            proc, base_url = start_standin(workdir / "pb_data", max(sizes) + 1024 * 1024)
+            schema_client = PocketBaseClient(base_url, use_token_cache=False)
+            schema_client.auth_admin(BENCH_ADMIN_EMAIL, BENCH_PASSWORD)
+        print(f"Benchmark target: {base_url} (workdir={workdir})")
+
+        # One pooled client shared by all workers, like the scripts use it.
+        client = PocketBaseClient(base_url, pool_size=max(levels), use_token_cache=False)
+        _, user_id = client.auth_user(args.email, args.password)
+        target = epub.discover_upload_target(
+            schema_client or client,
+            schema_file=Path(__file__).resolve().parent.parent / "pocketbase_collections.json",
+            use_cache=False,
+        )
+        if target and max(sizes) > target.max_size:
+            print(
+                f"Error: largest size {human_size(max(sizes))} exceeds books.{target.field} "
+                f"maxSize={target.max_size}; raise maxSize or pass smaller --sizes",
+                file=sys.stderr,
+            )
+            return 2
+
+        counter.install()
+        if trace_memory:
+            tracemalloc.start()
+        for size in sizes:
+            epub_path = workdir / f"bench-{human_size(size)}.epub"
+            if not epub_path.exists():
+                print(f"Generating {epub_path.name} ...")
+                generate_epub(epub_path, size)
+            for level in levels:
+                print(f"Running size={human_size(size)} concurrency={level}")
+                results.extend(
+                    bench_size(client, user_id, epub_path, size, level, target, counter, trace_memory)
+                )
+    except Exception as exc:  # noqa: BLE001
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        counter.uninstall()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print()
+    print_table(results)
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nprocess max RSS: {max_rss_mb:.1f} MB")
+
+    if args.json_path:
+        payload = {
+            "createdAt": int(time.time()),
+            "maxRssMb": round(max_rss_mb, 1),
+            "results": {r.key(): {**asdict(r), "mb_per_sec": round(r.mb_per_sec, 2)} for r in results},
+        }
+        Path(args.json_path).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"Wrote {args.json_path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")).get("results") or {}
+        problems = find_regressions(results, baseline, args.max_regression)
+        if problems:
+            print("\nRegressions vs baseline:")
+            for line in problems:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions vs baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+"""
+Benchmark the mail_queue hooks of pb_hooks/main.pb.js at growing user counts.
+
+The nightly `daily_ai_note_report` cron loads up to 10,000 users, then for each
+one runs its ai_notes query and queues a report, one after the other. Every
+queued row (and every /boox-mail-send call) also runs `enforceMailDailyLimit`
+in onRecordCreate, which reads all of that user's rows for the day. This
+harness finds where that stops fitting in the nightly window.
+
+What it does:
+1) Starts a real PocketBase (--pocketbase-bin, `serve --dev` with this repo's
+   pb_hooks, schema from setup_pocketbase.py + setup_daily_email_collections.py)
+   and a local SMTP sink, so the queue hook can send and the daily limit sees
+   "sent" rows. Or uses a running local instance (--url, its own mail settings).
+2) For each --users level, tops the seed up to that many bench users, each with
+   --notes done ai_notes from the last 24h and --queue-rows mail_queue rows of
+   today (mixed sent/pending/failed).
+3) Runs the cron --runs times via POST /api/crons/daily_ai_note_report and waits
+   for its "finished" log entry. The first run does the work; later runs should
+   queue nothing (the per-day de-dup).
+4) Has --send-users users call /api/boox-mail-send --sends-per-user times each
+   (past the daily limit of 20), --concurrency users at a time.
+5) Reports runtime, per-user cost, SQL statements issued (counted from the
+   --dev query log, so only with --pocketbase-bin), queue growth and mails
+   delivered, then fits runtime against users to estimate how many users the
+   --window-min window holds.
+
+The stand-in (pocketbase_standin.py) does not run JS hooks or crons, so this
+needs the PocketBase binary (v0.23+, for /api/crons). Never point --url at a
+production server: the seed creates users and queue rows.
+
+Usage examples:
+  python3 scripts/bench_mail_queue.py --pocketbase-bin ~/bin/pocketbase --users 100,1000,5000
+  python3 scripts/bench_mail_queue.py --pocketbase-bin ./pocketbase --users 2000 --notes 20 --window-min 15 --json /tmp/mail.json
+  python3 scripts/bench_mail_queue.py --url http://127.0.0.1:8090 --admin-email a@b.c --admin-password '***' --users 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, IO, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from pb_client import PocketBaseClient, PocketBaseError, records_path, stable_record_id
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_DOMAIN = "bench.local"
+BENCH_ADMIN_EMAIL = f"admin@{BENCH_DOMAIN}"
+BENCH_PASSWORD = "bench-password"
+CRON_ID = "daily_ai_note_report"
+FINISHED_MESSAGE = "daily_ai_note_report finished"
+FAILED_MESSAGE = "daily_ai_note_report failed"
+AUTO_CATEGORY = "ai_note_daily_report_auto"
+SUMMARY_CATEGORY = "ai_note_daily_summary"
+SEND_PATH = "/api/boox-mail-send"
+# Limits hard-coded in pb_hooks/main.pb.js.
+MAIL_DAILY_LIMIT = 20
+CRON_USER_CAP = 10000
+CRON_EXISTING_CAP = 500
+SEED_STATUSES = ("sent", "pending", "failed")
+DEFAULT_USERS = "100,1000"
+DEFAULT_WINDOW_MIN = 60.0
+# --dev prints every statement as "[0.52ms] SELECT ...".
+SQL_RE = re.compile(r"\[\s*[\d.]+\s*ms\]\s+(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.IGNORECASE)
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+@dataclass
+class CronResult:
+    users: int
+    run: int
+    runtime_sec: float
+    processed: int
+    queued: int
+    skipped_existing: int
+    skipped_no_notes: int
+    user_errors: int
+    queue_growth: int
+    mails: int
+    queries: Optional[int]
+
+    @property
+    def per_user_ms(self) -> float:
+        return self.runtime_sec * 1000 / self.processed if self.processed else 0.0
+
+
+@dataclass
+class SendResult:
+    users: int
+    requests: int
+    queued: int
+    limited: int
+    errors: int
+    elapsed_sec: float
+    p50_ms: float
+    p95_ms: float
+    queue_growth: int
+    mails: int
+    queries: Optional[int]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class QueryLog:
+    """Counts the SQL statements `pocketbase serve --dev` prints, ignoring the _logs writes."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+        self.counts: Counter = Counter()
+        self.tail: deque = deque(maxlen=20)
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.read, name="pb-query-log", daemon=True)
+        self.thread.start()
+
+    def read(self) -> None:
+        for raw in self.stream:
+            line = ANSI_RE.sub("", raw).rstrip()
+            self.tail.append(line)
+            match = SQL_RE.search(line)
+            if match and "_logs" not in line:
+                with self.lock:
+                    self.counts[match.group(1).upper()] += 1
+
+    def take(self) -> int:
+        """Statements since the last take()."""
+        with self.lock:
+            total = sum(self.counts.values())
+            self.counts.clear()
+        return total
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Accepts and drops every message, so the queue hook marks rows "sent"."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), SmtpSinkHandler)
+        self.lock = threading.Lock()
+        self.messages = 0
+
+    def take(self) -> int:
+        with self.lock:
+            count, self.messages = self.messages, 0
+        return count
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        self.wfile.write(b"220 bench smtp sink\r\n")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.rstrip(b"\r\n")
+            if in_data:
+                if line == b".":
+                    in_data = False
+                    with self.server.lock:  # type: ignore[attr-defined]
+                        self.server.messages += 1  # type: ignore[attr-defined]
+                    self.wfile.write(b"250 queued\r\n")
+                continue
+            verb = line[:4].upper()
+            if verb in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250 bench\r\n")
+            elif verb == b"DATA":
+                in_data = True
+                self.wfile.write(b"354 end with .\r\n")
+            elif verb == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_pocketbase(binary: str, workdir: Path, hooks_dir: Path, max_notes: int) -> Tuple[subprocess.Popen, str, QueryLog]:
+    data_dir = workdir / "pb_data"
+    subprocess.run(
+        [binary, "superuser", "upsert", BENCH_ADMIN_EMAIL, BENCH_PASSWORD, "--dir", str(data_dir)],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    address = f"127.0.0.1:{free_port()}"
+    proc = subprocess.Popen(
+        [binary, "serve", "--dev", "--dir", str(data_dir), "--hooksDir", str(hooks_dir), "--http", address],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env={**os.environ, "DAILY_AI_NOTE_REPORT_MAX_NOTES": str(max_notes)},
+    )
+    log = QueryLog(proc.stdout)  # type: ignore[arg-type]
+    base_url = f"http://{address}"
+    probe = PocketBaseClient(base_url, use_token_cache=False)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            if probe.request("GET", "/api/health", timeout=2).status_code == 200:
+                return proc, base_url, log
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("PocketBase failed to start:\n" + "\n".join(log.tail))
+
+
+def apply_schema(base_url: str, email: str, password: str) -> None:
+    for script in (REPO_ROOT / "setup_pocketbase.py", REPO_ROOT / "scripts" / "setup_daily_email_collections.py"):
+        result = subprocess.run(
+            [sys.executable, str(script), "--url", base_url, "--email", email, "--password", password],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{script.name} failed:\n{(result.stdout + result.stderr)[-1500:]}")
+
+
+def configure_smtp(client: PocketBaseClient, sink: SmtpSink) -> None:
+    client.call(
+        "PATCH",
+        "/api/settings",
+        "update mail settings",
+        json_body={
+            "meta": {"senderAddress": f"bench@{BENCH_DOMAIN}", "senderName": "Bench"},
+            "smtp": {"enabled": True, "host": "127.0.0.1", "port": sink.server_address[1], "tls": False},
+        },
+    )
+
+
+def bench_email(index: int) -> str:
+    return f"bench-{index:05d}@{BENCH_DOMAIN}"
+
+
+def seed(client: PocketBaseClient, users: int, notes: int, queue_rows: int, batch_size: int) -> int:
+    """Create the missing bench users 0..users-1 with their notes and queue rows; returns users created."""
+    existing = {
+        str(item.get("email"))
+        for item in client.iter_records("users", per_page=500, filter=f'email ~ "@{BENCH_DOMAIN}"', fields="email")
+    }
+    now_ms = int(time.time() * 1000)
+    operations: List[dict] = []
+    created = 0
+
+    def flush() -> None:
+        if operations:
+            client.batch(operations, timeout=600)
+            operations.clear()
+
+    for index in range(users):
+        email = bench_email(index)
+        if email in existing:
+            continue
+        user_id = stable_record_id("bench_user", str(index))
+        operations.append(
+            {
+                "method": "POST",
+                "url": records_path("users"),
+                "body": {
+                    "id": user_id,
+                    "email": email,
+                    "password": BENCH_PASSWORD,
+                    "passwordConfirm": BENCH_PASSWORD,
+                    "verified": True,
+                    "name": f"Bench {index}",
+                },
+            }
+        )
+        for n in range(notes):
+            operations.append(
+                {
+                    "method": "POST",
+                    "url": records_path("ai_notes"),
+                    "body": {
+                        "id": stable_record_id("bench_note", str(index), str(n)),
+                        "user": user_id,
+                        "bookId": f"bench-book-{n % 3}",
+                        "bookTitle": f"Bench Book {n % 3}",
+                        "messages": f'[{{"role":"user","content":"note {n}"}}]',
+                        "originalText": f"A highlighted passage number {n} from the bench book. " * 3,
+                        "aiResponse": "A long model answer about the passage. " * 10,
+                        "status": "done",
+                        "createdAt": now_ms,
+                        "updatedAt": now_ms,
+                    },
+                }
+            )
+        for q in range(queue_rows):
+            row_id = stable_record_id("bench_queue", str(index), str(q))
+            # Created under the cron's category, which skips the daily limit and mail
+            # hook bookkeeping, then turned into an ordinary row of the wanted status.
+            operations.append(
+                {
+                    "method": "POST",
+                    "url": records_path("mail_queue"),
+                    "body": {
+                        "id": row_id,
+                        "user": user_id,
+                        "toEmail": email,
+                        "subject": "Bench seed",
+                        "body": "Seeded row.",
+                        "category": AUTO_CATEGORY,
+                        "status": "pending",
+                        "createdAt": now_ms,
+                    },
+                }
+            )
+            operations.append(
+                {
+                    "method": "PATCH",
+                    "url": records_path("mail_queue", row_id),
+                    "body": {"category": SUMMARY_CATEGORY, "status": SEED_STATUSES[q % len(SEED_STATUSES)]},
+                }
+            )
+        created += 1
+        if len(operations) >= batch_size:
+            flush()
+    flush()
+    return created
+
+
+def queue_count(client: PocketBaseClient, filter: str = "") -> int:  # noqa: A002
+    return int(client.list_records("mail_queue", per_page=1, filter=filter or None).get("totalItems") or 0)
+
+
+def clear_reports(client: PocketBaseClient, batch_size: int) -> int:
+    """Delete the cron's queued reports, so the next run starts from the same state."""
+    ids = [
+        str(item["id"])
+        for item in client.iter_records(
+            "mail_queue", per_page=500, filter=f'category = "{AUTO_CATEGORY}" && subject != "Bench seed"', fields="id"
+        )
+    ]
+    for offset in range(0, len(ids), batch_size):
+        client.batch(
+            [{"method": "DELETE", "url": records_path("mail_queue", rid)} for rid in ids[offset:offset + batch_size]],
+            timeout=600,
+        )
+    return len(ids)
+
+
+def log_time(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] + "Z"
+
+
+def parse_log_time(value: str) -> float:
+    return datetime.strptime(value.replace("T", " ").rstrip("Z"), "%Y-%m-%d %H:%M:%S.%f").replace(
+        tzinfo=timezone.utc
+    ).timestamp()
+
+
+def run_cron(
+    client: PocketBaseClient,
+    users: int,
+    run: int,
+    log: Optional[QueryLog],
+    sink: Optional[SmtpSink],
+    timeout: float,
+) -> CronResult:
+    before = queue_count(client)
+    if log:
+        log.take()
+    if sink:
+        sink.take()
+    started = time.time()
+    client.call("POST", f"/api/crons/{CRON_ID}", "run cron")
+    # The cron runs in the background; its last act is the "finished" log entry.
+    log_filter = f'(message = "{FINISHED_MESSAGE}" || message = "{FAILED_MESSAGE}") && created >= "{log_time(started - 1)}"'
+    entry: Optional[dict] = None
+    while entry is None:
+        if time.time() - started > timeout:
+            raise RuntimeError(f"cron did not log {FINISHED_MESSAGE!r} within {timeout:.0f}s")
+        time.sleep(0.5)
+        items = client.call(
+            "GET", "/api/logs", "list logs", params={"filter": log_filter, "sort": "-created", "perPage": 1}
+        ).get("items") or []
+        entry = items[0] if items else None
+    if entry.get("message") == FAILED_MESSAGE:
+        raise RuntimeError(f"cron failed: {(entry.get('data') or {}).get('error')}")
+    data = entry.get("data") or {}
+    # Let the hooks of the last queued rows finish before counting.
+    time.sleep(1.0)
+
+    def stat(name: str) -> int:
+        return int(str(data.get(name) or 0))
+
+    return CronResult(
+        users=users,
+        run=run,
+        runtime_sec=round(parse_log_time(str(entry.get("created"))) - started, 3),
+        processed=stat("users"),
+        queued=stat("queued"),
+        skipped_existing=stat("skippedExisting"),
+        skipped_no_notes=stat("skippedNoNotes"),
+        user_errors=stat("userErrors"),
+        queue_growth=queue_count(client) - before,
+        mails=sink.take() if sink else 0,
+        queries=log.take() if log else None,
+    )
+
+
+def run_sends(
+    base_url: str,
+    admin: PocketBaseClient,
+    users: int,
+    sends_per_user: int,
+    concurrency: int,
+    log: Optional[QueryLog],
+    sink: Optional[SmtpSink],
+) -> SendResult:
+    clients: List[Tuple[PocketBaseClient, str]] = []
+    for index in range(users):
+        client = PocketBaseClient(base_url, use_token_cache=False)
+        client.auth_user(bench_email(index), BENCH_PASSWORD)
+        clients.append((client, bench_email(index)))
+
+    def worker(entry: Tuple[PocketBaseClient, str]) -> List[Tuple[int, float]]:
+        client, email = entry
+        results = []
+        for n in range(sends_per_user):
+            start = time.perf_counter()
+            status = client.request(
+                "POST", SEND_PATH, json_body={"toEmail": email, "subject": "Bench summary", "body": f"Bench mail {n}."}
+            ).status_code
+            results.append((status, (time.perf_counter() - start) * 1000))
+        return results
+
+    before = queue_count(admin)
+    if log:
+        log.take()
+    if sink:
+        sink.take()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = [item for chunk in pool.map(worker, clients) for item in chunk]
+    elapsed = time.perf_counter() - start
+    time.sleep(1.0)
+    for client, _ in clients:
+        client.close()
+    latencies = sorted(ms for _, ms in outcomes)
+    statuses = Counter(status for status, _ in outcomes)
+    return SendResult(
+        users=users,
+        requests=len(outcomes),
+        queued=statuses[200],
+        limited=statuses[429],
+        errors=len(outcomes) - statuses[200] - statuses[429],
+        elapsed_sec=round(elapsed, 3),
+        p50_ms=round(percentile(latencies, 50), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        queue_growth=queue_count(admin) - before,
+        mails=sink.take() if sink else 0,
+        queries=log.take() if log else None,
+    )
+
+
+def fit_line(points: List[Tuple[float, float]]) -> Tuple[float, float]:
+    """Least-squares (intercept, slope) of y against x; through the origin for a single point."""
+    if len(points) == 1:
+        x, y = points[0]
+        return 0.0, y / x if x else 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if not var:
+        return 0.0, mean_y / mean_x if mean_x else 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+    return mean_y - slope * mean_x, slope
+
+
+def print_cron_table(results: List[CronResult]) -> None:
+    header = (
+        f"{'users':>6} {'run':>3} {'sec':>8} {'ms/user':>8} {'queued':>6} {'dedup':>6} {'nonotes':>7} "
+        f"{'errors':>6} {'growth':>6} {'mails':>6} {'queries':>8} {'q/user':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        queries = f"{r.queries:>8}" if r.queries is not None else f"{'-':>8}"
+        per_user = f"{r.queries / r.processed:6.1f}" if r.queries is not None and r.processed else f"{'-':>6}"
+        print(
+            f"{r.users:>6} {r.run:>3} {r.runtime_sec:8.2f} {r.per_user_ms:8.2f} {r.queued:>6} {r.skipped_existing:>6} "
+            f"{r.skipped_no_notes:>7} {r.user_errors:>6} {r.queue_growth:>6} {r.mails:>6} {queries} {per_user}"
+        )
+
+
+def print_send_table(result: SendResult) -> None:
+    queries = f"{result.queries / max(result.requests, 1):.1f}" if result.queries is not None else "-"
+    print(
+        f"/boox-mail-send: {result.requests} requests from {result.users} users in {result.elapsed_sec:.2f}s "
+        f"({result.requests / result.elapsed_sec if result.elapsed_sec else 0:.1f} req/s), "
+        f"p50 {result.p50_ms:.1f} ms, p95 {result.p95_ms:.1f} ms"
+    )
+    print(
+        f"  queued={result.queued} limited(429)={result.limited} errors={result.errors} "
+        f"queue_growth={result.queue_growth} mails={result.mails} queries/request={queries}"
+    )
+
+
+def report_window(results: List[CronResult], window_min: float) -> Dict[str, float]:
+    first_runs = [r for r in results if r.run == 1 and r.processed]
+    if not first_runs:
+        return {}
+    intercept, slope = fit_line([(float(r.processed), r.runtime_sec) for r in first_runs])
+    window_sec = window_min * 60
+    fits = int((window_sec - intercept) / slope) if slope > 0 else 0
+    print(f"\nruntime ~ {intercept:.2f}s + {slope * 1000:.2f} ms/user (first runs)")
+    if slope > 0:
+        print(f"a {window_min:g} min window holds ~{fits} users", end="")
+        print(f"; the cron only loads the first {CRON_USER_CAP}" if fits > CRON_USER_CAP else "")
+    for r in results:
+        if r.run > 1 and r.queued:
+            print(
+                f"users={r.users} run {r.run}: {r.queued} reports queued again; the de-dup lookup "
+                f"reads at most {CRON_EXISTING_CAP} queued reports"
+            )
+        if r.users > CRON_USER_CAP and r.processed <= CRON_USER_CAP:
+            print(f"users={r.users}: only {r.processed} users loaded, the rest get no report")
+    return {"intercept_sec": round(intercept, 3), "ms_per_user": round(slope * 1000, 3), "users_in_window": fits}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the mail_queue cron and send hooks of pb_hooks.")
+    parser.add_argument("--pocketbase-bin", help="PocketBase binary to start with this repo's pb_hooks")
+    parser.add_argument("--url", help="Use a running local PocketBase (hooks loaded) instead")
+    parser.add_argument("--admin-email", default=BENCH_ADMIN_EMAIL, help="Superuser email (with --url)")
+    parser.add_argument("--admin-password", default=BENCH_PASSWORD, help="Superuser password (with --url)")
+    parser.add_argument("--allow-remote", action="store_true", help="Allow a --url that is not on this host")
+    parser.add_argument("--hooks-dir", default=str(REPO_ROOT / "pb_hooks"), help="pb_hooks directory to load")
+    parser.add_argument("--workdir", help="Where to keep the PocketBase data (default: temp dir); reused seeds stay")
+    parser.add_argument("--users", default=DEFAULT_USERS, help=f"Comma separated user counts (default: {DEFAULT_USERS})")
+    parser.add_argument("--notes", type=int, default=5, help="Done ai_notes per user from the last 24h")
+    parser.add_argument("--queue-rows", type=int, default=3, help=f"mail_queue rows per user today (<= {MAIL_DAILY_LIMIT})")
+    parser.add_argument("--max-notes", type=int, default=30, help="DAILY_AI_NOTE_REPORT_MAX_NOTES (with --pocketbase-bin)")
+    parser.add_argument("--runs", type=int, default=2, help="Cron runs per user count; runs after the first test de-dup")
+    parser.add_argument("--send-users", type=int, default=20, help="Users calling /boox-mail-send (0 skips)")
+    parser.add_argument("--sends-per-user", type=int, default=MAIL_DAILY_LIMIT + 5, help="Calls per send user")
+    parser.add_argument("--concurrency", type=int, default=8, help="Send users at a time")
+    parser.add_argument("--window-min", type=float, default=DEFAULT_WINDOW_MIN, help="Nightly window to fit the cron in")
+    parser.add_argument("--batch-size", type=int, default=50, help="Sub-requests per /api/batch while seeding")
+    parser.add_argument("--cron-timeout", type=float, default=3600, help="Seconds to wait for one cron run")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    try:
+        levels = sorted({int(u) for u in args.users.split(",") if u.strip()})
+    except ValueError as exc:
+        print(f"Error: --users: {exc}", file=sys.stderr)
+        return 2
+    if bool(args.pocketbase_bin) == bool(args.url):
+        print("Error: pass exactly one of --pocketbase-bin and --url", file=sys.stderr)
+        return 2
+    if args.url and not args.allow_remote and urlparse(args.url).hostname not in ("127.0.0.1", "localhost", "::1"):
+        print("Error: --url is not local; the seed writes users and mail. Pass --allow-remote to insist.", file=sys.stderr)
+        return 2
+    if not levels or levels[0] <= 0 or args.notes < 0 or args.runs <= 0 or args.concurrency <= 0:
+        print("Error: --users, --runs and --concurrency must be positive, --notes >= 0", file=sys.stderr)
+        return 2
+    if not 0 <= args.queue_rows <= MAIL_DAILY_LIMIT:
+        print(f"Error: --queue-rows must be 0-{MAIL_DAILY_LIMIT}", file=sys.stderr)
+        return 2
+    if args.send_users > levels[0]:
+        print(f"Error: --send-users must be <= the smallest --users level ({levels[0]})", file=sys.stderr)
+        return 2
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-mail-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    proc: Optional[subprocess.Popen] = None
+    sink: Optional[SmtpSink] = None
+    log: Optional[QueryLog] = None
+    cron_results: List[CronResult] = []
+    send_result: Optional[SendResult] = None
+
+    try:
+        if args.pocketbase_bin:
+            proc, base_url, log = start_pocketbase(args.pocketbase_bin, workdir, Path(args.hooks_dir), args.max_notes)
+            apply_schema(base_url, BENCH_ADMIN_EMAIL, BENCH_PASSWORD)
+            admin_email, admin_password = BENCH_ADMIN_EMAIL, BENCH_PASSWORD
+        else:
+            base_url = args.url.rstrip("/")
+            admin_email, admin_password = args.admin_email, args.admin_password
+        admin = PocketBaseClient(base_url, use_token_cache=False)
+        if not admin.auth_admin(admin_email, admin_password):
+            print(f"Error: superuser auth failed: {admin.last_auth_error}", file=sys.stderr)
+            return 2
+        if proc is not None:
+            sink = SmtpSink()
+            threading.Thread(target=sink.serve_forever, name="smtp-sink", daemon=True).start()
+            configure_smtp(admin, sink)
+        print(f"Benchmark target: {base_url} (workdir={workdir}, sql counting={'on' if log else 'off'})")
+
+        for users in levels:
+            start = time.perf_counter()
+            created = seed(admin, users, args.notes, args.queue_rows, args.batch_size)
+            print(f"Seeded {created} users ({users} total) in {time.perf_counter() - start:.1f}s")
+            removed = clear_reports(admin, args.batch_size)
+            if removed:
+                print(f"Removed {removed} reports queued by earlier runs")
+            for run in range(1, args.runs + 1):
+                result = run_cron(admin, users, run, log, sink, args.cron_timeout)
+                print(f"  cron users={users} run={run}: {result.runtime_sec:.2f}s, queued {result.queued}")
+                cron_results.append(result)
+
+        if args.send_users:
+            print(f"Sending as {args.send_users} users, {args.sends_per_user} calls each")
+            send_result = run_sends(
+                base_url, admin, args.send_users, args.sends_per_user, args.concurrency, log, sink
+            )
+    except KeyboardInterrupt:
+        print("Interrupted.", file=sys.stderr)
+        return 130
+    except (PocketBaseError, RuntimeError, OSError, subprocess.CalledProcessError) as exc:
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        if isinstance(exc, PocketBaseError) and exc.status == 404 and "cron" in str(exc):
+            print("Hint: /api/crons needs PocketBase v0.23+ with pb_hooks/main.pb.js loaded.", file=sys.stderr)
+        return 1
+    finally:
+        if sink is not None:
+            sink.shutdown()
+            sink.server_close()
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print()
+    print_cron_table(cron_results)
+    if send_result:
+        print()
+        print_send_table(send_result)
+    window = report_window(cron_results, args.window_min)
+
+    if args.json_path:
+        payload = {
+            "createdAt": int(time.time()),
+            "notesPerUser": args.notes,
+            "queueRowsPerUser": args.queue_rows,
+            "windowMin": args.window_min,
+            "cron": [{**asdict(r), "per_user_ms": round(r.per_user_ms, 3)} for r in cron_results],
+            "send": asdict(send_result) if send_result else None,
+            "fit": window,
+        }
+        Path(args.json_path).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"Wrote {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
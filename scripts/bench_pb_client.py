@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark connection reuse in pb_client.py against a local TLS stand-in.
+
+What it does:
+1) Creates a throwaway self-signed certificate with the `openssl` CLI
+2) Starts scripts/pocketbase_standin.py over HTTPS and seeds ai_notes
+3) Runs the request mix of the backfill scripts (list a page, get a record,
+   patch updatedAt) in two modes at each concurrency level:
+   - bare:   module-level requests.get/patch, a new TCP+TLS handshake per call
+   - pooled: one shared PocketBaseClient (keep-alive pool sized to the workers)
+4) Reports req/s, p50/p95 latency, server-side accepted connections (one TLS
+   handshake each) and response bytes per request
+
+Usage examples:
+  python3 scripts/bench_pb_client.py
+  python3 scripts/bench_pb_client.py --iterations 300 --concurrency 1,8
+  python3 scripts/bench_pb_client.py --plain   # no openssl: HTTP, TCP handshakes only
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from bench_epub_transfer import BENCH_EMAIL, BENCH_PASSWORD, start_standin
+from pb_client import PocketBaseClient
+
+
+DEFAULT_ITERATIONS = 200
+DEFAULT_CONCURRENCY = "1,4"
+MODES = ("bare", "pooled")
+
+
+@dataclass
+class ModeResult:
+    mode: str
+    concurrency: int
+    requests: int
+    elapsed_sec: float
+    p50_ms: float
+    p95_ms: float
+    connections: Optional[int]
+    bytes_out: Optional[int]
+
+    @property
+    def per_sec(self) -> float:
+        return self.requests / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def make_certificate(workdir: Path) -> Tuple[Path, Path]:
+    cert, key = workdir / "cert.pem", workdir / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", str(key), "-out", str(cert),
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+def seed_notes(client: PocketBaseClient, user_id: str, count: int) -> List[str]:
+    body = "Reading notes and a long model answer. " * 12
+    ids = []
+    for i in range(count):
+        record = client.create_record(
+            "ai_notes",
+            {
+                "user": user_id,
+                "bookId": "bench-book",
+                "messages": f'[{{"role":"user","content":"note {i}"}}]',
+                "originalText": f"passage {i}",
+                "aiResponse": body,
+                "status": "done",
+                "createdAt": int(time.time() * 1000),
+            },
+        )
+        ids.append(record["id"])
+    return ids
+
+
+def bare_sender(base_url: str, token: str, verify) -> Callable[[str, str, Optional[dict], Optional[dict]], int]:
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def send(method: str, path: str, params: Optional[dict], body: Optional[dict]) -> int:
+        resp = requests.request(
+            method, f"{base_url}{path}", params=params, json=body, headers=headers, timeout=30, verify=verify
+        )
+        return resp.status_code
+
+    return send
+
+
+def pooled_sender(client: PocketBaseClient) -> Callable[[str, str, Optional[dict], Optional[dict]], int]:
+    def send(method: str, path: str, params: Optional[dict], body: Optional[dict]) -> int:
+        return client.request(method, path, params=params, json_body=body).status_code
+
+    return send
+
+
+def run_mode(
+    send: Callable[[str, str, Optional[dict], Optional[dict]], int],
+    note_ids: List[str],
+    iterations: int,
+    concurrency: int,
+) -> Tuple[int, float, List[float]]:
+    list_path = "/api/collections/ai_notes/records"
+
+    def worker(index: int) -> List[float]:
+        latencies = []
+        for i in range(index, iterations, concurrency):
+            record_path = f"{list_path}/{note_ids[i % len(note_ids)]}"
+            calls = (
+                ("GET", list_path, {"page": 1, "perPage": 50, "sort": "+id"}, None),
+                ("GET", record_path, None, None),
+                ("PATCH", record_path, None, {"updatedAt": int(time.time() * 1000)}),
+            )
+            for method, path, params, body in calls:
+                start = time.perf_counter()
+                status = send(method, path, params, body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status >= 300:
+                    raise RuntimeError(f"{method} {path} returned {status}")
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [ms for chunk in pool.map(worker, range(concurrency)) for ms in chunk]
+    return len(latencies), time.perf_counter() - start, sorted(latencies)
+
+
+def standin_stats(base_url: str, verify, reset: bool = False) -> Dict[str, int]:
+    if reset:
+        requests.post(f"{base_url}/_standin/reset", timeout=10, verify=verify)
+        return {}
+    data = requests.get(f"{base_url}/_standin/stats", timeout=10, verify=verify).json()
+    # The stats request itself opened one connection.
+    return {"connections": int(data.get("connections") or 0) - 1, "bytes_out": int(data.get("bytes_out") or 0)}
+
+
+def print_table(results: List[ModeResult]) -> None:
+    header = f"{'mode':<7} {'conc':>4} {'reqs':>6} {'sec':>7} {'req/s':>8} {'p50_ms':>7} {'p95_ms':>7} {'conns':>6} {'B/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        conns = f"{r.connections:>6}" if r.connections is not None else f"{'-':>6}"
+        per_req = f"{r.bytes_out / max(r.requests, 1):7.0f}" if r.bytes_out is not None else f"{'-':>7}"
+        print(
+            f"{r.mode:<7} {r.concurrency:>4} {r.requests:>6} {r.elapsed_sec:7.2f} {r.per_sec:8.1f} "
+            f"{r.p50_ms:7.2f} {r.p95_ms:7.2f} {conns} {per_req}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure handshake savings of the pooled PocketBase client.")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Request mixes per mode (3 requests each)")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="Comma separated worker counts")
+    parser.add_argument("--records", type=int, default=60, help="ai_notes records to seed")
+    parser.add_argument("--plain", action="store_true", help="Serve HTTP instead of HTTPS (no openssl needed)")
+    parser.add_argument("--workdir", help="Where to write the certificate and stand-in data (default: temp dir)")
+    args = parser.parse_args()
+
+    try:
+        levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    if not levels or min(levels) <= 0 or args.iterations <= 0 or args.records <= 0:
+        print("Error: --concurrency, --iterations and --records must be positive", file=sys.stderr)
+        return 2
+
+    tls = not args.plain
+    if tls and not shutil.which("openssl"):
+        print("Error: openssl not found; install it or pass --plain", file=sys.stderr)
+        return 2
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-pb-client-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    proc: Optional[subprocess.Popen] = None
+    results: List[ModeResult] = []
+    try:
+        extra_args: List[str] = []
+        verify = True
+        if tls:
+            cert, key = make_certificate(workdir)
+            extra_args = ["--tls-cert", str(cert), "--tls-key", str(key)]
+            verify = str(cert)
+        proc, base_url = start_standin(workdir / "pb_data", extra_args=extra_args)
+        print(f"Benchmark target: {base_url} (workdir={workdir})")
+
+        setup_client = PocketBaseClient(base_url, use_token_cache=False)
+        setup_client.session.verify = verify
+        token, user_id = setup_client.auth_user(BENCH_EMAIL, BENCH_PASSWORD)
+        note_ids = seed_notes(setup_client, user_id, args.records)
+        setup_client.close()
+
+        for level in levels:
+            for mode in MODES:
+                client = None
+                if mode == "pooled":
+                    client = PocketBaseClient(base_url, token=token, pool_size=level, use_token_cache=False)
+                    client.session.verify = verify
+                    send = pooled_sender(client)
+                else:
+                    send = bare_sender(base_url, token, verify)
+                print(f"Running mode={mode} concurrency={level}")
+                standin_stats(base_url, verify, reset=True)
+                count, elapsed, latencies = run_mode(send, note_ids, args.iterations, level)
+                stats = standin_stats(base_url, verify)
+                if client is not None:
+                    client.close()
+                results.append(
+                    ModeResult(
+                        mode=mode,
+                        concurrency=level,
+                        requests=count,
+                        elapsed_sec=elapsed,
+                        p50_ms=percentile(latencies, 50),
+                        p95_ms=percentile(latencies, 95),
+                        connections=stats.get("connections"),
+                        bytes_out=stats.get("bytes_out"),
+                    )
+                )
+    except Exception as exc:  # noqa: BLE001
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print()
+    print_table(results)
+    by_key = {(r.mode, r.concurrency): r for r in results}
+    print()
+    for level in levels:
+        bare, pooled = by_key.get(("bare", level)), by_key.get(("pooled", level))
+        if not bare or not pooled or not bare.elapsed_sec:
+            continue
+        saved = (bare.connections or 0) - (pooled.connections or 0)
+        print(
+            f"concurrency={level}: {saved} {'TLS' if tls else 'TCP'} handshakes avoided, "
+            f"{pooled.per_sec / max(bare.per_sec, 1e-9):.2f}x throughput, "
+            f"p50 {bare.p50_ms:.2f} -> {pooled.p50_ms:.2f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
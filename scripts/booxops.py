@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+booxops: one fast-starting entry point for the ops scripts.
+
+Commands (each forwards its arguments to the script's own main()):
+  backfill-qdrant   scripts/backfill_ai_notes_to_qdrant.py
+  rag-touch         scripts/backfill_ai_notes_to_rag_embeddings.py
+  setup-schema      setup_pocketbase.py
+  verify-epub       scripts/verify_epub_upload.py
+  check             check_collections.py
+  export            scripts/export_user_data.py
+  import            scripts/import_user_data.py
+  migrate-dims      scripts/migrate_embedding_dims.py
+  compact-sync-logs scripts/compact_qdrant_sync_logs.py
+  crash-fingerprints scripts/fingerprint_crash_reports.py
+  translation-cache scripts/translation_cache.py
+  ai-digests        scripts/build_ai_note_digests.py
+  reading-rollups   scripts/reading_rollups.py
+  rag-search-cache  scripts/rag_search_cache.py
+  trace-summary     scripts/trace_summary.py
+  import-budget     start-up import cost of every command, measured with -X importtime
+
+Only the chosen command's module is imported, and the heavy third-party and
+stdlib modules (DEFERRED_IMPORTS) are registered as lazy modules first: the
+script's `import requests` succeeds immediately and the real import happens on
+first use (requests.Session(), asyncio.run(), ...). `--help`, argument errors
+and early exits never pay for them.
+
+import-budget runs `python -X importtime booxops.py <command> --help` in a fresh
+interpreter per command, sums the top-level imports the bare interpreter does
+not already load, and exits 1 when a command goes over --budget-ms or loads a
+deferred module eagerly. The scripts' shared modules (dataclasses, pb_client,
+http_trace, argparse) put most commands at 20-65 ms on a single-core host, so
+the default budget of 100 ms flags regressions of the size of an eager
+`requests` (~140 ms) or multiprocessing import rather than run-to-run noise.
+
+Usage examples:
+  python3 scripts/booxops.py backfill-qdrant --limit 500 --async-inflight 64
+  python3 scripts/booxops.py rag-touch --dry-run
+  python3 scripts/booxops.py check --email admin@example.com --password secret
+  python3 scripts/booxops.py import-budget --budget-ms 60 ai-digests export
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPTS_DIR.parent
+
+# command -> (module, help); modules live in scripts/ or the repository root.
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "backfill-qdrant": ("backfill_ai_notes_to_qdrant", "Embed ai_notes and upsert them into Qdrant"),
+    "rag-touch": ("backfill_ai_notes_to_rag_embeddings", "Touch ai_notes so the RAG hook re-embeds them"),
+    "setup-schema": ("setup_pocketbase", "Create/update the PocketBase collections"),
+    "verify-epub": ("verify_epub_upload", "Upload an EPUB and verify the stored copy"),
+    "check": ("check_collections", "Collection schemas, counts and capacity report"),
+    "export": ("export_user_data", "Export user data collections to compressed archives"),
+    "import": ("import_user_data", "Import/restore an export with batched upserts"),
+    "migrate-dims": ("migrate_embedding_dims", "Shrink Qdrant vectors behind an alias, with recall check"),
+    "compact-sync-logs": ("compact_qdrant_sync_logs", "Roll up qdrant_sync_logs per day and prune old rows"),
+    "crash-fingerprints": ("fingerprint_crash_reports", "Fingerprint crash_reports and aggregate duplicates"),
+    "translation-cache": ("translation_cache", "Analyze translation cache hits and prefill caption translations"),
+    "ai-digests": ("build_ai_note_digests", "Precompute daily AI-note digests for the mailer and app"),
+    "reading-rollups": ("reading_rollups", "Roll up reading progress per user/book/day into SQLite and report"),
+    "rag-search-cache": ("rag_search_cache", "Caching proxy for /boox-rag-search, invalidated by realtime note changes"),
+    "trace-summary": ("trace_summary", "Summarize http_trace JSONL files"),
+}
+DEFERRED_IMPORTS = ("requests", "asyncio", "ssl")
+DEFAULT_BUDGET_MS = 100.0
+DEFAULT_REPEAT = 5
+
+
+class DeferredModule(types.ModuleType):
+    """Stand-in kept in sys.modules until an attribute is read; reads go to the real module.
+
+    `import requests` only looks at `__spec__`, which the stand-in has, so the import
+    statement stays free. (importlib.util.LazyLoader does not work here: on 3.11 the
+    import statement's `__spec__` check already triggers its load.)
+    """
+
+    def __init__(self, spec):
+        super().__init__(spec.name)
+        self.__spec__ = spec
+
+    def __getattr__(self, attr: str):
+        return getattr(_load_deferred(self), attr)
+
+
+# Reentrant: loading asyncio touches the deferred ssl module.
+_deferred_lock = threading.RLock()
+
+
+def _load_deferred(stub: DeferredModule) -> types.ModuleType:
+    name = stub.__spec__.name
+    with _deferred_lock:
+        if sys.modules.get(name) is stub:
+            del sys.modules[name]
+            try:
+                importlib.import_module(name)
+            except BaseException:
+                sys.modules[name] = stub
+                raise
+        return sys.modules[name]
+
+
+def defer_imports(names: Tuple[str, ...] = DEFERRED_IMPORTS) -> None:
+    """Put a DeferredModule in sys.modules for each of `names` not imported yet."""
+    for name in names:
+        if name in sys.modules:
+            continue
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            continue  # not installed: the script's own import fails as usual
+        sys.modules[name] = DeferredModule(spec)
+
+
+def run_command(command: str, argv: List[str]) -> int:
+    module_name = COMMANDS[command][0]
+    for path in (str(SCRIPTS_DIR), str(REPO_ROOT)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    defer_imports()
+    module = importlib.import_module(module_name)
+    # The scripts parse sys.argv themselves; prog shows up as "booxops <command>" in their help.
+    sys.argv = [f"booxops {command}", *argv]
+    result = module.main()
+    # Some scripts' main() return None on success (or call sys.exit themselves).
+    return result if isinstance(result, int) else 0
+
+
+def parse_importtime(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """Total import time (ms) and cumulative ms per top-level module from -X importtime output."""
+    total_us = 0
+    top: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            cumulative_us = int(cumulative.strip())
+        except ValueError:
+            continue  # the header line
+        if name.startswith(" ") and not name.startswith("  "):
+            # One space after the bar: a top-level import; nested ones are indented further.
+            total_us += cumulative_us
+            top[name.strip()] = top.get(name.strip(), 0.0) + cumulative_us / 1000
+    return total_us / 1000, top
+
+
+def loaded_modules(stderr: str) -> set:
+    names = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            names.add(line.rsplit("|", 1)[1].strip())
+    return names
+
+
+def measure(argv: List[str], repeat: int) -> Tuple[float, Dict[str, float], set]:
+    """Fastest of `repeat` runs of `python -X importtime <argv>`."""
+    import subprocess
+
+    best: Optional[Tuple[float, Dict[str, float], set]] = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", *argv],
+            cwd=str(REPO_ROOT),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        total_ms, top = parse_importtime(proc.stderr)
+        if best is None or total_ms < best[0]:
+            best = (total_ms, top, loaded_modules(proc.stderr))
+    assert best is not None
+    return best
+
+
+def import_budget(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="booxops import-budget", description="Measure start-up imports of every booxops command"
+    )
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Max ms of imports per command beyond bare start-up")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per command; the fastest counts")
+    parser.add_argument("--top", type=int, default=3, help="Heaviest top-level imports to show per command")
+    parser.add_argument("commands", nargs="*", help="Commands to measure (default: all)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.commands if name not in COMMANDS]
+    if unknown:
+        print(f"Error: unknown command(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    if args.repeat < 1:
+        print("Error: --repeat must be >= 1", file=sys.stderr)
+        return 2
+
+    baseline_ms, _, baseline_modules = measure(["-c", "pass"], args.repeat)
+    print(f"[info] bare interpreter start-up imports: {baseline_ms:.1f} ms (budget {args.budget_ms:.1f} ms on top)")
+    failed = 0
+    for command in args.commands or list(COMMANDS):
+        _, top, modules = measure([str(Path(__file__).resolve()), command, "--help"], args.repeat)
+        eager = sorted(name for name in DEFERRED_IMPORTS if name in modules and name not in baseline_modules)
+        added = {name: ms for name, ms in top.items() if name not in baseline_modules}
+        added_ms = sum(added.values())
+        heaviest = sorted(added.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        over = added_ms > args.budget_ms or eager
+        failed += bool(over)
+        print(
+            f"{'[WARN]' if over else '[ok]'} {command:<16} {added_ms:7.1f} ms  "
+            + ", ".join(f"{name}={ms:.1f}" for name, ms in heaviest)
+        )
+        if eager:
+            print(f"       eagerly imported: {', '.join(eager)}")
+    if failed:
+        print(f"[WARN] {failed} command(s) over the import budget")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="booxops",
+        description="Fast-start entry point for the BooxReader ops scripts.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(f"  {name:<16} {help_text}" for name, (_, help_text) in COMMANDS.items())
+        + "\n  import-budget    Measure start-up imports of every command (-X importtime)"
+        + "\n\nRun `booxops <command> --help` for the options of a command.",
+    )
+    parser.add_argument("command", choices=[*COMMANDS, "import-budget"], metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.command == "import-budget":
+        return import_budget(args.args)
+    return run_command(args.command, args.args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Precompute each user's daily AI-note digest into ai_note_digests.
+
+The app's AiNoteDailySummaryBuilder and the daily_ai_note_report cron in
+pb_hooks/main.pb.js both rebuild the summary from raw notes, the cron with one
+ai_notes query per user. This job does it once for everybody:
+1) Streams the ai_notes of --day (default: the day that just ended in --tz)
+   in one pass, sorted by user (cursor on user, id), so each user's notes
+   arrive together and memory holds one user at a time
+2) Builds the digests (ai_note_digest.build_digest: the Kotlin builder's
+   project/person/era extraction and mail body) in a process pool
+3) Upserts them --batch-size per /api/batch request, with ids derived from
+   (user, day, timezone), so a rerun rewrites the same records, then deletes
+   the digests of that day whose user no longer has notes in it
+
+The digest covers notes of every status, like the app's summary; mailBody holds
+the cron's report over the "done" notes only (--mail-max-notes, default:
+DAILY_AI_NOTE_REPORT_MAX_NOTES as for the cron). The cron mails that body when a
+digest exists for the day and skips the user when it is empty. Both cover the
+previous UTC day on ai_notes.createdAt, so run this job (--tz UTC, the default)
+shortly before the cron, e.g. at 00:01 UTC for the 00:05 UTC cron; a --day that
+has not ended yet is refused. The app can read its own digests (list rule:
+owner only). Needs admin credentials, the batch API (PocketBase v0.23+) and the
+schema of setup_pocketbase.py (ai_note_digests, the ai_notes createdAt index).
+
+Usage examples:
+  python3 scripts/build_ai_note_digests.py
+  python3 scripts/build_ai_note_digests.py --day 2026-10-18 --tz Asia/Taipei --workers 4
+  python3 scripts/build_ai_note_digests.py --dry-run --show 2
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import http_trace
+from ai_note_digest import MAIL_MAX_NOTES, build_digest
+from openmetrics import exporter_from_args
+from pb_client import (
+    PocketBaseClient,
+    PocketBaseError,
+    load_env_file,
+    login,
+    print_fatal_error,
+    quote_filter_value,
+    records_path,
+    resolve_value,
+    stable_record_id,
+)
+from run_metrics import RunMetrics, add_run_args, validate_run_args
+
+
+NOTES_COLLECTION = "ai_notes"
+DIGEST_COLLECTION = "ai_note_digests"
+NOTE_FIELDS = "id,user,bookTitle,originalText,aiResponse,messages,status,createdAt"
+DEFAULT_TZ = "UTC"
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_BATCH_SIZE = 50
+# Users handed to the pool ahead of the writer, per worker.
+IN_FLIGHT_PER_WORKER = 8
+
+
+@dataclass
+class Counters:
+    notes_read: int = 0
+    users: int = 0
+    digests_written: int = 0
+    stale_removed: int = 0
+    pages: int = 0
+    batches: int = 0
+
+
+def day_bounds(day: date, tz: ZoneInfo) -> Tuple[int, int]:
+    """[start, end) of `day` in `tz` as Unix ms; DST days are 23 or 25 hours long."""
+    start = datetime(day.year, day.month, day.day, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+class DigestJob:
+    def __init__(
+        self,
+        client: PocketBaseClient,
+        args: argparse.Namespace,
+        counters: Counters,
+        metrics: RunMetrics,
+    ):
+        self.client = client
+        self.args = args
+        self.counters = counters
+        self.metrics = metrics
+        self.start_ms, self.end_ms = day_bounds(args.day, args.zone)
+        self.day = args.day.isoformat()
+        self.pending: List[dict] = []
+        self.users: Set[str] = set()
+        self.shown = 0
+
+    def user_groups(self) -> Iterator[Tuple[str, List[dict]]]:
+        """(user, notes) of the day, one user at a time, from a (user, id) cursor."""
+        cursor: Optional[Tuple[str, str]] = None
+        user = ""
+        notes: List[dict] = []
+        while True:
+            clauses = [f"createdAt >= {self.start_ms}", f"createdAt < {self.end_ms}"]
+            if cursor is not None:
+                last_user, last_id = (quote_filter_value(value) for value in cursor)
+                clauses.append(f"(user > {last_user} || (user = {last_user} && id > {last_id}))")
+            with self.metrics.stage("read"):
+                listing = self.client.list_records(
+                    NOTES_COLLECTION,
+                    per_page=self.args.page_size,
+                    filter=" && ".join(clauses),
+                    sort="+user,+id",
+                    fields=NOTE_FIELDS,
+                    skip_total=True,
+                    timeout=120,
+                )
+            items = listing.get("items") or []
+            self.counters.pages += 1
+            for item in items:
+                self.counters.notes_read += 1
+                owner = str(item.get("user") or "")
+                if owner != user and notes:
+                    yield user, notes
+                    notes = []
+                user = owner
+                notes.append(item)
+            if len(items) < self.args.page_size:
+                break
+            cursor = (str(items[-1].get("user") or ""), str(items[-1].get("id")))
+        if notes:
+            yield user, notes
+
+    def add(self, digest: dict) -> None:
+        self.counters.users += 1
+        self.metrics.done()
+        self.users.add(digest["user"])
+        if self.shown < self.args.show:
+            self.shown += 1
+            print(f"--- {digest['user']}: {digest['subject']}\n{digest['body']}\n")
+        if self.args.dry_run:
+            return
+        digest["id"] = stable_record_id(DIGEST_COLLECTION, digest["user"], digest["day"], digest["timezone"])
+        digest["generatedAt"] = int(time.time() * 1000)
+        self.pending.append(digest)
+        if len(self.pending) >= self.args.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        operations = [{"method": "PUT", "url": records_path(DIGEST_COLLECTION), "body": d} for d in self.pending]
+        with self.metrics.stage("write"):
+            self.client.batch(operations, timeout=300)
+        self.counters.batches += 1
+        self.counters.digests_written += len(self.pending)
+        self.pending = []
+
+    def run(self) -> None:
+        groups = self.user_groups()
+        if self.args.workers == 0:
+            for user, notes in groups:
+                with self.metrics.stage("build"):
+                    digest = build_digest(user, notes, self.day, self.args.tz, self.args.mail_max_notes)
+                self.add(digest)
+        else:
+            # Imported here: concurrent.futures.process pulls in multiprocessing at start-up.
+            from concurrent.futures import ProcessPoolExecutor
+
+            limit = self.args.workers * IN_FLIGHT_PER_WORKER
+            in_flight: Deque[Future] = deque()
+            with ProcessPoolExecutor(max_workers=self.args.workers) as pool:
+                for user, notes in groups:
+                    in_flight.append(pool.submit(build_digest, user, notes, self.day, self.args.tz, self.args.mail_max_notes))
+                    # Results are taken in submission order; the window keeps the pool busy.
+                    while len(in_flight) >= limit or (in_flight and in_flight[0].done()):
+                        self.add(in_flight.popleft().result())
+                while in_flight:
+                    self.add(in_flight.popleft().result())
+        self.flush()
+
+    def remove_stale(self) -> None:
+        """Delete digests of the day whose user had no notes in this run (notes deleted since)."""
+        stale = [
+            str(item["id"])
+            for item in self.client.iter_records(
+                DIGEST_COLLECTION,
+                per_page=DEFAULT_PAGE_SIZE,
+                filter=f"day = {quote_filter_value(self.day)} && timezone = {quote_filter_value(self.args.tz)}",
+                fields="id,user",
+            )
+            if str(item.get("user") or "") not in self.users
+        ]
+        if self.args.dry_run:
+            self.counters.stale_removed = len(stale)
+            return
+        for offset in range(0, len(stale), self.args.batch_size):
+            chunk = stale[offset:offset + self.args.batch_size]
+            with self.metrics.stage("delete"):
+                self.client.batch(
+                    [{"method": "DELETE", "url": records_path(DIGEST_COLLECTION, rid)} for rid in chunk], timeout=300
+                )
+            self.counters.batches += 1
+            self.counters.stale_removed += len(chunk)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Precompute daily AI-note digests into ai_note_digests.")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--day", help="Day to digest, YYYY-MM-DD (default: yesterday in --tz)")
+    parser.add_argument("--tz", default=DEFAULT_TZ, help=f"IANA time zone the day is cut in (default: {DEFAULT_TZ})")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Digest builder processes, 0 builds in-process"
+    )
+    parser.add_argument(
+        "--mail-max-notes",
+        type=int,
+        help=f"Notes in mailBody (default: DAILY_AI_NOTE_REPORT_MAX_NOTES or {MAIL_MAX_NOTES}, at most 100)",
+    )
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="ai_notes per list request")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Digests per /api/batch request")
+    parser.add_argument("--show", type=int, default=0, help="Print the first N digests")
+    parser.add_argument("--dry-run", action="store_true", help="Build and count only; write and delete nothing")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    try:
+        args.zone = ZoneInfo(args.tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"Error: unknown time zone {args.tz!r}", file=sys.stderr)
+        return 2
+    try:
+        args.day = date.fromisoformat(args.day) if args.day else datetime.now(args.zone).date() - timedelta(days=1)
+    except ValueError:
+        print("Error: --day must be YYYY-MM-DD", file=sys.stderr)
+        return 2
+    if day_bounds(args.day, args.zone)[1] > time.time() * 1000:
+        # The cron would mail a partial digest as if it were the whole day.
+        print(f"Error: --day {args.day.isoformat()} has not ended yet in {args.tz}", file=sys.stderr)
+        return 2
+    if args.mail_max_notes is None:
+        # Same default and cap as the cron, so mailBody lists what it would have.
+        try:
+            args.mail_max_notes = int(os.getenv("DAILY_AI_NOTE_REPORT_MAX_NOTES") or MAIL_MAX_NOTES)
+        except ValueError:
+            args.mail_max_notes = MAIL_MAX_NOTES
+        if args.mail_max_notes <= 0:
+            args.mail_max_notes = MAIL_MAX_NOTES
+    args.mail_max_notes = min(args.mail_max_notes, 100)
+    if args.mail_max_notes <= 0:
+        print("Error: --mail-max-notes must be > 0", file=sys.stderr)
+        return 2
+    if args.workers < 0 or args.show < 0:
+        print("Error: --workers and --show must be >= 0", file=sys.stderr)
+        return 2
+    if not 0 < args.page_size <= 1000 or not 0 < args.batch_size <= 1000:
+        print("Error: --page-size and --batch-size must be 1-1000", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="build_ai_note_digests")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, _ = login(client, admin_email, admin_password, None, None)
+    if auth_mode != "admin":
+        print("Error: digests cover every user; provide --admin-email/--admin-password.", file=sys.stderr)
+        return 2
+
+    print(
+        f"Start digests: pb={base_url}, day={args.day.isoformat()} ({args.tz}), workers={args.workers}, "
+        f"dry_run={args.dry_run}"
+    )
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(metrics, "build_ai_note_digests", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    job = DigestJob(client, args, counters, metrics)
+    try:
+        job.run()
+        job.remove_stale()
+    except KeyboardInterrupt:
+        return metrics.finish_run(
+            "Interrupted; run again to redo the day.", counters, 130, args.metrics_json, script="build_ai_note_digests"
+        )
+    except Exception as exc:  # noqa: BLE001
+        print_fatal_error(exc)
+        if isinstance(exc, PocketBaseError) and exc.status in (400, 404) and DIGEST_COLLECTION in str(exc):
+            print(f"Hint: run setup_pocketbase.py to create {DIGEST_COLLECTION}.", file=sys.stderr)
+        return metrics.finish_run(
+            "Failed; run again to redo the day.", counters, 1, args.metrics_json, script="build_ai_note_digests"
+        )
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="build_ai_note_digests")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
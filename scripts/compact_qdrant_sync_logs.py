@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Roll qdrant_sync_logs up into daily counts and delete the raw rows past retention.
+
+pb_hooks writes one qdrant_sync_logs row per ai_notes create/update/delete, so
+the collection grows without bound. What it does:
+1) Walks the days that hold log rows, oldest first, jumping over empty days
+   with one indexed query each. Days that ended less than --settle-min ago are
+   left alone, since the hooks may still be writing them
+2) Streams every row of a day not rolled up yet (id cursor, constant memory)
+   and counts them per (user, action, status), with the first/last timestamp
+   and the top reasons
+3) Writes the counts to qdrant_sync_log_rollups with /api/batch PUTs. Rollup ids
+   derive from (day, user, action, status), so writing a day again overwrites
+   the same records. The day's total (user empty, action/status "*") goes in
+   the last batch and marks the day as done; later runs skip marked days
+4) Deletes, --batch-size rows per /api/batch request, the rows older than
+   --retention-days, except error rows (--error-statuses), which are kept for
+   --error-retention-days. Only rolled-up days are ever deleted from
+
+All state lives in PocketBase: an interrupted run is resumed by running it
+again, and a finished one does nothing more until new days close. Needs admin
+credentials and the batch API (PocketBase v0.23+, Settings > Application >
+Batch API). Run setup_pocketbase.py first so the rollup collection and the
+qdrant_sync_logs timestamp index exist.
+
+Usage examples:
+  python3 scripts/compact_qdrant_sync_logs.py --dry-run
+  python3 scripts/compact_qdrant_sync_logs.py --retention-days 7 --error-retention-days 60
+  python3 scripts/compact_qdrant_sync_logs.py --rollup-only
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+  QDRANT_SYNC_LOG_COLLECTION
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import http_trace
+from openmetrics import exporter_from_args
+from pb_client import (
+    PocketBaseClient,
+    PocketBaseError,
+    load_env_file,
+    login,
+    print_fatal_error,
+    quote_filter_value,
+    records_path,
+    resolve_value,
+    stable_record_id,
+)
+from run_metrics import RunMetrics, add_run_args, validate_run_args
+
+
+DEFAULT_LOG_COLLECTION = "qdrant_sync_logs"
+ROLLUP_COLLECTION = "qdrant_sync_log_rollups"
+DEFAULT_RETENTION_DAYS = 14
+DEFAULT_ERROR_RETENTION_DAYS = 90
+# The statuses pb_hooks writes are success, skipped and failed.
+DEFAULT_ERROR_STATUSES = "failed"
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_SETTLE_MIN = 60
+DAY_MS = 86_400_000
+# action/status of the per-day total that marks a day as rolled up.
+TOTAL_KEY = "*"
+MAX_REASONS = 20
+LOG_FIELDS = "id,user,action,status,reason,timestamp"
+
+
+@dataclass
+class Counters:
+    days_rolled_up: int = 0
+    days_already_done: int = 0
+    rows_read: int = 0
+    rollup_records: int = 0
+    deleted_rows: int = 0
+    deleted_error_rows: int = 0
+    batches: int = 0
+
+
+def day_start(timestamp_ms: int) -> int:
+    return timestamp_ms - timestamp_ms % DAY_MS
+
+
+def day_label(start_ms: int) -> str:
+    return datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def rollup_id(day: str, user: str, action: str, status: str) -> str:
+    return stable_record_id(ROLLUP_COLLECTION, day, user, action, status)
+
+
+@dataclass
+class Group:
+    count: int = 0
+    first: Optional[int] = None
+    last: Optional[int] = None
+    reasons: Counter = field(default_factory=Counter)
+
+    def add(self, timestamp: int, reason: str) -> None:
+        self.count += 1
+        self.first = timestamp if self.first is None else min(self.first, timestamp)
+        self.last = timestamp if self.last is None else max(self.last, timestamp)
+        if reason:
+            self.reasons[reason] += 1
+
+    def record(self, day: str, user: str, action: str, status: str) -> Dict[str, object]:
+        return {
+            "id": rollup_id(day, user, action, status),
+            "user": user,
+            "day": day,
+            "action": action,
+            "status": status,
+            "count": self.count,
+            "firstTimestamp": self.first,
+            "lastTimestamp": self.last,
+            "reasons": dict(self.reasons.most_common(MAX_REASONS)),
+        }
+
+
+class Compactor:
+    def __init__(self, client: PocketBaseClient, args: argparse.Namespace, counters: Counters, metrics: RunMetrics):
+        self.client = client
+        self.args = args
+        self.collection = args.collection
+        self.counters = counters
+        self.metrics = metrics
+
+    def done_days(self) -> Set[str]:
+        """Days whose total record exists, i.e. fully rolled up by an earlier run."""
+        rows = self.client.iter_records(
+            ROLLUP_COLLECTION,
+            per_page=DEFAULT_PAGE_SIZE,
+            filter=f"action = {quote_filter_value(TOTAL_KEY)} && status = {quote_filter_value(TOTAL_KEY)}",
+            fields="id,day",
+        )
+        return {str(row.get("day")) for row in rows}
+
+    def next_timestamp(self, start_ms: int, before_ms: int) -> Optional[int]:
+        """Timestamp of the oldest row in [start_ms, before_ms), via the timestamp index."""
+        with self.metrics.stage("find_day"):
+            listing = self.client.list_records(
+                self.collection,
+                per_page=1,
+                filter=f"timestamp >= {start_ms} && timestamp < {before_ms}",
+                sort="+timestamp",
+                fields="timestamp",
+                skip_total=True,
+            )
+        items = listing.get("items") or []
+        return int(items[0].get("timestamp") or 0) if items else None
+
+    def day_rows(self, start_ms: int) -> Iterator[dict]:
+        last_id = ""
+        while True:
+            clauses = [f"timestamp >= {start_ms}", f"timestamp < {start_ms + DAY_MS}"]
+            if last_id:
+                clauses.append(f"id > {quote_filter_value(last_id)}")
+            with self.metrics.stage("read"):
+                listing = self.client.list_records(
+                    self.collection,
+                    per_page=self.args.page_size,
+                    filter=" && ".join(clauses),
+                    sort="+id",
+                    fields=LOG_FIELDS,
+                    skip_total=True,
+                    timeout=120,
+                )
+            items = listing.get("items") or []
+            yield from items
+            if len(items) < self.args.page_size:
+                return
+            last_id = str(items[-1].get("id"))
+
+    def send(self, operations: List[dict]) -> None:
+        with self.metrics.stage("pb_batch"):
+            self.client.batch(operations, timeout=300)
+        self.counters.batches += 1
+
+    def roll_up(self, start_ms: int) -> None:
+        day = day_label(start_ms)
+        groups: Dict[Tuple[str, str, str], Group] = {}
+        total = Group()
+        for row in self.day_rows(start_ms):
+            timestamp = int(row.get("timestamp") or 0)
+            reason = str(row.get("reason") or "")
+            key = (str(row.get("user") or ""), str(row.get("action") or ""), str(row.get("status") or ""))
+            groups.setdefault(key, Group()).add(timestamp, reason)
+            total.add(timestamp, reason)
+            self.counters.rows_read += 1
+            self.metrics.done()
+        records = [group.record(day, *key) for key, group in sorted(groups.items())]
+        # The total goes last: it is only written once every other rollup of the day is.
+        records.append(total.record(day, "", TOTAL_KEY, TOTAL_KEY))
+        print(f"[day] {day}: {total.count} rows -> {len(records) - 1} rollups")
+        if not self.args.dry_run:
+            size = self.args.batch_size
+            for offset in range(0, len(records), size):
+                self.send(
+                    [{"method": "PUT", "url": records_path(ROLLUP_COLLECTION), "body": body} for body in records[offset:offset + size]]
+                )
+        self.counters.rollup_records += len(records)
+        self.counters.days_rolled_up += 1
+
+    def roll_up_days(self, before_ms: int) -> None:
+        done = self.done_days()
+        timestamp = self.next_timestamp(0, before_ms)
+        while timestamp is not None:
+            start = day_start(timestamp)
+            if day_label(start) in done:
+                self.counters.days_already_done += 1
+            else:
+                self.roll_up(start)
+            timestamp = self.next_timestamp(start + DAY_MS, before_ms)
+
+    def delete_rows(self, filter_text: str, what: str) -> int:
+        """Delete every row matching `filter_text`, one batch per page; returns how many went."""
+        if self.args.dry_run:
+            listing = self.client.list_records(self.collection, per_page=1, filter=filter_text, fields="id")
+            found = int(listing.get("totalItems") or 0)
+            print(f"[dry-run] would delete {found} {what}")
+            return found
+        deleted = 0
+        while True:
+            # Deleted rows drop out of the filter, so the first page is always the next one.
+            with self.metrics.stage("list_delete"):
+                listing = self.client.list_records(
+                    self.collection,
+                    per_page=self.args.batch_size,
+                    filter=filter_text,
+                    sort="+timestamp",
+                    fields="id",
+                    skip_total=True,
+                    timeout=120,
+                )
+            ids = [str(item.get("id")) for item in listing.get("items") or []]
+            if not ids:
+                break
+            self.send([{"method": "DELETE", "url": records_path(self.collection, record_id)} for record_id in ids])
+            deleted += len(ids)
+        print(f"[delete] {deleted} {what}")
+        return deleted
+
+    def delete_expired(self, rolled_up_before: int, now_ms: int) -> None:
+        today = day_start(now_ms)
+        cutoff = min(today - self.args.retention_days * DAY_MS, rolled_up_before)
+        error_cutoff = min(today - self.args.error_retention_days * DAY_MS, rolled_up_before)
+        statuses = self.args.error_statuses
+        is_error = " || ".join(f"status = {quote_filter_value(status)}" for status in statuses)
+        not_error = " && ".join(f"status != {quote_filter_value(status)}" for status in statuses)
+        self.counters.deleted_rows += self.delete_rows(
+            f"timestamp < {cutoff}" + (f" && {not_error}" if not_error else ""),
+            f"rows before {day_label(cutoff)}",
+        )
+        if statuses:
+            self.counters.deleted_error_rows += self.delete_rows(
+                f"timestamp < {error_cutoff} && ({is_error})",
+                f"{'/'.join(statuses)} rows before {day_label(error_cutoff)}",
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Roll up qdrant_sync_logs per day and delete expired raw rows.")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--collection", help=f"Log collection (default: QDRANT_SYNC_LOG_COLLECTION or {DEFAULT_LOG_COLLECTION})")
+    parser.add_argument(
+        "--retention-days", type=int, default=DEFAULT_RETENTION_DAYS, help="Keep raw rows of the last N days"
+    )
+    parser.add_argument(
+        "--error-retention-days",
+        type=int,
+        default=DEFAULT_ERROR_RETENTION_DAYS,
+        help="Keep raw error rows of the last N days",
+    )
+    parser.add_argument(
+        "--error-statuses",
+        default=DEFAULT_ERROR_STATUSES,
+        help="Comma separated statuses kept for --error-retention-days (empty: none)",
+    )
+    parser.add_argument(
+        "--settle-min",
+        type=int,
+        default=DEFAULT_SETTLE_MIN,
+        help="Roll up a day only once it ended this many minutes ago",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Writes/deletes per /api/batch request")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Log rows per list request")
+    parser.add_argument("--rollup-only", action="store_true", help="Roll up closed days, delete nothing")
+    parser.add_argument("--dry-run", action="store_true", help="Read and count only; write and delete nothing")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+    args.collection = (
+        resolve_value(args.collection, "QDRANT_SYNC_LOG_COLLECTION", file_env) or DEFAULT_LOG_COLLECTION
+    ).strip()
+    args.error_statuses = [status.strip() for status in args.error_statuses.split(",") if status.strip()]
+
+    if args.retention_days < 1 or args.error_retention_days < args.retention_days:
+        print("Error: --retention-days must be >= 1 and --error-retention-days >= --retention-days", file=sys.stderr)
+        return 2
+    if not 0 < args.batch_size <= 1000 or args.page_size <= 0:
+        print("Error: --batch-size must be 1-1000 and --page-size > 0", file=sys.stderr)
+        return 2
+    if args.settle_min < 0:
+        print("Error: --settle-min must be >= 0", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="compact_qdrant_sync_logs")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, _ = login(client, admin_email, admin_password, None, None)
+    if auth_mode != "admin":
+        print("Error: the sync logs are admin-only; provide --admin-email/--admin-password.", file=sys.stderr)
+        return 2
+
+    now_ms = int(time.time() * 1000)
+    # Days that start before this have ended at least --settle-min ago.
+    rolled_up_before = day_start(now_ms - args.settle_min * 60_000)
+    print(
+        f"Start compaction: pb={base_url}, collection={args.collection}, closed days before {day_label(rolled_up_before)}, "
+        f"retention={args.retention_days}d, errors({','.join(args.error_statuses) or '-'})={args.error_retention_days}d, "
+        f"dry_run={args.dry_run}"
+    )
+
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(metrics, "compact_qdrant_sync_logs", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    compactor = Compactor(client, args, counters, metrics)
+    try:
+        compactor.roll_up_days(rolled_up_before)
+        if not args.rollup_only:
+            compactor.delete_expired(rolled_up_before, now_ms)
+    except KeyboardInterrupt:
+        return metrics.finish_run(
+            "Interrupted; run again to resume.", counters, 130, args.metrics_json, script="compact_qdrant_sync_logs"
+        )
+    except Exception as exc:  # noqa: BLE001
+        print_fatal_error(exc)
+        if isinstance(exc, PocketBaseError) and exc.status == 404 and ROLLUP_COLLECTION in str(exc):
+            print(f"Hint: run setup_pocketbase.py to create {ROLLUP_COLLECTION}.", file=sys.stderr)
+        return metrics.finish_run(
+            "Failed; run again to resume.", counters, 1, args.metrics_json, script="compact_qdrant_sync_logs"
+        )
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="compact_qdrant_sync_logs")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
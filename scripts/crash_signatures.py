@@ -0,0 +1,222 @@
+"""
+Stack trace normalization and fingerprints for crash_reports, plus readers for local crash files.
+
+Two reports of the same bug rarely have identical text: messages carry ids,
+hash codes and addresses, line numbers move between builds, R8 renames
+classes in release builds and Kotlin numbers its lambdas. `signature()` keeps
+what identifies the bug:
+- the exception class of each block (the report and its "Caused by:" chain),
+  without the message,
+- the first `frames` frames of the innermost cause, as `package.Class.method`
+  without the (File.kt:123) location and the `$1` / `$lambda$0` /
+  `$$ExternalSynthetic...` suffixes; runs of obfuscated frames (`a.b.c(SourceFile:3)`) collapse
+  into one `<obfuscated>`, native frames keep library and symbol only,
+- for reports without frames (handled errors, logcat one-liners) the message
+  instead, with numbers, hex addresses, @hashcodes and UUIDs masked.
+The fingerprint is the first 16 hex digits of the sha256 of that signature.
+
+read_crash_file() turns local files into crash_reports-shaped dicts:
+- logcat text (`adb logcat -v threadtime`, e.g. android-crash-log/crash_log.txt):
+  one report per E/F line that names an exception, with the `at ...` /
+  `Caused by:` lines of the same pid/tid/tag that follow it
+- a bare stack trace (Log.getStackTraceString output): one report
+- JSON: a list of the app's pending crash reports (CrashReportHandler, snake_case
+  keys) or of crash_reports records; JSONL archives from export_user_data.py
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_FRAMES = 8
+FINGERPRINT_LENGTH = 16
+
+EXCEPTION_RE = re.compile(
+    r"^(?:Caused by:\s*|Exception in thread \"[^\"]*\"\s*)?"
+    r"((?:[A-Za-z_$][\w$]*\.)+[\w$]*(?:Exception|Error|Throwable)|[A-Z][\w$]*(?:Exception|Error))(?::\s*(.*))?$"
+)
+FRAME_RE = re.compile(r"^at\s+([\w$.<>/-]+)\s*(?:\((.*)\))?")
+NATIVE_FRAME_RE = re.compile(r"^#\d+\s+pc\s+[0-9a-fA-F]+\s+(\S+)(?:\s+\(([^+)]+)(?:\+\d+)?\))?")
+MORE_RE = re.compile(r"^\.\.\.\s*\d+\s+more$")
+SYNTHETIC_SUFFIX_RE = re.compile(r"(\$\$ExternalSynthetic\w*|\$lambda[\$-]?\d*|\$\d+|-\$\$Nest\$\w+)+")
+OBFUSCATED_SEGMENT_RE = re.compile(r"^[a-zA-Z]{1,2}\d{0,2}$")
+MASKS = (
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),
+    (re.compile(r"@[0-9a-fA-F]{5,}\b"), "@<hash>"),
+    (re.compile(r"\d+"), "#"),
+)
+LOGCAT_RE = re.compile(
+    r"^(?:(\d{4})-)?(\d{2})-(\d{2})\s+(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s+(\d+)\s+(\d+)\s+([VDIWEF])\s+([^:]*?)\s*:\s?(.*)$"
+)
+# crash_reports field <- keys used by the app's pending reports and by exports.
+RECORD_KEYS = {
+    "stackTrace": ("stackTrace", "stacktrace", "stack_trace"),
+    "message": ("message",),
+    "appVersion": ("appVersion", "app_version"),
+    "androidVersion": ("androidVersion", "os_version", "osVersion"),
+    "deviceModel": ("deviceModel", "device_model"),
+    "timestamp": ("timestamp", "created_at", "createdAt"),
+}
+
+
+@dataclass
+class Signature:
+    fingerprint: str
+    exception: str
+    title: str
+    text: str
+
+
+def mask(text: str) -> str:
+    for pattern, replacement in MASKS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def normalize_frame(symbol: str) -> str:
+    """`package.Class.method` of a JVM frame, lambda/synthetic suffixes removed; '' when obfuscated."""
+    symbol = SYNTHETIC_SUFFIX_RE.sub("", symbol)
+    parts = [part for part in symbol.split(".") if part]
+    # R8 names classes and methods a, b, ..., a0: such a frame changes with every build.
+    if len(parts) >= 2 and all(OBFUSCATED_SEGMENT_RE.match(part) for part in parts[-2:]):
+        return ""
+    return ".".join(parts)
+
+
+def parse_blocks(stack_text: str) -> List[Dict[str, object]]:
+    """Split a trace into exception blocks: [{"exception", "message", "frames"}], outermost first."""
+    blocks: List[Dict[str, object]] = []
+    for raw in stack_text.splitlines():
+        line = raw.strip()
+        if not line or MORE_RE.match(line):
+            continue
+        frame = FRAME_RE.match(line)
+        native = NATIVE_FRAME_RE.match(line)
+        if (frame or native) and blocks:
+            if frame:
+                name = normalize_frame(frame.group(1))
+            else:
+                library = native.group(1).rsplit("/", 1)[-1]
+                name = f"{library} ({native.group(2)})" if native.group(2) else library
+            frames: List[str] = blocks[-1]["frames"]  # type: ignore[assignment]
+            entry = name or "<obfuscated>"
+            if not (entry == "<obfuscated>" and frames and frames[-1] == entry):
+                frames.append(entry)
+            continue
+        header = EXCEPTION_RE.match(line)
+        if header and (not blocks or line.startswith("Caused by:") or not blocks[-1]["frames"]):
+            if blocks and not line.startswith("Caused by:") and not blocks[-1]["frames"]:
+                # A second header before any frame: the first one was a message line.
+                blocks.pop()
+            blocks.append({"exception": header.group(1), "message": header.group(2) or "", "frames": []})
+        elif not blocks:
+            blocks.append({"exception": "", "message": line, "frames": []})
+    return blocks
+
+
+def signature(stack_text: str, message: str = "", frames: int = DEFAULT_FRAMES) -> Signature:
+    blocks = parse_blocks(stack_text or "") or [{"exception": "", "message": message or "", "frames": []}]
+    chain = [str(block["exception"]) for block in blocks if block["exception"]]
+    root = next((block for block in reversed(blocks) if block["frames"]), None)
+    if root is not None:
+        body = list(root["frames"])[:frames]  # type: ignore[arg-type]
+    else:
+        body = [mask(str(blocks[0]["message"]) or message or "")]
+    text = "\n".join(["exception: " + " <- ".join(chain or ["<none>"]), *body])
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+    exception = chain[-1] if chain else ""
+    where = next((frame for frame in body if frame != "<obfuscated>"), "") if root is not None else body[0]
+    title = f"{exception.rsplit('.', 1)[-1] or 'Error'} at {where}" if root is not None else f"{exception or 'Error'}: {where}"
+    return Signature(fingerprint=digest, exception=exception, title=title[:300], text=text)
+
+
+def logcat_reports(lines: Iterator[str], year: int) -> Iterator[Dict[str, object]]:
+    """One report per E/F logcat line naming an exception, with the trace lines that follow it."""
+    current: Optional[Dict[str, object]] = None
+    for raw in lines:
+        match = LOGCAT_RE.match(raw.rstrip("\n"))
+        if not match:
+            continue
+        yr, month, day, hour, minute, second, millis, pid, tid, level, tag, text = match.groups()
+        key = (pid, tid, tag)
+        stripped = text.strip()
+        continues = current is not None and current["key"] == key and (
+            stripped.startswith(("at ", "Caused by:", "... ", "#")) or MORE_RE.match(stripped)
+        )
+        if continues:
+            current["lines"].append(text)  # type: ignore[union-attr]
+            continue
+        if current is not None:
+            yield finish_logcat_report(current)
+            current = None
+        if level not in "EF":
+            continue
+        exception_at = re.search(r"(?:[A-Za-z_$][\w$]*\.)+[\w$]*(?:Exception|Error|Throwable)\b.*", text)
+        if not exception_at and tag != "AndroidRuntime":
+            continue
+        when = datetime(int(yr or year), int(month), int(day), int(hour), int(minute), int(second), tzinfo=timezone.utc)
+        current = {
+            "key": key,
+            "tag": tag,
+            "timestamp": int(when.timestamp() * 1000) + int(millis),
+            "lines": [exception_at.group(0) if exception_at else text],
+        }
+    if current is not None:
+        yield finish_logcat_report(current)
+
+
+def finish_logcat_report(current: Dict[str, object]) -> Dict[str, object]:
+    lines: List[str] = current["lines"]  # type: ignore[assignment]
+    return {
+        "stackTrace": "\n".join(line if not line.strip().startswith("at ") else "\t" + line.strip() for line in lines),
+        "message": f"[{current['tag']}] {lines[0]}"[:4000],
+        "timestamp": current["timestamp"],
+    }
+
+
+def record_from_object(item: Dict[str, object]) -> Optional[Dict[str, object]]:
+    record: Dict[str, object] = {}
+    for name, keys in RECORD_KEYS.items():
+        value = next((item[key] for key in keys if item.get(key) not in (None, "")), None)
+        if value is not None:
+            record[name] = value
+    manufacturer = str(item.get("device_manufacturer") or "").strip()
+    if manufacturer and record.get("deviceModel"):
+        record["deviceModel"] = f"{manufacturer} {record['deviceModel']}".strip()
+    return record if record.get("stackTrace") or record.get("message") else None
+
+
+def read_crash_file(path: Path, year: Optional[int] = None) -> Iterator[Dict[str, object]]:
+    """crash_reports-shaped dicts (stackTrace, message, timestamp, ...) from a local file."""
+    name = path.name
+    if name.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst", ".parquet")):
+        from archive_io import iter_records
+
+        for item in iter_records(path):
+            record = record_from_object(item)
+            if record:
+                yield record
+        return
+    text = path.read_text(encoding="utf-8", errors="replace")
+    if name.endswith(".json"):
+        data = json.loads(text)
+        if isinstance(data, str):
+            # SharedPreferences keeps the pending reports as a JSON string.
+            data = json.loads(data)
+        for item in data if isinstance(data, list) else [data]:
+            record = record_from_object(item) if isinstance(item, dict) else None
+            if record:
+                yield record
+        return
+    lines = text.splitlines()
+    if any(LOGCAT_RE.match(line) for line in lines[:50]):
+        yield from logcat_reports(iter(lines), year or datetime.now(timezone.utc).year)
+    elif text.strip():
+        yield {"stackTrace": text.strip(), "timestamp": int(path.stat().st_mtime * 1000)}
@@ -0,0 +1,423 @@
+"""
+Embedding providers for the backfill tooling.
+
+Every backend turns a batch of texts into unit vectors of `dimensions` floats:
+
+  vectors = backend.embed(texts, timeout=None)
+  vectors = await backend.embed_async(texts, timeout=None)
+
+Backends (--embedding-backend):
+- openai:  OpenAI-compatible POST .../embeddings (DashScope compatible-mode by
+           default), up to `batch_size` texts per request. embed_async goes
+           through pb_async.AsyncHttpClient after use_async_client().
+- hashing: feature-hashed words (1 + log tf) plus a little per-text noise, the
+           vectors fake_services.py serves. No model and no network: for tests,
+           benchmarks and dry runs of a reindex. Texts sharing words land close.
+- onnx:    a sentence-embedding model exported to ONNX (a directory with
+           model.onnx and tokenizer.json, e.g. all-MiniLM-L6-v2), mean-pooled
+           and normalized. Needs `pip install onnxruntime tokenizers numpy`;
+           its dimensions come from the model.
+
+The local backends split each batch over a process pool (`processes`,
+default: CPU count); every worker loads the model once and runs it single
+threaded. `remote` is True only for openai, the one worth hedging.
+
+Each backend counts texts, batches, failures and busy time; throughput_line()
+reports texts/s over the wall time between its first and last batch.
+bench_embedding_backends.py compares backends on synthetic texts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from run_metrics import RunMetrics, timed
+
+
+BACKENDS = ("openai", "hashing", "onnx")
+DEFAULT_BATCH_SIZE = {"openai": 10, "hashing": 64, "onnx": 32}
+DEFAULT_EMBED_TIMEOUT_SEC = 120.0
+DEFAULT_ONNX_MAX_TOKENS = 256
+FEATURES_PER_WORD = 4
+ONNX_PACKAGES = ("onnxruntime", "tokenizers", "numpy")
+
+
+class ServiceError(RuntimeError):
+    """Non-2xx answer from the embedding API or Qdrant; `status` feeds the failure reason."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+# --- hashing embedder (also served by fake_services.py) ---------------------------
+
+
+@lru_cache(maxsize=65536)
+def word_features(model: str, word: str, dimensions: int) -> Tuple[Tuple[int, float], ...]:
+    digest = hashlib.blake2b(f"{model}:{word}".encode("utf-8"), digest_size=4 * FEATURES_PER_WORD).digest()
+    return tuple(
+        (int.from_bytes(digest[i : i + 3], "little") % dimensions, 1.0 if digest[i + 3] & 1 else -1.0)
+        for i in range(0, len(digest), 4)
+    )
+
+
+def hashing_embedding(model: str, text: str, dimensions: int) -> List[float]:
+    """Feature-hashed words (1 + log tf) plus a little per-text noise, normalized to unit length."""
+    vector = [0.0] * dimensions
+    for word, count in Counter(re.findall(r"\w+", text.lower())).items():
+        weight = 1.0 + math.log(count)
+        for index, sign in word_features(model, word, dimensions):
+            vector[index] += sign * weight
+    noise = hashlib.shake_256(f"{model}\0{text}".encode("utf-8")).digest(dimensions)
+    for index, byte in enumerate(noise):
+        vector[index] += (byte - 127.5) / 1275.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [round(v / norm, 6) for v in vector]
+
+
+# --- OpenAI-compatible request/response -------------------------------------------
+
+
+def embedding_request(model: str, texts: List[str], dimensions: int) -> Dict[str, object]:
+    return {
+        "model": model,
+        "input": texts[0] if len(texts) == 1 else texts,
+        "dimensions": dimensions,
+        "encoding_format": "float",
+    }
+
+
+def parse_embeddings(body: Dict[str, object], count: int, dimensions: int) -> List[List[float]]:
+    data = body.get("data")
+    if not isinstance(data, list) or len(data) != count:
+        raise RuntimeError(f"embedding missing: expected {count}, got {len(data) if isinstance(data, list) else 0}")
+    vectors: List[List[float]] = []
+    for item in sorted(data, key=lambda d: int((d or {}).get("index") or 0)):
+        vector = (item or {}).get("embedding")
+        if not isinstance(vector, list):
+            raise RuntimeError("embedding missing")
+        if len(vector) != dimensions:
+            raise RuntimeError(f"embedding dim mismatch: {len(vector)} != {dimensions}")
+        if any(not isinstance(v, (int, float)) or not math.isfinite(v) for v in vector):
+            raise RuntimeError("embedding contains non-finite values")
+        vectors.append([float(v) for v in vector])
+    return vectors
+
+
+# --- backends ---------------------------------------------------------------------
+
+
+class EmbeddingBackend:
+    """Base class; subclasses implement _embed and, with a native async path, _embed_async."""
+
+    name = "base"
+    remote = False
+
+    def __init__(self, dimensions: int, batch_size: int, model: str):
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.model = model
+        self.stats: Counter = Counter()
+        self.busy_sec = 0.0
+        self.first_started: Optional[float] = None
+        self.last_finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        started = time.perf_counter()
+        try:
+            vectors = self._embed(texts, timeout)
+        except BaseException:
+            self._record(started, 0)
+            raise
+        self._record(started, len(texts))
+        return vectors
+
+    async def embed_async(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        started = time.perf_counter()
+        try:
+            vectors = await self._embed_async(texts, timeout)
+        except asyncio.CancelledError:
+            # A hedging loser or an interrupted run, not a failure of the backend.
+            self._record(started, 0, failed=False)
+            raise
+        except BaseException:
+            self._record(started, 0)
+            raise
+        self._record(started, len(texts))
+        return vectors
+
+    def _embed(self, texts: List[str], timeout: Optional[float]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def _embed_async(self, texts: List[str], timeout: Optional[float]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._embed, texts, timeout)
+
+    def _record(self, started: float, texts: int, failed: bool = True) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            if self.first_started is None or started < self.first_started:
+                self.first_started = started
+            self.last_finished = now
+            self.busy_sec += now - started
+            if texts:
+                self.stats["texts"] += texts
+                self.stats["batches"] += 1
+            elif failed:
+                self.stats["failed_batches"] += 1
+            else:
+                self.stats["cancelled_batches"] += 1
+
+    def use_async_client(self, http) -> None:
+        """Hand over the pb_async.AsyncHttpClient of the async engine (remote backends only)."""
+
+    def describe(self) -> str:
+        return f"{self.name}({self.model}, {self.dimensions}d, batch={self.batch_size})"
+
+    def throughput(self) -> float:
+        """Texts per second over the wall time between the first batch start and the last batch end."""
+        if self.first_started is None or self.last_finished is None:
+            return 0.0
+        return self.stats["texts"] / max(self.last_finished - self.first_started, 1e-9)
+
+    def throughput_line(self) -> str:
+        batches = self.stats["batches"] + self.stats["failed_batches"] + self.stats["cancelled_batches"]
+        mean_ms = self.busy_sec / batches * 1000 if batches else 0.0
+        return (
+            f"embedding backend {self.describe()}: texts={self.stats['texts']} batches={self.stats['batches']} "
+            f"failed_batches={self.stats['failed_batches']} rate={self.throughput():.1f} texts/s "
+            f"mean_batch_ms={mean_ms:.1f}"
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class OpenAICompatibleBackend(EmbeddingBackend):
+    name = "openai"
+    remote = True
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        model: str,
+        dimensions: int,
+        batch_size: int = DEFAULT_BATCH_SIZE["openai"],
+        session=None,
+        verify_ssl: bool = True,
+        metrics: Optional[RunMetrics] = None,
+    ):
+        super().__init__(dimensions, batch_size, model)
+        self.url = url
+        self.api_key = api_key
+        self.session = session
+        self.verify_ssl = verify_ssl
+        self.metrics = metrics
+        self.http = None
+
+    def use_async_client(self, http) -> None:
+        self.http = http
+
+    def _embed(self, texts: List[str], timeout: Optional[float]) -> List[List[float]]:
+        with timed(self.metrics, "embed"):
+            resp = self.session.post(
+                self.url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json=embedding_request(self.model, texts, self.dimensions),
+                timeout=timeout or DEFAULT_EMBED_TIMEOUT_SEC,
+                verify=self.verify_ssl,
+            )
+        if resp.status_code != 200:
+            raise ServiceError(f"embedding API failed: {resp.status_code} {resp.text[:500]}", resp.status_code)
+        with timed(self.metrics, "embed_decode"):
+            return parse_embeddings(resp.json() if resp.text else {}, len(texts), self.dimensions)
+
+    async def _embed_async(self, texts: List[str], timeout: Optional[float]) -> List[List[float]]:
+        if self.http is None:
+            return await super()._embed_async(texts, timeout)
+        with timed(self.metrics, "embed"):
+            resp = await self.http.request(
+                "POST",
+                self.url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json_body=embedding_request(self.model, texts, self.dimensions),
+                timeout=timeout or DEFAULT_EMBED_TIMEOUT_SEC,
+            )
+        if resp.status != 200:
+            raise ServiceError(f"embedding API failed: {resp.status} {resp.text[:500]}", resp.status)
+        with timed(self.metrics, "embed_decode"):
+            return parse_embeddings(resp.json() if resp.content else {}, len(texts), self.dimensions)
+
+
+# Worker-process side of the local backends: one loaded model per (kind, ...) spec.
+_worker_models: Dict[Tuple, object] = {}
+
+
+def _load_onnx(model_dir: str, max_tokens: int):
+    import numpy as np
+    import onnxruntime
+    from tokenizers import Tokenizer
+
+    directory = Path(model_dir)
+    candidates = [directory / "model.onnx", directory / "onnx" / "model.onnx", *sorted(directory.glob("*.onnx"))]
+    model_path = next((p for p in candidates if p.is_file()), None)
+    if model_path is None:
+        raise RuntimeError(f"no .onnx model in {model_dir}")
+    tokenizer = Tokenizer.from_file(str(directory / "tokenizer.json"))
+    tokenizer.enable_truncation(max_length=max_tokens)
+    tokenizer.enable_padding()
+    options = onnxruntime.SessionOptions()
+    # One core per worker process; the pool provides the parallelism.
+    options.intra_op_num_threads = 1
+    session = onnxruntime.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+    return np, tokenizer, session, {i.name for i in session.get_inputs()}
+
+
+def _onnx_embed(loaded, texts: List[str]) -> List[List[float]]:
+    np, tokenizer, session, input_names = loaded
+    encodings = tokenizer.encode_batch(texts)
+    mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+    feeds = {
+        "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+        "attention_mask": mask,
+        "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+    }
+    output = session.run(None, {name: value for name, value in feeds.items() if name in input_names})[0]
+    if output.ndim == 3:
+        # Token embeddings: mean over the real (unpadded) tokens.
+        weights = mask[..., None].astype(output.dtype)
+        output = (output * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+    output = output / np.clip(np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None)
+    return output.astype(float).tolist()
+
+
+def _worker_embed(spec: Tuple, texts: List[str]) -> List[List[float]]:
+    kind = spec[0]
+    if kind == "hashing":
+        _, model, dimensions = spec
+        return [hashing_embedding(model, text, dimensions) for text in texts]
+    loaded = _worker_models.get(spec)
+    if loaded is None:
+        loaded = _worker_models[spec] = _load_onnx(spec[1], spec[2])
+    return _onnx_embed(loaded, texts)
+
+
+class LocalBackend(EmbeddingBackend):
+    """Runs _worker_embed(spec, chunk) on a process pool, one chunk per worker."""
+
+    def __init__(self, spec: Tuple, dimensions: int, batch_size: int, model: str, processes: int = 0):
+        super().__init__(dimensions, batch_size, model)
+        self.spec = spec
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self._pool = None
+
+    def describe(self) -> str:
+        return f"{self.name}({self.model}, {self.dimensions}d, batch={self.batch_size}, processes={self.processes})"
+
+    def _get_pool(self):
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn: workers must not inherit the parent's threads or loaded native runtimes.
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _chunks(self, texts: List[str]) -> List[List[str]]:
+        size = max(1, math.ceil(len(texts) / self.processes))
+        return [texts[i : i + size] for i in range(0, len(texts), size)]
+
+    def _embed(self, texts: List[str], timeout: Optional[float]) -> List[List[float]]:
+        if self.processes == 1:
+            return _worker_embed(self.spec, texts)
+        pool = self._get_pool()
+        futures = [pool.submit(_worker_embed, self.spec, chunk) for chunk in self._chunks(texts)]
+        return [vector for future in futures for vector in future.result(timeout=timeout)]
+
+    async def _embed_async(self, texts: List[str], timeout: Optional[float]) -> List[List[float]]:
+        if self.processes == 1:
+            return await super()._embed_async(texts, timeout)
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        parts = await asyncio.wait_for(
+            asyncio.gather(*(loop.run_in_executor(pool, _worker_embed, self.spec, chunk) for chunk in self._chunks(texts))),
+            timeout,
+        )
+        return [vector for part in parts for vector in part]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+class HashingBackend(LocalBackend):
+    name = "hashing"
+
+    def __init__(self, dimensions: int, model: str = "hashing", batch_size: int = DEFAULT_BATCH_SIZE["hashing"], processes: int = 0):
+        super().__init__(("hashing", model, dimensions), dimensions, batch_size, model, processes)
+
+
+class OnnxBackend(LocalBackend):
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_dir: str,
+        batch_size: int = DEFAULT_BATCH_SIZE["onnx"],
+        processes: int = 0,
+        max_tokens: int = DEFAULT_ONNX_MAX_TOKENS,
+    ):
+        import importlib.util
+
+        missing = [name for name in ONNX_PACKAGES if importlib.util.find_spec(name) is None]
+        if missing:
+            raise RuntimeError(f"the onnx backend needs {', '.join(missing)}: pip install {' '.join(ONNX_PACKAGES)}")
+        if not (Path(model_dir) / "tokenizer.json").is_file():
+            raise RuntimeError(f"{model_dir} has no tokenizer.json (export the model with its tokenizer)")
+        super().__init__(("onnx", str(model_dir), max_tokens), 0, batch_size, Path(model_dir).name, processes)
+        # Loads the model in the workers and learns its output size.
+        self.dimensions = len(self._embed(["dimension probe"], None)[0])
+
+
+def make_backend(
+    kind: str,
+    dimensions: int,
+    batch_size: int = 0,
+    processes: int = 0,
+    url: str = "",
+    api_key: str = "",
+    model: str = "",
+    onnx_model: str = "",
+    session=None,
+    verify_ssl: bool = True,
+    metrics: Optional[RunMetrics] = None,
+) -> EmbeddingBackend:
+    """Build a backend by name; batch_size 0 means the backend's default. Raises ValueError/RuntimeError."""
+    batch_size = batch_size or DEFAULT_BATCH_SIZE[kind]
+    if kind == "openai":
+        return OpenAICompatibleBackend(
+            url, api_key, model, dimensions, batch_size=batch_size, session=session, verify_ssl=verify_ssl, metrics=metrics
+        )
+    if kind == "hashing":
+        return HashingBackend(dimensions, model=model or "hashing", batch_size=batch_size, processes=processes)
+    if kind == "onnx":
+        if not onnx_model:
+            raise ValueError("the onnx backend needs --onnx-model DIR")
+        return OnnxBackend(onnx_model, batch_size=batch_size, processes=processes)
+    raise ValueError(f"unknown embedding backend: {kind}")
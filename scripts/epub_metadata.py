@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Extract EPUB metadata for `books` records without touching content documents.
+
+Only three things are read from each file:
+1) The ZIP central directory (parsed by `zipfile` when the archive is opened)
+2) META-INF/container.xml, to locate the package document
+3) The OPF package document itself
+
+Chapters, images and the cover are never decompressed; the cover is reported
+as an href relative to the archive root.
+
+Usage:
+  python3 scripts/epub_metadata.py test.epub
+  python3 scripts/epub_metadata.py ~/books --workers 8 > books.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import posixpath
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from xml.etree import ElementTree
+
+
+CONTAINER_PATH = "META-INF/container.xml"
+# Guard against malformed or hostile archives; real OPF files are a few hundred KB at most.
+MAX_XML_BYTES = 4 * 1024 * 1024
+
+NS = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+
+@dataclass
+class EpubMetadata:
+    title: Optional[str] = None
+    author: Optional[str] = None
+    language: Optional[str] = None
+    cover_href: Optional[str] = None
+    opf_path: Optional[str] = None
+
+    def to_record_fields(self) -> Dict[str, str]:
+        """Map onto `books` collection fields, omitting unknown values."""
+        fields = {
+            "title": self.title,
+            "author": self.author,
+            "language": self.language,
+            "coverHref": self.cover_href,
+        }
+        return {key: value for key, value in fields.items() if value}
+
+
+def read_small_member(archive: zipfile.ZipFile, name: str) -> bytes:
+    info = archive.getinfo(name)
+    if info.file_size > MAX_XML_BYTES:
+        raise ValueError(f"{name} is too large ({info.file_size} bytes)")
+    return archive.read(info)
+
+
+def find_opf_path(archive: zipfile.ZipFile) -> Optional[str]:
+    try:
+        root = ElementTree.fromstring(read_small_member(archive, CONTAINER_PATH))
+    except KeyError:
+        root = None
+    if root is not None:
+        for rootfile in root.iter(f"{{{NS['container']}}}rootfile"):
+            full_path = (rootfile.get("full-path") or "").strip()
+            if full_path:
+                return full_path
+    # Non-conforming files: fall back to the first .opf in the central directory.
+    for name in archive.namelist():
+        if name.lower().endswith(".opf"):
+            return name
+    return None
+
+
+def first_text(parent: ElementTree.Element, path: str) -> Optional[str]:
+    for element in parent.findall(path, NS):
+        text = " ".join((element.text or "").split())
+        if text:
+            return text
+    return None
+
+
+def find_cover_href(package: ElementTree.Element, opf_path: str) -> Optional[str]:
+    manifest = package.find("opf:manifest", NS)
+    if manifest is None:
+        return None
+    items = manifest.findall("opf:item", NS)
+
+    href = None
+    # EPUB 3: <item properties="cover-image">
+    for item in items:
+        if "cover-image" in (item.get("properties") or "").split():
+            href = item.get("href")
+            break
+    # EPUB 2: <meta name="cover" content="item-id"/>
+    if not href:
+        cover_id = None
+        for meta in package.findall("opf:metadata/opf:meta", NS):
+            if meta.get("name") == "cover":
+                cover_id = meta.get("content")
+                break
+        if cover_id:
+            for item in items:
+                if item.get("id") == cover_id:
+                    href = item.get("href")
+                    break
+    if not href:
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(opf_path), href))
+
+
+def read_epub_metadata(path: Path) -> EpubMetadata:
+    with zipfile.ZipFile(path) as archive:
+        opf_path = find_opf_path(archive)
+        if not opf_path:
+            raise ValueError("no OPF package document found")
+        package = ElementTree.fromstring(read_small_member(archive, opf_path))
+
+    metadata = package.find("opf:metadata", NS)
+    if metadata is None:
+        return EpubMetadata(opf_path=opf_path, cover_href=find_cover_href(package, opf_path))
+    return EpubMetadata(
+        title=first_text(metadata, "dc:title"),
+        author=first_text(metadata, "dc:creator"),
+        language=first_text(metadata, "dc:language"),
+        cover_href=find_cover_href(package, opf_path),
+        opf_path=opf_path,
+    )
+
+
+def iter_epub_paths(inputs: Iterable[str]) -> Iterator[Path]:
+    for raw in inputs:
+        path = Path(raw).expanduser()
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*.epub") if p.is_file())
+        else:
+            yield path
+
+
+def extract_one(path: Path) -> Dict[str, object]:
+    try:
+        return {"path": str(path), **asdict(read_epub_metadata(path))}
+    except (OSError, zipfile.BadZipFile, ValueError, ElementTree.ParseError) as exc:
+        return {"path": str(path), "error": str(exc)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Extract title/author/language/cover from EPUB files.")
+    parser.add_argument("paths", nargs="+", help="EPUB files or directories (searched recursively)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel readers (I/O bound)")
+    args = parser.parse_args()
+
+    if args.workers <= 0:
+        print("Error: --workers must be > 0", file=sys.stderr)
+        return 2
+
+    paths: List[Path] = list(iter_epub_paths(args.paths))
+    start_ts = time.time()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for row in pool.map(extract_one, paths):
+            if "error" in row:
+                failed += 1
+            print(json.dumps(row, ensure_ascii=False))
+    elapsed = time.time() - start_ts
+    rate = len(paths) / elapsed if elapsed > 0 else 0.0
+    print(f"files={len(paths)} failed={failed} elapsed_sec={elapsed:.2f} files_per_sec={rate:.1f}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Export PocketBase user data collections to compressed archives (backups, migrations).
+
+What it does:
+1) Authenticates to PocketBase (prefers admin credentials; a user login exports
+   only that user's records)
+2) Counts each collection, then streams it with cursor paging
+   (filter id > last id, sort +id, skipTotal), so deep pages cost the same as
+   the first one and records created mid-export cannot shift the pages
+3) Runs every collection at once on the asyncio engine (pb_async.py); with
+   --shards N each collection is also split into N id ranges fetched in
+   parallel, one file each. --inflight caps the requests in flight
+4) Writes JSONL compressed with zstd (when `zstandard` is installed) or gzip,
+   or Parquet with --format parquet (needs pyarrow), via archive_io.py. The
+   next page is fetched while the current one is written, and memory stays at
+   about two pages per shard whatever the collection size
+5) Writes manifest.json with per-file record counts, sizes and sha256
+   checksums, plus the server's count from step 2 to spot records that
+   changed during the export
+
+books is exported as metadata only: the bookFile field keeps the stored file
+name, the EPUB itself is not downloaded.
+
+Usage examples:
+  python3 scripts/export_user_data.py --out /backups/pb-$(date +%F)
+  python3 scripts/export_user_data.py --out /tmp/export --shards 4 --inflight 16 --per-page 1000
+  python3 scripts/export_user_data.py --out /tmp/export --collections ai_notes,progress --format parquet
+  python3 scripts/export_user_data.py --out /tmp/me --email reader@example.com --password secret
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+  POCKETBASE_TEST_EMAIL
+  POCKETBASE_TEST_PASSWORD
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import http_trace
+from archive_io import (
+    COMPRESSIONS,
+    FORMAT_VERSION,
+    ARCHIVE_SUFFIXES,
+    FORMATS,
+    MANIFEST_NAME,
+    ArchiveWriter,
+    has_module,
+    open_writer,
+    resolve_compression,
+    write_manifest,
+)
+from openmetrics import exporter_from_args
+from pb_async import AsyncHttpClient, AsyncPocketBase, parse_host_limits, run_cancellable
+from pb_client import (
+    RECORD_ID_ALPHABET,
+    PocketBaseClient,
+    load_env_file,
+    login,
+    quote_filter_value,
+    resolve_value,
+)
+from run_metrics import RunMetrics, add_run_args, failure_reason, validate_run_args
+
+
+DEFAULT_COLLECTIONS = ("ai_notes", "progress", "bookmarks", "books", "settings", "ai_profiles")
+DEFAULT_PER_PAGE = 500
+DEFAULT_INFLIGHT = 8
+# Shards split on the first character of the record id.
+MAX_SHARDS = len(RECORD_ID_ALPHABET)
+
+
+@dataclass
+class Counters:
+    collections: int = 0
+    files: int = 0
+    records: int = 0
+    pages: int = 0
+    bytes_written: int = 0
+    failed_collections: int = 0
+
+
+def shard_bounds(shards: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """[lower, upper) id bounds; the first shard is open below and the last above, so any id falls in one."""
+    cuts = [RECORD_ID_ALPHABET[len(RECORD_ID_ALPHABET) * i // shards] for i in range(1, shards)]
+    lowers: List[Optional[str]] = [None, *cuts]
+    uppers: List[Optional[str]] = [*cuts, None]
+    return list(zip(lowers, uppers))
+
+
+def shard_filter(base: Optional[str], lower: Optional[str], upper: Optional[str], after: Optional[str]) -> Optional[str]:
+    parts = [f"({base})"] if base else []
+    if lower is not None:
+        parts.append(f"id >= {quote_filter_value(lower)}")
+    if upper is not None:
+        parts.append(f"id < {quote_filter_value(upper)}")
+    if after is not None:
+        parts.append(f"id > {quote_filter_value(after)}")
+    return " && ".join(parts) or None
+
+
+def shard_label(lower: Optional[str], upper: Optional[str]) -> str:
+    return f"[{lower or ''}, {upper or ''})"
+
+
+async def count_records(pb: AsyncPocketBase, collection: str, base_filter: Optional[str]) -> int:
+    listing = await pb.list_records(collection, page=1, per_page=1, filter=base_filter, fields="id", timeout=120)
+    return int(listing.get("totalItems") or 0)
+
+
+async def export_shard(
+    pb: AsyncPocketBase,
+    collection: str,
+    writer: ArchiveWriter,
+    base_filter: Optional[str],
+    lower: Optional[str],
+    upper: Optional[str],
+    per_page: int,
+    counters: Counters,
+    metrics: RunMetrics,
+) -> None:
+    """Page through one id range, writing each page while the next one is fetched."""
+    loop = asyncio.get_running_loop()
+
+    async def fetch(after: Optional[str]) -> List[dict]:
+        with metrics.stage("pb_list"):
+            listing = await pb.list_records(
+                collection,
+                page=1,
+                per_page=per_page,
+                filter=shard_filter(base_filter, lower, upper, after),
+                sort="+id",
+                skip_total=True,
+                timeout=120,
+            )
+        return listing.get("items") or []
+
+    pending: Optional[asyncio.Future] = asyncio.ensure_future(fetch(None))
+    try:
+        while pending is not None:
+            items = await pending
+            pending = None
+            if not items:
+                break
+            counters.pages += 1
+            if len(items) == per_page:
+                pending = asyncio.ensure_future(fetch(str(items[-1].get("id") or "")))
+            with metrics.stage("write"):
+                # Encoding and compression run off the loop; the next fetch proceeds meanwhile.
+                await loop.run_in_executor(None, writer.write, items)
+            counters.records += len(items)
+            metrics.done(len(items))
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+
+
+async def export_collection(
+    pb: AsyncPocketBase,
+    collection: str,
+    args: argparse.Namespace,
+    out_dir: Path,
+    compression: str,
+    base_filter: Optional[str],
+    server_total: int,
+    counters: Counters,
+    metrics: RunMetrics,
+) -> Dict[str, object]:
+    """Export all shards of one collection; returns its manifest entry. Partial files are removed on error."""
+    bounds = shard_bounds(args.shards)
+    writers: List[ArchiveWriter] = []
+    for index in range(len(bounds)):
+        stem = collection if len(bounds) == 1 else f"{collection}.{index + 1:02d}-of-{len(bounds):02d}"
+        writers.append(open_writer(out_dir, stem, args.format, compression, args.level))
+    tasks = [
+        asyncio.ensure_future(
+            export_shard(pb, collection, writer, base_filter, lower, upper, args.per_page, counters, metrics)
+        )
+        for writer, (lower, upper) in zip(writers, bounds)
+    ]
+    try:
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed shard fails the collection; stop its siblings before the files go.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        loop = asyncio.get_running_loop()
+        files = []
+        for writer, (lower, upper) in zip(writers, bounds):
+            entry = await loop.run_in_executor(None, writer.close)
+            if len(bounds) > 1:
+                entry["shard"] = shard_label(lower, upper)
+            files.append(entry)
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    records = sum(int(entry["records"]) for entry in files)
+    size = sum(int(entry["bytes"]) for entry in files)
+    counters.bytes_written += size
+    counters.files += len(files)
+    counters.collections += 1
+    drift = "" if records == server_total else f" (server counted {server_total}; records changed during the export)"
+    print(f"[ok] {collection}: {records} records, {size / 1024:.1f} KB in {len(files)} file(s){drift}")
+    return {"records": records, "server_total": server_total, "filter": base_filter, "files": files}
+
+
+async def export_all(
+    client: PocketBaseClient,
+    args: argparse.Namespace,
+    collections: List[str],
+    out_dir: Path,
+    compression: str,
+    base_filter: Optional[str],
+    counters: Counters,
+    metrics: RunMetrics,
+) -> Tuple[Dict[str, object], Dict[str, str]]:
+    """Returns (manifest entries of the exported collections, error per failed collection)."""
+    http = AsyncHttpClient(
+        default_limit=args.inflight, limits=parse_host_limits(args.host_limit), verify_ssl=not args.insecure
+    )
+    pb = AsyncPocketBase(client, http)
+    metrics.add_probe("connection_replays", lambda: http.stats["replays"])
+    try:
+        totals = await asyncio.gather(
+            *(count_records(pb, name, base_filter) for name in collections), return_exceptions=True
+        )
+        errors: Dict[str, str] = {}
+        runnable: List[Tuple[str, int]] = []
+        for name, total in zip(collections, totals):
+            if isinstance(total, BaseException):
+                errors[name] = str(total)
+                metrics.failure(failure_reason("count", total))
+                print(f"[WARN] {name}: cannot count records: {total}", file=sys.stderr)
+            else:
+                runnable.append((name, total))
+                print(f"[info] {name}: {total} records on the server")
+        metrics.set_total(sum(total for _, total in runnable))
+
+        results = await asyncio.gather(
+            *(
+                export_collection(pb, name, args, out_dir, compression, base_filter, total, counters, metrics)
+                for name, total in runnable
+            ),
+            return_exceptions=True,
+        )
+        entries: Dict[str, object] = {}
+        for (name, _), result in zip(runnable, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                errors[name] = str(result)
+                metrics.failure(failure_reason("export", result))
+                print(f"[WARN] {name}: export failed: {result}", file=sys.stderr)
+            else:
+                entries[name] = result
+        return entries, errors
+    finally:
+        await http.close()
+        print(f"async engine: {http.stats['connections']} connections, peak in-flight {http.peak_inflight}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export PocketBase user data collections to compressed archives.")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--email", help="PocketBase users collection email (fallback auth)")
+    parser.add_argument("--password", help="PocketBase users collection password (fallback auth)")
+    parser.add_argument("--out", required=True, help="Output directory (created; must not hold a previous export)")
+    parser.add_argument(
+        "--collections", default=",".join(DEFAULT_COLLECTIONS), help="Comma separated collections to export"
+    )
+    parser.add_argument("--user-id", help="Export only records of this user id")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl", help="jsonl (compressed) or parquet (needs pyarrow)")
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="auto",
+        help="JSONL: zstd (needs zstandard), gzip or none; auto = zstd if installed, else gzip. Parquet: codec",
+    )
+    parser.add_argument("--level", type=int, help="Compression level (default: 6 for zstd/gzip)")
+    parser.add_argument("--per-page", type=int, default=DEFAULT_PER_PAGE, help="Records per request (PocketBase max: 1000)")
+    parser.add_argument("--shards", type=int, default=1, help=f"Id ranges per collection fetched in parallel (1-{MAX_SHARDS})")
+    parser.add_argument("--inflight", type=int, default=DEFAULT_INFLIGHT, help="Max PocketBase requests in flight")
+    parser.add_argument(
+        "--host-limit",
+        action="append",
+        default=[],
+        metavar="HOST=N",
+        help="Max connections to HOST (repeatable; default: --inflight)",
+    )
+    parser.add_argument("--overwrite", action="store_true", help="Replace an existing export in --out")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+    user_email = resolve_value(args.email, "POCKETBASE_TEST_EMAIL", file_env)
+    user_password = resolve_value(args.password, "POCKETBASE_TEST_PASSWORD", file_env)
+
+    collections = [name.strip() for name in args.collections.split(",") if name.strip()]
+    if not collections or len(set(collections)) != len(collections):
+        print("Error: --collections must list distinct collection names", file=sys.stderr)
+        return 2
+    if not 0 < args.per_page <= 1000:
+        print("Error: --per-page must be 1-1000", file=sys.stderr)
+        return 2
+    if not 1 <= args.shards <= MAX_SHARDS:
+        print(f"Error: --shards must be 1-{MAX_SHARDS}", file=sys.stderr)
+        return 2
+    if args.inflight <= 0:
+        print("Error: --inflight must be > 0", file=sys.stderr)
+        return 2
+    try:
+        parse_host_limits(args.host_limit)
+    except ValueError as exc:
+        print(f"Error: --host-limit: {exc}", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+    if args.format == "parquet":
+        if not has_module("pyarrow"):
+            print("Error: --format parquet needs pyarrow: pip install pyarrow", file=sys.stderr)
+            return 2
+        compression = "zstd" if args.compression == "auto" else args.compression
+    else:
+        try:
+            compression = resolve_compression(args.compression)
+        except RuntimeError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+
+    out_dir = Path(args.out)
+    if (out_dir / MANIFEST_NAME).exists() and not args.overwrite:
+        print(f"Error: {out_dir} already holds an export; use --overwrite or another --out", file=sys.stderr)
+        return 2
+    if out_dir.exists() and args.overwrite:
+        for path in out_dir.iterdir():
+            if path.is_file() and (path.name == MANIFEST_NAME or path.name.endswith(ARCHIVE_SUFFIXES)):
+                path.unlink()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="export_user_data")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, user_id = login(client, admin_email, admin_password, user_email, user_password)
+    if not auth_mode:
+        print(
+            "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
+            "or user creds (--email/--password).",
+            file=sys.stderr,
+        )
+        return 2
+    filter_user_id: Optional[str] = args.user_id or user_id
+    base_filter = f"user = {quote_filter_value(filter_user_id)}" if filter_user_id else None
+
+    print(
+        f"Start export: pb={base_url}, out={out_dir}, auth={auth_mode}/{client.auth_source}, "
+        f"user_filter={filter_user_id or '<none>'}, format={args.format}/{compression}, "
+        f"shards={args.shards}, inflight={args.inflight}, collections={','.join(collections)}"
+    )
+
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(metrics, "export_user_data", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    started = dt.datetime.now(dt.timezone.utc)
+    try:
+        entries, errors = run_cancellable(
+            export_all(client, args, collections, out_dir, compression, base_filter, counters, metrics)
+        )
+    except asyncio.CancelledError:
+        return metrics.finish_run(
+            "Interrupted; no manifest written.",
+            counters,
+            130,
+            args.metrics_json,
+            script="export_user_data",
+            rate_of="records",
+        )
+    except Exception as exc:  # noqa: BLE001
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return metrics.finish_run(
+            "Failed.", counters, 1, args.metrics_json, script="export_user_data", rate_of="records"
+        )
+    counters.failed_collections = len(errors)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created": started.isoformat(timespec="seconds"),
+        "elapsed_sec": round(time.time() - metrics.started, 1),
+        "source": base_url,
+        "auth": auth_mode,
+        "user_filter": filter_user_id,
+        "format": args.format,
+        "compression": compression,
+        "per_page": args.per_page,
+        "shards": args.shards,
+        "collections": entries,
+        "errors": errors,
+    }
+    path = write_manifest(out_dir, manifest)
+    print(f"Wrote {path}")
+    if errors:
+        return metrics.finish_run(
+            "Done with errors.", counters, 1, args.metrics_json, script="export_user_data", rate_of="records"
+        )
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="export_user_data", rate_of="records")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
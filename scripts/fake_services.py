@@ -0,0 +1,933 @@
+#!/usr/bin/env python3
+"""
+Offline stand-ins for every service the backfill scripts call, for load tests and CI.
+
+- PocketBase: pocketbase_standin.py (SQLite records, auth, /api/batch), seeded
+  with --notes synthetic ai_notes owned by the fake user.
+- Embeddings: OpenAI-compatible POST .../embeddings, the shape of DashScope's
+  compatible-mode endpoint. Vectors are unit length and deterministic: the same
+  (model, text, dimensions) always gives the same vector, and texts sharing
+  words land close together, so search and recall@k behave sensibly (the
+  hashing backend of embedding_backends.py computes the same vectors). Latency
+  (--embed-latency-ms/--embed-jitter-ms), a slow tail of stalled requests
+  (--embed-stall-rate/--embed-stall-ms), random 500s (--embed-error-rate) and
+  429s, either random (--embed-429-rate) or from a token bucket (--embed-rps,
+  with Retry-After), are configurable.
+- Chat: OpenAI-compatible POST .../chat/completions on the same server and
+  with the same latency/throttling/errors, as the local stand-in for LLM
+  translation (translation_cache.py). A user message that is a JSON object with
+  "lines" and "target_lang" is answered with a JSON array of
+  "[<target_lang>] <line>"; any other message is echoed back.
+- Qdrant: collections, aliases, upsert/retrieve/delete points, scroll, count
+  and brute-force search with payload filters (must/should/must_not with
+  match value/any/except, range, has_id). Points live in memory as float32
+  arrays; search is a linear scan, so keep searched collections small.
+
+Each service listens on its own free local port (per-host connection limits
+still apply) and exposes GET /_fake/stats and POST /_fake/reset (the stand-in:
+/_standin/stats). Random choices use --seed, so failure patterns repeat.
+
+Usage:
+  python3 scripts/fake_services.py --notes 5000 --embed-latency-ms 80 --embed-rps 200
+  python3 scripts/fake_services.py --notes 1000 --env-file /tmp/fake.env
+
+In-process (benchmarks, CI):
+  with FakeServices(notes=1000, embed_latency_ms=50) as kit:
+      subprocess.run([... "--url", kit.pocketbase_url, "--embedding-url", kit.embedding_url,
+                      "--qdrant-url", kit.qdrant_url, ...])
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import operator
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from embedding_backends import hashing_embedding
+from pocketbase_standin import StandinServer, build_server
+
+
+FAKE_ADMIN_EMAIL = "admin@fake.local"
+FAKE_USER_EMAIL = "reader@fake.local"
+FAKE_PASSWORD = "fake-password"
+FAKE_API_KEY = "sk-fake"
+DEFAULT_DIMENSIONS = 1024
+DEFAULT_COLLECTION = "ai_notes"
+# DashScope text-embedding-v3/v4 accept at most 10 inputs per call.
+DEFAULT_EMBED_MAX_BATCH = 10
+STATS_PATH = "/_fake/stats"
+RESET_PATH = "/_fake/reset"
+
+
+class FakeError(Exception):
+    def __init__(self, status: int, message: str, code: str = "", headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.code = code
+        self.headers = headers or {}
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Threaded server with request stats, injected latency and a seeded RNG."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, handler, latency_ms: int = 0, jitter_ms: int = 0, seed: int = 0):
+        super().__init__(address, handler)
+        self.latency_sec = max(latency_ms, 0) / 1000.0
+        self.jitter_sec = max(jitter_ms, 0) / 1000.0
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats: Counter = Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def roll(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < probability
+
+    def delay(self) -> None:
+        extra = 0.0
+        if self.jitter_sec:
+            with self.rng_lock:
+                extra = self.rng.uniform(0, self.jitter_sec)
+        if self.latency_sec or extra:
+            time.sleep(self.latency_sec + extra)
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        self.count("connections")
+        return conn, addr
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    # (method, path regex, handler suffix); subclasses fill this in.
+    ROUTES: Tuple[Tuple[str, str, str], ...] = ()
+    server: FakeServer
+
+    def log_message(self, format, *args):  # noqa: A002
+        return
+
+    def send_json(self, status: int, payload, headers: Optional[Dict[str, str]] = None) -> None:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        self.body_read = True
+        if not raw:
+            return {}
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise FakeError(400, f"Format error in JSON body: {exc}", "invalid_json")
+        if not isinstance(data, dict):
+            raise FakeError(400, "Format error in JSON body: expected an object", "invalid_json")
+        return data
+
+    def error_body(self, exc: FakeError) -> dict:
+        raise NotImplementedError
+
+    def before(self, route: str) -> None:
+        """Hook run after routing and before the handler (latency, throttling)."""
+        self.server.delay()
+
+    def dispatch(self, method: str) -> None:
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        self.body_read = False
+        try:
+            if method == "GET" and path == STATS_PATH:
+                with self.server.stats_lock:
+                    stats = dict(self.server.stats)
+                self.send_json(200, stats)
+            elif method == "POST" and path == RESET_PATH:
+                with self.server.stats_lock:
+                    self.server.stats.clear()
+                self.send_json(200, {})
+            else:
+                for route_method, pattern, name in self.ROUTES:
+                    match = re.fullmatch(pattern, path) if route_method == method else None
+                    if match:
+                        route = f"{method} {name}"
+                        self.server.count(route)
+                        self.before(route)
+                        getattr(self, f"handle_{name}")(*match.groups(), query=query)
+                        break
+                else:
+                    raise FakeError(404, f"Not found: {method} {path}", "not_found")
+        except FakeError as exc:
+            self.server.count(f"status {exc.status}")
+            self.send_json(exc.status, self.error_body(exc), exc.headers)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        if not self.body_read:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            if remaining:
+                self.rfile.read(remaining)
+
+    def do_GET(self):  # noqa: N802
+        self.dispatch("GET")
+
+    def do_POST(self):  # noqa: N802
+        self.dispatch("POST")
+
+    def do_PUT(self):  # noqa: N802
+        self.dispatch("PUT")
+
+    def do_PATCH(self):  # noqa: N802
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):  # noqa: N802
+        self.dispatch("DELETE")
+
+
+# --- embeddings ---------------------------------------------------------------------
+
+
+class TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """0 when a token was taken, otherwise seconds until one is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class EmbeddingServer(FakeServer):
+    def __init__(
+        self,
+        address,
+        latency_ms: int = 0,
+        jitter_ms: int = 0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        rps: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_ms: int = 0,
+        default_dimensions: int = DEFAULT_DIMENSIONS,
+        max_batch: int = DEFAULT_EMBED_MAX_BATCH,
+        api_key: Optional[str] = None,
+        seed: int = 0,
+    ):
+        super().__init__(address, EmbeddingHandler, latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.bucket = TokenBucket(rps) if rps > 0 else None
+        self.stall_rate = stall_rate
+        self.stall_sec = max(stall_ms, 0) / 1000.0
+        self.default_dimensions = default_dimensions
+        self.max_batch = max_batch
+        self.api_key = api_key
+
+
+class EmbeddingHandler(FakeHandler):
+    ROUTES = (
+        ("POST", r"(?:/.*)?/embeddings", "embeddings"),
+        ("POST", r"(?:/.*)?/chat/completions", "chat_completions"),
+    )
+    server: EmbeddingServer
+
+    def error_body(self, exc: FakeError) -> dict:
+        return {"error": {"message": exc.message, "type": exc.code or "invalid_request_error", "code": exc.code}}
+
+    def before(self, route: str) -> None:
+        # Throttling answers at once, like a gateway would; everything else pays the latency.
+        header = self.headers.get("Authorization") or ""
+        if not header.lower().startswith("bearer ") or (self.server.api_key and header[7:].strip() != self.server.api_key):
+            raise FakeError(401, "Invalid API-key provided.", "InvalidApiKey")
+        wait = self.server.bucket.take() if self.server.bucket else 0.0
+        if wait or self.server.roll(self.server.throttle_rate):
+            raise FakeError(
+                429,
+                "Requests rate limit exceeded, please try again later.",
+                "Throttling.RateQuota",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+        self.server.delay()
+        if self.server.stall_sec and self.server.roll(self.server.stall_rate):
+            self.server.count("stalls")
+            time.sleep(self.server.stall_sec)
+        if self.server.roll(self.server.error_rate):
+            raise FakeError(500, "The server had an error while processing your request.", "InternalError")
+
+    def handle_embeddings(self, query):
+        body = self.read_json()
+        inputs = body.get("input")
+        texts = [inputs] if isinstance(inputs, str) else inputs
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t for t in texts):
+            raise FakeError(400, "input must be a non-empty string or list of strings", "InvalidParameter")
+        if len(texts) > self.server.max_batch:
+            raise FakeError(400, f"batch size is invalid, it should not be larger than {self.server.max_batch}", "InvalidParameter")
+        try:
+            dimensions = int(body.get("dimensions") or self.server.default_dimensions)
+        except (TypeError, ValueError):
+            dimensions = 0
+        if not 0 < dimensions <= 4096:
+            raise FakeError(400, "dimensions must be between 1 and 4096", "InvalidParameter")
+        model = str(body.get("model") or "text-embedding-v4")
+        tokens = sum(max(1, len(t) // 4) for t in texts)
+        self.server.count("embedded_texts", len(texts))
+        self.send_json(
+            200,
+            {
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": hashing_embedding(model, text, dimensions)}
+                    for i, text in enumerate(texts)
+                ],
+                "model": model,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                "id": str(uuid.uuid4()),
+            },
+        )
+
+
+    def handle_chat_completions(self, query):
+        body = self.read_json()
+        messages = body.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise FakeError(400, "messages must be a non-empty list", "InvalidParameter")
+        prompt = str((messages[-1] or {}).get("content") or "")
+        try:
+            request = json.loads(prompt)
+        except ValueError:
+            request = None
+        if isinstance(request, dict) and isinstance(request.get("lines"), list):
+            target = str(request.get("target_lang") or "xx")
+            answer = json.dumps([f"[{target}] {line}" for line in request["lines"]], ensure_ascii=False)
+            self.server.count("translated_lines", len(request["lines"]))
+        else:
+            answer = prompt
+        tokens = max(1, len(prompt) // 4)
+        completion = max(1, len(answer) // 4)
+        self.send_json(
+            200,
+            {
+                "id": str(uuid.uuid4()),
+                "object": "chat.completion",
+                "model": str(body.get("model") or "qwen-plus"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": tokens, "completion_tokens": completion, "total_tokens": tokens + completion},
+            },
+        )
+
+
+# --- qdrant ---------------------------------------------------------------------------
+
+
+def parse_point_id(value):
+    if isinstance(value, bool):
+        value = None
+    if isinstance(value, int) and value >= 0:
+        return value
+    if isinstance(value, str):
+        try:
+            return str(uuid.UUID(value))
+        except ValueError:
+            pass
+    raise FakeError(
+        400, f"Format error in JSON body: value {value!r} is not a valid point ID, "
+        "valid values are either an unsigned integer or a UUID"
+    )
+
+
+def point_sort_key(point_id) -> Tuple[int, str]:
+    # Qdrant orders integer ids before UUIDs.
+    return (0, f"{point_id:020d}") if isinstance(point_id, int) else (1, point_id)
+
+
+def payload_values(payload: dict, key: str) -> List[object]:
+    values: List[object] = [payload]
+    for part in key.split("."):
+        nxt: List[object] = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                nxt.extend(item if isinstance(item, list) else [item])
+        values = nxt
+    return values
+
+
+def condition_matches(condition: dict, point_id, payload: dict) -> bool:
+    if any(k in condition for k in ("must", "should", "must_not")):
+        return filter_matches(condition, point_id, payload)
+    if "has_id" in condition:
+        return point_id in {parse_point_id(v) for v in condition["has_id"]}
+    values = payload_values(payload, str(condition.get("key") or ""))
+    if "match" in condition:
+        match = condition["match"] or {}
+        if "value" in match:
+            return match["value"] in values
+        if "any" in match:
+            return any(v in values for v in match["any"])
+        if "except" in match:
+            return not any(v in values for v in match["except"])
+        raise FakeError(400, f"Unsupported match condition: {match}")
+    if "range" in condition:
+        bounds = condition["range"] or {}
+        checks = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+        return any(
+            isinstance(v, (int, float)) and all(checks[k](v, b) for k, b in bounds.items() if k in checks and b is not None)
+            for v in values
+        )
+    if "is_empty" in condition:
+        return not payload_values(payload, str(condition["is_empty"].get("key") or ""))
+    raise FakeError(400, f"Unsupported filter condition: {condition}")
+
+
+def filter_matches(query_filter: Optional[dict], point_id, payload: dict) -> bool:
+    if not query_filter:
+        return True
+    as_list = lambda v: v if isinstance(v, list) else ([v] if v else [])  # noqa: E731
+    if not all(condition_matches(c, point_id, payload) for c in as_list(query_filter.get("must"))):
+        return False
+    should = as_list(query_filter.get("should"))
+    if should and not any(condition_matches(c, point_id, payload) for c in should):
+        return False
+    return not any(condition_matches(c, point_id, payload) for c in as_list(query_filter.get("must_not")))
+
+
+class QdrantCollection:
+    def __init__(self, name: str, size: int, distance: str = "Cosine"):
+        self.name = name
+        self.size = size
+        self.distance = distance
+        self.points: Dict[object, Tuple[array, dict]] = {}
+        self._order: Optional[List[object]] = None
+
+    def ordered_ids(self) -> List[object]:
+        if self._order is None:
+            self._order = sorted(self.points, key=point_sort_key)
+        return self._order
+
+    def upsert(self, point_id, vector, payload: dict) -> None:
+        if not isinstance(vector, list) or not all(isinstance(v, (int, float)) for v in vector):
+            raise FakeError(400, "Format error in JSON body: vector must be a list of numbers")
+        if len(vector) != self.size:
+            raise FakeError(400, f"Wrong input: Vector dimension error: expected dim: {self.size}, got {len(vector)}")
+        if self.distance == "Cosine":
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vector = [v / norm for v in vector]
+        if point_id not in self.points:
+            self._order = None
+        self.points[point_id] = (array("f", vector), payload if isinstance(payload, dict) else {})
+
+    def delete(self, point_id) -> None:
+        if self.points.pop(point_id, None) is not None:
+            self._order = None
+
+    def score(self, query: List[float], vector: array) -> float:
+        if self.distance == "Euclid":
+            return -math.sqrt(sum((a - b) ** 2 for a, b in zip(query, vector)))
+        return sum(map(operator.mul, query, vector))
+
+    def info(self) -> dict:
+        return {
+            "status": "green",
+            "optimizer_status": "ok",
+            "points_count": len(self.points),
+            "indexed_vectors_count": len(self.points),
+            "segments_count": 1,
+            "config": {"params": {"vectors": {"size": self.size, "distance": self.distance}}},
+            "payload_schema": {},
+        }
+
+
+def format_point(point_id, vector: array, payload: dict, with_payload, with_vector: bool) -> dict:
+    out: Dict[str, object] = {"id": point_id}
+    if with_payload is True:
+        out["payload"] = payload
+    elif isinstance(with_payload, list):
+        out["payload"] = {k: v for k, v in payload.items() if k in with_payload}
+    if with_vector:
+        out["vector"] = [round(v, 6) for v in vector]
+    return out
+
+
+class QdrantServer(FakeServer):
+    def __init__(self, address, latency_ms: int = 0, jitter_ms: int = 0, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(address, QdrantHandler, latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed)
+        self.error_rate = error_rate
+        self.collections: Dict[str, QdrantCollection] = {}
+        self.aliases: Dict[str, str] = {}
+        self.lock = threading.RLock()
+        self.operation_id = 0
+
+    def create_collection(self, name: str, size: int, distance: str = "Cosine") -> QdrantCollection:
+        with self.lock:
+            if name in self.collections:
+                raise FakeError(409, f"Wrong input: Collection `{name}` already exists!")
+            collection = self.collections[name] = QdrantCollection(name, size, distance)
+            return collection
+
+    def collection(self, name: str) -> QdrantCollection:
+        found = self.collections.get(self.aliases.get(name, name))
+        if found is None:
+            raise FakeError(404, f"Not found: Collection `{name}` doesn't exist!")
+        return found
+
+    def next_operation(self) -> int:
+        self.operation_id += 1
+        return self.operation_id
+
+
+class QdrantHandler(FakeHandler):
+    ROUTES = (
+        ("GET", r"/collections", "list_collections"),
+        ("GET", r"/aliases", "list_aliases"),
+        ("POST", r"/collections/aliases", "update_aliases"),
+        ("GET", r"/collections/([^/]+)/aliases", "collection_aliases"),
+        ("GET", r"/collections/([^/]+)", "get_collection"),
+        ("PUT", r"/collections/([^/]+)", "create_collection"),
+        ("DELETE", r"/collections/([^/]+)", "delete_collection"),
+        ("PUT", r"/collections/([^/]+)/points", "upsert_points"),
+        ("POST", r"/collections/([^/]+)/points", "retrieve_points"),
+        ("GET", r"/collections/([^/]+)/points/([^/]+)", "get_point"),
+        ("POST", r"/collections/([^/]+)/points/delete", "delete_points"),
+        ("POST", r"/collections/([^/]+)/points/scroll", "scroll_points"),
+        ("POST", r"/collections/([^/]+)/points/count", "count_points"),
+        ("POST", r"/collections/([^/]+)/points/search", "search_points"),
+    )
+    server: QdrantServer
+
+    def error_body(self, exc: FakeError) -> dict:
+        return {"status": {"error": exc.message}, "time": 0.0}
+
+    def before(self, route: str) -> None:
+        self.server.delay()
+        if self.server.roll(self.server.error_rate):
+            raise FakeError(503, "Service internal error: injected failure")
+
+    def ok(self, result, started: float) -> None:
+        self.send_json(200, {"result": result, "status": "ok", "time": round(time.perf_counter() - started, 6)})
+
+    def operation(self, query) -> dict:
+        waited = str(query.get("wait") or "").lower() in ("1", "true")
+        return {"operation_id": self.server.next_operation(), "status": "completed" if waited else "acknowledged"}
+
+    def handle_list_collections(self, query):
+        started = time.perf_counter()
+        with self.server.lock:
+            names = sorted(self.server.collections)
+        self.ok({"collections": [{"name": n} for n in names]}, started)
+
+    def handle_list_aliases(self, query):
+        started = time.perf_counter()
+        with self.server.lock:
+            aliases = [{"alias_name": a, "collection_name": c} for a, c in sorted(self.server.aliases.items())]
+        self.ok({"aliases": aliases}, started)
+
+    def handle_collection_aliases(self, name, query):
+        started = time.perf_counter()
+        with self.server.lock:
+            self.server.collection(name)
+            aliases = [{"alias_name": a, "collection_name": c} for a, c in sorted(self.server.aliases.items()) if c == name]
+        self.ok({"aliases": aliases}, started)
+
+    def handle_update_aliases(self, query):
+        started = time.perf_counter()
+        actions = self.read_json().get("actions") or []
+        with self.server.lock:
+            # All actions apply together, which is what makes an alias swap atomic.
+            aliases = dict(self.server.aliases)
+            for action in actions:
+                if "create_alias" in action:
+                    spec = action["create_alias"]
+                    if spec.get("collection_name") not in self.server.collections:
+                        raise FakeError(404, f"Not found: Collection `{spec.get('collection_name')}` doesn't exist!")
+                    aliases[spec["alias_name"]] = spec["collection_name"]
+                elif "delete_alias" in action:
+                    name = action["delete_alias"].get("alias_name")
+                    if aliases.pop(name, None) is None:
+                        raise FakeError(404, f"Not found: Alias {name} does not exists!")
+                elif "rename_alias" in action:
+                    spec = action["rename_alias"]
+                    if spec.get("old_alias_name") not in aliases:
+                        raise FakeError(404, f"Not found: Alias {spec.get('old_alias_name')} does not exists!")
+                    aliases[spec["new_alias_name"]] = aliases.pop(spec["old_alias_name"])
+                else:
+                    raise FakeError(400, f"Format error in JSON body: unknown alias action {action}")
+            self.server.aliases = aliases
+        self.ok(True, started)
+
+    def handle_get_collection(self, name, query):
+        started = time.perf_counter()
+        with self.server.lock:
+            info = self.server.collection(name).info()
+        self.ok(info, started)
+
+    def handle_create_collection(self, name, query):
+        started = time.perf_counter()
+        vectors = self.read_json().get("vectors") or {}
+        try:
+            size = int(vectors.get("size") or 0)
+        except (TypeError, ValueError, AttributeError):
+            size = 0
+        if size <= 0:
+            raise FakeError(400, "Wrong input: vectors.size must be a positive integer")
+        distance = str(vectors.get("distance") or "Cosine")
+        if distance not in ("Cosine", "Dot", "Euclid"):
+            raise FakeError(400, f"Format error in JSON body: unknown distance {distance}")
+        self.server.create_collection(name, size, distance)
+        self.ok(True, started)
+
+    def handle_delete_collection(self, name, query):
+        started = time.perf_counter()
+        with self.server.lock:
+            existed = self.server.collections.pop(name, None) is not None
+            self.server.aliases = {a: c for a, c in self.server.aliases.items() if c != name}
+        self.ok(existed, started)
+
+    def handle_upsert_points(self, name, query):
+        started = time.perf_counter()
+        points = self.read_json().get("points")
+        if not isinstance(points, list):
+            raise FakeError(400, "Format error in JSON body: missing field `points`")
+        with self.server.lock:
+            collection = self.server.collection(name)
+            parsed = [(parse_point_id(p.get("id")), p.get("vector"), p.get("payload") or {}) for p in points]
+            for point_id, vector, payload in parsed:
+                collection.upsert(point_id, vector, payload)
+        self.server.count("points_upserted", len(parsed))
+        self.ok(self.operation(query), started)
+
+    def handle_retrieve_points(self, name, query):
+        started = time.perf_counter()
+        body = self.read_json()
+        ids = [parse_point_id(i) for i in body.get("ids") or []]
+        with self.server.lock:
+            collection = self.server.collection(name)
+            found = [
+                format_point(i, *collection.points[i], body.get("with_payload", True), bool(body.get("with_vector")))
+                for i in ids
+                if i in collection.points
+            ]
+        self.ok(found, started)
+
+    def handle_get_point(self, name, point_id, query):
+        started = time.perf_counter()
+        parsed = parse_point_id(int(point_id) if point_id.isdigit() else point_id)
+        with self.server.lock:
+            collection = self.server.collection(name)
+            if parsed not in collection.points:
+                raise FakeError(404, f"Not found: No point with id {point_id} found")
+            point = format_point(parsed, *collection.points[parsed], True, True)
+        self.ok(point, started)
+
+    def handle_delete_points(self, name, query):
+        started = time.perf_counter()
+        body = self.read_json()
+        with self.server.lock:
+            collection = self.server.collection(name)
+            if "points" in body:
+                targets = [parse_point_id(i) for i in body.get("points") or []]
+            elif "filter" in body:
+                targets = [i for i, (_, payload) in collection.points.items() if filter_matches(body["filter"], i, payload)]
+            else:
+                raise FakeError(400, "Format error in JSON body: expected `points` or `filter`")
+            for point_id in targets:
+                collection.delete(point_id)
+        self.ok(self.operation(query), started)
+
+    def handle_scroll_points(self, name, query):
+        started = time.perf_counter()
+        body = self.read_json()
+        limit = max(1, int(body.get("limit") or 10))
+        offset = body.get("offset")
+        with self.server.lock:
+            collection = self.server.collection(name)
+            ordered = collection.ordered_ids()
+            start = 0
+            if offset is not None:
+                key = point_sort_key(parse_point_id(offset))
+                start = next((i for i, pid in enumerate(ordered) if point_sort_key(pid) >= key), len(ordered))
+            points: List[dict] = []
+            next_offset = None
+            for point_id in ordered[start:]:
+                vector, payload = collection.points[point_id]
+                if not filter_matches(body.get("filter"), point_id, payload):
+                    continue
+                if len(points) == limit:
+                    next_offset = point_id
+                    break
+                points.append(format_point(point_id, vector, payload, body.get("with_payload", True), bool(body.get("with_vector"))))
+        self.ok({"points": points, "next_page_offset": next_offset}, started)
+
+    def handle_count_points(self, name, query):
+        started = time.perf_counter()
+        body = self.read_json()
+        with self.server.lock:
+            collection = self.server.collection(name)
+            count = sum(1 for i, (_, payload) in collection.points.items() if filter_matches(body.get("filter"), i, payload))
+        self.ok({"count": count}, started)
+
+    def handle_search_points(self, name, query):
+        started = time.perf_counter()
+        body = self.read_json()
+        vector = body.get("vector")
+        if isinstance(vector, dict):
+            vector = vector.get("vector")
+        limit = max(1, int(body.get("limit") or 10))
+        offset = max(0, int(body.get("offset") or 0))
+        threshold = body.get("score_threshold")
+        with self.server.lock:
+            collection = self.server.collection(name)
+            if not isinstance(vector, list) or len(vector) != collection.size:
+                got = len(vector) if isinstance(vector, list) else 0
+                raise FakeError(400, f"Wrong input: Vector dimension error: expected dim: {collection.size}, got {got}")
+            query_vector = [float(v) for v in vector]
+            if collection.distance == "Cosine":
+                norm = math.sqrt(sum(v * v for v in query_vector)) or 1.0
+                query_vector = [v / norm for v in query_vector]
+            scored = []
+            for point_id, (stored, payload) in collection.points.items():
+                if not filter_matches(body.get("filter"), point_id, payload):
+                    continue
+                score = collection.score(query_vector, stored)
+                if threshold is None or score >= threshold:
+                    scored.append((score, point_id, stored, payload))
+            scored.sort(key=lambda item: (-item[0], point_sort_key(item[1])))
+            hits = []
+            for score, point_id, stored, payload in scored[offset : offset + limit]:
+                hit = format_point(point_id, stored, payload, body.get("with_payload", False), bool(body.get("with_vector")))
+                hit.update({"version": 0, "score": round(score, 6)})
+                hits.append(hit)
+        self.ok(hits, started)
+
+
+# --- kit ------------------------------------------------------------------------------
+
+
+class FakeServices:
+    """PocketBase stand-in, embeddings and Qdrant on free local ports, each on its own thread."""
+
+    def __init__(
+        self,
+        workdir: Optional[Path] = None,
+        host: str = "127.0.0.1",
+        notes: int = 0,
+        seed: int = 0,
+        pb_latency_ms: int = 0,
+        embed_latency_ms: int = 0,
+        embed_jitter_ms: int = 0,
+        embed_error_rate: float = 0.0,
+        embed_429_rate: float = 0.0,
+        embed_rps: float = 0.0,
+        embed_stall_rate: float = 0.0,
+        embed_stall_ms: int = 0,
+        embed_max_batch: int = DEFAULT_EMBED_MAX_BATCH,
+        qdrant_latency_ms: int = 0,
+        qdrant_error_rate: float = 0.0,
+        dimensions: int = DEFAULT_DIMENSIONS,
+        collection: str = DEFAULT_COLLECTION,
+    ):
+        self.workdir = workdir or Path(tempfile.mkdtemp(prefix="fake-services-"))
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self.dimensions = dimensions
+        self.collection = collection
+        self.pocketbase: StandinServer = build_server(
+            host=host,
+            data_dir=self.workdir / "pb_data",
+            superusers=(f"{FAKE_ADMIN_EMAIL}:{FAKE_PASSWORD}",),
+            users=(f"{FAKE_USER_EMAIL}:{FAKE_PASSWORD}",),
+            latency_ms=pb_latency_ms,
+            seed_notes=notes,
+            seed=seed,
+        )
+        self.embeddings = EmbeddingServer(
+            (host, 0),
+            latency_ms=embed_latency_ms,
+            jitter_ms=embed_jitter_ms,
+            error_rate=embed_error_rate,
+            throttle_rate=embed_429_rate,
+            rps=embed_rps,
+            stall_rate=embed_stall_rate,
+            stall_ms=embed_stall_ms,
+            default_dimensions=dimensions,
+            max_batch=embed_max_batch,
+            seed=seed,
+        )
+        self.qdrant = QdrantServer((host, 0), latency_ms=qdrant_latency_ms, error_rate=qdrant_error_rate, seed=seed)
+        if collection:
+            self.qdrant.create_collection(collection, dimensions)
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def pocketbase_url(self) -> str:
+        host, port = self.pocketbase.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def embedding_url(self) -> str:
+        return f"{self.embeddings.url}/compatible-mode/v1/embeddings"
+
+    @property
+    def chat_url(self) -> str:
+        return f"{self.embeddings.url}/compatible-mode/v1/chat/completions"
+
+    @property
+    def qdrant_url(self) -> str:
+        return self.qdrant.url
+
+    def env(self) -> Dict[str, str]:
+        """The env/.env keys the scripts and pb_hooks read, pointed at the fakes."""
+        return {
+            "POCKETBASE_URL": self.pocketbase_url,
+            "POCKETBASE_ADMIN_EMAIL": FAKE_ADMIN_EMAIL,
+            "POCKETBASE_ADMIN_PASSWORD": FAKE_PASSWORD,
+            "POCKETBASE_TEST_EMAIL": FAKE_USER_EMAIL,
+            "POCKETBASE_TEST_PASSWORD": FAKE_PASSWORD,
+            "DASHSCOPE_API_KEY": FAKE_API_KEY,
+            "DASHSCOPE_EMBED_URL": self.embedding_url,
+            "DASHSCOPE_EMBED_DIM": str(self.dimensions),
+            "TRANSLATION_API_URL": self.chat_url,
+            "QDRANT_URL": self.qdrant_url,
+            "QDRANT_COLLECTION": self.collection,
+        }
+
+    def start(self) -> "FakeServices":
+        for name, server in (("pocketbase", self.pocketbase), ("embeddings", self.embeddings), ("qdrant", self.qdrant)):
+            thread = threading.Thread(target=server.serve_forever, name=f"fake-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self) -> None:
+        for server in (self.pocketbase, self.embeddings, self.qdrant):
+            if self._threads:
+                server.shutdown()
+            server.server_close()
+        self._threads.clear()
+
+    def __enter__(self) -> "FakeServices":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run fake PocketBase, embedding and Qdrant services locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workdir", help="Where to keep the stand-in's SQLite data (default: temp dir)")
+    parser.add_argument("--notes", type=int, default=1000, help="Synthetic ai_notes to seed")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the notes and injected failures")
+    parser.add_argument("--pb-latency-ms", type=int, default=0, help="Delay per PocketBase /api request")
+    parser.add_argument("--embed-latency-ms", type=int, default=0, help="Delay per embedding request")
+    parser.add_argument("--embed-jitter-ms", type=int, default=0, help="Extra uniform random delay per embedding request")
+    parser.add_argument("--embed-error-rate", type=float, default=0.0, help="Share of embedding requests failing with 500")
+    parser.add_argument("--embed-429-rate", type=float, default=0.0, help="Share of embedding requests answered 429")
+    parser.add_argument("--embed-rps", type=float, default=0.0, help="Token-bucket rate limit; over it requests get 429")
+    parser.add_argument("--embed-stall-rate", type=float, default=0.0, help="Share of embedding requests that stall")
+    parser.add_argument("--embed-stall-ms", type=int, default=5000, help="How long a stalled embedding request hangs")
+    parser.add_argument("--embed-max-batch", type=int, default=DEFAULT_EMBED_MAX_BATCH, help="Max inputs per embedding call")
+    parser.add_argument("--qdrant-latency-ms", type=int, default=0, help="Delay per Qdrant request")
+    parser.add_argument("--qdrant-error-rate", type=float, default=0.0, help="Share of Qdrant requests failing with 503")
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS, help="Default embedding/collection size")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Qdrant collection to create ('' for none)")
+    parser.add_argument("--env-file", help="Also write the env keys to this file (.env format)")
+    args = parser.parse_args()
+
+    rates = (args.embed_error_rate, args.embed_429_rate, args.embed_stall_rate, args.qdrant_error_rate)
+    if any(not 0 <= r <= 1 for r in rates):
+        print("Error: rates must be between 0 and 1", file=sys.stderr)
+        return 2
+    if args.notes < 0 or args.dimensions <= 0 or args.embed_max_batch <= 0 or args.embed_rps < 0:
+        print("Error: --notes, --dimensions, --embed-max-batch and --embed-rps must be positive", file=sys.stderr)
+        return 2
+
+    kit = FakeServices(
+        workdir=Path(args.workdir) if args.workdir else None,
+        host=args.host,
+        notes=args.notes,
+        seed=args.seed,
+        pb_latency_ms=args.pb_latency_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        embed_jitter_ms=args.embed_jitter_ms,
+        embed_error_rate=args.embed_error_rate,
+        embed_429_rate=args.embed_429_rate,
+        embed_rps=args.embed_rps,
+        embed_stall_rate=args.embed_stall_rate,
+        embed_stall_ms=args.embed_stall_ms,
+        embed_max_batch=args.embed_max_batch,
+        qdrant_latency_ms=args.qdrant_latency_ms,
+        qdrant_error_rate=args.qdrant_error_rate,
+        dimensions=args.dimensions,
+        collection=args.collection,
+    ).start()
+    env = kit.env()
+    print(f"PocketBase stand-in: {kit.pocketbase_url} ({args.notes} ai_notes for {FAKE_USER_EMAIL})")
+    print(f"Embeddings:          {kit.embedding_url}")
+    print(f"Chat (translation):  {kit.chat_url}")
+    print(f"Qdrant:              {kit.qdrant_url} (collection={args.collection or '<none>'}, size={args.dimensions})")
+    print()
+    for key, value in env.items():
+        print(f"{key}={value}")
+    if args.env_file:
+        Path(args.env_file).write_text("".join(f"{k}={v}\n" for k, v in env.items()), encoding="utf-8")
+        print(f"\nWrote {args.env_file}")
+    print(
+        "\nExample:\n  python3 scripts/backfill_ai_notes_to_qdrant.py "
+        f"--embedding-url {kit.embedding_url} --dimensions {args.dimensions} --async-inflight 64",
+        flush=True,
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        kit.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Fingerprint crash_reports and keep one aggregate record per distinct crash in crash_fingerprints.
+
+What it does:
+1) With --file, reads local crash files (logcat text such as
+   android-crash-log/crash_log.txt, a bare stack trace, the app's pending
+   reports JSON or an export archive; see crash_signatures.py) and uploads them
+   to crash_reports with ids derived from their content, so uploading the same
+   file twice adds nothing (unless --prune-keep deleted the rows in between). --local-only prints the fingerprint table of the
+   files instead, without PocketBase
+2) Streams the crash_reports rows that have no fingerprint yet, oldest
+   timestamp first (id cursor for ties), and fingerprints their stack traces
+   (crash_signatures.signature: line numbers, lambda suffixes, obfuscated
+   frames, addresses and ids do not split a crash into many)
+3) Per /api/batch request (one transaction), tags the rows with their
+   fingerprint and upserts the crash_fingerprints records they touch: count,
+   first/last seen, and counts per app version, Android version and device.
+   A row is tagged in the same transaction that counts it, so reruns and
+   interrupted runs never count a report twice. Run one instance at a time
+4) With --prune-keep N, deletes the raw rows of each fingerprint except the N
+   newest and the first one seen (the aggregate's sampleId); the counts stay
+
+Triage then reads crash_fingerprints (sort by -count or -lastSeen) and
+crash_reports filtered by fingerprint. Needs admin credentials, the batch API
+(PocketBase v0.23+) and the schema of setup_pocketbase.py (fingerprint field
+and indexes on crash_reports, the crash_fingerprints collection).
+
+Usage examples:
+  python3 scripts/fingerprint_crash_reports.py
+  python3 scripts/fingerprint_crash_reports.py --prune-keep 20
+  python3 scripts/fingerprint_crash_reports.py --file android-crash-log/crash_log.txt --year 2026
+  python3 scripts/fingerprint_crash_reports.py --file crash_log.txt --local-only
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import http_trace
+from crash_signatures import DEFAULT_FRAMES, Signature, read_crash_file, signature
+from openmetrics import exporter_from_args
+from pb_client import (
+    PocketBaseClient,
+    PocketBaseError,
+    load_env_file,
+    login,
+    print_fatal_error,
+    quote_filter_value,
+    records_path,
+    resolve_value,
+    stable_record_id,
+)
+from run_metrics import RunMetrics, add_run_args, validate_run_args
+
+
+REPORTS_COLLECTION = "crash_reports"
+AGGREGATE_COLLECTION = "crash_fingerprints"
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_TOP = 15
+DEFAULT_LOCAL_APP_VERSION = "local"
+# Most common values kept per appVersions/androidVersions/devices map.
+MAX_VALUES = 50
+REPORT_FIELDS = "id,appVersion,androidVersion,deviceModel,stackTrace,message,timestamp"
+AGGREGATE_KEYS = (
+    "id", "fingerprint", "exception", "title", "signature", "count", "firstSeen", "lastSeen",
+    "appVersions", "androidVersions", "devices", "sampleId",
+)
+# aggregate map <- crash_reports field
+VALUE_MAPS = (("appVersions", "appVersion"), ("androidVersions", "androidVersion"), ("devices", "deviceModel"))
+
+
+@dataclass
+class Counters:
+    local_reports: int = 0
+    uploaded: int = 0
+    reports_read: int = 0
+    reports_tagged: int = 0
+    new_fingerprints: int = 0
+    pruned_rows: int = 0
+    batches: int = 0
+
+
+def merge(aggregate: Optional[dict], sig: Signature, report: Dict[str, object]) -> dict:
+    """`aggregate` with one more occurrence of `report` counted in; the input is not modified."""
+    if aggregate is None:
+        merged: Dict[str, object] = {
+            "id": stable_record_id(AGGREGATE_COLLECTION, sig.fingerprint),
+            "fingerprint": sig.fingerprint,
+            "exception": sig.exception,
+            "title": sig.title,
+            "signature": sig.text,
+            "count": 0,
+            "firstSeen": None,
+            "lastSeen": None,
+            "sampleId": str(report.get("id") or ""),
+        }
+    else:
+        merged = {key: aggregate.get(key) for key in AGGREGATE_KEYS}
+    merged["count"] = int(merged.get("count") or 0) + 1
+    timestamp = int(report.get("timestamp") or 0)
+    if timestamp:
+        merged["firstSeen"] = min(int(merged["firstSeen"] or timestamp), timestamp)
+        merged["lastSeen"] = max(int(merged["lastSeen"] or 0), timestamp)
+    for name, source in VALUE_MAPS:
+        values = Counter(merged.get(name) if isinstance(merged.get(name), dict) else {})
+        values[str(report.get(source) or "unknown")] += 1
+        merged[name] = dict(values.most_common(MAX_VALUES))
+    return merged
+
+
+def print_table(aggregates: Iterable[dict], top: int) -> None:
+    rows = sorted(aggregates, key=lambda a: (-int(a.get("count") or 0), str(a.get("fingerprint"))))[:top]
+    if not rows:
+        return
+    print(f"{'count':>7}  {'fingerprint':<16}  {'versions':<24}  title")
+    for row in rows:
+        versions = ",".join(list(row.get("appVersions") or {})[:3])
+        print(f"{int(row.get('count') or 0):>7}  {row.get('fingerprint'):<16}  {versions[:24]:<24}  {row.get('title')}")
+
+
+class Pipeline:
+    def __init__(self, client: PocketBaseClient, args: argparse.Namespace, counters: Counters, metrics: RunMetrics):
+        self.client = client
+        self.args = args
+        self.counters = counters
+        self.metrics = metrics
+        self.aggregates: Dict[str, dict] = {}
+        self.touched: Set[str] = set()
+
+    def send(self, operations: List[dict]) -> None:
+        with self.metrics.stage("pb_batch"):
+            self.client.batch(operations, timeout=300)
+        self.counters.batches += 1
+
+    def upload(self, reports: List[Dict[str, object]]) -> None:
+        """PUT local reports into crash_reports; ids come from the content, so a re-upload is a no-op."""
+        bodies = []
+        for report in reports:
+            trace = str(report.get("stackTrace") or report.get("message") or "")
+            timestamp = int(report.get("timestamp") or 0)
+            content = hashlib.sha256(trace.encode("utf-8")).hexdigest()
+            bodies.append(
+                {
+                    "id": stable_record_id(REPORTS_COLLECTION, str(timestamp), content),
+                    "appVersion": str(report.get("appVersion") or DEFAULT_LOCAL_APP_VERSION),
+                    "androidVersion": str(report.get("androidVersion") or ""),
+                    "deviceModel": str(report.get("deviceModel") or ""),
+                    "stackTrace": trace,
+                    "message": str(report.get("message") or "")[:4000],
+                    "timestamp": timestamp,
+                }
+            )
+        if self.args.dry_run:
+            print(f"[dry-run] would upload {len(bodies)} local reports")
+            return
+        size = self.args.batch_size
+        for offset in range(0, len(bodies), size):
+            self.send([{"method": "PUT", "url": records_path(REPORTS_COLLECTION), "body": body} for body in bodies[offset:offset + size]])
+            self.counters.uploaded += len(bodies[offset:offset + size])
+        print(f"[upload] {len(bodies)} local reports")
+
+    def load_aggregates(self, fingerprints: Set[str]) -> None:
+        missing = sorted(fp for fp in fingerprints if fp not in self.aggregates)
+        if not missing:
+            return
+        with self.metrics.stage("load_aggregates"):
+            listing = self.client.list_records(
+                AGGREGATE_COLLECTION,
+                per_page=len(missing),
+                filter=" || ".join(f"fingerprint = {quote_filter_value(fp)}" for fp in missing),
+                skip_total=True,
+            )
+        for item in listing.get("items") or []:
+            self.aggregates[str(item.get("fingerprint"))] = item
+
+    def pending_rows(self) -> Iterable[List[dict]]:
+        """Pages of untagged rows by (timestamp, id); the cursor also skips rows a dry run leaves untagged."""
+        cursor: Optional[Tuple[int, str]] = None
+        while True:
+            clauses = ["fingerprint = ''"]
+            if cursor is not None:
+                clauses.append(f"(timestamp > {cursor[0]} || (timestamp = {cursor[0]} && id > {quote_filter_value(cursor[1])}))")
+            with self.metrics.stage("read"):
+                listing = self.client.list_records(
+                    REPORTS_COLLECTION,
+                    per_page=self.args.batch_size,
+                    filter=" && ".join(clauses),
+                    sort="+timestamp,+id",
+                    fields=REPORT_FIELDS,
+                    skip_total=True,
+                    timeout=120,
+                )
+            items = listing.get("items") or []
+            if not items:
+                return
+            used = yield items
+            last = items[used - 1] if used else items[-1]
+            cursor = (int(last.get("timestamp") or 0), str(last.get("id")))
+
+    def tag_pending(self) -> None:
+        pages = self.pending_rows()
+        try:
+            items = next(pages)
+        except StopIteration:
+            return
+        while True:
+            self.counters.reports_read += len(items)
+            rows: List[Tuple[dict, Signature]] = []
+            fingerprints: Set[str] = set()
+            for item in items:
+                sig = signature(str(item.get("stackTrace") or ""), str(item.get("message") or ""), self.args.frames)
+                # Each row costs a PATCH and each new fingerprint a PUT in the same batch.
+                if rows and len(rows) + len(fingerprints | {sig.fingerprint}) > self.args.batch_size:
+                    break
+                rows.append((item, sig))
+                fingerprints.add(sig.fingerprint)
+            self.counters.reports_read -= len(items) - len(rows)
+            self.load_aggregates(fingerprints)
+            updated: Dict[str, dict] = {}
+            for item, sig in rows:
+                updated[sig.fingerprint] = merge(updated.get(sig.fingerprint) or self.aggregates.get(sig.fingerprint), sig, item)
+            operations = [
+                {"method": "PATCH", "url": records_path(REPORTS_COLLECTION, str(item["id"])), "body": {"fingerprint": sig.fingerprint}}
+                for item, sig in rows
+            ]
+            operations += [
+                {"method": "PUT", "url": records_path(AGGREGATE_COLLECTION), "body": body} for body in updated.values()
+            ]
+            if not self.args.dry_run:
+                try:
+                    self.send(operations)
+                except PocketBaseError as exc:
+                    first, last = rows[0][0], rows[-1][0]
+                    raise PocketBaseError(
+                        f"tagging {len(rows)} reports ({first['id']} .. {last['id']}): {exc}", status=exc.status
+                    ) from exc
+            self.counters.new_fingerprints += sum(1 for fp in updated if fp not in self.aggregates)
+            self.aggregates.update(updated)
+            self.touched.update(updated)
+            self.counters.reports_tagged += len(rows)
+            self.metrics.done(len(rows))
+            try:
+                items = pages.send(len(rows))
+            except StopIteration:
+                return
+
+    def prune(self, keep: int) -> None:
+        """Delete the raw rows of each fingerprint beyond its `keep` newest and its sample."""
+        candidates = self.client.iter_records(
+            AGGREGATE_COLLECTION, per_page=200, filter=f"count > {keep + 1}", fields="id,fingerprint,sampleId"
+        )
+        for aggregate in candidates:
+            rows = self.client.iter_records(
+                REPORTS_COLLECTION,
+                per_page=500,
+                filter=f"fingerprint = {quote_filter_value(str(aggregate['fingerprint']))}",
+                sort="-timestamp,-id",
+                fields="id",
+            )
+            ids = [str(row["id"]) for row in rows]
+            doomed = [record_id for record_id in ids[keep:] if record_id != aggregate.get("sampleId")]
+            if not doomed:
+                continue
+            if not self.args.dry_run:
+                size = self.args.batch_size
+                for offset in range(0, len(doomed), size):
+                    self.send(
+                        [{"method": "DELETE", "url": records_path(REPORTS_COLLECTION, record_id)} for record_id in doomed[offset:offset + size]]
+                    )
+            self.counters.pruned_rows += len(doomed)
+            print(f"[prune] {aggregate['fingerprint']}: {'would delete' if self.args.dry_run else 'deleted'} {len(doomed)} of {len(ids)} rows")
+
+
+def read_local_files(paths: List[str], year: Optional[int], app_version: str) -> List[Dict[str, object]]:
+    reports: List[Dict[str, object]] = []
+    for name in paths:
+        found = list(read_crash_file(Path(name), year))
+        print(f"[file] {name}: {len(found)} reports")
+        for report in found:
+            report.setdefault("appVersion", app_version)
+        reports.extend(found)
+    return reports
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fingerprint crash_reports and aggregate them per distinct crash.")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--file", action="append", default=[], help="Local crash file to ingest (repeatable)")
+    parser.add_argument("--local-only", action="store_true", help="Only print the fingerprint table of --file")
+    parser.add_argument("--year", type=int, help="Year of logcat timestamps without one (default: this year)")
+    parser.add_argument(
+        "--app-version", default=DEFAULT_LOCAL_APP_VERSION, help="appVersion of local reports that carry none"
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=DEFAULT_FRAMES,
+        help="Frames of the root cause in a fingerprint (changing it starts new fingerprints)",
+    )
+    parser.add_argument("--prune-keep", type=int, help="Delete raw rows per fingerprint beyond the N newest")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Sub-requests per /api/batch request")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Fingerprints listed at the end")
+    parser.add_argument("--dry-run", action="store_true", help="Fingerprint and count only; write and delete nothing")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    if args.frames <= 0:
+        print("Error: --frames must be > 0", file=sys.stderr)
+        return 2
+    if not 2 <= args.batch_size <= 1000:
+        print("Error: --batch-size must be 2-1000", file=sys.stderr)
+        return 2
+    if args.prune_keep is not None and args.prune_keep < 1:
+        print("Error: --prune-keep must be >= 1", file=sys.stderr)
+        return 2
+    if args.local_only and not args.file:
+        print("Error: --local-only needs --file", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    try:
+        local_reports = read_local_files(args.file, args.year, args.app_version)
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    if args.local_only:
+        aggregates: Dict[str, dict] = {}
+        for report in local_reports:
+            sig = signature(str(report.get("stackTrace") or ""), str(report.get("message") or ""), args.frames)
+            aggregates[sig.fingerprint] = merge(aggregates.get(sig.fingerprint), sig, report)
+        print(f"{len(local_reports)} reports, {len(aggregates)} fingerprints")
+        print_table(aggregates.values(), args.top)
+        return 0
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="fingerprint_crash_reports")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, _ = login(client, admin_email, admin_password, None, None)
+    if auth_mode != "admin":
+        print("Error: crash_reports is admin-only; provide --admin-email/--admin-password.", file=sys.stderr)
+        return 2
+
+    print(
+        f"Start fingerprinting: pb={base_url}, frames={args.frames}, local_reports={len(local_reports)}, "
+        f"prune_keep={args.prune_keep if args.prune_keep is not None else '-'}, dry_run={args.dry_run}"
+    )
+    counters = Counters(local_reports=len(local_reports))
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(metrics, "fingerprint_crash_reports", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    pipeline = Pipeline(client, args, counters, metrics)
+    try:
+        if local_reports:
+            pipeline.upload(local_reports)
+        pipeline.tag_pending()
+        if args.prune_keep is not None:
+            pipeline.prune(args.prune_keep)
+    except KeyboardInterrupt:
+        return metrics.finish_run(
+            "Interrupted; run again to continue.", counters, 130, args.metrics_json, script="fingerprint_crash_reports"
+        )
+    except Exception as exc:  # noqa: BLE001
+        print_fatal_error(exc)
+        if isinstance(exc, PocketBaseError) and exc.status in (400, 404) and "fingerprint" in str(exc):
+            print("Hint: run setup_pocketbase.py for the fingerprint field and crash_fingerprints.", file=sys.stderr)
+        return metrics.finish_run(
+            "Failed; run again to continue.", counters, 1, args.metrics_json, script="fingerprint_crash_reports"
+        )
+    print_table((pipeline.aggregates[fp] for fp in pipeline.touched), args.top)
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="fingerprint_crash_reports")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,275 @@
+"""
+Tail-latency control for calls to an API with a slow tail (the embedding endpoint).
+
+`Hedger` wraps one logical call and gives it
+- an adaptive deadline per attempt: `deadline_factor` x p99 of the recent
+  successful attempts, clamped to [min_deadline, max_deadline]. Until
+  `min_samples` latencies are known (or with factor 0) it is max_deadline.
+  An attempt that times out is cut off and re-sent up to `retries` times.
+- optional hedging: when the attempt is still running after the recent
+  `hedge_quantile` latency (p95 by default), a duplicate is sent and the first
+  usable answer wins. The loser is cancelled (asyncio) or abandoned to finish
+  on its own deadline (threads). Duplicates are capped at `hedge_budget` x calls.
+
+An attempt that raises is unusable: if the other attempt is still running it
+is awaited instead, otherwise the error propagates. `stats` counts calls,
+attempts, hedges, hedge_wins, hedges_denied (over budget) and cutoffs, for
+RunMetrics probes. Latencies come from the last `window` successful attempts,
+so the deadline follows the API as it speeds up or slows down.
+
+The wrapped function receives the deadline in seconds and must apply it itself:
+requests' timeout (time without bytes from the server) for the sync client,
+the total-time timeout of pb_async.AsyncHttpClient.request for the async one.
+
+Usage:
+  hedger = Hedger(max_deadline=120, hedge=True)
+  vectors = hedger.call(lambda deadline: backend.embed(texts, timeout=deadline))
+  vectors = await hedger.call_async(lambda deadline: backend.embed_async(texts, timeout=deadline))
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Deque, Iterator, List, Optional, Set, TypeVar
+
+import http_trace
+
+
+T = TypeVar("T")
+
+DEFAULT_DEADLINE_FACTOR = 4.0
+DEFAULT_MIN_DEADLINE_SEC = 10.0
+DEFAULT_HEDGE_QUANTILE = 0.95
+DEFAULT_HEDGE_BUDGET = 0.05
+DEFAULT_WINDOW = 512
+DEFAULT_MIN_SAMPLES = 20
+# Re-sort the latency window after this many new observations.
+RESORT_EVERY = 16
+# Abandoned sync attempts keep a thread until their deadline; a hedge must not queue behind them.
+HEDGE_THREADS = 16
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """requests' Timeout family, socket timeouts and asyncio.wait_for timeouts."""
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+class Hedger:
+    def __init__(
+        self,
+        max_deadline: float,
+        deadline_factor: float = DEFAULT_DEADLINE_FACTOR,
+        min_deadline: float = DEFAULT_MIN_DEADLINE_SEC,
+        retries: int = 1,
+        hedge: bool = False,
+        hedge_quantile: float = DEFAULT_HEDGE_QUANTILE,
+        hedge_budget: float = DEFAULT_HEDGE_BUDGET,
+        window: int = DEFAULT_WINDOW,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+    ):
+        self.max_deadline = max_deadline
+        self.deadline_factor = deadline_factor
+        self.min_deadline = min(min_deadline, max_deadline)
+        self.retries = retries
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.stats: Counter = Counter()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._sorted: List[float] = []
+        self._unsorted = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # -- latency model -------------------------------------------------
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            self._unsorted += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Nearest-rank quantile of the recent latencies; None until min_samples are known."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            if self._unsorted >= RESORT_EVERY or len(self._sorted) < self.min_samples:
+                self._sorted = sorted(self._latencies)
+                self._unsorted = 0
+            values = self._sorted
+        return values[min(len(values) - 1, max(0, int(q * len(values) + 0.5) - 1))]
+
+    def deadline(self) -> float:
+        p99 = self.quantile(0.99) if self.deadline_factor > 0 else None
+        if p99 is None:
+            return self.max_deadline
+        return min(self.max_deadline, max(self.min_deadline, self.deadline_factor * p99))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before sending a duplicate; None when hedging is off or not warmed up."""
+        return self.quantile(self.hedge_quantile) if self.hedge else None
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self.stats["hedges"] + 1 > self.hedge_budget * self.stats["calls"]:
+                self.stats["hedges_denied"] += 1
+                return False
+            self.stats["hedges"] += 1
+            return True
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    # -- sync ------------------------------------------------------------
+
+    def call(self, fn: Callable[[float], T]) -> T:
+        self._count("calls")
+        # Attempts of one call are numbered 1, 2, ... in the http_trace records.
+        numbers = itertools.count(1)
+        for round_index in range(self.retries + 1):
+            deadline = self.deadline()
+            delay = self.hedge_delay()
+            try:
+                if delay is None or delay >= deadline:
+                    return self._timed(fn, deadline, next(numbers))
+                return self._call_hedged(fn, deadline, delay, numbers)
+            except Exception as exc:  # noqa: BLE001
+                if not is_timeout(exc):
+                    raise
+                self._count("cutoffs")
+                if round_index == self.retries:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _timed(self, fn: Callable[[float], T], deadline: float, number: int) -> T:
+        self._count("attempts")
+        with http_trace.attempt(number):
+            started = time.perf_counter()
+            result = fn(deadline)
+        self.observe(time.perf_counter() - started)
+        return result
+
+    def _submit(self, fn: Callable[[float], T], deadline: float, number: int) -> Future:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="hedge")
+        # A fresh copy per attempt keeps the caller's http_trace note id in the worker thread.
+        return self._executor.submit(contextvars.copy_context().run, self._timed, fn, deadline, number)
+
+    def _call_hedged(self, fn: Callable[[float], T], deadline: float, delay: float, numbers: Iterator[int]) -> T:
+        primary = self._submit(fn, deadline, next(numbers))
+        pending: Set[Future] = {primary}
+        done, _ = wait(pending, timeout=delay)
+        hedge: Optional[Future] = None
+        if not done and self._take_hedge():
+            hedge = self._submit(fn, deadline, next(numbers))
+            pending.add(hedge)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                exc = future.exception()
+                if exc is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                first_error = first_error or exc
+        assert first_error is not None
+        raise first_error
+
+    # -- asyncio ---------------------------------------------------------
+
+    async def call_async(self, factory: Callable[[float], Awaitable[T]]) -> T:
+        self._count("calls")
+        numbers = itertools.count(1)
+        for round_index in range(self.retries + 1):
+            deadline = self.deadline()
+            delay = self.hedge_delay()
+            try:
+                if delay is None or delay >= deadline:
+                    return await self._timed_async(factory, deadline, next(numbers))
+                return await self._call_hedged_async(factory, deadline, delay, numbers)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                if not is_timeout(exc):
+                    raise
+                self._count("cutoffs")
+                if round_index == self.retries:
+                    raise
+        raise AssertionError("unreachable")
+
+    async def _timed_async(self, factory: Callable[[float], Awaitable[T]], deadline: float, number: int) -> T:
+        self._count("attempts")
+        with http_trace.attempt(number):
+            started = time.perf_counter()
+            result = await factory(deadline)
+        self.observe(time.perf_counter() - started)
+        return result
+
+    async def _call_hedged_async(
+        self, factory: Callable[[float], Awaitable[T]], deadline: float, delay: float, numbers: Iterator[int]
+    ) -> T:
+        primary = asyncio.ensure_future(self._timed_async(factory, deadline, next(numbers)))
+        pending = {primary}
+        hedge = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self._take_hedge():
+                hedge = asyncio.ensure_future(self._timed_async(factory, deadline, next(numbers)))
+                pending.add(hedge)
+            first_error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    first_error = first_error or exc
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            assert first_error is not None
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+                # Retrieve the outcome so a cancelled loser does not log "exception was never retrieved".
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    # -- reporting -------------------------------------------------------
+
+    def summary(self) -> str:
+        stats = self.stats
+        p50 = self.quantile(0.5)
+        hedge_after = self.hedge_delay()
+        parts = [
+            f"calls={stats['calls']}",
+            f"attempts={stats['attempts']}",
+            f"deadline={self.deadline():.1f}s",
+            f"p50={p50 * 1000:.0f}ms" if p50 is not None else "p50=-",
+        ]
+        if self.hedge:
+            share = stats["hedges"] / stats["calls"] * 100 if stats["calls"] else 0.0
+            parts += [
+                f"hedge_after={hedge_after * 1000:.0f}ms" if hedge_after is not None else "hedge_after=-",
+                f"hedges={stats['hedges']} ({share:.1f}%)",
+                f"hedge_wins={stats['hedge_wins']}",
+                f"hedges_denied={stats['hedges_denied']}",
+            ]
+        parts.append(f"cutoffs={stats['cutoffs']}")
+        return " ".join(parts)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # Abandoned duplicates finish on their own deadline; do not wait for them.
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,219 @@
+"""
+Opt-in tracing of every outbound HTTP call to a rotating JSONL file.
+
+Enable with BOOX_HTTP_TRACE=/path/trace.jsonl (any script using pb_client's
+sessions or pb_async), or with --trace-file on the backfills. Each call becomes
+one line:
+
+  {"run": "...", "script": "backfill_ai_notes_to_qdrant", "service": "embedding",
+   "method": "POST", "endpoint": "/compatible-mode/v1/embeddings", "status": 200,
+   "bytes_out": 812, "bytes_in": 9120, "start": 1760000000.123456,
+   "end": 1760000000.301002, "ms": 177.546, "attempt": 1, "note_id": "abc..."}
+
+`endpoint` is the path with record/point ids replaced by {id}, so calls group
+by route. `note_id` and `attempt` come from the caller's context (`note()`,
+`attempt()`), which follows asyncio tasks and threads. For requests the span
+ends when the response headers arrive and `bytes_in` is the Content-Length on
+the wire; for the async engine it ends with the body. The file rotates at
+BOOX_HTTP_TRACE_MAX_MB (default 64) keeping 4 backups (trace.jsonl.1 ...).
+
+trace_summary.py aggregates latency per endpoint and draws a concurrency timeline.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+
+TRACE_ENV = "BOOX_HTTP_TRACE"
+TRACE_MAX_MB_ENV = "BOOX_HTTP_TRACE_MAX_MB"
+DEFAULT_MAX_MB = 64
+DEFAULT_BACKUPS = 4
+
+_UUID_RE = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+# After these segments the next one is an id, except for the named sub-routes.
+_ID_PARENTS = {"records", "points"}
+_ID_SUB_ROUTES = {"delete", "scroll", "count", "search", "query", "payload", "vectors", "token", "recommend"}
+
+_note_id: ContextVar[Optional[str]] = ContextVar("http_trace_note_id", default=None)
+_attempt: ContextVar[int] = ContextVar("http_trace_attempt", default=1)
+
+_active: Optional["Tracer"] = None
+_active_checked = False
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def note(note_id: Optional[str]) -> Iterator[None]:
+    """Tag the calls made inside the block with `note_id`."""
+    token = _note_id.set(note_id)
+    try:
+        yield
+    finally:
+        _note_id.reset(token)
+
+
+@contextmanager
+def attempt(number: int) -> Iterator[None]:
+    """Mark the calls made inside the block as retry attempt `number` (first try is 1)."""
+    token = _attempt.set(number)
+    try:
+        yield
+    finally:
+        _attempt.reset(token)
+
+
+def endpoint_template(path: str) -> str:
+    """The route of `path`: record/point ids and file names become {id}/{name}."""
+    parts = path.split("/")
+    if len(parts) == 6 and parts[1:3] == ["api", "files"]:
+        return f"/api/files/{parts[3]}/{{id}}/{{name}}"
+    out = []
+    for i, part in enumerate(parts):
+        if _UUID_RE.fullmatch(part) or part.isdigit():
+            part = "{id}"
+        elif i > 0 and parts[i - 1] in _ID_PARENTS and part and part not in _ID_SUB_ROUTES:
+            part = "{id}"
+        out.append(part)
+    return "/".join(out) or "/"
+
+
+def service_name(url: str) -> str:
+    parts = urlsplit(url)
+    path = parts.path
+    if path.startswith("/api/"):
+        return "pocketbase"
+    if path.endswith("/embeddings"):
+        return "embedding"
+    if path.startswith("/collections") or path.startswith("/aliases"):
+        return "qdrant"
+    return parts.hostname or "unknown"
+
+
+class Span:
+    __slots__ = ("method", "url", "bytes_out", "start", "started", "note_id", "attempt")
+
+    def __init__(self, method: str, url: str, bytes_out: int):
+        self.method = method
+        self.url = url
+        self.bytes_out = bytes_out
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.note_id = _note_id.get()
+        self.attempt = _attempt.get()
+
+
+class Tracer:
+    """Thread-safe JSONL span writer with size-based rotation."""
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        backups: int = DEFAULT_BACKUPS,
+        script: Optional[str] = None,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.script = script or Path(sys.argv[0] or "python").stem
+        self.run_id = uuid.uuid4().hex[:12]
+        self.lock = threading.Lock()
+        self.spans = 0
+        self._file = self.path.open("a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def start(self, method: str, url: str, bytes_out: int = 0) -> Span:
+        return Span(method.upper(), url, bytes_out)
+
+    def finish(
+        self, span: Span, status: Optional[int] = None, bytes_in: Optional[int] = None, error: Optional[BaseException] = None
+    ) -> None:
+        elapsed = time.perf_counter() - span.started
+        record = {
+            "run": self.run_id,
+            "script": self.script,
+            "service": service_name(span.url),
+            "method": span.method,
+            "endpoint": endpoint_template(urlsplit(span.url).path),
+            "status": status,
+            "bytes_out": span.bytes_out,
+            "bytes_in": bytes_in,
+            "start": round(span.start, 6),
+            "end": round(span.start + elapsed, 6),
+            "ms": round(elapsed * 1000, 3),
+            "attempt": span.attempt,
+            "note_id": span.note_id,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"[:300]
+        self.write(record)
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self._file.closed:
+                return
+            if self._size and self._size + len(line) > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += len(line)
+            self.spans += 1
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{index}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._size = 0
+
+    def close(self) -> None:
+        with self.lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def enable(path: str, script: Optional[str] = None) -> Tracer:
+    """Start tracing to `path` for this process (replacing any earlier tracer)."""
+    global _active, _active_checked
+    with _active_lock:
+        if _active is not None:
+            _active.close()
+        try:
+            max_mb = float(os.getenv(TRACE_MAX_MB_ENV) or DEFAULT_MAX_MB)
+        except ValueError:
+            max_mb = DEFAULT_MAX_MB
+        _active = Tracer(Path(path), max_bytes=int(max_mb * 1024 * 1024), script=script)
+        _active_checked = True
+        atexit.register(_active.close)
+        return _active
+
+
+def active() -> Optional[Tracer]:
+    """The process tracer: the one passed to enable(), else one from BOOX_HTTP_TRACE, else None."""
+    global _active_checked
+    if not _active_checked:
+        path = os.getenv(TRACE_ENV, "").strip()
+        if path:
+            return enable(path)
+        _active_checked = True
+    return _active
@@ -0,0 +1,646 @@
+#!/usr/bin/env python3
+"""
+Import (restore or migrate) an export written by export_user_data.py into PocketBase.
+
+What it does:
+1) Authenticates to PocketBase (prefers admin credentials; a user login imports
+   every record as that user)
+2) Reads manifest.json, checks each archive file against its sha256, then
+   streams the records (JSONL or Parquet, via archive_io.py) in constant memory
+3) Remaps user relations: --user-map OLD=NEW / --user-map-file, or --to-user
+   for everything else. A record that moves to another user gets a new id
+   derived from (old id, new user), so a copy never overwrites its original and
+   re-running the import updates the same copies
+4) Upserts --batch-size records per /api/batch request (one transaction each),
+   with --inflight batches in flight on the asyncio engine (pb_async.py).
+   Records go in with PUT (insert or update by id); a record whose unique key
+   (e.g. idx_progress_user_book, idx_books_user_book, idx_settings_user)
+   already belongs to another record on the target is PATCHed into that record
+   instead, so a restore over existing data merges rather than fails
+5) Checkpoints the records committed per file to import-checkpoint.json in the
+   export directory; an interrupted or failed run resumes where it stopped
+
+The target needs the batch API enabled (PocketBase v0.23+, Settings >
+Application > Batch API) with Max allowed batch requests >= --batch-size.
+books is restored as metadata only: the bookFile field is left out, the EPUB
+itself is not part of the export.
+
+Usage examples:
+  python3 scripts/import_user_data.py --in /backups/pb-2026-10-18
+  python3 scripts/import_user_data.py --in /tmp/export --collections progress,books --inflight 8
+  python3 scripts/import_user_data.py --in /tmp/export --user-map abc123def456ghi=newuserid000001
+  python3 scripts/import_user_data.py --in /tmp/me --email reader@example.com --password secret
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+  POCKETBASE_TEST_EMAIL
+  POCKETBASE_TEST_PASSWORD
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import http_trace
+from archive_io import MANIFEST_NAME, file_sha256, iter_records, read_manifest
+from openmetrics import exporter_from_args
+from pb_async import AsyncHttpClient, AsyncPocketBase, TaskWindow, parse_host_limits, run_cancellable
+from pb_client import (
+    PocketBaseClient,
+    PocketBaseError,
+    load_env_file,
+    login,
+    print_fatal_error,
+    quote_filter_value,
+    records_path,
+    resolve_value,
+    stable_record_id,
+)
+from run_metrics import RunMetrics, add_run_args, validate_run_args
+
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_INFLIGHT = 4
+DEFAULT_RETRIES = 2
+DEFAULT_SCHEMA_FILE = Path(__file__).resolve().parents[1] / "pocketbase_collections.json"
+CHECKPOINT_NAME = "import-checkpoint.json"
+CHECKPOINT_EVERY_SEC = 5.0
+# Records per existing-key lookup; a 1000-clause OR filter overflows the request URL (414/400).
+LOOKUP_CLAUSES = 100
+USERS_COLLECTION_IDS = ("_pb_users_auth_", "users")
+# Server-managed keys of an exported record; PocketBase ignores or rejects them on write.
+DROP_KEYS = ("collectionId", "collectionName", "expand", "created", "updated")
+# Used when neither the server nor --schema-file describes a collection.
+KNOWN_UNIQUE_KEYS: Dict[str, List[Tuple[str, ...]]] = {
+    "settings": [("user",)],
+    "progress": [("user", "bookId")],
+    "books": [("user", "bookId")],
+}
+UNIQUE_INDEX_RE = re.compile(r"\s*CREATE\s+UNIQUE\s+INDEX\s+`?\w+`?\s+ON\s+`?\w+`?\s*\(([^)]*)\)\s*$", re.I)
+
+
+@dataclass
+class Counters:
+    files: int = 0
+    records: int = 0
+    batches: int = 0
+    merged_conflicts: int = 0
+    remapped_users: int = 0
+    retried_batches: int = 0
+    skipped_resumed: int = 0
+
+
+@dataclass
+class CollectionPlan:
+    """What the importer needs to know about one target collection."""
+
+    name: str
+    user_fields: Tuple[str, ...] = ("user",)
+    file_fields: Tuple[str, ...] = ()
+    json_fields: Tuple[str, ...] = ()
+    multi_fields: Tuple[str, ...] = ()
+    unique_keys: List[Tuple[str, ...]] = field(default_factory=list)
+
+
+def field_option(definition: dict, key: str):
+    """A field option from either schema layout (v0.23 `fields` or the older `schema` + options)."""
+    if key in definition:
+        return definition[key]
+    return (definition.get("options") or {}).get(key)
+
+
+def parse_unique_indexes(indexes: List[str]) -> List[Tuple[str, ...]]:
+    keys = []
+    for index in indexes or []:
+        match = UNIQUE_INDEX_RE.match(str(index))
+        if match and " WHERE " not in str(index).upper():
+            keys.append(tuple(c.strip().strip("`") for c in match.group(1).split(",") if c.strip()))
+    return keys
+
+
+def plan_collection(name: str, definition: Optional[dict]) -> CollectionPlan:
+    if definition is None:
+        return CollectionPlan(
+            name=name,
+            file_fields=("bookFile",) if name == "books" else (),
+            unique_keys=list(KNOWN_UNIQUE_KEYS.get(name, [])),
+        )
+    fields = [f for f in definition.get("fields") or definition.get("schema") or [] if isinstance(f, dict)]
+
+    def names(*types: str) -> Tuple[str, ...]:
+        return tuple(str(f["name"]) for f in fields if f.get("type") in types)
+
+    return CollectionPlan(
+        name=name,
+        user_fields=tuple(
+            str(f["name"])
+            for f in fields
+            if f.get("type") == "relation" and field_option(f, "collectionId") in USERS_COLLECTION_IDS
+        ),
+        file_fields=names("file"),
+        json_fields=names("json"),
+        multi_fields=tuple(
+            str(f["name"])
+            for f in fields
+            if f.get("type") in ("relation", "select", "file") and int(field_option(f, "maxSelect") or 1) != 1
+        ),
+        unique_keys=parse_unique_indexes(definition.get("indexes") or []),
+    )
+
+
+def load_definitions(client: PocketBaseClient, names: List[str], schema_file: Path) -> Dict[str, Tuple[dict, str]]:
+    """Collection definitions from the server (admin only), else from the schema file."""
+    found: Dict[str, Tuple[dict, str]] = {}
+    for name in names:
+        try:
+            found[name] = (client.get_collection(name), "server")
+        except PocketBaseError:
+            pass
+    missing = [name for name in names if name not in found]
+    if missing and schema_file.exists():
+        content = json.loads(schema_file.read_text(encoding="utf-8"))
+        entries = content.get("collections", []) if isinstance(content, dict) else content
+        for entry in entries or []:
+            if isinstance(entry, dict) and entry.get("name") in missing:
+                found[str(entry["name"])] = (entry, schema_file.name)
+    return found
+
+
+def derived_record_id(record_id: str, user_id: str) -> str:
+    """Stable PocketBase-shaped id for the copy of `record_id` owned by `user_id`."""
+    return stable_record_id(record_id, user_id)
+
+
+def parse_user_map(pairs: List[str], map_file: Optional[str]) -> Dict[str, str]:
+    """OLD=NEW pairs plus a JSON {"old": "new"} file; raises ValueError on malformed input."""
+    mapping: Dict[str, str] = {}
+    if map_file:
+        data = json.loads(Path(map_file).read_text(encoding="utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError(f"{map_file}: expected a JSON object of old id -> new id")
+        mapping.update({str(k): str(v) for k, v in data.items()})
+    for pair in pairs:
+        old, sep, new = pair.partition("=")
+        if not sep or not old.strip() or not new.strip():
+            raise ValueError(f"expected OLD=NEW, got {pair!r}")
+        mapping[old.strip()] = new.strip()
+    return mapping
+
+
+def prepare_record(
+    record: Dict[str, object],
+    plan: CollectionPlan,
+    user_map: Dict[str, str],
+    to_user: Optional[str],
+    counters: Counters,
+) -> Dict[str, object]:
+    """The request body for one archived record: server keys and files dropped, users remapped."""
+    body = {k: v for k, v in record.items() if k not in DROP_KEYS and k not in plan.file_fields}
+    for name in (*plan.json_fields, *plan.multi_fields):
+        # Parquet archives keep JSON values and lists as text.
+        value = body.get(name)
+        if isinstance(value, str) and (name in plan.json_fields or value.startswith("[")):
+            try:
+                body[name] = json.loads(value)
+            except ValueError:
+                pass
+    moved_to = None
+    for name in plan.user_fields:
+        old = body.get(name)
+        if not isinstance(old, str) or not old:
+            continue
+        new = user_map.get(old) or to_user or old
+        if new != old:
+            body[name] = new
+            moved_to = moved_to or new
+    if moved_to and body.get("id"):
+        body["id"] = derived_record_id(str(body["id"]), moved_to)
+        counters.remapped_users += 1
+    return body
+
+
+def key_values(body: Dict[str, object], key: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple("" if body.get(column) is None else str(body.get(column)) for column in key)
+
+
+async def batch_operations(
+    pb: AsyncPocketBase, plan: CollectionPlan, bodies: List[Dict[str, object]]
+) -> Tuple[List[dict], int]:
+    """
+    Upsert sub-requests for one batch, and how many of them merge into an existing record.
+
+    Each unique key of the collection costs one list request per LOOKUP_CLAUSES records
+    of the batch, so the OR filter stays well under the server's URL limit.
+    """
+    existing: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], str] = {}
+    for key in plan.unique_keys:
+        values = sorted({key_values(body, key) for body in bodies})
+        clauses = [
+            "(" + " && ".join(f"{column} = {quote_filter_value(value)}" for column, value in zip(key, row)) + ")"
+            for row in values
+        ]
+        for start in range(0, len(clauses), LOOKUP_CLAUSES):
+            chunk = clauses[start : start + LOOKUP_CLAUSES]
+            listing = await pb.list_records(
+                plan.name,
+                per_page=len(chunk),
+                filter=" || ".join(chunk),
+                fields=",".join(("id", *key)),
+                skip_total=True,
+                timeout=120,
+            )
+            for item in listing.get("items") or []:
+                existing[(key, key_values(item, key))] = str(item.get("id"))
+    operations: List[dict] = []
+    merged = 0
+    for body in bodies:
+        target = None
+        for key in plan.unique_keys:
+            found = existing.get((key, key_values(body, key)))
+            if found and found != body.get("id"):
+                target = found
+                break
+        if target:
+            merged += 1
+            payload = {k: v for k, v in body.items() if k != "id"}
+            operations.append({"method": "PATCH", "url": records_path(plan.name, target), "body": payload})
+        else:
+            operations.append({"method": "PUT", "url": records_path(plan.name), "body": body})
+    return operations, merged
+
+
+def retryable(exc: PocketBaseError) -> bool:
+    """Unique conflicts (a concurrent writer), throttling and server errors; not other validation errors."""
+    return exc.status is None or exc.status == 429 or exc.status >= 500 or "validation_not_unique" in str(exc)
+
+
+class FileProgress:
+    """Committed records of one file: batches finish out of order, the checkpoint keeps the contiguous prefix."""
+
+    def __init__(self, done: int):
+        self.done = done
+        self._finished: Dict[int, int] = {}
+
+    def complete(self, start: int, count: int) -> None:
+        self._finished[start] = count
+        while self.done in self._finished:
+            self.done += self._finished.pop(self.done)
+
+
+class Checkpoint:
+    """
+    import-checkpoint.json: {"key": {...}, "files": {"ai_notes.jsonl.zst": committed records}}.
+
+    `key` ties it to the target and user mapping; a checkpoint for anything else is refused.
+    """
+
+    def __init__(self, path: Path, key: Dict[str, object]):
+        self.path = path
+        self.key = key
+        self.files: Dict[str, FileProgress] = {}
+        self.saved_at = 0.0
+
+    def load(self) -> None:
+        """Raises RuntimeError when the file belongs to another target or mapping."""
+        if not self.path.exists():
+            return
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        if data.get("key") != self.key:
+            raise RuntimeError(
+                f"{self.path} belongs to another import (target or user mapping differs); use --restart"
+            )
+        self.files = {name: FileProgress(int(done)) for name, done in (data.get("files") or {}).items()}
+
+    def committed(self, name: str) -> int:
+        progress = self.files.get(name)
+        return progress.done if progress else 0
+
+    def progress(self, name: str) -> FileProgress:
+        return self.files.setdefault(name, FileProgress(0))
+
+    def save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".part")
+        data = {"key": self.key, "files": {name: p.done for name, p in self.files.items()}}
+        tmp.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.saved_at = time.time()
+
+    def maybe_save(self) -> None:
+        if time.time() - self.saved_at >= CHECKPOINT_EVERY_SEC:
+            self.save()
+
+
+async def send_batch(
+    pb: AsyncPocketBase,
+    plan: CollectionPlan,
+    bodies: List[Dict[str, object]],
+    start: int,
+    progress: FileProgress,
+    args: argparse.Namespace,
+    checkpoint: Checkpoint,
+    counters: Counters,
+    metrics: RunMetrics,
+) -> None:
+    for attempt in range(args.retries + 1):
+        with metrics.stage("resolve_keys"):
+            operations, merged = await batch_operations(pb, plan, bodies)
+        try:
+            with metrics.stage("pb_batch"):
+                await pb.batch(operations, timeout=300)
+            break
+        except PocketBaseError as exc:
+            if attempt == args.retries or not retryable(exc):
+                raise PocketBaseError(
+                    f"{plan.name} records {start + 1}-{start + len(bodies)}: {exc}", status=exc.status
+                ) from exc
+            counters.retried_batches += 1
+            await asyncio.sleep(min(2 ** attempt, 30))
+    progress.complete(start, len(bodies))
+    counters.batches += 1
+    counters.records += len(bodies)
+    counters.merged_conflicts += merged
+    metrics.done(len(bodies))
+    checkpoint.maybe_save()
+
+
+async def import_file(
+    pb: AsyncPocketBase,
+    window: TaskWindow,
+    plan: CollectionPlan,
+    path: Path,
+    entry: Dict[str, object],
+    user_map: Dict[str, str],
+    to_user: Optional[str],
+    args: argparse.Namespace,
+    checkpoint: Checkpoint,
+    counters: Counters,
+    metrics: RunMetrics,
+) -> None:
+    """Queue the batches of one archive file; they finish in the shared window."""
+    loop = asyncio.get_running_loop()
+    progress = checkpoint.progress(path.name)
+    skip = progress.done
+    expected = int(entry.get("records") or 0)
+    if skip >= expected:
+        print(f"[skip] {path.name}: all {expected} records already imported")
+        counters.skipped_resumed += expected
+        return
+    if not args.no_verify:
+        with metrics.stage("verify"):
+            digest = await loop.run_in_executor(None, file_sha256, path)
+        if digest != entry.get("sha256"):
+            raise RuntimeError(f"{path.name}: sha256 does not match the manifest; the archive is damaged")
+    print(f"[info] {plan.name}: importing {path.name} ({expected} records" + (f", resuming at {skip})" if skip else ")"))
+    counters.skipped_resumed += skip
+
+    records: Iterator[Dict[str, object]] = iter_records(path)
+    try:
+        # Decompression and decoding run off the loop, one batch at a time.
+        await loop.run_in_executor(None, lambda: next(itertools.islice(records, skip, skip), None))
+        offset = skip
+        while True:
+            with metrics.stage("read"):
+                chunk = await loop.run_in_executor(None, lambda: list(itertools.islice(records, args.batch_size)))
+            if not chunk:
+                break
+            bodies = [prepare_record(record, plan, user_map, to_user, counters) for record in chunk]
+            await window.submit(send_batch(pb, plan, bodies, offset, progress, args, checkpoint, counters, metrics))
+            offset += len(chunk)
+    finally:
+        close = getattr(records, "close", None)
+        if close:
+            close()
+    if offset != expected:
+        print(f"[WARN] {path.name}: read {offset} records, manifest says {expected}", file=sys.stderr)
+    counters.files += 1
+
+
+async def import_all(
+    client: PocketBaseClient,
+    args: argparse.Namespace,
+    in_dir: Path,
+    manifest: Dict[str, object],
+    plans: Dict[str, CollectionPlan],
+    user_map: Dict[str, str],
+    to_user: Optional[str],
+    checkpoint: Checkpoint,
+    counters: Counters,
+    metrics: RunMetrics,
+) -> None:
+    http = AsyncHttpClient(
+        default_limit=args.inflight * 2, limits=parse_host_limits(args.host_limit), verify_ssl=not args.insecure
+    )
+    pb = AsyncPocketBase(client, http)
+    metrics.add_probe("connection_replays", lambda: http.stats["replays"])
+    window = TaskWindow(args.inflight)
+    collections = manifest.get("collections") or {}
+    try:
+        try:
+            for name, plan in plans.items():
+                for entry in collections[name].get("files") or []:
+                    await import_file(
+                        pb, window, plan, in_dir / str(entry["path"]), entry, user_map, to_user, args,
+                        checkpoint, counters, metrics,
+                    )
+            await window.drain()
+        except BaseException:
+            # Stop the other batches; whatever committed is in the checkpoint.
+            await window.cancel()
+            raise
+    finally:
+        checkpoint.save()
+        await http.close()
+        print(f"async engine: {http.stats['connections']} connections, peak in-flight {http.peak_inflight}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import an export_user_data.py archive into PocketBase.")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--email", help="PocketBase users collection email (fallback auth)")
+    parser.add_argument("--password", help="PocketBase users collection password (fallback auth)")
+    parser.add_argument("--in", dest="in_dir", required=True, help="Export directory (holds manifest.json)")
+    parser.add_argument("--collections", help="Comma separated collections to import (default: all in the manifest)")
+    parser.add_argument(
+        "--user-map", action="append", default=[], metavar="OLD=NEW", help="Move OLD user's records to NEW (repeatable)"
+    )
+    parser.add_argument("--user-map-file", help='JSON file {"old user id": "new user id", ...}')
+    parser.add_argument("--to-user", help="Move records of every unmapped user to this user id")
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Records per /api/batch request (server max applies)"
+    )
+    parser.add_argument("--inflight", type=int, default=DEFAULT_INFLIGHT, help="Max batches in flight")
+    parser.add_argument(
+        "--host-limit",
+        action="append",
+        default=[],
+        metavar="HOST=N",
+        help="Max connections to HOST (repeatable; default: 2 x --inflight)",
+    )
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Retries of a failed batch")
+    parser.add_argument("--checkpoint", help=f"Checkpoint file (default: {CHECKPOINT_NAME} in --in)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and import everything")
+    parser.add_argument("--no-verify", action="store_true", help="Skip the sha256 check of the archive files")
+    parser.add_argument(
+        "--schema-file",
+        default=str(DEFAULT_SCHEMA_FILE),
+        help="Collection definitions used when the server's cannot be read (user auth)",
+    )
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+    user_email = resolve_value(args.email, "POCKETBASE_TEST_EMAIL", file_env)
+    user_password = resolve_value(args.password, "POCKETBASE_TEST_PASSWORD", file_env)
+
+    if not 0 < args.batch_size <= 1000:
+        print("Error: --batch-size must be 1-1000", file=sys.stderr)
+        return 2
+    if args.inflight <= 0:
+        print("Error: --inflight must be > 0", file=sys.stderr)
+        return 2
+    if args.retries < 0:
+        print("Error: --retries must be >= 0", file=sys.stderr)
+        return 2
+    try:
+        parse_host_limits(args.host_limit)
+        user_map = parse_user_map(args.user_map, args.user_map_file)
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    in_dir = Path(args.in_dir)
+    try:
+        manifest = read_manifest(in_dir)
+    except (OSError, ValueError, RuntimeError) as exc:
+        print(f"Error: cannot read {in_dir / MANIFEST_NAME}: {exc}", file=sys.stderr)
+        return 2
+    exported = manifest.get("collections") or {}
+    for name, error in (manifest.get("errors") or {}).items():
+        print(f"[WARN] {name} was not exported ({error}); it cannot be imported", file=sys.stderr)
+    if args.collections:
+        names = [name.strip() for name in args.collections.split(",") if name.strip()]
+        missing = [name for name in names if name not in exported]
+        if not names or missing:
+            print(f"Error: not in the export: {', '.join(missing) or '<none given>'}", file=sys.stderr)
+            return 2
+    else:
+        names = list(exported)
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="import_user_data")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, user_id = login(client, admin_email, admin_password, user_email, user_password)
+    if not auth_mode:
+        print(
+            "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
+            "or user creds (--email/--password).",
+            file=sys.stderr,
+        )
+        return 2
+    # A user may only write its own records.
+    to_user: Optional[str] = args.to_user or user_id
+    if auth_mode == "user" and (user_map or (args.to_user and args.to_user != user_id)):
+        print("Error: --user-map/--to-user need admin credentials", file=sys.stderr)
+        return 2
+
+    definitions = load_definitions(client, names, Path(args.schema_file))
+    plans: Dict[str, CollectionPlan] = {}
+    for name in names:
+        definition, source = definitions.get(name, (None, "built-in defaults"))
+        plans[name] = plan_collection(name, definition)
+        keys = ", ".join("(" + ", ".join(key) + ")" for key in plans[name].unique_keys) or "none"
+        print(f"[info] {name}: schema from {source}, user fields={','.join(plans[name].user_fields) or '-'}, unique keys={keys}")
+
+    checkpoint = Checkpoint(
+        Path(args.checkpoint) if args.checkpoint else in_dir / CHECKPOINT_NAME,
+        {
+            "target": base_url,
+            "export_created": manifest.get("created"),
+            "user_map": dict(sorted(user_map.items())),
+            "to_user": to_user,
+        },
+    )
+    if not args.restart:
+        try:
+            checkpoint.load()
+        except (OSError, ValueError, RuntimeError) as exc:
+            print(f"Error: checkpoint: {exc}", file=sys.stderr)
+            return 2
+
+    print(
+        f"Start import: pb={base_url}, in={in_dir}, auth={auth_mode}/{client.auth_source}, "
+        f"to_user={to_user or '<unchanged>'}, user_map={len(user_map)}, batch_size={args.batch_size}, "
+        f"inflight={args.inflight}, collections={','.join(names)}, checkpoint={checkpoint.path}"
+    )
+
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    metrics.set_total(
+        sum(
+            max(0, int(entry.get("records") or 0) - checkpoint.committed(str(entry["path"])))
+            for name in names
+            for entry in exported[name].get("files") or []
+        )
+    )
+    try:
+        exporter_from_args(metrics, "import_user_data", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    try:
+        run_cancellable(
+            import_all(client, args, in_dir, manifest, plans, user_map, to_user, checkpoint, counters, metrics)
+        )
+    except asyncio.CancelledError:
+        return metrics.finish_run(
+            f"Interrupted; rerun to resume from {checkpoint.path}.",
+            counters,
+            130,
+            args.metrics_json,
+            script="import_user_data",
+            rate_of="records",
+        )
+    except Exception as exc:  # noqa: BLE001
+        print_fatal_error(exc)
+        return metrics.finish_run(
+            f"Failed; rerun to resume from {checkpoint.path}.",
+            counters,
+            1,
+            args.metrics_json,
+            script="import_user_data",
+            rate_of="records",
+        )
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="import_user_data", rate_of="records")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,746 @@
+#!/usr/bin/env python3
+"""
+Migrate the ai_notes Qdrant vectors to fewer dimensions (e.g. 1024 -> 512/256) behind an alias.
+
+Smaller vectors cut Qdrant's vector memory and the per-candidate scoring cost
+of every search by the same factor. What it does:
+1) Fills a shadow collection (default ALIAS_<dims>d) from the live one:
+   - truncate: keeps the first --target-dims values of each stored vector and
+     renormalizes (Matryoshka-trained models such as text-embedding-v3/v4 put
+     the most information first); no embedding calls, no PocketBase access
+   - reembed:  re-embeds each note (text rebuilt from ai_notes, as the
+     backfill does) with `dimensions` = --target-dims
+   Points keep their ids and payloads, plus source_vector_sha1, the digest of
+   the live vector they were made from. Points already in the shadow with the
+   same digest are skipped, so an interrupted fill resumes and a later run only
+   copies the notes written or re-embedded since; shadow points whose live
+   point is gone are deleted.
+2) Measures recall@k of the shadow against the full-size collection: for
+   --sample-queries stored notes (each held out of its own results), or for the
+   texts of --queries, the top-k of both collections are compared, filtered per
+   user like the hooks' search. The vector memory of both sizes is reported.
+3) With --swap, and only when every recall@k reaches --min-recall (or with
+   --force-swap), tops up the shadow (the same pass: new and changed points
+   copied, deleted ones removed) and repoints the alias in one
+   /collections/aliases request, so searches move over atomically. Writes that
+   land between that last pass and the swap are not carried over; pause the
+   hooks' Qdrant writes around --swap when that matters. The old collection is
+   kept; --swap-to OLD repoints the alias back.
+
+The alias is what pb_hooks and the backfill must use as QDRANT_COLLECTION /
+--collection. If the live collection is not behind an alias yet, pass a new
+--alias name: the swap creates it, then point QDRANT_COLLECTION at it. After
+the swap, set DASHSCOPE_EMBED_DIM to --target-dims for the hooks (and
+--dimensions for the backfill), otherwise new notes fail the dimension check.
+
+Usage examples:
+  python3 scripts/migrate_embedding_dims.py --target-dims 512
+  python3 scripts/migrate_embedding_dims.py --collection ai_notes --alias ai_notes_live --target-dims 256 --swap
+  python3 scripts/migrate_embedding_dims.py --target-dims 256 --mode reembed --queries eval_queries.jsonl --k 5,10
+  python3 scripts/migrate_embedding_dims.py --alias ai_notes_live --swap-to ai_notes
+
+Optional env/.env keys:
+  QDRANT_URL
+  POCKETBASE_URL, POCKETBASE_ADMIN_EMAIL, POCKETBASE_ADMIN_PASSWORD (reembed)
+  DASHSCOPE_API_KEY (reembed, --queries)
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+
+import http_trace
+from backfill_ai_notes_to_qdrant import (
+    DEFAULT_COLLECTION,
+    DEFAULT_EMBEDDING_URL,
+    DEFAULT_MODEL,
+    build_text_to_embed,
+    embed_texts,
+    upsert_points,
+)
+from embedding_backends import BACKENDS, DEFAULT_EMBED_TIMEOUT_SEC, EmbeddingBackend, ServiceError, make_backend
+from hedging import Hedger
+from openmetrics import exporter_from_args
+from pb_client import PocketBaseClient, load_env_file, login, make_session, quote_filter_value, resolve_value
+from run_metrics import RunMetrics, add_run_args, failure_reason, validate_run_args
+
+
+MODES = ("truncate", "reembed")
+DEFAULT_SCROLL_BATCH = 256
+DEFAULT_SAMPLE_QUERIES = 200
+DEFAULT_K = "5,10"
+DEFAULT_MIN_RECALL = 0.95
+DEFAULT_EMBED_WORKERS = 4
+# Payload key of shadow points: vector_digest() of the live vector they were made from.
+SOURCE_DIGEST_KEY = "source_vector_sha1"
+
+
+@dataclass
+class Counters:
+    scanned: int = 0
+    already_present: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    missing_notes: int = 0
+    refreshed: int = 0
+    pruned: int = 0
+    failed: int = 0
+    queries: int = 0
+
+
+def qdrant_call(
+    session: requests.Session,
+    method: str,
+    url: str,
+    what: str,
+    body: Optional[dict] = None,
+    timeout: float = 60,
+    ok_statuses: Tuple[int, ...] = (200,),
+):
+    """One Qdrant REST call; returns `result` of the answer, raises ServiceError otherwise."""
+    resp = session.request(
+        method, url, data=json.dumps(body) if body is not None else None, headers={"Content-Type": "application/json"}, timeout=timeout
+    )
+    if resp.status_code not in ok_statuses:
+        raise ServiceError(f"qdrant {what} failed: {resp.status_code} {resp.text[:500]}", resp.status_code)
+    return (resp.json() if resp.text else {}).get("result")
+
+
+def collection_url(qdrant_url: str, collection: str) -> str:
+    return f"{qdrant_url}/collections/{quote(collection)}"
+
+
+def list_aliases(session: requests.Session, qdrant_url: str) -> Dict[str, str]:
+    result = qdrant_call(session, "GET", f"{qdrant_url}/aliases", "list aliases") or {}
+    return {str(a.get("alias_name")): str(a.get("collection_name")) for a in result.get("aliases") or []}
+
+
+def collection_info(session: requests.Session, qdrant_url: str, collection: str) -> Optional[dict]:
+    """GET /collections/NAME (NAME may be an alias); None when it does not exist."""
+    resp = session.get(collection_url(qdrant_url, collection), timeout=60)
+    if resp.status_code == 404:
+        return None
+    if resp.status_code != 200:
+        raise ServiceError(f"qdrant get collection {collection} failed: {resp.status_code} {resp.text[:500]}", resp.status_code)
+    return (resp.json() if resp.text else {}).get("result") or {}
+
+
+def vector_params(info: dict) -> Tuple[int, str]:
+    """(size, distance) of a collection's single unnamed vector; raises RuntimeError for named vectors."""
+    vectors = ((info.get("config") or {}).get("params") or {}).get("vectors") or {}
+    if "size" not in vectors:
+        raise RuntimeError("collections with named vectors are not supported")
+    return int(vectors["size"]), str(vectors.get("distance") or "Cosine")
+
+
+def count_points(session: requests.Session, qdrant_url: str, collection: str) -> int:
+    result = qdrant_call(session, "POST", collection_url(qdrant_url, collection) + "/points/count", "count", {"exact": True})
+    return int((result or {}).get("count") or 0)
+
+
+def scroll_points(
+    session: requests.Session,
+    qdrant_url: str,
+    collection: str,
+    limit: int,
+    offset,
+    with_vector: bool,
+    with_payload=True,
+) -> Tuple[List[dict], object]:
+    body = {"limit": limit, "with_payload": with_payload, "with_vector": with_vector}
+    if offset is not None:
+        body["offset"] = offset
+    result = qdrant_call(session, "POST", collection_url(qdrant_url, collection) + "/points/scroll", "scroll", body) or {}
+    return result.get("points") or [], result.get("next_page_offset")
+
+
+def retrieve_points(
+    session: requests.Session, qdrant_url: str, collection: str, ids: List[object], with_vector: bool
+) -> List[dict]:
+    if not ids:
+        return []
+    body = {"ids": ids, "with_payload": True, "with_vector": with_vector}
+    return qdrant_call(session, "POST", collection_url(qdrant_url, collection) + "/points", "retrieve", body) or []
+
+
+def search_ids(
+    session: requests.Session, qdrant_url: str, collection: str, vector: List[float], limit: int, user_id: Optional[str]
+) -> List[object]:
+    body: Dict[str, object] = {"vector": vector, "limit": limit, "with_payload": False}
+    if user_id:
+        body["filter"] = {"must": [{"key": "user_id", "match": {"value": user_id}}]}
+    hits = qdrant_call(session, "POST", collection_url(qdrant_url, collection) + "/points/search", "search", body) or []
+    return [hit.get("id") for hit in hits]
+
+
+def vector_digest(vector: object) -> str:
+    """What a shadow point remembers of the live vector it was made from."""
+    return hashlib.sha1(json.dumps(vector, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def truncate_vector(vector: List[float], dims: int) -> List[float]:
+    """First `dims` values scaled back to unit length (Matryoshka truncation)."""
+    head = [float(v) for v in vector[:dims]]
+    norm = math.sqrt(sum(v * v for v in head))
+    return [v / norm for v in head] if norm > 0 else head
+
+
+def recall_at(baseline: List[object], candidate: List[object], k: int) -> Optional[float]:
+    """Share of the baseline's top-k that the candidate's top-k also returns; None without baseline hits."""
+    expected = set(baseline[:k])
+    if not expected:
+        return None
+    return len(expected & set(candidate[:k])) / len(expected)
+
+
+def vector_memory_mb(points: int, dims: int) -> float:
+    """float32 vector payload only; the HNSW graph is about the same size at any dimension."""
+    return points * dims * 4 / 1048576
+
+
+def shadow_payload(point: dict) -> dict:
+    return {**(point.get("payload") or {}), SOURCE_DIGEST_KEY: point["digest"]}
+
+
+class Migration:
+    def __init__(
+        self,
+        args: argparse.Namespace,
+        session: requests.Session,
+        qdrant_url: str,
+        source: str,
+        shadow: str,
+        counters: Counters,
+        metrics: RunMetrics,
+        client: Optional[PocketBaseClient] = None,
+        backend: Optional[EmbeddingBackend] = None,
+        baseline_backend: Optional[EmbeddingBackend] = None,
+        hedger: Optional[Hedger] = None,
+    ):
+        self.args = args
+        self.session = session
+        self.qdrant_url = qdrant_url
+        self.source = source
+        self.shadow = shadow
+        self.counters = counters
+        self.metrics = metrics
+        self.client = client
+        self.backend = backend
+        self.baseline_backend = baseline_backend
+        self.hedger = hedger
+
+    # -- fill ------------------------------------------------------------------
+
+    def fill(self) -> None:
+        """Copy every source point missing from the shadow or changed since it was copied, at the target size."""
+        args = self.args
+        offset = None
+        executor = ThreadPoolExecutor(max_workers=args.embed_workers) if args.mode == "reembed" else None
+        try:
+            while True:
+                with self.metrics.stage("qdrant_scroll"):
+                    points, offset = scroll_points(
+                        self.session, self.qdrant_url, self.source, args.scroll_batch, offset, True
+                    )
+                if not points:
+                    break
+                self.counters.scanned += len(points)
+                for point in points:
+                    point["digest"] = vector_digest(point.get("vector"))
+                missing = points
+                if not args.refill:
+                    with self.metrics.stage("qdrant_retrieve"):
+                        present = retrieve_points(self.session, self.qdrant_url, self.shadow, [p["id"] for p in points], False)
+                    copied = {p.get("id"): (p.get("payload") or {}).get(SOURCE_DIGEST_KEY) for p in present}
+                    missing = [p for p in points if copied.get(p["id"], "") != p["digest"]]
+                    self.counters.refreshed += sum(1 for p in missing if p["id"] in copied)
+                    self.counters.already_present += len(points) - len(missing)
+                    self.metrics.done(len(points) - len(missing))
+                if missing:
+                    shadow_points = self.truncated(missing) if args.mode == "truncate" else self.reembedded(missing, executor)
+                    self.upsert(shadow_points)
+                if offset is None:
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    def prune(self) -> None:
+        """Delete shadow points whose live point is gone (notes deleted since they were copied)."""
+        offset = None
+        while True:
+            with self.metrics.stage("qdrant_scroll"):
+                points, offset = scroll_points(
+                    self.session, self.qdrant_url, self.shadow, self.args.scroll_batch, offset, False, with_payload=False
+                )
+            ids = [p["id"] for p in points]
+            if ids:
+                with self.metrics.stage("qdrant_retrieve"):
+                    live = {p.get("id") for p in retrieve_points(self.session, self.qdrant_url, self.source, ids, False)}
+                gone = [point_id for point_id in ids if point_id not in live]
+                if gone:
+                    with self.metrics.stage("qdrant_delete"):
+                        qdrant_call(
+                            self.session,
+                            "POST",
+                            collection_url(self.qdrant_url, self.shadow) + "/points/delete?wait=true",
+                            "delete",
+                            {"points": gone},
+                        )
+                    self.counters.pruned += len(gone)
+            if offset is None:
+                break
+
+    def truncated(self, points: List[dict]) -> List[dict]:
+        out = []
+        with self.metrics.stage("truncate"):
+            for point in points:
+                vector = point.get("vector")
+                if not isinstance(vector, list):
+                    raise RuntimeError(f"point {point.get('id')}: named or missing vector; only unnamed vectors are supported")
+                out.append({"id": point["id"], "vector": truncate_vector(vector, self.args.target_dims), "payload": shadow_payload(point)})
+        self.metrics.done(len(points))
+        return out
+
+    def reembedded(self, points: List[dict], executor: ThreadPoolExecutor) -> List[dict]:
+        """Rebuild each point's text from its ai_notes record and embed it at the target size."""
+        by_pb_id = {str((p.get("payload") or {}).get("pb_id") or ""): p for p in points}
+        by_pb_id.pop("", None)
+        with self.metrics.stage("pb_list"):
+            listing = self.client.list_records(
+                "ai_notes",
+                per_page=max(len(by_pb_id), 1),
+                filter=" || ".join(f"id = {quote_filter_value(pb_id)}" for pb_id in by_pb_id) or None,
+                skip_total=True,
+                timeout=60,
+            )
+        texts: List[Tuple[dict, str]] = []
+        for record in listing.get("items") or []:
+            point = by_pb_id.pop(str(record.get("id")), None)
+            text = build_text_to_embed(record, max_chars=self.args.max_chars)
+            if point is not None and text.strip():
+                texts.append((point, text))
+        # Points whose note was deleted (or has no pb_id) are not carried over.
+        dropped = len(points) - len(texts)
+        self.counters.missing_notes += dropped
+        self.metrics.done(dropped)
+
+        size = self.backend.batch_size
+        batches = [texts[i : i + size] for i in range(0, len(texts), size)]
+        out: List[dict] = []
+        for batch, future in zip(batches, [executor.submit(self.embed_batch, b) for b in batches]):
+            try:
+                vectors = future.result()
+            except Exception as exc:  # noqa: BLE001
+                self.counters.failed += len(batch)
+                self.metrics.failure(failure_reason("embed", exc))
+                self.metrics.done(len(batch))
+                print(f"[WARN] embedding of {len(batch)} notes failed: {exc}", file=sys.stderr)
+                continue
+            self.counters.embedded += len(batch)
+            self.metrics.done(len(batch))
+            for (point, _), vector in zip(batch, vectors):
+                out.append({"id": point["id"], "vector": vector, "payload": shadow_payload(point)})
+        return out
+
+    def embed_batch(self, batch: List[Tuple[dict, str]]) -> List[List[float]]:
+        with self.metrics.stage("embed_call"):
+            return embed_texts(self.backend, self.hedger, [text for _, text in batch])
+
+    def upsert(self, points: List[dict]) -> None:
+        for start in range(0, len(points), self.args.batch_size):
+            chunk = points[start : start + self.args.batch_size]
+            try:
+                upsert_points(self.session, self.qdrant_url, self.shadow, chunk, verify_ssl=not self.args.insecure, metrics=self.metrics)
+            except Exception as exc:  # noqa: BLE001
+                # A later run retries them: the fill only skips points already in the shadow.
+                self.counters.failed += len(chunk)
+                self.metrics.failure(failure_reason("upsert", exc))
+                print(f"[WARN] upsert of {len(chunk)} points failed: {exc}", file=sys.stderr)
+                continue
+            self.counters.upserted += len(chunk)
+
+    # -- recall ----------------------------------------------------------------
+
+    def sampled_queries(self) -> List[Tuple[str, List[float], List[float], Optional[str], Optional[object]]]:
+        """Reservoir-sample stored points; each one queries both collections with its own vectors."""
+        rng = random.Random(self.args.seed)
+        reservoir: List[dict] = []
+        seen = 0
+        offset = None
+        while True:
+            with self.metrics.stage("qdrant_scroll"):
+                points, offset = scroll_points(
+                    self.session, self.qdrant_url, self.shadow, 1024, offset, False, with_payload=["user_id"]
+                )
+            for point in points:
+                seen += 1
+                if len(reservoir) < self.args.sample_queries:
+                    reservoir.append(point)
+                else:
+                    slot = rng.randrange(seen)
+                    if slot < self.args.sample_queries:
+                        reservoir[slot] = point
+            if offset is None or not points:
+                break
+        ids = [p["id"] for p in reservoir]
+        baseline = {p["id"]: p for p in retrieve_points(self.session, self.qdrant_url, self.source, ids, True)}
+        shadow = {p["id"]: p for p in retrieve_points(self.session, self.qdrant_url, self.shadow, ids, True)}
+        queries = []
+        for point_id in ids:
+            if point_id in baseline and point_id in shadow:
+                user_id = str((shadow[point_id].get("payload") or {}).get("user_id") or "") or None
+                queries.append((str(point_id), baseline[point_id]["vector"], shadow[point_id]["vector"], user_id, point_id))
+        return queries
+
+    def file_queries(self, path: Path) -> List[Tuple[str, List[float], List[float], Optional[str], Optional[object]]]:
+        """--queries: JSONL {"text": ..., "user_id": ...} or one query text per line."""
+        entries: List[Tuple[str, Optional[str]]] = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                entries.append((str(item.get("text") or ""), str(item.get("user_id") or "") or None))
+            else:
+                entries.append((line, None))
+        entries = [(text, user) for text, user in entries if text]
+        queries = []
+        size = self.baseline_backend.batch_size
+        for start in range(0, len(entries), size):
+            chunk = entries[start : start + size]
+            texts = [text for text, _ in chunk]
+            with self.metrics.stage("embed_call"):
+                baseline = embed_texts(self.baseline_backend, self.hedger, texts)
+                if self.args.mode == "truncate":
+                    candidate = [truncate_vector(v, self.args.target_dims) for v in baseline]
+                else:
+                    candidate = embed_texts(self.backend, self.hedger, texts)
+            for (text, user), b, c in zip(chunk, baseline, candidate):
+                queries.append((text[:40], b, c, user if self.args.per_user else None, None))
+        return queries
+
+    def measure_recall(self, ks: List[int]) -> Dict[str, object]:
+        if self.args.queries:
+            queries = self.file_queries(Path(self.args.queries))
+        else:
+            queries = self.sampled_queries()
+        limit = max(ks) + 1  # room for the held-out query point
+        sums = {k: 0.0 for k in ks}
+        counted = {k: 0 for k in ks}
+        worst: List[Tuple[float, str]] = []
+        for label, base_vector, shadow_vector, user_id, exclude in queries:
+            user_filter = user_id if self.args.per_user else None
+            with self.metrics.stage("search_baseline"):
+                base = search_ids(self.session, self.qdrant_url, self.source, base_vector, limit, user_filter)
+            with self.metrics.stage("search_shadow"):
+                cand = search_ids(self.session, self.qdrant_url, self.shadow, shadow_vector, limit, user_filter)
+            base = [i for i in base if i != exclude]
+            cand = [i for i in cand if i != exclude]
+            self.counters.queries += 1
+            for k in ks:
+                value = recall_at(base, cand, k)
+                if value is not None:
+                    sums[k] += value
+                    counted[k] += 1
+            value = recall_at(base, cand, max(ks))
+            if value is not None:
+                worst.append((value, label))
+        recall = {f"recall@{k}": round(sums[k] / counted[k], 4) if counted[k] else None for k in ks}
+        worst.sort()
+        return {"queries": len(queries), **recall, "worst": [{"query": q, "recall": round(r, 4)} for r, q in worst[:5]]}
+
+
+def swap_alias(session: requests.Session, qdrant_url: str, alias: str, target: str, aliases: Dict[str, str]) -> Optional[str]:
+    """Point `alias` at `target` in one request; returns the collection it pointed at before."""
+    previous = aliases.get(alias)
+    actions: List[dict] = []
+    if previous is not None:
+        actions.append({"delete_alias": {"alias_name": alias}})
+    actions.append({"create_alias": {"collection_name": target, "alias_name": alias}})
+    qdrant_call(session, "POST", f"{qdrant_url}/collections/aliases", "update aliases", {"actions": actions})
+    return previous
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Migrate Qdrant ai_notes vectors to fewer dimensions behind an alias.")
+    parser.add_argument("--qdrant-url", help="Qdrant base URL, e.g. http://127.0.0.1:6333")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Live collection or alias holding the full-size vectors")
+    parser.add_argument("--alias", help="Alias the hooks search through, repointed by --swap (default: --collection)")
+    parser.add_argument("--target-dims", type=int, help="Dimensions of the new vectors, e.g. 512 or 256")
+    parser.add_argument("--mode", choices=MODES, default="truncate", help="truncate: cut + renormalize; reembed: embed again")
+    parser.add_argument("--shadow", help="Shadow collection (default: ALIAS_<dims>d)")
+    parser.add_argument("--refill", action="store_true", help="Rewrite points already in the shadow")
+    parser.add_argument("--skip-fill", action="store_true", help="Only measure (and swap) an already filled shadow")
+    parser.add_argument("--scroll-batch", type=int, default=DEFAULT_SCROLL_BATCH, help="Points per Qdrant scroll page")
+    parser.add_argument("--batch-size", type=int, default=64, help="Qdrant upsert batch size")
+    parser.add_argument("--k", default=DEFAULT_K, help="Comma separated k values for recall@k")
+    parser.add_argument(
+        "--sample-queries", type=int, default=DEFAULT_SAMPLE_QUERIES, help="Stored notes used as held-out queries (0: skip)"
+    )
+    parser.add_argument("--queries", help='Query set instead of sampled notes: JSONL {"text", "user_id"} or text lines')
+    parser.add_argument("--per-user", default="true", help="Filter searches by the query's user_id, like the hooks (true/false)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the query sample")
+    parser.add_argument("--min-recall", type=float, default=DEFAULT_MIN_RECALL, help="Every recall@k must reach this to --swap")
+    parser.add_argument("--swap", action="store_true", help="Repoint --alias at the shadow when the recall gate passes")
+    parser.add_argument("--force-swap", action="store_true", help="Swap even below --min-recall")
+    parser.add_argument("--swap-to", metavar="COLLECTION", help="Only repoint --alias at COLLECTION (e.g. roll back) and exit")
+    parser.add_argument("--url", help="PocketBase base URL (reembed)")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--dashscope-api-key", help="Alibaba DashScope API key")
+    parser.add_argument("--embedding-backend", choices=BACKENDS, default="openai", help="Backend for reembed and --queries")
+    parser.add_argument("--embedding-url", default=DEFAULT_EMBEDDING_URL, help="Embedding API URL")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Embedding model (the one the live vectors came from)")
+    parser.add_argument("--onnx-model", help="onnx backend: directory with model.onnx and tokenizer.json")
+    parser.add_argument("--embed-batch", type=int, default=0, help="Texts per embedding call (0: backend default)")
+    parser.add_argument("--embed-workers", type=int, default=DEFAULT_EMBED_WORKERS, help="reembed: embedding calls in flight")
+    parser.add_argument("--embed-timeout", type=float, default=DEFAULT_EMBED_TIMEOUT_SEC, help="Max embedding deadline, seconds")
+    parser.add_argument("--max-chars", type=int, default=6000, help="Max chars for embedding input")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    parser.add_argument("--report", help="Write the recall/memory report to this JSON file")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    file_env = load_env_file(Path(".env"))
+    qdrant_url = (resolve_value(args.qdrant_url, "QDRANT_URL", file_env) or "http://127.0.0.1:6333").rstrip("/")
+    alias = args.alias or args.collection
+    verify_ssl = not args.insecure
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="migrate_embedding_dims")
+    session = make_session(pool_size=max(args.embed_workers, 1) + 2, verify_ssl=verify_ssl)
+
+    if args.swap_to:
+        try:
+            aliases = list_aliases(session, qdrant_url)
+            if collection_info(session, qdrant_url, args.swap_to) is None:
+                print(f"Error: collection {args.swap_to} does not exist", file=sys.stderr)
+                return 2
+            previous = swap_alias(session, qdrant_url, alias, args.swap_to, aliases)
+        except (requests.RequestException, ServiceError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        print(f"Alias {alias}: {previous or '<none>'} -> {args.swap_to}")
+        return 0
+
+    try:
+        ks = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    except ValueError:
+        ks = []
+    if not ks or ks[0] <= 0:
+        print("Error: --k must list positive integers", file=sys.stderr)
+        return 2
+    if not args.target_dims or args.target_dims <= 0:
+        print("Error: --target-dims must be > 0", file=sys.stderr)
+        return 2
+    if args.scroll_batch <= 0 or args.batch_size <= 0 or args.embed_workers <= 0 or args.sample_queries < 0:
+        print("Error: --scroll-batch, --batch-size and --embed-workers must be > 0, --sample-queries >= 0", file=sys.stderr)
+        return 2
+    if not 0 <= args.min_recall <= 1:
+        print("Error: --min-recall must be between 0 and 1", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+    per_user = str(args.per_user).strip().lower() in ("1", "true", "yes", "y", "on")
+    args.per_user = per_user
+
+    try:
+        aliases = list_aliases(session, qdrant_url)
+        source_info = collection_info(session, qdrant_url, args.collection)
+        if source_info is None:
+            print(f"Error: Qdrant collection {args.collection} does not exist", file=sys.stderr)
+            return 2
+        source = aliases.get(args.collection, args.collection)
+        source_dims, distance = vector_params(source_info)
+    except (requests.RequestException, ServiceError, RuntimeError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    if args.swap and alias not in aliases and collection_info(session, qdrant_url, alias) is not None:
+        print(
+            f"Error: {alias} is a collection, not an alias; pass a new --alias (e.g. {alias}_live) and point "
+            "QDRANT_COLLECTION at it after the swap",
+            file=sys.stderr,
+        )
+        return 2
+    if args.target_dims >= source_dims:
+        print(f"Error: --target-dims must be below the live size ({source_dims})", file=sys.stderr)
+        return 2
+    shadow = args.shadow or f"{alias}_{args.target_dims}d"
+    if shadow == source:
+        print("Error: --shadow must differ from the live collection", file=sys.stderr)
+        return 2
+
+    needs_embedding = args.mode == "reembed" or bool(args.queries)
+    api_key = resolve_value(args.dashscope_api_key, "DASHSCOPE_API_KEY", file_env)
+    if needs_embedding and args.embedding_backend == "openai" and not api_key:
+        print("Error: missing DashScope API key. Use --dashscope-api-key or DASHSCOPE_API_KEY.", file=sys.stderr)
+        return 2
+
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    client: Optional[PocketBaseClient] = None
+    if args.mode == "reembed" and not args.skip_fill:
+        base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+        if not base_url:
+            print("Error: reembed needs PocketBase for the note texts. Use --url or POCKETBASE_URL.", file=sys.stderr)
+            return 2
+        client = PocketBaseClient(base_url.rstrip("/"), verify_ssl=verify_ssl)
+        admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+        admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+        auth_mode, _ = login(client, admin_email, admin_password, None, None)
+        if auth_mode != "admin":
+            print("Error: reembed reads every user's notes and needs admin creds (--admin-email/--admin-password).", file=sys.stderr)
+            return 2
+        metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+
+    backend = baseline_backend = None
+    hedger = Hedger(max_deadline=args.embed_timeout)
+    metrics.add_finish_hook(hedger.close)
+    if needs_embedding:
+        try:
+            common = dict(
+                batch_size=args.embed_batch,
+                url=args.embedding_url,
+                api_key=api_key or "",
+                model=args.model,
+                onnx_model=args.onnx_model or "",
+                session=session,
+                verify_ssl=verify_ssl,
+                metrics=metrics,
+            )
+            backend = make_backend(args.embedding_backend, args.target_dims, **common)
+            if args.queries:
+                baseline_backend = make_backend(args.embedding_backend, source_dims, **common)
+        except (ValueError, RuntimeError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+        for built, dims in ((backend, args.target_dims), (baseline_backend, source_dims)):
+            if built is not None:
+                metrics.add_finish_hook(built.close)
+                if built.dimensions != dims:
+                    print(f"Error: {built.describe()} produces {built.dimensions}-dim vectors, need {dims}", file=sys.stderr)
+                    return 2
+
+    try:
+        shadow_info = collection_info(session, qdrant_url, shadow)
+        if shadow_info is None:
+            qdrant_call(
+                session, "PUT", collection_url(qdrant_url, shadow), "create collection",
+                {"vectors": {"size": args.target_dims, "distance": distance}},
+            )
+            print(f"Created shadow collection {shadow} ({args.target_dims}d, {distance})")
+        elif vector_params(shadow_info)[0] != args.target_dims:
+            print(f"Error: shadow {shadow} holds {vector_params(shadow_info)[0]}-dim vectors, not {args.target_dims}", file=sys.stderr)
+            return 2
+        source_points = count_points(session, qdrant_url, source)
+    except (requests.RequestException, ServiceError, RuntimeError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+    print(
+        f"Start migration: qdrant={qdrant_url}, live={source} ({source_dims}d, {source_points} points), "
+        f"shadow={shadow} ({args.target_dims}d), alias={alias} -> {aliases.get(alias, '<none>')}, mode={args.mode}"
+        + (f", embedding={backend.describe()}" if backend else "")
+    )
+    try:
+        exporter_from_args(metrics, "migrate_embedding_dims", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    migration = Migration(args, session, qdrant_url, source, shadow, counters, metrics, client, backend, baseline_backend, hedger)
+    report: Dict[str, object] = {
+        "live": source,
+        "shadow": shadow,
+        "alias": alias,
+        "mode": args.mode,
+        "source_dims": source_dims,
+        "target_dims": args.target_dims,
+        "points": source_points,
+        "vector_memory_mb": {
+            str(source_dims): round(vector_memory_mb(source_points, source_dims), 1),
+            str(args.target_dims): round(vector_memory_mb(source_points, args.target_dims), 1),
+        },
+    }
+    try:
+        if not args.skip_fill:
+            metrics.set_total(source_points)
+            migration.fill()
+            migration.prune()
+            print(
+                f"[ok] fill: {counters.upserted} points written ({counters.refreshed} changed since copied), "
+                f"{counters.already_present} already present, {counters.pruned} deleted"
+            )
+        if args.queries or args.sample_queries:
+            recall = migration.measure_recall(ks)
+            report["recall"] = recall
+            print(f"[ok] recall over {recall['queries']} queries: " + ", ".join(f"{k}={recall[k]}" for k in recall if k.startswith("recall@")))
+        print(
+            f"[info] vector memory: {source_dims}d {report['vector_memory_mb'][str(source_dims)]} MB -> "
+            f"{args.target_dims}d {report['vector_memory_mb'][str(args.target_dims)]} MB"
+        )
+        status = 0
+        if args.swap:
+            values = [v for k, v in (report.get("recall") or {}).items() if k.startswith("recall@")]
+            passed = bool(values) and all(v is not None and v >= args.min_recall for v in values)
+            if not passed and not args.force_swap:
+                print(f"[WARN] recall below --min-recall {args.min_recall} (or not measured); alias not swapped", file=sys.stderr)
+                status = 1
+            else:
+                # Catch up on what the hooks wrote, re-embedded or deleted in the live collection since the fill.
+                written, pruned = counters.upserted, counters.pruned
+                migration.fill()
+                migration.prune()
+                print(f"[ok] top-up: {counters.upserted - written} points written, {counters.pruned - pruned} deleted")
+                previous = swap_alias(session, qdrant_url, alias, shadow, list_aliases(session, qdrant_url))
+                report["swapped_from"] = previous
+                print(f"[ok] alias {alias}: {previous or '<none>'} -> {shadow}")
+                print(f"     set DASHSCOPE_EMBED_DIM={args.target_dims} for pb_hooks (backfill: --dimensions {args.target_dims})")
+                print(f"     roll back with: --alias {alias} --swap-to {previous or source}")
+    except KeyboardInterrupt:
+        return metrics.finish_run(
+            "Interrupted; rerun to resume the fill.",
+            counters,
+            130,
+            args.metrics_json,
+            script="migrate_embedding_dims",
+            extra={"report": report},
+        )
+    except Exception as exc:  # noqa: BLE001
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return metrics.finish_run(
+            "Failed.", counters, 1, args.metrics_json, script="migrate_embedding_dims", extra={"report": report}
+        )
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote report to {args.report}")
+    if counters.failed and status == 0:
+        status = 1
+    return metrics.finish_run(
+        "Done." if status == 0 else "Done with problems.",
+        counters,
+        status,
+        args.metrics_json,
+        script="migrate_embedding_dims",
+        extra={"report": report},
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
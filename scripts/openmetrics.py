@@ -0,0 +1,272 @@
+"""
+Prometheus / OpenMetrics export of a RunMetrics (run_metrics.py) for cron jobs.
+
+`MetricsExporter` can
+- rewrite a textfile every `interval` seconds and once more at exit, for the
+  node_exporter textfile collector (--collector.textfile.directory; the file
+  must end in .prom). It is replaced atomically, so a scrape never sees half a file.
+- serve GET /metrics on a local port while the run lasts. Clients sending
+  `Accept: application/openmetrics-text` get OpenMetrics, others get the
+  Prometheus text format.
+
+Exported families (prefix `booxreader_`, every sample labelled job="<script>"):
+  notes_processed_total                items finished (processed or skipped)
+  notes_candidates                     totalItems reported by PocketBase
+  notes_total{state}                   the script's end-of-run counters
+  stage_duration_seconds{stage}        histogram per stage (stage="embed" is embedding latency)
+  <distribution>                       histograms of values, e.g. upsert_batch_size
+  failures_total{reason}               failures by reason (e.g. embed_http_429)
+  <probe>_total                        counters read from clients, e.g. pb_reauth_retries_total
+  queue_depth{queue}                   current queue depth gauges
+  throughput_items_per_second{window}  sliding-window throughput
+  last_success_timestamp_seconds       unix time of the last successful item
+  run_start_timestamp_seconds, run_exit_status (-1 while running)
+
+Histogram buckets are derived from the log-bucketed RunMetrics histograms, so a
+bucket boundary can be off by up to one 4% step.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from run_metrics import RATE_WINDOWS_SEC, Histogram, RunMetrics
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+PREFIX = "booxreader_"
+DEFAULT_WRITE_INTERVAL_SEC = 15
+STAGE_BUCKETS_SEC = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+VALUE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Family:
+    def __init__(self, name: str, kind: str, help_text: str):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+
+    def add(self, suffix: str, labels: Dict[str, str], value: float) -> None:
+        self.samples.append((suffix, labels, value))
+
+    def render(self, openmetrics: bool) -> List[str]:
+        # OpenMetrics names a counter family without `_total`; the Prometheus text format names it with it.
+        family = self.name if openmetrics or self.kind != "counter" else self.name + "_total"
+        lines = [f"# HELP {family} {self.help_text}", f"# TYPE {family} {self.kind}"]
+        for suffix, labels, value in self.samples:
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+def add_histogram(family: _Family, labels: Dict[str, str], histogram: Histogram, bounds: List[float], scale: float) -> None:
+    """`scale` converts the stored unit to the exported one (ms -> s is 1000)."""
+    counts = histogram.cumulative([bound * scale for bound in bounds])
+    for bound, count in zip(bounds, counts):
+        family.add("_bucket", {**labels, "le": format_value(bound)}, count)
+    family.add("_bucket", {**labels, "le": "+Inf"}, histogram.count)
+    family.add("_count", labels, histogram.count)
+    family.add("_sum", labels, histogram.total_ms / scale)
+
+
+def render(metrics: RunMetrics, job: str, counters: object = None, openmetrics: bool = False) -> str:
+    """Render one exposition of `metrics` (and a counters dataclass) for job=`job`."""
+    base = {"job": job}
+    families: List[_Family] = []
+
+    def family(name: str, kind: str, help_text: str) -> _Family:
+        fam = _Family(PREFIX + name, kind, help_text)
+        families.append(fam)
+        return fam
+
+    family("notes_processed", "counter", "Items finished (processed or skipped).").add("_total", base, metrics.items_done)
+    family("notes_candidates", "gauge", "Candidate items reported by PocketBase totalItems.").add("", base, metrics.total)
+    if counters is not None and is_dataclass(counters):
+        fam = family("notes", "counter", "End-of-run counters of the script, by state.")
+        for state, value in asdict(counters).items():
+            fam.add("_total", {**base, "state": state}, value)
+
+    with metrics._lock:
+        stages = {name: _copy(h) for name, h in metrics.stages.items()}
+        distributions = {name: _copy(h) for name, h in metrics.distributions.items()}
+        failures = dict(metrics.failures)
+        gauges = {name: gauge.value for name, gauge in metrics.gauges.items()}
+
+    if stages:
+        fam = family("stage_duration_seconds", "histogram", "Wall time per call of each stage.")
+        for name, histogram in sorted(stages.items()):
+            add_histogram(fam, {**base, "stage": name}, histogram, STAGE_BUCKETS_SEC, 1000.0)
+    for name, histogram in sorted(distributions.items()):
+        add_histogram(family(name, "histogram", f"Distribution of {name}."), base, histogram, VALUE_BUCKETS, 1.0)
+
+    fam = family("failures", "counter", "Failures by reason.")
+    for reason, value in sorted(failures.items()):
+        fam.add("_total", {**base, "reason": reason}, value)
+    for name, read in sorted(metrics.probes.items()):
+        family(name, "counter", f"{name} reported by the clients.").add("_total", base, float(read()))
+    if gauges:
+        fam = family("queue_depth", "gauge", "Current depth of in-process queues.")
+        for name, value in sorted(gauges.items()):
+            fam.add("", {**base, "queue": name}, value)
+    fam = family("throughput_items_per_second", "gauge", "Items finished per second over a sliding window.")
+    for window in RATE_WINDOWS_SEC:
+        fam.add("", {**base, "window": f"{window}s"}, round(metrics.rate(window), 3))
+
+    family("last_success_timestamp_seconds", "gauge", "Unix time of the last successful item.").add(
+        "", base, round(metrics.last_success, 3)
+    )
+    family("run_start_timestamp_seconds", "gauge", "Unix time the run started.").add("", base, round(metrics.started, 3))
+    family("run_exit_status", "gauge", "Exit status of the run, -1 while running.").add(
+        "", base, -1 if metrics.exit_status is None else metrics.exit_status
+    )
+
+    lines: List[str] = []
+    for fam in families:
+        if fam.samples:
+            lines.extend(fam.render(openmetrics))
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    clone = Histogram()
+    clone.buckets = dict(histogram.buckets)
+    clone.count = histogram.count
+    clone.total_ms = histogram.total_ms
+    clone.min_ms = histogram.min_ms
+    clone.max_ms = histogram.max_ms
+    return clone
+
+
+def write_textfile(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+class MetricsExporter:
+    """Keeps a textfile and/or a local /metrics endpoint up to date until the run finishes."""
+
+    def __init__(
+        self,
+        metrics: RunMetrics,
+        job: str,
+        counters: object = None,
+        textfile: Optional[str] = None,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+        interval: float = DEFAULT_WRITE_INTERVAL_SEC,
+    ):
+        self.metrics = metrics
+        self.job = job
+        self.counters = counters
+        self.textfile = Path(textfile) if textfile else None
+        self.interval = interval
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        if port is not None:
+            self.server = self._make_server(host, port)
+        metrics.add_finish_hook(self.close)
+
+    def render(self, openmetrics: bool = False) -> str:
+        return render(self.metrics, self.job, self.counters, openmetrics=openmetrics)
+
+    def start(self) -> "MetricsExporter":
+        if self.server is not None:
+            thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            host, port = self.server.server_address[:2]
+            print(f"[info] serving metrics on http://{host}:{port}/metrics")
+        if self.textfile is not None:
+            self.write()
+            thread = threading.Thread(target=self._write_loop, name="metrics-textfile", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def write(self) -> None:
+        if self.textfile is None:
+            return
+        try:
+            write_textfile(self.textfile, self.render())
+        except OSError as exc:
+            print(f"[warn] could not write metrics textfile {self.textfile}: {exc}")
+
+    def close(self) -> None:
+        """Final textfile write (with the exit status) and shut the endpoint down."""
+        self._stop.set()
+        self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _make_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        # http.server pulls in the email package; only pay for it when an endpoint is requested.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):  # noqa: A002
+                return
+
+            def do_GET(self):  # noqa: N802
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                openmetrics = "application/openmetrics-text" in (self.headers.get("Accept") or "")
+                body = exporter.render(openmetrics=openmetrics).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+
+
+def exporter_from_args(
+    metrics: RunMetrics, job: str, counters: object, textfile: Optional[str], port: Optional[int]
+) -> Optional[MetricsExporter]:
+    """Start an exporter when --metrics-textfile or --metrics-port was given; None otherwise."""
+    if not textfile and port is None:
+        return None
+    return MetricsExporter(metrics, job, counters=counters, textfile=textfile, port=port).start()
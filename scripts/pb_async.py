@@ -0,0 +1,548 @@
+"""
+Asyncio I/O engine for the operational scripts (stdlib only, no aiohttp).
+
+`AsyncHttpClient` speaks HTTP/1.1 over asyncio streams. Every host gets its own
+keep-alive pool and connection limit (PocketBase, DashScope and Qdrant can each
+be capped separately), so one event loop keeps hundreds of requests in flight
+without a thread per request; a request beyond its host's limit waits for a
+free connection. Responses are requested gzip-compressed and decoded.
+
+`AsyncPocketBase` sends record calls for a PocketBaseClient that is already
+authenticated, so the token cache, auth-refresh and re-auth logic stay in one
+place (pb_client.py).
+
+`TaskWindow` bounds the number of running tasks, and `run_cancellable()` is
+asyncio.run() with structured Ctrl-C handling: the first SIGINT/SIGTERM cancels
+the main task so its `finally` blocks can flush completed work (e.g. a partial
+Qdrant upsert batch); a second Ctrl-C aborts immediately.
+
+Usage from a script in scripts/:
+  from pb_async import AsyncHttpClient, AsyncPocketBase, TaskWindow, run_cancellable
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import signal
+import ssl
+import sys
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Coroutine, Dict, List, Optional, Set, Tuple, TypeVar, Union
+from urllib.parse import urlencode, urlsplit
+
+import http_trace
+from pb_client import (
+    DEFAULT_TIMEOUT,
+    USER_AGENT,
+    PocketBaseClient,
+    PocketBaseError,
+    ai_notes_filter,
+    compact_error_text,
+    list_params,
+    records_path,
+)
+
+
+DEFAULT_HOST_LIMIT = 64
+# Idle keep-alive connections older than this are closed instead of reused.
+KEEPALIVE_IDLE_SEC = 15
+MAX_HEADER_LINES = 100
+# Replaying these after a dropped keep-alive connection cannot apply a change twice.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+T = TypeVar("T")
+
+
+@dataclass
+class AsyncResponse:
+    status: int
+    headers: Dict[str, str]
+    content: bytes
+    url: str = ""
+
+    @property
+    def status_code(self) -> int:
+        return self.status
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@dataclass
+class _Connection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    idle_since: float = 0.0
+
+    def usable(self) -> bool:
+        return (
+            not self.writer.is_closing()
+            and not self.reader.at_eof()
+            and time.monotonic() - self.idle_since < KEEPALIVE_IDLE_SEC
+        )
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+@dataclass
+class _HostPool:
+    limit: int
+    slots: asyncio.Semaphore
+    idle: List[_Connection] = field(default_factory=list)
+
+    def take_idle(self) -> Optional[_Connection]:
+        while self.idle:
+            conn = self.idle.pop()
+            if conn.usable():
+                return conn
+            conn.close()
+        return None
+
+    def put_idle(self, conn: _Connection) -> None:
+        conn.idle_since = time.monotonic()
+        self.idle.append(conn)
+
+
+def make_ssl_context(verify_ssl: Union[bool, str]) -> ssl.SSLContext:
+    """Mirror requests: a CA bundle path, True (REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE, else certifi) or False."""
+    if verify_ssl is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    cafile = verify_ssl if isinstance(verify_ssl, str) else None
+    cafile = cafile or os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE")
+    if not cafile:
+        try:
+            import certifi
+
+            cafile = certifi.where()
+        except ImportError:
+            cafile = None
+    return ssl.create_default_context(cafile=cafile)
+
+
+def parse_host_limits(values: List[str]) -> Dict[str, int]:
+    """Parse repeated `host=N` (or `host:port=N`) options."""
+    limits: Dict[str, int] = {}
+    for value in values:
+        host, sep, raw = value.rpartition("=")
+        if not sep or not host.strip():
+            raise ValueError(f"expected HOST=N, got {value!r}")
+        limit = int(raw)
+        if limit <= 0:
+            raise ValueError(f"limit for {host} must be > 0")
+        limits[host.strip().lower()] = limit
+    return limits
+
+
+async def read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks: List[bytes] = []
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise ConnectionResetError("connection closed inside a chunked body")
+        size = int(size_line.split(b";", 1)[0].strip(), 16)
+        if size == 0:
+            # Skip trailers up to the terminating blank line.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+async def read_response(reader: asyncio.StreamReader, method: str) -> Tuple[int, Dict[str, str], bytes, bool]:
+    """Read one response; returns (status, lower-cased headers, decoded body, keep-alive)."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("connection closed before the response")
+    parts = line.decode("latin-1").split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ConnectionError(f"malformed status line: {line[:80]!r}")
+    version, status = parts[0], int(parts[1])
+
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        key = name.strip().lower()
+        headers[key] = f"{headers[key]}, {value.strip()}" if key in headers else value.strip()
+    else:
+        raise ConnectionError("too many response headers")
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = "close" not in connection if version == "HTTP/1.1" else "keep-alive" in connection
+    if method == "HEAD" or status in (204, 304):
+        body = b""
+    elif "chunked" in headers.get("transfer-encoding", "").lower():
+        body = await read_chunked(reader)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    encoding = headers.get("content-encoding", "").lower()
+    if body and encoding in ("gzip", "x-gzip"):
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif body and encoding == "deflate":
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            body = zlib.decompress(body, -zlib.MAX_WBITS)
+    return status, headers, body, keep_alive
+
+
+class AsyncHttpClient:
+    """
+    Keep-alive HTTP/1.1 client for asyncio with a connection limit per host.
+
+    `limits` maps a host name (or "host:port") to its limit; other hosts get
+    `default_limit`. A request holds one connection for its whole exchange, so
+    the limit is also the most requests in flight against that host.
+    `stats` counts opened connections, requests and replays after a dropped
+    keep-alive connection. With http_trace active every request is traced
+    from the moment it holds a connection slot until its body is read.
+    """
+
+    def __init__(
+        self,
+        default_limit: int = DEFAULT_HOST_LIMIT,
+        limits: Optional[Dict[str, int]] = None,
+        verify_ssl: Union[bool, str] = True,
+        timeout: float = DEFAULT_TIMEOUT,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.default_limit = default_limit
+        self.limits = {key.lower(): value for key, value in (limits or {}).items()}
+        self.timeout = timeout
+        self.headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        self.headers.update(headers or {})
+        self.ssl_context = make_ssl_context(verify_ssl)
+        self.pools: Dict[Tuple[str, str, int], _HostPool] = {}
+        self.stats: Counter = Counter()
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.tracer = http_trace.active()
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        for pool in self.pools.values():
+            for conn in pool.idle:
+                conn.close()
+            pool.idle.clear()
+
+    def limit_for(self, host: str, port: int) -> int:
+        return self.limits.get(f"{host}:{port}") or self.limits.get(host) or self.default_limit
+
+    def pool(self, scheme: str, host: str, port: int) -> _HostPool:
+        key = (scheme, host, port)
+        pool = self.pools.get(key)
+        if pool is None:
+            limit = self.limit_for(host, port)
+            pool = self.pools[key] = _HostPool(limit=limit, slots=asyncio.Semaphore(limit))
+        return pool
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[dict] = None,
+        json_body=None,
+        data: Union[bytes, str, None] = None,
+        headers: Optional[Dict[str, Optional[str]]] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncResponse:
+        """Send one request; a header value of None drops that default header."""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        host = parts.hostname.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        query = parts.query
+        if params:
+            extra = urlencode({k: v for k, v in params.items() if v is not None}, doseq=True)
+            query = f"{query}&{extra}" if query else extra
+        if query:
+            target = f"{target}?{query}"
+
+        merged = {key.lower(): (key, value) for key, value in self.headers.items()}
+        body = b""
+        if json_body is not None:
+            body = json.dumps(json_body).encode("utf-8")
+            merged["content-type"] = ("Content-Type", "application/json")
+        elif data is not None:
+            body = data.encode("utf-8") if isinstance(data, str) else data
+        for key, value in (headers or {}).items():
+            if value is None:
+                merged.pop(key.lower(), None)
+            else:
+                merged[key.lower()] = (key, value)
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc.rpartition('@')[2]}"]
+        lines += [f"{key}: {value}" for key, value in merged.values()]
+        if body or method not in ("GET", "HEAD", "DELETE", "OPTIONS"):
+            lines.append(f"Content-Length: {len(body)}")
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        pool = self.pool(scheme, host, port)
+        async with pool.slots:
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+            span = self.tracer.start(method, url, len(body)) if self.tracer else None
+            try:
+                resp = await asyncio.wait_for(
+                    self._exchange(pool, scheme, host, port, method, payload, url),
+                    timeout or self.timeout,
+                )
+            except BaseException as exc:
+                if span is not None:
+                    self.tracer.finish(span, error=exc)
+                raise
+            finally:
+                self.inflight -= 1
+            if span is not None:
+                wire_bytes = resp.headers.get("content-length")
+                self.tracer.finish(span, status=resp.status, bytes_in=int(wire_bytes) if wire_bytes else len(resp.content))
+            return resp
+
+    async def _exchange(
+        self, pool: _HostPool, scheme: str, host: str, port: int, method: str, payload: bytes, url: str
+    ) -> AsyncResponse:
+        while True:
+            conn = pool.take_idle()
+            reused = conn is not None
+            if conn is None:
+                conn = await self._connect(scheme, host, port)
+            try:
+                conn.writer.write(payload)
+                await conn.writer.drain()
+                status, headers, content, keep_alive = await read_response(conn.reader, method)
+            except (OSError, asyncio.IncompleteReadError):
+                conn.close()
+                # The server may close an idle keep-alive connection just as we reuse it.
+                if reused and method in IDEMPOTENT_METHODS:
+                    self.stats["replays"] += 1
+                    continue
+                raise
+            except BaseException:
+                # Cancelled or timed out mid-exchange: the connection state is unknown.
+                conn.close()
+                raise
+            self.stats["requests"] += 1
+            if keep_alive:
+                pool.put_idle(conn)
+            else:
+                conn.close()
+            return AsyncResponse(status=status, headers=headers, content=content, url=url)
+
+    async def _connect(self, scheme: str, host: str, port: int) -> _Connection:
+        context = self.ssl_context if scheme == "https" else None
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=context, server_hostname=host if context else None
+        )
+        self.stats["connections"] += 1
+        return _Connection(reader, writer)
+
+
+class AsyncPocketBase:
+    """
+    Async record calls on behalf of an authenticated PocketBaseClient.
+
+    A 401/403 re-authenticates through the sync client once (off the event loop,
+    shared by all waiting requests) and retries with the new token.
+    """
+
+    def __init__(self, client: PocketBaseClient, http: AsyncHttpClient):
+        self.client = client
+        self.http = http
+        self._auth_lock = asyncio.Lock()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[dict] = None,
+        json_body=None,
+        timeout: Optional[float] = None,
+    ) -> AsyncResponse:
+        sent_token = self.client.token
+        resp = await self._send(method, path, params, json_body, timeout)
+        if resp.status in (401, 403):
+            async with self._auth_lock:
+                loop = asyncio.get_running_loop()
+                changed = await loop.run_in_executor(None, self.client.reauthenticate, sent_token)
+            if changed:
+                self.client.retries += 1
+                with http_trace.attempt(2):
+                    resp = await self._send(method, path, params, json_body, timeout)
+        return resp
+
+    async def _send(self, method, path, params, json_body, timeout) -> AsyncResponse:
+        return await self.http.request(
+            method,
+            self.client.url(path),
+            params=params,
+            json_body=json_body,
+            headers=self.client.auth_headers(),
+            timeout=timeout or self.client.timeout,
+        )
+
+    async def call(self, method: str, path: str, what: str, **kwargs):
+        """request() that raises PocketBaseError unless 2xx, returning the decoded JSON body."""
+        resp = await self.request(method, path, **kwargs)
+        if resp.status < 200 or resp.status >= 300:
+            raise PocketBaseError(f"{what} failed: {resp.status} {compact_error_text(resp)}", status=resp.status)
+        return resp.json() if resp.content else {}
+
+    async def list_records(
+        self,
+        collection: str,
+        page: int = 1,
+        per_page: int = 30,
+        filter: Optional[str] = None,  # noqa: A002 - PocketBase query name
+        sort: Optional[str] = None,
+        fields: Optional[str] = None,
+        skip_total: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, object]:
+        params = list_params(page, per_page, filter, sort, fields, skip_total)
+        return await self.call("GET", records_path(collection), f"list {collection}", params=params, timeout=timeout)
+
+    async def get_record(self, collection: str, record_id: str) -> dict:
+        return await self.call("GET", records_path(collection, record_id), f"get {collection}/{record_id}")
+
+    async def create_record(self, collection: str, payload: dict) -> dict:
+        return await self.call("POST", records_path(collection), f"create {collection}", json_body=payload)
+
+    async def update_record(self, collection: str, record_id: str, payload: dict) -> dict:
+        return await self.call(
+            "PATCH", records_path(collection, record_id), f"update {collection}/{record_id}", json_body=payload
+        )
+
+    async def batch(self, operations: List[dict], timeout: Optional[float] = None) -> List[dict]:
+        """POST /api/batch; see PocketBaseClient.batch()."""
+        result = await self.call("POST", "/api/batch", "batch", json_body={"requests": operations}, timeout=timeout)
+        return result if isinstance(result, list) else []
+
+
+async def list_ai_notes_page_async(
+    pb: AsyncPocketBase,
+    page: int,
+    per_page: int,
+    only_done: bool,
+    user_id: Optional[str],
+) -> Dict[str, object]:
+    return await pb.list_records(
+        "ai_notes",
+        page=page,
+        per_page=per_page,
+        filter=ai_notes_filter(only_done, user_id),
+        sort="+id",
+        timeout=60,
+    )
+
+
+class TaskWindow:
+    """
+    Keep at most `size` tasks running; `submit()` waits for a free slot.
+
+    Tasks are expected to handle their own errors; an unexpected exception is
+    re-raised from the next submit()/drain().
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.running: Set[asyncio.Task] = set()
+
+    async def submit(self, coro: Coroutine[object, object, object]) -> None:
+        try:
+            while len(self.running) >= self.size:
+                await self._wait(asyncio.FIRST_COMPLETED)
+        except BaseException:
+            coro.close()  # never started; avoids a "never awaited" warning on cancel
+            raise
+        self.running.add(asyncio.ensure_future(coro))
+
+    async def drain(self) -> None:
+        while self.running:
+            await self._wait(asyncio.ALL_COMPLETED)
+
+    async def cancel(self) -> None:
+        for task in self.running:
+            task.cancel()
+        await asyncio.gather(*self.running, return_exceptions=True)
+        self.running.clear()
+
+    async def _wait(self, return_when: str) -> None:
+        done, self.running = await asyncio.wait(self.running, return_when=return_when)
+        # Retrieve every exception (not just the first), so none is reported as "never retrieved".
+        errors = [task.exception() for task in done if not task.cancelled() and task.exception() is not None]
+        if errors:
+            raise errors[0]
+
+
+def run_cancellable(main: Awaitable[T]) -> T:
+    """
+    asyncio.run(main), where the first Ctrl-C (or SIGTERM) cancels `main`.
+
+    The coroutine sees CancelledError at its current await, so it can cancel its
+    in-flight requests, flush completed work in `finally` and return normally.
+    A second Ctrl-C raises KeyboardInterrupt right away.
+    """
+
+    async def runner() -> T:
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(main)
+        installed: List[int] = []
+
+        def interrupt(signum: int) -> None:
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+            installed.clear()
+            print(
+                f"\n[warn] {signal.Signals(signum).name}: cancelling in-flight requests and flushing "
+                "completed work (Ctrl-C again to abort)",
+                file=sys.stderr,
+            )
+            task.cancel()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, interrupt, sig)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows, or not the main thread: default Ctrl-C handling.
+        try:
+            return await task
+        finally:
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+
+    return asyncio.run(runner())
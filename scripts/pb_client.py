@@ -0,0 +1,688 @@
+"""
+Shared PocketBase client for the operational scripts.
+
+One `PocketBaseClient` wraps a pooled `requests.Session`, so every call made by
+a script run reuses the same keep-alive connections instead of paying a new
+TCP+TLS handshake per request. Responses are requested gzip-compressed and
+decoded transparently. All calls share one default timeout.
+
+Auth tokens are cached in $BOOX_CACHE_DIR/auth_tokens.json (mode 0600) with
+their JWT `exp` and the endpoint/payload variant that worked. A later run
+reuses the token without any request until it is close to expiry, then calls
+auth-refresh, and only falls back to password auth (remembered variant first)
+when that fails. A 401/403 on a cached token triggers one password re-auth and
+a retry. Set BOOX_TOKEN_CACHE=0 to disable the cache.
+
+Also home to the helpers the scripts used to copy-paste:
+  load_env_file, resolve_value, parse_bool, login, list_ai_notes_page
+
+Usage from a script in scripts/:
+  from pb_client import PocketBaseClient, load_env_file, resolve_value
+
+From the repository root, add scripts/ to sys.path first (see setup_pocketbase.py).
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+
+import http_trace
+
+
+DEFAULT_TIMEOUT = 30
+# Pool size per host; raise it to at least the number of worker threads sharing a client.
+DEFAULT_POOL_SIZE = 10
+USER_AGENT = "booxreader-ops"
+ADMIN_AUTH_PATHS = (
+    "/api/collections/_superusers/auth-with-password",
+    "/api/admins/auth-with-password",
+)
+IDENTITY_KEYS = ("identity", "email")
+TOKEN_CACHE_NAME = "auth_tokens.json"
+# Cached tokens are used as-is until this close to `exp`, then refreshed.
+TOKEN_REFRESH_MARGIN_SEC = 600
+# Credential fingerprints in the token cache: scrypt, ~70 ms per check, so the
+# file is not a cheap offline password oracle. Entries with another kdf are dropped.
+FINGERPRINT_KDF = "scrypt-n16384-r8-p1"
+FINGERPRINT_SCRYPT = {"n": 2**14, "r": 8, "p": 1, "dklen": 32}
+# PocketBase's generated record ids: RECORD_ID_LENGTH chars of this alphabet.
+RECORD_ID_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+RECORD_ID_LENGTH = 15
+
+
+class PocketBaseError(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None, response: Optional[requests.Response] = None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+
+
+def print_fatal_error(exc: BaseException) -> None:
+    """Print "Fatal error: ..." to stderr, with a hint when /api/batch is disabled on the server."""
+    print(f"Fatal error: {exc}", file=sys.stderr)
+    if isinstance(exc, PocketBaseError) and exc.status == 403 and "batch" in str(exc).lower():
+        print("Hint: enable the batch API in the PocketBase settings (Application > Batch API).", file=sys.stderr)
+
+
+def load_env_file(path: Path) -> Dict[str, str]:
+    env: Dict[str, str] = {}
+    if not path.exists():
+        return env
+    for raw in path.read_text(encoding="utf-8").splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        key = key.strip()
+        value = value.strip().strip('"').strip("'")
+        if key:
+            env[key] = value
+    return env
+
+
+def resolve_value(explicit: Optional[str], env_key: str, file_env: Dict[str, str]) -> Optional[str]:
+    if explicit:
+        return explicit
+    return os.getenv(env_key) or file_env.get(env_key)
+
+
+def parse_bool(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def cache_dir() -> Path:
+    override = os.getenv("BOOX_CACHE_DIR")
+    if override:
+        return Path(override).expanduser()
+    return Path.home() / ".cache" / "booxreader"
+
+
+def token_cache_enabled() -> bool:
+    return os.getenv("BOOX_TOKEN_CACHE", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def jwt_exp(token: str) -> Optional[int]:
+    """Read `exp` from a JWT payload without verifying it (the server does that)."""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+        return int(payload["exp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def credential_fingerprint(salt: str, email: str, password: str) -> str:
+    return hashlib.scrypt(
+        f"{email}\0{password}".encode("utf-8"), salt=bytes.fromhex(salt), **FINGERPRINT_SCRYPT
+    ).hex()
+
+
+class TokenCache:
+    """
+    Per-user JSON file of auth tokens keyed by "<base_url> <kind> <email>".
+
+    Entries also hold a salted scrypt fingerprint of the credentials, so a
+    changed password never silently reuses the old token.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or cache_dir() / TOKEN_CACHE_NAME
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, dict]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key: str, email: str, password: str) -> Optional[dict]:
+        entry = self.load().get(key)
+        if not isinstance(entry, dict) or not entry.get("token"):
+            return None
+        if entry.get("kdf") != FINGERPRINT_KDF:
+            return None
+        try:
+            fingerprint = credential_fingerprint(str(entry.get("salt") or ""), email, password)
+        except ValueError:
+            return None
+        if not secrets.compare_digest(str(entry.get("fingerprint") or ""), fingerprint):
+            return None
+        return entry
+
+    def put(self, key: str, entry: Optional[dict]) -> None:
+        """Store (or with entry=None, drop) one token; the file is written atomically as 0600."""
+        with self._lock:
+            # Also drops entries fingerprinted with an older, weaker scheme.
+            data = {k: v for k, v in self.load().items() if isinstance(v, dict) and v.get("kdf") == FINGERPRINT_KDF}
+            if entry is None:
+                if data.pop(key, None) is None:
+                    return
+            else:
+                data[key] = entry
+            try:
+                self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(prefix=".auth-", dir=self.path.parent)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
+                os.chmod(tmp, 0o600)
+                os.replace(tmp, self.path)
+            except OSError as exc:
+                print(f"[warn] could not write token cache {self.path}: {exc}")
+
+
+def records_path(collection: str, record_id: Optional[str] = None) -> str:
+    path = f"/api/collections/{quote(collection, safe='')}/records"
+    return f"{path}/{quote(record_id, safe='')}" if record_id else path
+
+
+def stable_record_id(*parts: str) -> str:
+    """A PocketBase-shaped record id derived from `parts`; the same parts always give the same id."""
+    number = int.from_bytes(hashlib.sha256(":".join(parts).encode("utf-8")).digest(), "big")
+    chars = []
+    for _ in range(RECORD_ID_LENGTH):
+        number, digit = divmod(number, len(RECORD_ID_ALPHABET))
+        chars.append(RECORD_ID_ALPHABET[digit])
+    return "".join(chars)
+
+
+def list_params(
+    page: int,
+    per_page: int,
+    filter: Optional[str] = None,  # noqa: A002 - PocketBase query name
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    skip_total: bool = False,
+) -> Dict[str, object]:
+    """Query parameters of GET /api/collections/{name}/records."""
+    params: Dict[str, object] = {"page": page, "perPage": per_page}
+    if filter:
+        params["filter"] = filter
+    if sort:
+        params["sort"] = sort
+    if fields:
+        params["fields"] = fields
+    if skip_total:
+        params["skipTotal"] = 1
+    return params
+
+
+def quote_filter_value(value: str) -> str:
+    """Quote a string literal for a PocketBase filter expression."""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def compact_error_text(resp: requests.Response) -> str:
+    text = (resp.text or "").strip()
+    if not text:
+        return "<empty>"
+    try:
+        data = resp.json()
+        if isinstance(data, dict):
+            parts = []
+            message = data.get("message")
+            if isinstance(message, str) and message.strip():
+                parts.append(message.strip())
+            details = data.get("data")
+            if details:
+                parts.append(json.dumps(details, ensure_ascii=False))
+            if parts:
+                return " | ".join(parts)[:1000]
+        return text[:500]
+    except Exception:
+        return text[:500]
+
+
+_tracing_adapter_class = None
+
+
+def tracing_adapter_class():
+    """HTTPAdapter subclass writing one http_trace span per request sent through it.
+
+    Built on first use: requests.adapters is only imported once a session is made,
+    so importing pb_client stays cheap under booxops' deferred imports.
+    """
+    global _tracing_adapter_class
+    if _tracing_adapter_class is not None:
+        return _tracing_adapter_class
+    from requests.adapters import HTTPAdapter
+
+    class TracingAdapter(HTTPAdapter):
+        def __init__(self, tracer: http_trace.Tracer, **kwargs):
+            super().__init__(**kwargs)
+            self.tracer = tracer
+
+        def send(self, request, **kwargs):
+            body = request.body
+            size = len(body) if isinstance(body, (bytes, str)) else int(request.headers.get("Content-Length") or 0)
+            span = self.tracer.start(request.method or "GET", request.url or "", size)
+            try:
+                resp = super().send(request, **kwargs)
+            except BaseException as exc:
+                self.tracer.finish(span, error=exc)
+                raise
+            length = resp.headers.get("Content-Length")
+            self.tracer.finish(span, status=resp.status_code, bytes_in=int(length) if length else None)
+            return resp
+
+    _tracing_adapter_class = TracingAdapter
+    return TracingAdapter
+
+
+def make_session(pool_size: int = DEFAULT_POOL_SIZE, verify_ssl: bool = True) -> requests.Session:
+    """A keep-alive session whose per-host pool holds `pool_size` connections (traced if http_trace is on)."""
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    tracer = http_trace.active()
+    if tracer is not None:
+        adapter: HTTPAdapter = tracing_adapter_class()(tracer, pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.verify = verify_ssl
+    session.headers.update(
+        {
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+    )
+    return session
+
+
+class PocketBaseClient:
+    """
+    Pooled PocketBase REST client.
+
+    `request()` returns the raw response for callers that branch on status codes;
+    the typed helpers raise PocketBaseError on any non-2xx response. The client
+    is safe to share between threads as long as pool_size >= worker count.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        verify_ssl: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        session: Optional[requests.Session] = None,
+        token_cache: Optional[TokenCache] = None,
+        use_token_cache: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.verify_ssl = verify_ssl
+        self.timeout = timeout
+        self.session = session or make_session(pool_size=pool_size, verify_ssl=verify_ssl)
+        if token_cache is None and use_token_cache and token_cache_enabled():
+            token_cache = TokenCache()
+        self.token_cache = token_cache
+        # How the current token was obtained: "cache", "refresh" or "password".
+        self.auth_source = ""
+        self.last_auth_error = ""
+        # Requests re-sent after a re-auth (sync and async), for run metrics.
+        self.retries = 0
+        self._reauth: Optional[Callable[[], bool]] = None
+        self._auth_lock = threading.Lock()
+
+    def __enter__(self) -> "PocketBaseClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    # --- transport ----------------------------------------------------------------
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[dict] = None,
+        json_body=None,
+        data=None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        sent_token = self.token
+        resp = self._send(method, path, params, json_body, data, headers, timeout, stream)
+        # A cached token can be revoked server-side (PocketBase then treats the caller as a
+        # guest, so 401 or 403); re-auth once with the password and retry replayable requests.
+        if resp.status_code in (401, 403) and data is None and self.reauthenticate(sent_token):
+            resp.close()
+            self.retries += 1
+            with http_trace.attempt(2):
+                resp = self._send(method, path, params, json_body, data, headers, timeout, stream)
+        return resp
+
+    def reauthenticate(self, sent_token: Optional[str]) -> bool:
+        """
+        Handle a 401/403 for a request sent with `sent_token`.
+
+        The first caller re-runs password auth (only once per cached token); the
+        rest wait on the lock. True when the current token differs from the one sent.
+        """
+        if self._reauth is None and self.token == sent_token:
+            return False
+        with self._auth_lock:
+            reauth, self._reauth = self._reauth, None
+            if reauth is not None and self.token == sent_token:
+                reauth()
+        return self.token != sent_token
+
+    def _send(self, method, path, params, json_body, data, headers, timeout, stream) -> requests.Response:
+        merged: Dict[str, Optional[str]] = dict(self.auth_headers())
+        if headers:
+            merged.update(headers)
+        return self.session.request(
+            method,
+            self.url(path),
+            params=params,
+            json=json_body,
+            data=data,
+            headers=merged,
+            timeout=timeout or self.timeout,
+            stream=stream,
+            # Per-request, because REQUESTS_CA_BUNDLE would otherwise override session.verify.
+            verify=self.session.verify,
+        )
+
+    def call(self, method: str, path: str, what: str, **kwargs):
+        """request() that raises PocketBaseError unless 2xx, returning the decoded JSON body."""
+        resp = self.request(method, path, **kwargs)
+        if resp.status_code < 200 or resp.status_code >= 300:
+            raise PocketBaseError(
+                f"{what} failed: {resp.status_code} {compact_error_text(resp)}",
+                status=resp.status_code,
+                response=resp,
+            )
+        return resp.json() if resp.content else {}
+
+    # --- auth ---------------------------------------------------------------------
+
+    def auth_admin(self, email: str, password: str) -> Optional[str]:
+        """Try the v0.23+ superuser endpoint, then the legacy admins one; sets self.token."""
+        variants = [(path, key) for path in ADMIN_AUTH_PATHS for key in IDENTITY_KEYS]
+        result = self.authenticate("admin", email, password, variants)
+        return result[0] if result else None
+
+    def auth_user(self, email: str, password: str, collection: str = "users") -> Tuple[str, str]:
+        """Authenticate an auth-collection record; sets self.token and returns (token, record id)."""
+        path = f"/api/collections/{quote(collection, safe='')}/auth-with-password"
+        result = self.authenticate(collection, email, password, [(path, key) for key in IDENTITY_KEYS])
+        if not result or not result[1]:
+            raise PocketBaseError(f"user auth failed: {self.last_auth_error or 'token or user id missing'}")
+        return result
+
+    def authenticate(
+        self,
+        kind: str,
+        email: str,
+        password: str,
+        variants: List[Tuple[str, str]],
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Cached token -> auth-refresh -> password auth over `variants` ((path, identity key)).
+
+        Returns (token, record id) or None; on success self.token is set.
+        """
+        cache_key = f"{self.base_url} {kind} {email}"
+        self.auth_source = ""
+        entry = self.token_cache.get(cache_key, email, password) if self.token_cache else None
+        if entry:
+            remaining = int(entry.get("exp") or 0) - time.time()
+            remembered = (str(entry.get("path") or ""), str(entry.get("identityKey") or ""))
+            if remaining > TOKEN_REFRESH_MARGIN_SEC:
+                self.token = str(entry["token"])
+                self.auth_source = "cache"
+            elif remaining > 0:
+                self._refresh(cache_key, entry, email, password)
+            if self.auth_source in ("cache", "refresh") and self.token:
+                self._reauth = lambda: self._password_auth(cache_key, email, password, [remembered] + variants) is not None
+                return self.token, str(entry.get("recordId") or "")
+            if remembered in variants:
+                variants = [remembered] + [v for v in variants if v != remembered]
+        result = self._password_auth(cache_key, email, password, variants)
+        if result is None and entry and self.token_cache:
+            # Same credentials no longer work: the cached token is not worth keeping.
+            self.token_cache.put(cache_key, None)
+        return result
+
+    def _refresh(self, cache_key: str, entry: dict, email: str, password: str) -> None:
+        path = str(entry.get("path") or "").replace("auth-with-password", "auth-refresh")
+        try:
+            resp = self._send("POST", path, None, None, None, {"Authorization": f"Bearer {entry['token']}"}, None, False)
+        except requests.RequestException:
+            return
+        if resp.status_code != 200:
+            return
+        body = resp.json() if resp.content else {}
+        token = str(body.get("token") or "").strip()
+        if token:
+            self._remember(cache_key, entry["path"], entry["identityKey"], email, password, token, body)
+            self.auth_source = "refresh"
+
+    def _password_auth(
+        self, cache_key: str, email: str, password: str, variants: List[Tuple[str, str]]
+    ) -> Optional[Tuple[str, str]]:
+        self.last_auth_error = ""
+        tried = set()
+        for path, key in variants:
+            if (path, key) in tried or not path:
+                continue
+            tried.add((path, key))
+            try:
+                resp = self._send(
+                    "POST", path, None, {key: email, "password": password}, None, {"Authorization": None}, None, False
+                )
+            except requests.RequestException as exc:
+                self.last_auth_error = str(exc)
+                continue
+            if resp.status_code != 200:
+                self.last_auth_error = f"{resp.status_code} {compact_error_text(resp)}"
+                continue
+            body = resp.json() if resp.content else {}
+            token = str(body.get("token") or "").strip()
+            if not token:
+                self.last_auth_error = "token missing in auth response"
+                continue
+            record_id = self._remember(cache_key, path, key, email, password, token, body)
+            self.auth_source = "password"
+            self._reauth = None
+            return token, record_id
+        return None
+
+    def _remember(
+        self, cache_key: str, path: str, key: str, email: str, password: str, token: str, body: dict
+    ) -> str:
+        self.token = token
+        record_id = str((body.get("record") or body.get("admin") or {}).get("id") or "").strip()
+        if self.token_cache:
+            salt = secrets.token_hex(16)
+            self.token_cache.put(
+                cache_key,
+                {
+                    "token": token,
+                    "exp": jwt_exp(token) or 0,
+                    "path": path,
+                    "identityKey": key,
+                    "recordId": record_id,
+                    "kdf": FINGERPRINT_KDF,
+                    "salt": salt,
+                    "fingerprint": credential_fingerprint(salt, email, password),
+                    "savedAt": int(time.time()),
+                },
+            )
+        return record_id
+
+    # --- records ------------------------------------------------------------------
+
+    def records_path(self, collection: str, record_id: Optional[str] = None) -> str:
+        return records_path(collection, record_id)
+
+    def list_records(
+        self,
+        collection: str,
+        page: int = 1,
+        per_page: int = 30,
+        filter: Optional[str] = None,  # noqa: A002 - PocketBase query name
+        sort: Optional[str] = None,
+        fields: Optional[str] = None,
+        skip_total: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, object]:
+        params = list_params(page, per_page, filter, sort, fields, skip_total)
+        return self.call(
+            "GET", self.records_path(collection), f"list {collection}", params=params, timeout=timeout
+        )
+
+    def iter_records(
+        self,
+        collection: str,
+        per_page: int = 200,
+        filter: Optional[str] = None,  # noqa: A002
+        sort: str = "+id",
+        fields: Optional[str] = None,
+    ) -> Iterator[dict]:
+        page = 1
+        while True:
+            listing = self.list_records(
+                collection, page=page, per_page=per_page, filter=filter, sort=sort, fields=fields, skip_total=True
+            )
+            items = listing.get("items") or []
+            yield from items
+            if len(items) < per_page:
+                return
+            page += 1
+
+    def first_record(self, collection: str, filter: str) -> Optional[dict]:  # noqa: A002
+        items = self.list_records(collection, per_page=1, filter=filter, skip_total=True).get("items") or []
+        return items[0] if items else None
+
+    def get_record(self, collection: str, record_id: str, fields: Optional[str] = None) -> dict:
+        params = {"fields": fields} if fields else None
+        return self.call("GET", self.records_path(collection, record_id), f"get {collection}/{record_id}", params=params)
+
+    def create_record(self, collection: str, payload: dict) -> dict:
+        return self.call("POST", self.records_path(collection), f"create {collection}", json_body=payload)
+
+    def update_record(self, collection: str, record_id: str, payload: dict) -> dict:
+        return self.call(
+            "PATCH", self.records_path(collection, record_id), f"update {collection}/{record_id}", json_body=payload
+        )
+
+    def delete_record(self, collection: str, record_id: str, missing_ok: bool = True) -> None:
+        resp = self.request("DELETE", self.records_path(collection, record_id))
+        if resp.status_code == 404 and missing_ok:
+            return
+        if resp.status_code >= 300:
+            raise PocketBaseError(
+                f"delete {collection}/{record_id} failed: {resp.status_code} {compact_error_text(resp)}",
+                status=resp.status_code,
+                response=resp,
+            )
+
+    def batch(self, operations: List[dict], timeout: Optional[float] = None) -> List[dict]:
+        """
+        POST /api/batch (PocketBase v0.23+, batch API enabled in settings).
+
+        `operations` are {"method", "url", "body"} dicts; the whole batch runs in
+        one transaction and the per-operation {"status", "body"} list is returned.
+        """
+        result = self.call("POST", "/api/batch", "batch", json_body={"requests": operations}, timeout=timeout)
+        return result if isinstance(result, list) else []
+
+    # --- collections --------------------------------------------------------------
+
+    def list_collections(self) -> List[dict]:
+        data = self.call("GET", "/api/collections", "list collections", params={"perPage": 500})
+        return data.get("items", data) if isinstance(data, dict) else data
+
+    def get_collection(self, name_or_id: str) -> dict:
+        return self.call("GET", f"/api/collections/{quote(name_or_id, safe='')}", f"get collection {name_or_id}")
+
+    def create_collection(self, payload: dict) -> dict:
+        return self.call("POST", "/api/collections", "create collection", json_body=payload)
+
+    def update_collection(self, name_or_id: str, payload: dict) -> dict:
+        return self.call(
+            "PATCH",
+            f"/api/collections/{quote(name_or_id, safe='')}",
+            f"PATCH /api/collections/{name_or_id}",
+            json_body=payload,
+        )
+
+
+def login(
+    client: PocketBaseClient,
+    admin_email: Optional[str],
+    admin_password: Optional[str],
+    user_email: Optional[str],
+    user_password: Optional[str],
+) -> Tuple[str, Optional[str]]:
+    """
+    Authenticate preferring admin credentials, falling back to a users record.
+
+    Returns (auth mode, user id); auth mode is "" when neither set of credentials worked.
+    """
+    if admin_email and admin_password and client.auth_admin(admin_email, admin_password):
+        return "admin", None
+    if user_email and user_password:
+        _, user_id = client.auth_user(user_email, user_password)
+        return "user", user_id
+    return "", None
+
+
+def list_ai_notes_page(
+    client: PocketBaseClient,
+    page: int,
+    per_page: int,
+    only_done: bool,
+    user_id: Optional[str],
+) -> Dict[str, object]:
+    return client.list_records(
+        "ai_notes",
+        page=page,
+        per_page=per_page,
+        filter=ai_notes_filter(only_done, user_id),
+        sort="+id",
+        timeout=60,
+    )
+
+
+def ai_notes_filter(only_done: bool, user_id: Optional[str]) -> Optional[str]:
+    filters: List[str] = []
+    if only_done:
+        filters.append("status='done'")
+    if user_id:
+        filters.append(f"user={quote_filter_value(user_id)}")
+    return "(" + "&&".join(filters) + ")" if filters else None
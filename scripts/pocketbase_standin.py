@@ -0,0 +1,1144 @@
+#!/usr/bin/env python3
+"""
+Local PocketBase stand-in for benchmarks and offline script testing.
+
+It loads the collection definitions from pocketbase_collections.json and serves
+the subset of the PocketBase REST API the operational scripts use:
+
+- POST /api/collections/{users,_superusers}/auth-with-password, auth-refresh
+- GET  /api/collections, /api/collections/{name}          (superuser only)
+- CRUD /api/collections/{name}/records[/{id}]             (JSON or multipart)
+- POST /api/files/token, GET /api/files/{collection}/{id}/{name}
+- POST /api/batch   create/upsert/update/delete sub-requests in one transaction
+- GET  /api/health
+
+Records live in SQLite; filters (`a='x' && (b>1 || c~'y')`) and sorts are
+translated to json_extract() SQL. File fields honour maxSize/mimeTypes and
+unique indexes are enforced, with PocketBase-shaped validation errors. Request
+bodies are spooled to disk, so multi-GB uploads run in constant memory.
+
+JSON responses over 1KB are gzip-compressed when the client accepts it. With
+--tls-cert/--tls-key the server speaks HTTPS, so clients pay a real TLS
+handshake per new connection. --latency-ms delays every /api response to mimic
+a remote server, which is what makes in-flight concurrency matter.
+
+--seed-notes N inserts N synthetic ai_notes owned by the first --user (deterministic
+for a given --seed), so listing/PATCH workloads can start from a realistic table.
+fake_services.py starts this server next to fake embedding and Qdrant endpoints.
+
+Extra endpoints for harnesses:
+  GET  /_standin/stats   request counts per route template, plus accepted
+                         `connections` and JSON response `bytes_out`
+  POST /_standin/reset   clear stats
+
+Usage:
+  python3 scripts/pocketbase_standin.py --port 8090 \
+      --superuser admin@example.com:secret --user reader@example.com:secret
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import itertools
+import json
+import mmap
+import random
+import re
+import secrets
+import shutil
+import sqlite3
+import ssl
+import string
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+DEFAULT_SCHEMA_FILE = Path(__file__).resolve().parent.parent / "pocketbase_collections.json"
+# PocketBase applies a 5MB limit when a file field's maxSize is 0/unset.
+DEFAULT_FILE_MAX_SIZE = 5242880
+TOKEN_TTL_SEC = 7 * 24 * 3600
+COPY_CHUNK_SIZE = 1024 * 1024
+GZIP_MIN_BYTES = 1024
+ID_ALPHABET = string.ascii_lowercase + string.digits
+SYSTEM_FIELDS = {"id", "created", "updated", "collectionId", "collectionName"}
+AUTH_HIDDEN_FIELDS = {"password", "tokenKey"}
+# PocketBase's default Settings > Batch > max allowed requests.
+DEFAULT_BATCH_MAX_REQUESTS = 50
+SEED_SYLLABLES = "ka lo mi ne ru sa ti vo ber con dal fen gor hul lin mar nor pel ras tin".split()
+SEED_VOCABULARY = 2000
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, data: Optional[dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.data = data or {}
+
+    def to_json(self) -> dict:
+        return {"code": self.status, "message": self.message, "data": self.data}
+
+
+def new_record_id() -> str:
+    return "".join(secrets.choice(ID_ALPHABET) for _ in range(15))
+
+
+def pb_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] + "Z"
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def make_token(record_id: str, collection_id: str, ttl_sec: int = TOKEN_TTL_SEC) -> str:
+    """JWT-shaped token (unsigned) so clients can read `exp` like with real PocketBase."""
+    header = b64url(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = {
+        "id": record_id,
+        "collectionId": collection_id,
+        "type": "auth",
+        "exp": int(time.time()) + ttl_sec,
+        "nonce": secrets.token_hex(4),
+    }
+    return f"{header}.{b64url(json.dumps(payload).encode())}.{b64url(secrets.token_bytes(16))}"
+
+
+def field_options(field: dict) -> dict:
+    """Flatten legacy `options` so flat (v0.23+) and old layouts read the same."""
+    options = field.get("options") if isinstance(field.get("options"), dict) else {}
+    return {**options, **{k: v for k, v in field.items() if k != "options"}}
+
+
+def default_value(field: dict):
+    kind = field.get("type")
+    if kind == "number":
+        return 0
+    if kind == "bool":
+        return False
+    if kind in ("file", "relation", "select") and int(field_options(field).get("maxSelect") or 1) > 1:
+        return []
+    if kind == "json":
+        return None
+    return ""
+
+
+def coerce_value(field: dict, value):
+    """Multipart values arrive as strings; coerce them like PocketBase does."""
+    kind = field.get("type")
+    if kind == "number":
+        if value in ("", None):
+            return 0
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, "Failed to validate record.", {field["name"]: {"code": "validation_invalid_number", "message": "Invalid number."}})
+        return int(number) if number.is_integer() else number
+    if kind == "bool":
+        if isinstance(value, str):
+            return value.strip().lower() in {"1", "true", "on", "yes"}
+        return bool(value)
+    if kind == "json" and isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    if value is None:
+        return default_value(field)
+    if kind in ("file", "relation", "select") or isinstance(value, str):
+        return value
+    return str(value)
+
+
+class Collection:
+    def __init__(self, data: dict):
+        self.name = str(data.get("name"))
+        self.id = str(data.get("id") or ("_pb_users_auth_" if self.name == "users" else f"pbc_{self.name}"))
+        self.type = data.get("type") or "base"
+        self.raw = data
+        raw_fields = data.get("fields") or data.get("schema") or []
+        self.fields: Dict[str, dict] = {
+            str(f["name"]): f for f in raw_fields if isinstance(f, dict) and f.get("name") and f["name"] not in SYSTEM_FIELDS
+        }
+        if self.type == "auth":
+            for name, kind in (("email", "email"), ("password", "password"), ("tokenKey", "text")):
+                self.fields.setdefault(name, {"name": name, "type": kind})
+        self.unique_indexes: List[Tuple[str, Tuple[str, ...]]] = []
+        for index in data.get("indexes") or []:
+            match = re.match(r"\s*CREATE\s+UNIQUE\s+INDEX\s+`?(\w+)`?\s+ON\s+`?\w+`?\s*\(([^)]*)\)", index, re.I)
+            if match:
+                columns = tuple(c.strip().strip("`") for c in match.group(2).split(",") if c.strip())
+                self.unique_indexes.append((match.group(1), columns))
+
+    def rule(self, action: str) -> Optional[str]:
+        return self.raw.get(f"{action}Rule")
+
+    def to_json(self) -> dict:
+        fields = [{"name": "id", "type": "text", "system": True, "primaryKey": True}]
+        fields.extend(self.fields[name] for name in self.fields)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "fields": fields,
+            "indexes": self.raw.get("indexes") or [],
+            **{f"{action}Rule": self.rule(action) for action in ("list", "view", "create", "update", "delete")},
+        }
+
+
+class FilterTranslator:
+    """Translate the PocketBase filter subset used by the scripts into SQL."""
+
+    TOKEN_RE = re.compile(
+        r"\s*(?:(?P<str>'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|(?P<num>-?\d+(?:\.\d+)?)"
+        r"|(?P<op>&&|\|\||!=|>=|<=|!~|=|>|<|~|\(|\))|(?P<ident>[@A-Za-z_][\w.@]*))"
+    )
+    SQL_OPS = {"=": "=", "!=": "!=", ">": ">", ">=": ">=", "<": "<", "<=": "<=", "~": "LIKE", "!~": "NOT LIKE"}
+
+    def __init__(self, text: str):
+        self.tokens: List[Tuple[str, str]] = []
+        pos = 0
+        text = text or ""
+        while pos < len(text):
+            if text[pos:].strip() == "":
+                break
+            match = self.TOKEN_RE.match(text, pos)
+            if not match:
+                raise ApiError(400, f"Invalid filter near: {text[pos:pos + 20]!r}")
+            kind = match.lastgroup or ""
+            self.tokens.append((kind, match.group(kind)))
+            pos = match.end()
+        self.pos = 0
+        self.params: List[object] = []
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise ApiError(400, "Unexpected end of filter")
+        self.pos += 1
+        return token
+
+    def translate(self) -> Tuple[str, List[object]]:
+        if not self.tokens:
+            return "1=1", []
+        sql = self.parse_or()
+        if self.peek() is not None:
+            raise ApiError(400, f"Unexpected token in filter: {self.peek()[1]!r}")
+        return sql, self.params
+
+    def parse_or(self) -> str:
+        parts = [self.parse_and()]
+        while self.peek() == ("op", "||"):
+            self.take()
+            parts.append(self.parse_and())
+        return "(" + " OR ".join(parts) + ")" if len(parts) > 1 else parts[0]
+
+    def parse_and(self) -> str:
+        parts = [self.parse_atom()]
+        while self.peek() == ("op", "&&"):
+            self.take()
+            parts.append(self.parse_atom())
+        return "(" + " AND ".join(parts) + ")" if len(parts) > 1 else parts[0]
+
+    def parse_atom(self) -> str:
+        if self.peek() == ("op", "("):
+            self.take()
+            inner = self.parse_or()
+            if self.take() != ("op", ")"):
+                raise ApiError(400, "Unbalanced parentheses in filter")
+            return inner
+        kind, ident = self.take()
+        if kind != "ident":
+            raise ApiError(400, f"Expected field name in filter, got {ident!r}")
+        op_kind, op = self.take()
+        if op_kind != "op" or op not in self.SQL_OPS:
+            raise ApiError(400, f"Unsupported filter operator {op!r}")
+        value = self.parse_value()
+        column = "id" if ident == "id" else f"json_extract(data, '$.{ident}')"
+        if value is None:
+            return f"({column} IS NULL OR {column} = '')" if op == "=" else f"({column} IS NOT NULL AND {column} != '')"
+        if op in ("~", "!~"):
+            value = f"%{value}%"
+        self.params.append(value)
+        return f"{column} {self.SQL_OPS[op]} ?"
+
+    def parse_value(self):
+        kind, raw = self.take()
+        if kind == "str":
+            return re.sub(r"\\(.)", r"\1", raw[1:-1])
+        if kind == "num":
+            return float(raw) if "." in raw else int(raw)
+        if kind == "ident":
+            lowered = raw.lower()
+            if lowered == "true":
+                return 1
+            if lowered == "false":
+                return 0
+            if lowered == "null":
+                return None
+        raise ApiError(400, f"Unsupported filter value {raw!r}")
+
+
+def sort_sql(sort: str) -> str:
+    parts = []
+    for raw in (sort or "").split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        if raw == "@random":
+            parts.append("RANDOM()")
+            continue
+        direction = "DESC" if raw.startswith("-") else "ASC"
+        name = raw.lstrip("+-")
+        if not re.fullmatch(r"[A-Za-z_]\w*", name):
+            raise ApiError(400, f"Invalid sort field {name!r}")
+        column = "id" if name == "id" else f"json_extract(data, '$.{name}')"
+        parts.append(f"{column} {direction}")
+    parts.append("rowid ASC")
+    return ", ".join(parts)
+
+
+class Store:
+    """SQLite-backed record store. A single lock keeps the stand-in simple and correct."""
+
+    def __init__(self, data_dir: Path, collections: List[Collection]):
+        self.data_dir = data_dir
+        self.files_dir = data_dir / "storage"
+        self.files_dir.mkdir(parents=True, exist_ok=True)
+        self.collections = {c.name: c for c in collections}
+        self.by_id = {c.id: c for c in collections}
+        self.lock = threading.RLock()
+        self.in_transaction = False
+        self._pending_file_removals: List[Path] = []
+        self.db = sqlite3.connect(str(data_dir / "data.db"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS records (collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (collection, id))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_records_user ON records (collection, json_extract(data, '$.user'))")
+        self.db.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Hold the lock and commit once at the end; an exception rolls every write back."""
+        with self.lock:
+            self.in_transaction = True
+            try:
+                yield
+            except BaseException:
+                self.db.rollback()
+                self._pending_file_removals.clear()
+                raise
+            else:
+                self.db.commit()
+                for path in self._pending_file_removals:
+                    shutil.rmtree(path, ignore_errors=True)
+                self._pending_file_removals.clear()
+            finally:
+                self.in_transaction = False
+
+    def commit(self) -> None:
+        if not self.in_transaction:
+            self.db.commit()
+
+    def collection(self, name_or_id: str) -> Collection:
+        found = self.collections.get(name_or_id) or self.by_id.get(name_or_id)
+        if not found:
+            raise ApiError(404, "Missing collection context.")
+        return found
+
+    def get(self, collection: Collection, record_id: str) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT data FROM records WHERE collection=? AND id=?", (collection.name, record_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(
+        self,
+        collection: Collection,
+        where: str,
+        params: List[object],
+        order: str,
+        page: int,
+        per_page: int,
+        skip_total: bool,
+    ) -> Tuple[List[dict], int]:
+        base = f"FROM records WHERE collection=? AND ({where})"
+        args = [collection.name, *params]
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT data {base} ORDER BY {order} LIMIT ? OFFSET ?", (*args, per_page, (page - 1) * per_page)
+            ).fetchall()
+            total = -1 if skip_total else self.db.execute(f"SELECT COUNT(*) {base}", args).fetchone()[0]
+        return [json.loads(r[0]) for r in rows], total
+
+    def find_one(self, collection: Collection, field: str, value) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute(
+                f"SELECT data FROM records WHERE collection=? AND json_extract(data, '$.{field}') = ? LIMIT 1",
+                (collection.name, value),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def check_unique(self, collection: Collection, record: dict) -> None:
+        for _, columns in collection.unique_indexes:
+            clauses = " AND ".join(f"json_extract(data, '$.{c}') = ?" for c in columns)
+            values = [record.get(c) for c in columns]
+            row = self.db.execute(
+                f"SELECT id FROM records WHERE collection=? AND id != ? AND {clauses} LIMIT 1",
+                (collection.name, record["id"], *values),
+            ).fetchone()
+            if row:
+                raise ApiError(
+                    400,
+                    "Failed to create record.",
+                    {c: {"code": "validation_not_unique", "message": "Value must be unique."} for c in columns},
+                )
+
+    def save(self, collection: Collection, record: dict, create: bool) -> dict:
+        with self.lock:
+            if create and self.get(collection, record["id"]):
+                raise ApiError(400, "Failed to create record.", {"id": {"code": "validation_not_unique", "message": "Value must be unique."}})
+            self.check_unique(collection, record)
+            self.db.execute(
+                "INSERT OR REPLACE INTO records (collection, id, data) VALUES (?, ?, ?)",
+                (collection.name, record["id"], json.dumps(record, ensure_ascii=False)),
+            )
+            self.commit()
+        return record
+
+    def delete(self, collection: Collection, record_id: str) -> bool:
+        with self.lock:
+            cur = self.db.execute("DELETE FROM records WHERE collection=? AND id=?", (collection.name, record_id))
+            if self.in_transaction:
+                self._pending_file_removals.append(self.files_dir / collection.id / record_id)
+            else:
+                self.db.commit()
+        if not self.in_transaction:
+            shutil.rmtree(self.files_dir / collection.id / record_id, ignore_errors=True)
+        return cur.rowcount > 0
+
+    def insert_many(self, collection: Collection, records: List[dict]) -> None:
+        """Bulk insert for seeding; skips the unique checks."""
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO records (collection, id, data) VALUES (?, ?, ?)",
+                ((collection.name, r["id"], json.dumps(r, ensure_ascii=False)) for r in records),
+            )
+            self.commit()
+
+    def file_path(self, collection: Collection, record_id: str, name: str) -> Path:
+        return self.files_dir / collection.id / record_id / name
+
+
+def load_collections(schema_file: Path) -> List[Collection]:
+    content = json.loads(schema_file.read_text(encoding="utf-8"))
+    entries = content.get("collections", []) if isinstance(content, dict) else content
+    return [Collection(e) for e in entries if isinstance(e, dict) and e.get("name")]
+
+
+def parse_multipart(body_path: Path, boundary: bytes) -> Tuple[Dict[str, str], List[Tuple[str, str, str, int, int]]]:
+    """Return (text fields, [(field, filename, content_type, start, end)]) offsets into the spooled body."""
+    fields: Dict[str, str] = {}
+    files: List[Tuple[str, str, str, int, int]] = []
+    with body_path.open("rb") as f:
+        if body_path.stat().st_size == 0:
+            return fields, files
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            delimiter = b"--" + boundary
+            pos = mm.find(delimiter)
+            while pos != -1:
+                start = pos + len(delimiter)
+                if mm[start:start + 2] == b"--":
+                    break
+                start += 2
+                header_end = mm.find(b"\r\n\r\n", start)
+                if header_end == -1:
+                    break
+                headers = mm[start:header_end].decode("utf-8", "replace")
+                data_start = header_end + 4
+                next_pos = mm.find(b"\r\n" + delimiter, data_start)
+                if next_pos == -1:
+                    break
+                name_match = re.search(r'name="([^"]*)"', headers)
+                file_match = re.search(r'filename="([^"]*)"', headers)
+                type_match = re.search(r"Content-Type:\s*([^\r\n;]+)", headers, re.I)
+                if name_match:
+                    if file_match:
+                        files.append(
+                            (
+                                name_match.group(1),
+                                file_match.group(1),
+                                (type_match.group(1).strip() if type_match else "application/octet-stream"),
+                                data_start,
+                                next_pos,
+                            )
+                        )
+                    else:
+                        fields[name_match.group(1)] = mm[data_start:next_pos].decode("utf-8", "replace")
+                pos = next_pos + 2
+    return fields, files
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Clients opening hundreds of connections at once must not overflow the accept backlog.
+    request_queue_size = 1024
+
+    def __init__(self, address, store: Store):
+        super().__init__(address, StandinHandler)
+        self.store = store
+        self.stats: Counter = Counter()
+        self.stats_lock = threading.Lock()
+        self.tokens: Dict[str, Tuple[str, str]] = {}
+        self.token_ttl = TOKEN_TTL_SEC
+        self.latency_sec = 0.0
+        self.batch_max_requests = DEFAULT_BATCH_MAX_REQUESTS
+        self.file_tokens: set = set()
+
+    def count(self, route: str, amount: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[route] += amount
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        self.count("connections")
+        return conn, addr
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus delayed
+    # ACKs add ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    server: StandinServer
+
+    def log_message(self, format, *args):  # noqa: A002
+        return
+
+    def setup(self):
+        # The listening socket defers the TLS handshake so accept() never blocks on it.
+        if isinstance(self.request, ssl.SSLSocket):
+            self.request.do_handshake()
+        super().setup()
+
+    # --- plumbing -----------------------------------------------------------------
+
+    def send_json(self, status: int, payload) -> None:
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        gzipped = len(body) >= GZIP_MIN_BYTES and "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if gzipped:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count("bytes_out", len(body))
+
+    def spool_body(self) -> Path:
+        self.body_consumed = True
+        length = int(self.headers.get("Content-Length") or 0)
+        spool = tempfile.NamedTemporaryFile(prefix="standin-body-", dir=self.server.store.data_dir, delete=False)
+        with spool:
+            remaining = length
+            while remaining > 0:
+                chunk = self.rfile.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                spool.write(chunk)
+                remaining -= len(chunk)
+        return Path(spool.name)
+
+    def read_json_body(self) -> dict:
+        self.body_consumed = True
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            raise ApiError(400, "Failed to load the submitted data due to invalid formatting.")
+        return data if isinstance(data, dict) else {}
+
+    def auth(self) -> Optional[Tuple[str, str]]:
+        """Return (collection name, record id) for the bearer token, if any."""
+        header = self.headers.get("Authorization") or ""
+        token = header[7:] if header.lower().startswith("bearer ") else header
+        return self.server.tokens.get(token.strip()) if token else None
+
+    def is_superuser(self, auth: Optional[Tuple[str, str]]) -> bool:
+        return bool(auth and auth[0] == "_superusers")
+
+    def dispatch(self, method: str) -> None:
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        route, handler, groups = self.resolve(method, path)
+        self.server.count(f"{method} {route}")
+        self.body_consumed = False
+        if self.server.latency_sec and path.startswith("/api/"):
+            time.sleep(self.server.latency_sec)
+        try:
+            handler(*groups, query=query)
+        except ApiError as exc:
+            self.send_json(exc.status, exc.to_json())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        if not self.body_consumed:
+            self.discard_body()
+
+    def discard_body(self) -> None:
+        """Drain a body the handler ignored so the next keep-alive request parses cleanly."""
+        remaining = int(self.headers.get("Content-Length") or 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+    ROUTES = (
+        ("GET", r"/api/health", "health"),
+        ("GET", r"/_standin/stats", "stats"),
+        ("POST", r"/_standin/reset", "reset"),
+        ("POST", r"/api/collections/([^/]+)/auth-with-password", "auth_with_password"),
+        ("POST", r"/api/collections/([^/]+)/auth-refresh", "auth_refresh"),
+        ("GET", r"/api/collections", "list_collections"),
+        ("GET", r"/api/collections/([^/]+)", "view_collection"),
+        ("GET", r"/api/collections/([^/]+)/records", "list_records"),
+        ("POST", r"/api/collections/([^/]+)/records", "create_record"),
+        ("GET", r"/api/collections/([^/]+)/records/([^/]+)", "view_record"),
+        ("PATCH", r"/api/collections/([^/]+)/records/([^/]+)", "update_record"),
+        ("DELETE", r"/api/collections/([^/]+)/records/([^/]+)", "delete_record"),
+        ("POST", r"/api/batch", "batch"),
+        ("POST", r"/api/files/token", "file_token"),
+        ("GET", r"/api/files/([^/]+)/([^/]+)/([^/]+)", "download_file"),
+    )
+
+    def resolve(self, method: str, path: str):
+        for route_method, pattern, name in self.ROUTES:
+            if route_method != method:
+                continue
+            match = re.fullmatch(pattern, path)
+            if match:
+                template = re.sub(r"\(\[\^/\]\+\)", "{}", pattern)
+                return template, getattr(self, f"handle_{name}"), match.groups()
+        return path, self.handle_not_found, ()
+
+    def do_GET(self):  # noqa: N802
+        self.dispatch("GET")
+
+    def do_POST(self):  # noqa: N802
+        self.dispatch("POST")
+
+    def do_PATCH(self):  # noqa: N802
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):  # noqa: N802
+        self.dispatch("DELETE")
+
+    # --- access rules -------------------------------------------------------------
+
+    def check_rule(self, collection: Collection, action: str, auth, record: Optional[dict] = None) -> Optional[str]:
+        """Return an owner id to scope by, or None for unrestricted; raise when denied."""
+        if self.is_superuser(auth):
+            return None
+        rule = collection.rule(action)
+        if rule is None:
+            raise ApiError(403, "Only superusers can perform this action.")
+        if "@request.auth.id" in rule and not auth:
+            raise ApiError(401 if action in ("create", "update", "delete") else 403, "The request requires valid authorization token.")
+        if "user = @request.auth.id" in rule.replace("  ", " "):
+            owner = auth[1]
+            if record is not None and record.get("user") not in ("", None, owner):
+                raise ApiError(404 if action in ("view", "update", "delete") else 400, "The requested resource wasn't found.")
+            return owner
+        return None
+
+    # --- handlers -----------------------------------------------------------------
+
+    def handle_not_found(self, query):
+        self.send_json(404, {"code": 404, "message": "The requested resource wasn't found.", "data": {}})
+
+    def handle_health(self, query):
+        self.send_json(200, {"code": 200, "message": "API is healthy.", "data": {}})
+
+    def handle_stats(self, query):
+        with self.server.stats_lock:
+            routes = dict(self.server.stats)
+        meta = {key: routes.pop(key, 0) for key in ("connections", "bytes_out")}
+        self.send_json(200, {"requests": routes, "total": sum(routes.values()), **meta})
+
+    def handle_reset(self, query):
+        with self.server.stats_lock:
+            self.server.stats.clear()
+        self.send_json(204, None)
+
+    def issue_auth(self, collection: Collection, record: dict) -> dict:
+        token = make_token(record["id"], collection.id, ttl_sec=self.server.token_ttl)
+        self.server.tokens[token] = (collection.name, record["id"])
+        return {"token": token, "record": self.public_record(collection, record)}
+
+    def handle_auth_with_password(self, name, query):
+        collection = self.server.store.collection(name)
+        if collection.type != "auth":
+            raise ApiError(400, "The collection is not an auth collection.")
+        body = self.read_json_body()
+        identity = str(body.get("identity") or body.get("email") or "").strip()
+        record = self.server.store.find_one(collection, "email", identity) if identity else None
+        if not record or record.get("password") != body.get("password"):
+            raise ApiError(400, "Failed to authenticate.")
+        self.send_json(200, self.issue_auth(collection, record))
+
+    def handle_auth_refresh(self, name, query):
+        auth = self.auth()
+        collection = self.server.store.collection(name)
+        if not auth or auth[0] != collection.name:
+            raise ApiError(401, "The request requires valid record authorization token.")
+        record = self.server.store.get(collection, auth[1])
+        if not record:
+            raise ApiError(404, "Missing auth record context.")
+        self.send_json(200, self.issue_auth(collection, record))
+
+    def handle_list_collections(self, query):
+        if not self.is_superuser(self.auth()):
+            raise ApiError(403, "Only superusers can perform this action.")
+        items = [c.to_json() for c in self.server.store.collections.values()]
+        self.send_json(200, {"page": 1, "perPage": len(items), "totalItems": len(items), "totalPages": 1, "items": items})
+
+    def handle_view_collection(self, name, query):
+        if not self.is_superuser(self.auth()):
+            raise ApiError(403, "Only superusers can perform this action.")
+        self.send_json(200, self.server.store.collection(name).to_json())
+
+    def public_record(self, collection: Collection, record: dict) -> dict:
+        out = {"collectionId": collection.id, "collectionName": collection.name}
+        for name, field in collection.fields.items():
+            if name in AUTH_HIDDEN_FIELDS:
+                continue
+            out[name] = record.get(name, default_value(field))
+        out["id"] = record["id"]
+        out["created"] = record.get("created", "")
+        out["updated"] = record.get("updated", "")
+        return out
+
+    def handle_list_records(self, name, query):
+        store = self.server.store
+        collection = store.collection(name)
+        owner = self.check_rule(collection, "list", self.auth())
+        where, params = FilterTranslator(query.get("filter", "")).translate()
+        if owner:
+            where = f"({where}) AND json_extract(data, '$.user') = ?"
+            params.append(owner)
+        page = max(1, int(query.get("page") or 1))
+        per_page = min(1000, max(1, int(query.get("perPage") or 30)))
+        skip_total = str(query.get("skipTotal") or "").lower() in ("1", "true")
+        items, total = store.list(collection, where, params, sort_sql(query.get("sort", "")), page, per_page, skip_total)
+        self.send_json(
+            200,
+            {
+                "page": page,
+                "perPage": per_page,
+                "totalItems": total,
+                "totalPages": -1 if total < 0 else (total + per_page - 1) // per_page,
+                "items": [self.project(self.public_record(collection, r), query) for r in items],
+            },
+        )
+
+    @staticmethod
+    def project(record: dict, query: Dict[str, str]) -> dict:
+        """Apply the `fields=a,b` response projection."""
+        wanted = [f.strip() for f in (query.get("fields") or "").split(",") if f.strip()]
+        if not wanted or "*" in wanted:
+            return record
+        return {k: v for k, v in record.items() if k in wanted}
+
+    def handle_view_record(self, name, record_id, query):
+        store = self.server.store
+        collection = store.collection(name)
+        record = store.get(collection, record_id)
+        if not record:
+            raise ApiError(404, "The requested resource wasn't found.")
+        self.check_rule(collection, "view", self.auth(), record)
+        self.send_json(200, self.project(self.public_record(collection, record), query))
+
+    def read_submission(self) -> Tuple[dict, List[Tuple[str, str, str, int, int]], Optional[Path]]:
+        content_type = self.headers.get("Content-Type") or ""
+        if content_type.startswith("multipart/form-data"):
+            match = re.search(r"boundary=\"?([^\";]+)\"?", content_type)
+            if not match:
+                raise ApiError(400, "Missing multipart boundary.")
+            body_path = self.spool_body()
+            fields, files = parse_multipart(body_path, match.group(1).encode())
+            return dict(fields), files, body_path
+        return self.read_json_body(), [], None
+
+    def apply_submission(self, collection: Collection, record: dict, data: dict, files, body_path: Optional[Path]) -> None:
+        errors = {}
+        for key, value in data.items():
+            field = collection.fields.get(key)
+            if field is None or field.get("type") == "file":
+                continue  # PocketBase ignores unknown keys
+            record[key] = coerce_value(field, value)
+        for field_name, filename, mime, start, end in files:
+            field = collection.fields.get(field_name)
+            if field is None or field.get("type") != "file":
+                continue
+            opts = field_options(field)
+            max_size = int(opts.get("maxSize") or 0) or DEFAULT_FILE_MAX_SIZE
+            mime_types = opts.get("mimeTypes") or []
+            size = end - start
+            if size > max_size:
+                errors[field_name] = {
+                    "code": "validation_file_size_limit",
+                    "message": f"Failed to upload {filename!r} - the maximum allowed file size is {max_size} bytes.",
+                    "params": {"file": filename, "maxSize": max_size},
+                }
+                continue
+            if mime_types and mime not in mime_types:
+                errors[field_name] = {
+                    "code": "validation_invalid_mime_type",
+                    "message": f"{filename!r} mime type must be one of: {', '.join(mime_types)}.",
+                    "params": {"file": filename, "types": ", ".join(mime_types)},
+                }
+                continue
+            stem, dot, ext = Path(filename).name.rpartition(".")
+            stored = f"{re.sub(r'[^A-Za-z0-9_]+', '_', stem or ext)[:80]}_{secrets.token_hex(5)}{dot}{ext if stem else ''}"
+            target = self.server.store.file_path(collection, record["id"], stored)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with body_path.open("rb") as src, target.open("wb") as dst:  # type: ignore[union-attr]
+                src.seek(start)
+                remaining = size
+                while remaining > 0:
+                    chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+            record[field_name] = stored
+        if errors:
+            raise ApiError(400, "Failed to update record.", errors)
+
+    def create_record(self, collection: Collection, data: dict, files=(), body_path: Optional[Path] = None) -> dict:
+        record = {n: default_value(f) for n, f in collection.fields.items()}
+        record_id = str(data.get("id") or "").strip() or new_record_id()
+        record["id"] = record_id
+        record["created"] = record["updated"] = pb_now()
+        self.apply_submission(collection, record, data, files, body_path)
+        owner = self.check_rule(collection, "create", self.auth(), record)
+        if owner and not record.get("user"):
+            raise ApiError(400, "Failed to create record.", {"user": {"code": "validation_required", "message": "Missing required value."}})
+        return self.server.store.save(collection, record, create=True)
+
+    def update_record(
+        self, collection: Collection, record_id: str, data: dict, files=(), body_path: Optional[Path] = None
+    ) -> dict:
+        store = self.server.store
+        record = store.get(collection, record_id)
+        if not record:
+            raise ApiError(404, "The requested resource wasn't found.")
+        owner = self.check_rule(collection, "update", self.auth(), record)
+        self.apply_submission(collection, record, data, files, body_path)
+        if owner and record.get("user") != owner:
+            raise ApiError(400, "Failed to update record.", {"user": {"code": "validation_invalid", "message": "Invalid owner."}})
+        record["updated"] = pb_now()
+        return store.save(collection, record, create=False)
+
+    def delete_record(self, collection: Collection, record_id: str) -> None:
+        store = self.server.store
+        record = store.get(collection, record_id)
+        if not record:
+            raise ApiError(404, "The requested resource wasn't found.")
+        self.check_rule(collection, "delete", self.auth(), record)
+        store.delete(collection, record_id)
+
+    def handle_create_record(self, name, query):
+        collection = self.server.store.collection(name)
+        data, files, body_path = self.read_submission()
+        try:
+            record = self.create_record(collection, data, files, body_path)
+        finally:
+            if body_path:
+                body_path.unlink(missing_ok=True)
+        self.send_json(200, self.project(self.public_record(collection, record), query))
+
+    def handle_update_record(self, name, record_id, query):
+        collection = self.server.store.collection(name)
+        data, files, body_path = self.read_submission()
+        try:
+            record = self.update_record(collection, record_id, data, files, body_path)
+        finally:
+            if body_path:
+                body_path.unlink(missing_ok=True)
+        self.send_json(200, self.project(self.public_record(collection, record), query))
+
+    def handle_delete_record(self, name, record_id, query):
+        self.delete_record(self.server.store.collection(name), record_id)
+        self.send_json(204, None)
+
+    BATCH_ROUTES = (
+        ("POST", r"/api/collections/([^/]+)/records"),
+        ("PUT", r"/api/collections/([^/]+)/records"),
+        ("PATCH", r"/api/collections/([^/]+)/records/([^/]+)"),
+        ("DELETE", r"/api/collections/([^/]+)/records/([^/]+)"),
+    )
+
+    def run_batch_request(self, method: str, url: str, body: dict) -> Tuple[int, Optional[dict]]:
+        parsed = urlparse(url)
+        path = unquote(parsed.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        for route_method, pattern in self.BATCH_ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                break
+        else:
+            raise ApiError(400, f"Invalid batch request {method} {path}.")
+        collection = self.server.store.collection(match.group(1))
+        self.server.count(f"batch {method} {re.sub(r'[(][^)]*[)]', '{}', pattern)}")
+        if method == "DELETE":
+            self.delete_record(collection, match.group(2))
+            return 204, None
+        if method == "PATCH":
+            record = self.update_record(collection, match.group(2), body)
+        elif method == "PUT" and body.get("id") and self.server.store.get(collection, str(body["id"])):
+            record = self.update_record(collection, str(body["id"]), body)
+        else:
+            record = self.create_record(collection, body)
+        return 200, self.project(self.public_record(collection, record), query)
+
+    def handle_batch(self, query):
+        """PocketBase batch API: every sub-request commits together or not at all."""
+        requests_ = self.read_json_body().get("requests")
+        if not isinstance(requests_, list) or not requests_:
+            raise ApiError(400, "Failed to read the submitted batch data.", {"requests": {"code": "validation_required", "message": "Cannot be blank."}})
+        if len(requests_) > self.server.batch_max_requests:
+            raise ApiError(
+                400,
+                "Failed to read the submitted batch data.",
+                {"requests": {"code": "validation_length_too_long", "message": f"The length must be no more than {self.server.batch_max_requests}."}},
+            )
+        results: List[dict] = []
+        try:
+            with self.server.store.transaction():
+                for index, item in enumerate(requests_):
+                    item = item if isinstance(item, dict) else {}
+                    body = item.get("body") if isinstance(item.get("body"), dict) else {}
+                    try:
+                        status, payload = self.run_batch_request(str(item.get("method") or "").upper(), str(item.get("url") or ""), body)
+                    except ApiError as exc:
+                        raise ApiError(
+                            400,
+                            "Batch transaction failed.",
+                            {"requests": {str(index): {"code": "batch_request_failed", "message": "Batch request failed.", "response": exc.to_json()}}},
+                        )
+                    results.append({"status": status, "body": payload})
+        finally:
+            self.server.count("batch sub-requests", len(results))
+        self.send_json(200, results)
+
+    def handle_file_token(self, query):
+        if not self.auth():
+            raise ApiError(401, "The request requires valid record authorization token.")
+        token = make_token(self.auth()[1], "files", ttl_sec=120)
+        self.server.file_tokens.add(token)
+        self.send_json(200, {"token": token})
+
+    def handle_download_file(self, name, record_id, filename, query):
+        store = self.server.store
+        collection = store.collection(name)
+        field = next((f for f in collection.fields.values() if f.get("type") == "file"), None)
+        protected = bool(field and field_options(field).get("protected"))
+        if protected and query.get("token") not in self.server.file_tokens and not self.auth():
+            raise ApiError(404, "The requested resource wasn't found.")
+        path = store.file_path(collection, record_id, filename)
+        if not path.is_file():
+            raise ApiError(404, "The requested resource wasn't found.")
+        size = path.stat().st_size
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        with path.open("rb") as f:
+            shutil.copyfileobj(f, self.wfile, COPY_CHUNK_SIZE)
+
+
+def seed_auth_record(store: Store, collection_name: str, spec: str) -> dict:
+    email, _, password = spec.partition(":")
+    if not email or not password:
+        raise ValueError(f"expected email:password, got {spec!r}")
+    collection = store.collection(collection_name)
+    existing = store.find_one(collection, "email", email)
+    record = existing or {n: default_value(f) for n, f in collection.fields.items()}
+    record.update({"email": email, "password": password, "verified": True})
+    record.setdefault("id", new_record_id())
+    if not record.get("tokenKey"):
+        record["tokenKey"] = secrets.token_hex(25)
+    if not existing:
+        record["created"] = record["updated"] = pb_now()
+    return store.save(collection, record, create=not existing)
+
+
+def seed_ai_notes(store: Store, owner_id: str, count: int, seed: int = 0) -> int:
+    """Insert `count` synthetic ai_notes owned by `owner_id`; the same seed yields the same notes."""
+    rng = random.Random(seed)
+    collection = store.collection("ai_notes")
+    now_ms = int(time.time() * 1000)
+    created = pb_now()
+    batch: List[dict] = []
+    # Zipf-weighted made-up words: common words are shared, rare ones tell notes apart.
+    vocabulary = sorted({"".join(rng.choice(SEED_SYLLABLES) for _ in range(rng.randint(1, 3))) for _ in range(SEED_VOCABULARY)})
+    rng.shuffle(vocabulary)
+    cumulative = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def sentence(words: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=words)).capitalize() + "."
+
+    for i in range(count):
+        question = sentence(rng.randint(4, 14))
+        # A few notes have no answer yet, so the backfills' skip paths get exercised too.
+        answer = "" if rng.random() < 0.03 else " ".join(sentence(rng.randint(6, 18)) for _ in range(rng.randint(1, 40)))
+        record = {n: default_value(f) for n, f in collection.fields.items()}
+        record.update(
+            {
+                "id": "".join(rng.choice(ID_ALPHABET) for _ in range(15)),
+                "user": owner_id,
+                "bookId": f"book-{rng.randint(1, max(count // 50, 1)):04d}",
+                "bookTitle": sentence(rng.randint(1, 4))[:-1],
+                "messages": json.dumps([{"role": "user", "content": question}] + ([{"role": "assistant", "content": answer}] if answer else [])),
+                "originalText": sentence(rng.randint(8, 60)),
+                "aiResponse": answer,
+                "status": "done" if answer else "generating",
+                "createdAt": now_ms - rng.randint(0, 365 * 86400) * 1000,
+                "updatedAt": now_ms,
+                "created": created,
+                "updated": created,
+            }
+        )
+        batch.append(record)
+        if len(batch) >= 1000:
+            store.insert_many(collection, batch)
+            batch.clear()
+    if batch:
+        store.insert_many(collection, batch)
+    return count
+
+
+def build_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    schema_file: Path = DEFAULT_SCHEMA_FILE,
+    data_dir: Optional[Path] = None,
+    superusers: Tuple[str, ...] = (),
+    users: Tuple[str, ...] = (),
+    max_file_size: int = 0,
+    tls_cert: Optional[Path] = None,
+    tls_key: Optional[Path] = None,
+    token_ttl: int = TOKEN_TTL_SEC,
+    latency_ms: int = 0,
+    seed_notes: int = 0,
+    seed: int = 0,
+    batch_max_requests: int = DEFAULT_BATCH_MAX_REQUESTS,
+) -> StandinServer:
+    """Create (but do not start) a stand-in server; port=0 picks a free port."""
+    data_dir = data_dir or Path(tempfile.mkdtemp(prefix="pb-standin-"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    collections = load_collections(schema_file)
+    if max_file_size > 0:
+        for collection in collections:
+            for field in collection.fields.values():
+                if field.get("type") == "file":
+                    field["maxSize"] = max_file_size
+                    if isinstance(field.get("options"), dict):
+                        field["options"]["maxSize"] = max_file_size
+    store = Store(data_dir, collections)
+    for spec in superusers:
+        seed_auth_record(store, "_superusers", spec)
+    owners = [seed_auth_record(store, "users", spec) for spec in users]
+    if seed_notes > 0:
+        if not owners:
+            raise ValueError("seeding ai_notes needs a --user to own them")
+        seed_ai_notes(store, owners[0]["id"], seed_notes, seed=seed)
+    server = StandinServer((host, port), store)
+    server.token_ttl = token_ttl
+    server.latency_sec = max(latency_ms, 0) / 1000.0
+    server.batch_max_requests = batch_max_requests
+    if tls_cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(str(tls_cert), str(tls_key) if tls_key else None)
+        server.socket = context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve a local PocketBase stand-in backed by SQLite.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090, help="Port (0 picks a free one)")
+    parser.add_argument("--schema-file", default=str(DEFAULT_SCHEMA_FILE), help="Collections JSON to serve")
+    parser.add_argument("--data-dir", help="Directory for data.db and storage/ (default: temp dir)")
+    parser.add_argument("--superuser", action="append", default=[], help="Seed superuser email:password")
+    parser.add_argument("--user", action="append", default=[], help="Seed users record email:password")
+    parser.add_argument("--max-file-size", type=int, default=0, help="Override maxSize of every file field")
+    parser.add_argument("--tls-cert", help="PEM certificate; serve HTTPS instead of HTTP")
+    parser.add_argument("--tls-key", help="PEM private key for --tls-cert (if not in the same file)")
+    parser.add_argument("--token-ttl", type=int, default=TOKEN_TTL_SEC, help="Auth token lifetime in seconds")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Delay every /api response by this much")
+    parser.add_argument("--seed-notes", type=int, default=0, help="Insert N synthetic ai_notes owned by the first --user")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --seed-notes")
+    parser.add_argument(
+        "--batch-max-requests", type=int, default=DEFAULT_BATCH_MAX_REQUESTS, help="Max sub-requests per /api/batch"
+    )
+    args = parser.parse_args()
+
+    if args.seed_notes and not args.user:
+        print("Error: --seed-notes needs a --user to own the notes", file=sys.stderr)
+        return 2
+    server = build_server(
+        host=args.host,
+        port=args.port,
+        schema_file=Path(args.schema_file),
+        data_dir=Path(args.data_dir) if args.data_dir else None,
+        superusers=tuple(args.superuser),
+        users=tuple(args.user),
+        max_file_size=args.max_file_size,
+        tls_cert=Path(args.tls_cert) if args.tls_cert else None,
+        tls_key=Path(args.tls_key) if args.tls_key else None,
+        token_ttl=args.token_ttl,
+        latency_ms=args.latency_ms,
+        seed_notes=args.seed_notes,
+        seed=args.seed,
+        batch_max_requests=args.batch_max_requests,
+    )
+    host, port = server.server_address[:2]
+    scheme = "https" if args.tls_cert else "http"
+    print(f"PocketBase stand-in listening on {scheme}://{host}:{port} (data={server.store.data_dir})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
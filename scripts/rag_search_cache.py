@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""
+Caching proxy in front of POST /boox-rag-search.
+
+Every /boox-rag-search call embeds the query (one DashScope request) and scores
+up to maxCandidates vectors, even when the same user asks the same question
+again or the app re-queries after a screen rotation. This proxy answers those
+repeats itself:
+- query embeddings, keyed by (normalized query, model, dimensions): the proxy
+  embeds the query and forwards it as `embedding`, so the hook skips its own
+  call. Normalization is NFKC plus collapsed whitespace, case is kept. An
+  embedding does not depend on anyone's notes, so this cache is shared by all
+  users and never invalidated (LRU, --embedding-cache-size entries)
+- results per user, keyed by the query and topK, maxCandidates, minScore,
+  includeContent and documentId: only 200 answers for callers whose token
+  resolves to a users record (checked once per token with auth-refresh, then
+  remembered for --token-ttl), LRU over --result-cache-size entries, at most
+  --result-ttl seconds old. With user credentials instead of admin ones only
+  that user's results are cached
+- invalidation: a realtime (SSE) subscription to the --watch collections
+  (ai_notes and the RAG collections the hooks write for them) drops a user's
+  results on every create/update/delete of one of their records. While the
+  stream is down nothing is served from or stored in the result cache, and on
+  reconnect it starts empty, since changes in between were missed. A search
+  that was in flight when its user's results were invalidated is not stored.
+  PocketBase closes idle realtime connections after a few minutes, so quiet
+  periods also start the result cache over.
+- hit/miss counters: GET /cache-stats (JSON) and --metrics-port/--metrics-textfile
+  (notes_total{state="result_hits"}, ...), stage timings for embed and upstream.
+
+Requests without a users token go through uncached, error answers are never
+stored. A request bringing its own `embedding` is forwarded as is and its
+answer cached under the vector's digest. If the proxy cannot embed, the original
+body is forwarded and the hook embeds. SearchCache is the library part for a search sidecar that wants the
+caches without the HTTP server.
+
+Point the app's rag search URL at the proxy; it needs admin credentials to
+subscribe to every user's changes (user credentials only see their own).
+--model/--dimensions must match DASHSCOPE_EMBED_MODEL/DASHSCOPE_EMBED_DIM of
+the hooks, or the forwarded vectors match no stored embedding.
+
+Usage examples:
+  python3 scripts/rag_search_cache.py --listen 127.0.0.1:8095
+  python3 scripts/rag_search_cache.py --listen 0.0.0.0:8095 --result-ttl 120 --metrics-port 9470
+  curl -s http://127.0.0.1:8095/cache-stats
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+  POCKETBASE_TEST_EMAIL
+  POCKETBASE_TEST_PASSWORD
+  DASHSCOPE_API_KEY
+  DASHSCOPE_EMBED_URL
+  DASHSCOPE_EMBED_MODEL
+  DASHSCOPE_EMBED_DIM
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import http_trace
+from embedding_backends import BACKENDS, DEFAULT_EMBED_TIMEOUT_SEC, EmbeddingBackend, ServiceError, make_backend
+from openmetrics import exporter_from_args
+from pb_client import (
+    PocketBaseClient,
+    PocketBaseError,
+    jwt_exp,
+    load_env_file,
+    login,
+    make_session,
+    resolve_value,
+)
+from run_metrics import RunMetrics, add_run_args, validate_run_args
+
+
+SEARCH_PATH = "/boox-rag-search"
+STATS_PATH = "/cache-stats"
+DEFAULT_LISTEN = "127.0.0.1:8095"
+DEFAULT_EMBEDDING_URL = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1/embeddings"
+DEFAULT_MODEL = "text-embedding-v4"
+DEFAULT_DIMENSIONS = 1024
+DEFAULT_WATCH = "ai_notes,documents,chunks,embeddings"
+DEFAULT_EMBEDDING_CACHE_SIZE = 10000
+DEFAULT_RESULT_CACHE_SIZE = 5000
+DEFAULT_RESULT_TTL_SEC = 300.0
+DEFAULT_TOKEN_TTL_SEC = 600.0
+DEFAULT_UPSTREAM_TIMEOUT_SEC = 120.0
+# PocketBase drops a realtime client after 5 idle minutes; read a little longer than that.
+STREAM_READ_TIMEOUT_SEC = 330.0
+STREAM_RETRY_MAX_SEC = 30.0
+# The request fields that change a /boox-rag-search answer, besides the query.
+RESULT_KEY_FIELDS = ("topK", "limit", "maxCandidates", "minScore", "includeContent", "documentId")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class Counters:
+    requests: int = 0
+    embedding_hits: int = 0
+    embedding_misses: int = 0
+    embedding_failures: int = 0
+    result_hits: int = 0
+    result_misses: int = 0
+    result_bypassed: int = 0
+    results_stored: int = 0
+    results_discarded: int = 0
+    invalidations: int = 0
+    invalidated_results: int = 0
+    stream_connects: int = 0
+    stream_failures: int = 0
+    token_checks: int = 0
+    upstream_errors: int = 0
+
+
+def normalize_query(text: object) -> str:
+    return WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", str(text or ""))).strip()
+
+
+def digest(value: object) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class LruCache:
+    """Thread-safe LRU map with an optional per-entry expiry (time.monotonic seconds)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[object, Tuple[float, object]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: object) -> Optional[object]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] and entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: object, value: object, ttl: float = 0.0) -> List[object]:
+        """Store `value`; returns the keys evicted to make room."""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl if ttl else 0.0, value)
+            self.entries.move_to_end(key)
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[0])
+            return evicted
+
+
+class ResultCache:
+    """Search answers per (user, request key), with per-user invalidation and generations."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.ttl = ttl
+        self.lru = LruCache(max_entries)
+        self.by_user: Dict[str, Set[str]] = {}
+        # Bumped on every invalidation of a user and (epoch) on every clear, so a search
+        # that started before either can tell its answer may be stale.
+        self.generations: Dict[str, int] = {}
+        self.epoch = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lru)
+
+    def stamp(self, user: str) -> Tuple[int, int]:
+        with self.lock:
+            return self.epoch, self.generations.get(user, 0)
+
+    def get(self, user: str, key: str) -> Optional[dict]:
+        return self.lru.get((user, key))  # type: ignore[return-value]
+
+    def put(self, user: str, key: str, payload: dict, stamp: Tuple[int, int]) -> bool:
+        """Store unless `user`'s results were invalidated since `stamp` was taken."""
+        with self.lock:
+            if stamp != (self.epoch, self.generations.get(user, 0)):
+                return False
+            for old_user, old_key in self.lru.put((user, key), payload, self.ttl):  # type: ignore[misc]
+                self.by_user.get(old_user, set()).discard(old_key)
+            self.by_user.setdefault(user, set()).add(key)
+            return True
+
+    def invalidate(self, user: str) -> int:
+        with self.lock:
+            self.generations[user] = self.generations.get(user, 0) + 1
+            keys = self.by_user.pop(user, set())
+            with self.lru.lock:
+                for key in keys:
+                    self.lru.entries.pop((user, key), None)
+            return len(keys)
+
+    def clear(self) -> int:
+        with self.lock:
+            self.epoch += 1
+            self.generations.clear()
+            self.by_user.clear()
+            with self.lru.lock:
+                dropped = len(self.lru.entries)
+                self.lru.entries.clear()
+            return dropped
+
+
+class SearchCache:
+    """
+    The caches around one upstream /boox-rag-search.
+
+    search() takes the caller's Authorization header and JSON body and returns
+    (status, payload, cache) with cache one of "hit", "miss", "bypass".
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        backend: Optional[EmbeddingBackend],
+        counters: Counters,
+        metrics: RunMetrics,
+        embedding_cache_size: int = DEFAULT_EMBEDDING_CACHE_SIZE,
+        result_cache_size: int = DEFAULT_RESULT_CACHE_SIZE,
+        result_ttl: float = DEFAULT_RESULT_TTL_SEC,
+        token_ttl: float = DEFAULT_TOKEN_TTL_SEC,
+        upstream_timeout: float = DEFAULT_UPSTREAM_TIMEOUT_SEC,
+        verify_ssl: bool = True,
+        only_user: str = "",
+    ):
+        self.upstream = upstream.rstrip("/")
+        self.backend = backend
+        self.counters = counters
+        self.metrics = metrics
+        self.embeddings = LruCache(embedding_cache_size)
+        self.results = ResultCache(result_cache_size, result_ttl)
+        self.tokens = LruCache(max(1000, result_cache_size))
+        self.token_ttl = token_ttl
+        self.upstream_timeout = upstream_timeout
+        # With user credentials the stream only carries that user's changes; cache no one else.
+        self.only_user = only_user
+        self.session = make_session(verify_ssl=verify_ssl)
+        # Result caching is only safe while the invalidation stream is up (InvalidationListener).
+        self.live = threading.Event()
+        self.lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            setattr(self.counters, name, getattr(self.counters, name) + amount)
+
+    def stats(self) -> dict:
+        return {
+            **asdict(self.counters),
+            "live": self.live.is_set(),
+            "embedding_entries": len(self.embeddings),
+            "result_entries": len(self.results),
+        }
+
+    def user_of(self, authorization: str) -> str:
+        """The users record id behind a Bearer token, checked upstream once per token; "" if none."""
+        token = authorization.replace("Bearer ", "", 1).strip()
+        if not token:
+            return ""
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        cached = self.tokens.get(key)
+        if cached is not None:
+            return str(cached)
+        self.count("token_checks")
+        user = ""
+        with self.metrics.stage("auth"):
+            resp = self.session.post(
+                f"{self.upstream}/api/collections/users/auth-refresh",
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=self.upstream_timeout,
+            )
+        if resp.status_code == 200:
+            user = str(((resp.json() or {}).get("record") or {}).get("id") or "")
+        elif resp.status_code >= 500:
+            return ""  # do not remember a server-side failure
+        ttl = self.token_ttl
+        expires = jwt_exp(token)
+        if expires:
+            ttl = max(0.0, min(ttl, expires - time.time()))
+        if ttl > 0:
+            self.tokens.put(key, user, ttl)
+        return user
+
+    def query_embedding(self, query: str) -> Optional[List[float]]:
+        if self.backend is None or not query:
+            return None
+        key = (query, self.backend.model, self.backend.dimensions)
+        vector = self.embeddings.get(key)
+        if vector is not None:
+            self.count("embedding_hits")
+            return vector  # type: ignore[return-value]
+        self.count("embedding_misses")
+        try:
+            vector = self.backend.embed([query], timeout=DEFAULT_EMBED_TIMEOUT_SEC)[0]
+        except (ServiceError, ValueError, RuntimeError, OSError) as exc:
+            self.count("embedding_failures")
+            self.metrics.failure(f"embed_{type(exc).__name__}")
+            return None
+        self.embeddings.put(key, vector)
+        return vector
+
+    def forward(self, authorization: str, body: dict) -> Tuple[int, dict]:
+        headers = {"Authorization": authorization} if authorization else {}
+        with self.metrics.stage("upstream"):
+            resp = self.session.post(
+                f"{self.upstream}{SEARCH_PATH}", headers=headers, json=body, timeout=self.upstream_timeout
+            )
+        try:
+            payload = resp.json() if resp.content else {}
+        except ValueError:
+            payload = {"error": resp.text[:500]}
+        if resp.status_code != 200:
+            self.count("upstream_errors")
+            self.metrics.failure(f"upstream_http_{resp.status_code}")
+        return resp.status_code, payload if isinstance(payload, dict) else {"results": payload}
+
+    def search(self, authorization: str, body: dict) -> Tuple[int, dict, str]:
+        self.count("requests")
+        self.metrics.done()
+        query = normalize_query(body.get("query"))
+        own_embedding = body.get("embedding")
+        forwarded = dict(body)
+        if not own_embedding and query:
+            vector = self.query_embedding(query)
+            if vector is not None:
+                forwarded["embedding"] = vector
+
+        user = self.user_of(authorization) if self.live.is_set() else ""
+        if not user or (self.only_user and user != self.only_user) or (not query and not own_embedding):
+            self.count("result_bypassed")
+            status, payload = self.forward(authorization, forwarded)
+            return status, payload, "bypass"
+
+        key = digest(
+            {
+                "query": query if not own_embedding else "",
+                "embedding": digest(own_embedding) if own_embedding else "",
+                **{name: body.get(name) for name in RESULT_KEY_FIELDS},
+            }
+        )
+        cached = self.results.get(user, key)
+        if cached is not None:
+            self.count("result_hits")
+            return 200, cached, "hit"
+        self.count("result_misses")
+        stamp = self.results.stamp(user)
+        status, payload = self.forward(authorization, forwarded)
+        if status == 200 and self.live.is_set():
+            self.count("results_stored" if self.results.put(user, key, payload, stamp) else "results_discarded")
+        return status, payload, "miss"
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def iter_sse(lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+    """(event, data) pairs of a text/event-stream."""
+    event, data = "", []
+    for line in lines:
+        if line == "":
+            if data or event:
+                yield event or "message", "\n".join(data)
+            event, data = "", []
+        elif line.startswith(":"):
+            continue
+        else:
+            name, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if name == "event":
+                event = value
+            elif name == "data":
+                data.append(value)
+
+
+class InvalidationListener:
+    """
+    Keeps a realtime subscription to `collections` and invalidates the owner
+    (the `user` field) of every changed record. Reconnects with backoff; the
+    result cache is cleared and disabled whenever the stream is not connected.
+    """
+
+    def __init__(self, client: PocketBaseClient, cache: SearchCache, collections: List[str]):
+        self.client = client
+        self.cache = cache
+        self.collections = collections
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="rag-cache-realtime", daemon=True)
+
+    def topics(self) -> List[str]:
+        # Only id and user of each changed record; embeddings would otherwise stream whole vectors.
+        options = quote(json.dumps({"query": {"fields": "id,user"}}, separators=(",", ":")))
+        return [f"{name}/*?options={options}" for name in self.collections]
+
+    def start(self) -> "InvalidationListener":
+        self.thread.start()
+        return self
+
+    def close(self) -> None:
+        # The stream read blocks for up to STREAM_READ_TIMEOUT_SEC; the daemon thread is left to exit with us.
+        self.stop.set()
+        self.thread.join(timeout=1)
+
+    def run(self) -> None:
+        delay = 1.0
+        while not self.stop.is_set():
+            try:
+                self.listen()
+                delay = 1.0
+            except (PocketBaseError, OSError, ValueError) as exc:
+                if self.stop.is_set():
+                    return
+                self.cache.count("stream_failures")
+                print(f"Realtime stream failed ({exc}); retrying in {delay:.0f}s", file=sys.stderr)
+            finally:
+                self.cache.live.clear()
+                self.cache.results.clear()
+            self.stop.wait(delay)
+            delay = min(delay * 2, STREAM_RETRY_MAX_SEC)
+
+    def listen(self) -> None:
+        with self.client.request(
+            "GET", "/api/realtime", headers={"Accept": "text/event-stream"}, timeout=(10, STREAM_READ_TIMEOUT_SEC), stream=True
+        ) as resp:
+            if resp.status_code != 200:
+                raise PocketBaseError(f"realtime connect failed: {resp.status_code}", status=resp.status_code)
+            for event, data in iter_sse(resp.iter_lines(decode_unicode=True)):
+                if self.stop.is_set():
+                    return
+                if event == "PB_CONNECT":
+                    client_id = str((json.loads(data or "{}") or {}).get("clientId") or "")
+                    self.client.call(
+                        "POST",
+                        "/api/realtime",
+                        "realtime subscribe",
+                        json_body={"clientId": client_id, "subscriptions": self.topics()},
+                    )
+                    self.cache.results.clear()
+                    self.cache.live.set()
+                    self.cache.count("stream_connects")
+                    continue
+                record = (json.loads(data or "{}") or {}).get("record") or {}
+                user = record.get("user")
+                user = str(user[0] if isinstance(user, list) and user else user or "")
+                if user:
+                    self.cache.count("invalidations")
+                    self.cache.count("invalidated_results", self.cache.results.invalidate(user))
+
+
+def serve(cache: SearchCache, host: str, port: int):
+    """A ThreadingHTTPServer answering POST /boox-rag-search and GET /cache-stats."""
+    # http.server pulls in the email package; only pay for it when the proxy runs.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):  # noqa: A002
+            return
+
+        def send_json(self, status: int, payload: dict, cache_state: str = "") -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if cache_state:
+                self.send_header("X-Cache", cache_state)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):  # noqa: N802
+            if self.path.split("?", 1)[0] != STATS_PATH:
+                self.send_json(404, {"error": "not found"})
+                return
+            self.send_json(200, cache.stats())
+
+        def do_POST(self):  # noqa: N802
+            if self.path.split("?", 1)[0] != SEARCH_PATH:
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+            except ValueError:
+                self.send_json(400, {"error": "invalid JSON body"})
+                return
+            if not isinstance(body, dict):
+                self.send_json(400, {"error": "JSON object body required"})
+                return
+            try:
+                status, payload, cache_state = cache.search(self.headers.get("Authorization") or "", body)
+            except OSError as exc:
+                cache.count("upstream_errors")
+                self.send_json(502, {"error": f"upstream unavailable: {exc}"})
+                return
+            self.send_json(status, payload, cache_state)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Caching proxy for /boox-rag-search with realtime invalidation.")
+    parser.add_argument("--listen", default=DEFAULT_LISTEN, help=f"HOST:PORT to serve on (default: {DEFAULT_LISTEN})")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--email", help="PocketBase users collection email (fallback auth: own changes only)")
+    parser.add_argument("--password", help="PocketBase users collection password (fallback auth)")
+    parser.add_argument("--dashscope-api-key", help="Alibaba DashScope API key")
+    parser.add_argument(
+        "--embedding-backend",
+        choices=BACKENDS,
+        default="openai",
+        help="openai: OpenAI-compatible API; hashing: local feature hashing; onnx: local ONNX sentence model",
+    )
+    parser.add_argument("--embedding-url", help="Embedding API URL (default: DASHSCOPE_EMBED_URL or DashScope)")
+    parser.add_argument("--model", help=f"Embedding model (default: DASHSCOPE_EMBED_MODEL or {DEFAULT_MODEL})")
+    parser.add_argument(
+        "--dimensions", type=int, help=f"Embedding dimensions (default: DASHSCOPE_EMBED_DIM or {DEFAULT_DIMENSIONS})"
+    )
+    parser.add_argument("--onnx-model", help="onnx backend: directory with model.onnx and tokenizer.json")
+    parser.add_argument(
+        "--no-embed", action="store_true", help="Do not embed queries here; the hook embeds (results still cached)"
+    )
+    parser.add_argument("--watch", default=DEFAULT_WATCH, help=f"Collections whose changes invalidate (default: {DEFAULT_WATCH})")
+    parser.add_argument(
+        "--embedding-cache-size", type=int, default=DEFAULT_EMBEDDING_CACHE_SIZE, help="Query embeddings kept"
+    )
+    parser.add_argument("--result-cache-size", type=int, default=DEFAULT_RESULT_CACHE_SIZE, help="Search answers kept")
+    parser.add_argument("--result-ttl", type=float, default=DEFAULT_RESULT_TTL_SEC, help="Max age of a cached answer, seconds")
+    parser.add_argument("--token-ttl", type=float, default=DEFAULT_TOKEN_TTL_SEC, help="How long a checked token is trusted, seconds")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser, progress_sec=60)
+    args = parser.parse_args()
+
+    host, _, port_text = args.listen.rpartition(":")
+    if not host or not port_text.isdigit() or not 0 < int(port_text) < 65536:
+        print("Error: --listen must be HOST:PORT", file=sys.stderr)
+        return 2
+    if args.embedding_cache_size <= 0 or args.result_cache_size <= 0:
+        print("Error: --embedding-cache-size and --result-cache-size must be > 0", file=sys.stderr)
+        return 2
+    if args.result_ttl <= 0 or args.token_ttl <= 0:
+        print("Error: --result-ttl and --token-ttl must be > 0", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+    watch = [name.strip() for name in args.watch.split(",") if name.strip()]
+    if not watch:
+        print("Error: --watch needs at least one collection", file=sys.stderr)
+        return 2
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+    user_email = resolve_value(args.email, "POCKETBASE_TEST_EMAIL", file_env)
+    user_password = resolve_value(args.password, "POCKETBASE_TEST_PASSWORD", file_env)
+    api_key = resolve_value(args.dashscope_api_key, "DASHSCOPE_API_KEY", file_env)
+    embedding_url = resolve_value(args.embedding_url, "DASHSCOPE_EMBED_URL", file_env) or DEFAULT_EMBEDDING_URL
+    model = resolve_value(args.model, "DASHSCOPE_EMBED_MODEL", file_env) or DEFAULT_MODEL
+    dimensions_text = resolve_value(
+        str(args.dimensions) if args.dimensions else None, "DASHSCOPE_EMBED_DIM", file_env
+    ) or str(DEFAULT_DIMENSIONS)
+    if not dimensions_text.isdigit() or int(dimensions_text) <= 0:
+        print("Error: --dimensions/DASHSCOPE_EMBED_DIM must be > 0", file=sys.stderr)
+        return 2
+    dimensions = int(dimensions_text)
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="rag_search_cache")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, auth_user_id = login(client, admin_email, admin_password, user_email, user_password)
+    if not auth_mode:
+        print(
+            "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
+            "or user creds (--email/--password).",
+            file=sys.stderr,
+        )
+        return 2
+
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec, label="requests")
+    backend: Optional[EmbeddingBackend] = None
+    if not args.no_embed:
+        if args.embedding_backend == "openai" and not api_key:
+            print("Error: missing DashScope API key. Use --dashscope-api-key, DASHSCOPE_API_KEY or --no-embed.", file=sys.stderr)
+            return 2
+        try:
+            backend = make_backend(
+                args.embedding_backend,
+                dimensions,
+                url=embedding_url,
+                api_key=api_key or "",
+                model=model,
+                onnx_model=args.onnx_model or "",
+                session=make_session(verify_ssl=not args.insecure),
+                verify_ssl=not args.insecure,
+                metrics=metrics,
+            )
+        except (ValueError, RuntimeError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 2
+        if backend.dimensions != dimensions:
+            backend.close()
+            print(
+                f"Error: {backend.describe()} produces {backend.dimensions}-dim vectors; the hooks expect {dimensions}",
+                file=sys.stderr,
+            )
+            return 2
+
+    cache = SearchCache(
+        base_url,
+        backend,
+        counters,
+        metrics,
+        embedding_cache_size=args.embedding_cache_size,
+        result_cache_size=args.result_cache_size,
+        result_ttl=args.result_ttl,
+        token_ttl=args.token_ttl,
+        verify_ssl=not args.insecure,
+        only_user=(auth_user_id or "") if auth_mode == "user" else "",
+    )
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter = exporter_from_args(metrics, "rag_search_cache", counters, args.metrics_textfile, args.metrics_port)
+        server = serve(cache, host, int(port_text))
+    except OSError as exc:
+        print(f"Error: cannot listen: {exc}", file=sys.stderr)
+        return 2
+    listener = InvalidationListener(client, cache, watch).start()
+    print(
+        f"Serving {SEARCH_PATH} on http://{args.listen}: pb={base_url}, auth={auth_mode}/{client.auth_source}, "
+        f"embedding={backend.describe() if backend else '<hook>'}, watch={','.join(watch)}, "
+        f"result_ttl={args.result_ttl:g}s"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        return metrics.finish_run("Stopped.", counters, 0, args.metrics_json, script="rag_search_cache")
+    finally:
+        server.server_close()
+        listener.close()
+        cache.close()
+        if backend is not None:
+            backend.close()
+        if exporter is not None:
+            exporter.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
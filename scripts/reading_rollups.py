@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Incremental reading analytics: progress/bookmarks changes rolled up per user, book and day in SQLite.
+
+`progress` keeps only the latest locator per user/book and reading time only
+exists on the device (DailyReadingStats), so history has to be collected as it
+happens. `sync` (run it every few minutes from cron) does that:
+1) Streams the progress and bookmarks rows changed since the watermark stored
+   in --db (updatedAt, id cursor), re-reading --lookback-min before it for
+   late client clocks; rows not newer than what the store already saw are skipped
+2) Reads totalProgression out of locatorJson with a regex (the locator can
+   carry long text snippets; json.loads only when the regex misses)
+3) Folds each change into the local SQLite store, one transaction per page:
+   - book_state: last progression and updatedAt per user/book
+   - daily (user, book, day in --tz): updates, forward progress (sum of
+     positive progression deltas; the first sighting of a book only sets the
+     baseline), highest progression, new bookmarks, and estimated reading time:
+     the time between two consecutive updates of the same book when they are at
+     most --session-gap-min apart. The more often sync runs, the closer that
+     gets to DailyReadingStats
+   - user_daily (user, day): the same summed over books, with books active
+`report` answers from the rollups only, never from raw rows:
+   daily (totals per day), users (top readers), books (readers, completions),
+   user --user ID (one reader's days). Other questions: sqlite3 DB, same tables.
+The store remembers the --tz of its first sync and refuses another one.
+
+Usage examples:
+  python3 scripts/reading_rollups.py sync --db reading.sqlite --tz Asia/Taipei
+  python3 scripts/reading_rollups.py report daily --db reading.sqlite --days 14
+  python3 scripts/reading_rollups.py report books --db reading.sqlite --top 20
+  python3 scripts/reading_rollups.py report user --db reading.sqlite --user abc123def456ghi
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+  POCKETBASE_TEST_EMAIL
+  POCKETBASE_TEST_PASSWORD
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import http_trace
+from openmetrics import exporter_from_args
+from pb_client import PocketBaseClient, PocketBaseError, load_env_file, login, quote_filter_value, resolve_value
+from run_metrics import RunMetrics, add_run_args, validate_run_args
+
+
+PROGRESS = "progress"
+BOOKMARKS = "bookmarks"
+DEFAULT_DB = "reading_rollups.sqlite"
+DEFAULT_TZ = "UTC"
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_LOOKBACK_MIN = 10
+DEFAULT_SESSION_GAP_MIN = 30
+DEFAULT_DAYS = 7
+DEFAULT_TOP = 10
+# A book counts as finished at this progression.
+FINISHED_AT = 0.98
+TOTAL_PROGRESSION_RE = re.compile(r'"totalProgression"\s*:\s*(-?[0-9]+(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS watermarks (collection TEXT PRIMARY KEY, ts INTEGER NOT NULL, id TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS book_state (
+    user TEXT NOT NULL, book TEXT NOT NULL, title TEXT, progression REAL, updated_at INTEGER NOT NULL,
+    PRIMARY KEY (user, book)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily (
+    user TEXT NOT NULL, book TEXT NOT NULL, day TEXT NOT NULL,
+    updates INTEGER NOT NULL DEFAULT 0, progress REAL NOT NULL DEFAULT 0, max_progression REAL,
+    reading_ms INTEGER NOT NULL DEFAULT 0, bookmarks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, book, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_daily_day ON daily (day);
+CREATE INDEX IF NOT EXISTS idx_daily_book ON daily (book);
+CREATE TABLE IF NOT EXISTS user_daily (
+    user TEXT NOT NULL, day TEXT NOT NULL, books INTEGER NOT NULL DEFAULT 0, updates INTEGER NOT NULL DEFAULT 0,
+    progress REAL NOT NULL DEFAULT 0, reading_ms INTEGER NOT NULL DEFAULT 0, bookmarks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_user_daily_day ON user_daily (day);
+CREATE TABLE IF NOT EXISTS bookmarks_seen (id TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class Counters:
+    progress_read: int = 0
+    bookmarks_read: int = 0
+    progress_changes: int = 0
+    new_books: int = 0
+    new_bookmarks: int = 0
+    skipped_seen: int = 0
+    unparsed_locators: int = 0
+    pages: int = 0
+
+
+def total_progression(locator_json: object) -> Optional[float]:
+    """totalProgression (0..1) of a Readium locator JSON, falling back to locations.progression."""
+    text = str(locator_json or "")
+    match = TOTAL_PROGRESSION_RE.search(text)
+    if match:
+        value: Optional[float] = float(match.group(1))
+    else:
+        try:
+            locations = (json.loads(text) or {}).get("locations") or {}
+        except (ValueError, AttributeError):
+            return None
+        raw = locations.get("totalProgression", locations.get("progression"))
+        value = float(raw) if isinstance(raw, (int, float)) else None
+    return None if value is None else min(1.0, max(0.0, value))
+
+
+class Store:
+    def __init__(self, path: Path):
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def timezone(self, tz: str) -> str:
+        """The time zone the stored days were cut in; the first sync records `tz`."""
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('tz', ?)", (tz,))
+        return str(self.db.execute("SELECT value FROM meta WHERE key = 'tz'").fetchone()[0])
+
+    def watermark(self, collection: str) -> Tuple[int, str]:
+        row = self.db.execute("SELECT ts, id FROM watermarks WHERE collection = ?", (collection,)).fetchone()
+        return (int(row[0]), str(row[1])) if row else (0, "")
+
+    def set_watermark(self, collection: str, ts: int, record_id: str) -> None:
+        self.db.execute(
+            "INSERT INTO watermarks (collection, ts, id) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection) DO UPDATE SET ts = excluded.ts, id = excluded.id",
+            (collection, ts, record_id),
+        )
+
+    def book_states(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[Optional[float], int]]:
+        states = {}
+        for user, book in set(keys):
+            row = self.db.execute(
+                "SELECT progression, updated_at FROM book_state WHERE user = ? AND book = ?", (user, book)
+            ).fetchone()
+            if row:
+                states[(user, book)] = (row[0], int(row[1]))
+        return states
+
+    def add_daily(self, rows: Dict[Tuple[str, str, str], List[float]]) -> None:
+        """Fold [updates, progress, max_progression, reading_ms, bookmarks] into daily and user_daily."""
+        for (user, book, day), (updates, progress, top, reading_ms, bookmarks) in rows.items():
+            new_book_day = self.db.execute(
+                "SELECT 1 FROM daily WHERE user = ? AND book = ? AND day = ?", (user, book, day)
+            ).fetchone() is None
+            self.db.execute(
+                "INSERT INTO daily (user, book, day, updates, progress, max_progression, reading_ms, bookmarks) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (user, book, day) DO UPDATE SET "
+                "updates = updates + excluded.updates, progress = progress + excluded.progress, "
+                "max_progression = max(coalesce(max_progression, -1), coalesce(excluded.max_progression, -1)), "
+                "reading_ms = reading_ms + excluded.reading_ms, bookmarks = bookmarks + excluded.bookmarks",
+                (user, book, day, int(updates), progress, top if top >= 0 else None, int(reading_ms), int(bookmarks)),
+            )
+            self.db.execute(
+                "INSERT INTO user_daily (user, day, books, updates, progress, reading_ms, bookmarks) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (user, day) DO UPDATE SET "
+                "books = books + excluded.books, updates = updates + excluded.updates, "
+                "progress = progress + excluded.progress, reading_ms = reading_ms + excluded.reading_ms, "
+                "bookmarks = bookmarks + excluded.bookmarks",
+                (user, day, 1 if new_book_day else 0, int(updates), progress, int(reading_ms), int(bookmarks)),
+            )
+
+
+class Syncer:
+    def __init__(
+        self,
+        client: PocketBaseClient,
+        store: Store,
+        args: argparse.Namespace,
+        counters: Counters,
+        metrics: RunMetrics,
+    ):
+        self.client = client
+        self.store = store
+        self.args = args
+        self.counters = counters
+        self.metrics = metrics
+        self.session_gap_ms = int(args.session_gap_min * 60_000)
+
+    def day_of(self, timestamp_ms: int) -> str:
+        return datetime.fromtimestamp(timestamp_ms / 1000, self.args.zone).date().isoformat()
+
+    def changed_rows(self, collection: str, fields: str) -> Iterator[List[dict]]:
+        """Pages of rows by (updatedAt, id) from the stored watermark minus --lookback-min."""
+        ts, _ = self.store.watermark(collection)
+        cursor: Optional[Tuple[int, str]] = None
+        floor = max(0, ts - int(self.args.lookback_min * 60_000)) if ts else 0
+        while True:
+            clauses = [f"updatedAt >= {floor}"]
+            if cursor is not None:
+                clauses.append(
+                    f"(updatedAt > {cursor[0]} || (updatedAt = {cursor[0]} && id > {quote_filter_value(cursor[1])}))"
+                )
+            with self.metrics.stage("read"):
+                listing = self.client.list_records(
+                    collection,
+                    per_page=self.args.page_size,
+                    filter=" && ".join(clauses),
+                    sort="+updatedAt,+id",
+                    fields=fields,
+                    skip_total=True,
+                    timeout=120,
+                )
+            items = listing.get("items") or []
+            self.counters.pages += 1
+            if items:
+                yield items
+            if len(items) < self.args.page_size:
+                return
+            cursor = (int(items[-1].get("updatedAt") or 0), str(items[-1].get("id")))
+
+    def sync_progress(self) -> None:
+        for items in self.changed_rows(PROGRESS, "id,user,bookId,bookTitle,locatorJson,updatedAt"):
+            self.counters.progress_read += len(items)
+            self.metrics.done(len(items))
+            keys = [(str(item.get("user") or ""), str(item.get("bookId") or "")) for item in items]
+            states = self.store.book_states(keys)
+            # [updates, progress, max_progression, reading_ms, bookmarks]
+            rows: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0, 0.0, -1.0, 0, 0])
+            with self.metrics.stage("fold"), self.store.db:
+                for item, key in zip(items, keys):
+                    updated_at = int(item.get("updatedAt") or 0)
+                    previous = states.get(key)
+                    if previous is not None and previous[1] >= updated_at:
+                        self.counters.skipped_seen += 1
+                        continue
+                    progression = total_progression(item.get("locatorJson"))
+                    if progression is None:
+                        self.counters.unparsed_locators += 1
+                    row = rows[(key[0], key[1], self.day_of(updated_at))]
+                    row[0] += 1
+                    if progression is not None:
+                        row[2] = max(row[2], progression)
+                    if previous is None:
+                        self.counters.new_books += 1
+                    else:
+                        if progression is not None and previous[0] is not None and progression > previous[0]:
+                            row[1] += progression - previous[0]
+                        if updated_at - previous[1] <= self.session_gap_ms:
+                            row[3] += updated_at - previous[1]
+                    self.counters.progress_changes += 1
+                    kept = progression if progression is not None else (previous[0] if previous else None)
+                    states[key] = (kept, updated_at)
+                    self.store.db.execute(
+                        "INSERT INTO book_state (user, book, title, progression, updated_at) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (user, book) DO UPDATE SET title = excluded.title, "
+                        "progression = excluded.progression, updated_at = excluded.updated_at",
+                        (key[0], key[1], str(item.get("bookTitle") or ""), kept, updated_at),
+                    )
+                self.store.add_daily(rows)
+                last = items[-1]
+                self.store.set_watermark(PROGRESS, int(last.get("updatedAt") or 0), str(last.get("id")))
+
+    def sync_bookmarks(self) -> None:
+        for items in self.changed_rows(BOOKMARKS, "id,user,bookId,createdAt,updatedAt"):
+            self.counters.bookmarks_read += len(items)
+            self.metrics.done(len(items))
+            rows: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0, 0.0, -1.0, 0, 0])
+            with self.metrics.stage("fold"), self.store.db:
+                for item in items:
+                    inserted = self.store.db.execute(
+                        "INSERT OR IGNORE INTO bookmarks_seen (id) VALUES (?)", (str(item.get("id")),)
+                    ).rowcount
+                    if not inserted:
+                        self.counters.skipped_seen += 1
+                        continue
+                    created = int(item.get("createdAt") or item.get("updatedAt") or 0)
+                    key = (str(item.get("user") or ""), str(item.get("bookId") or ""), self.day_of(created))
+                    rows[key][4] += 1
+                    self.counters.new_bookmarks += 1
+                self.store.add_daily(rows)
+                last = items[-1]
+                self.store.set_watermark(BOOKMARKS, int(last.get("updatedAt") or 0), str(last.get("id")))
+
+
+def hours(ms: int) -> str:
+    return f"{(ms or 0) / 3_600_000:.1f}h"
+
+
+def report(store: Store, args: argparse.Namespace) -> int:
+    row = store.db.execute("SELECT value FROM meta WHERE key = 'tz'").fetchone()
+    today = datetime.now(ZoneInfo(row[0]) if row else args.zone).date()
+    since = (today - timedelta(days=args.days - 1)).isoformat()
+    db = store.db
+    if args.report == "daily":
+        print(f"{'day':<10} {'readers':>7} {'books':>6} {'updates':>8} {'progress':>9} {'reading':>8} {'bookmarks':>9}")
+        for day, readers, books, updates, progress, reading_ms, bookmarks in db.execute(
+            "SELECT day, count(*), sum(books), sum(updates), sum(progress), sum(reading_ms), sum(bookmarks) "
+            "FROM user_daily WHERE day >= ? GROUP BY day ORDER BY day",
+            (since,),
+        ):
+            print(
+                f"{day:<10} {readers:>7} {books:>6} {updates:>8} {progress:>9.2f} {hours(reading_ms):>8} {bookmarks:>9}"
+            )
+    elif args.report == "users":
+        print(f"{'user':<16} {'days':>5} {'books':>6} {'progress':>9} {'reading':>8} {'bookmarks':>9}")
+        for user, days, books, progress, reading_ms, bookmarks in db.execute(
+            "SELECT user, count(*), sum(books), sum(progress), sum(reading_ms), sum(bookmarks) FROM user_daily "
+            "WHERE day >= ? GROUP BY user ORDER BY sum(reading_ms) DESC, sum(progress) DESC LIMIT ?",
+            (since, args.top),
+        ):
+            print(f"{user:<16} {days:>5} {books:>6} {progress:>9.2f} {hours(reading_ms):>8} {bookmarks:>9}")
+    elif args.report == "books":
+        print(f"{'book':<40} {'readers':>7} {'finished':>8} {'progress':>9} {'reading':>8}")
+        for book, title, readers, finished, progress, reading_ms in db.execute(
+            "SELECT d.book, max(s.title), count(DISTINCT d.user), "
+            f"count(DISTINCT CASE WHEN d.max_progression >= {FINISHED_AT} THEN d.user END), "
+            "sum(d.progress), sum(d.reading_ms) FROM daily d "
+            "LEFT JOIN book_state s ON s.user = d.user AND s.book = d.book "
+            "WHERE d.day >= ? GROUP BY d.book ORDER BY count(DISTINCT d.user) DESC, sum(d.reading_ms) DESC LIMIT ?",
+            (since, args.top),
+        ):
+            label = (title or book)[:40]
+            print(f"{label:<40} {readers:>7} {finished:>8} {progress:>9.2f} {hours(reading_ms):>8}")
+    else:
+        print(f"{'day':<10} {'books':>6} {'updates':>8} {'progress':>9} {'reading':>8} {'bookmarks':>9}")
+        for day, books, updates, progress, reading_ms, bookmarks in db.execute(
+            "SELECT day, books, updates, progress, reading_ms, bookmarks FROM user_daily "
+            "WHERE user = ? AND day >= ? ORDER BY day",
+            (args.user, since),
+        ):
+            print(f"{day:<10} {books:>6} {updates:>8} {progress:>9.2f} {hours(reading_ms):>8} {bookmarks:>9}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Roll up progress/bookmarks changes per user, book and day.")
+    parser.add_argument("command", choices=("sync", "report"), help="sync: ingest changes; report: query rollups")
+    parser.add_argument("report", nargs="?", choices=("daily", "users", "books", "user"), default="daily")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"SQLite rollup store (default: {DEFAULT_DB})")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--email", help="PocketBase users collection email (fallback auth: own rows only)")
+    parser.add_argument("--password", help="PocketBase users collection password (fallback auth)")
+    parser.add_argument("--tz", default=DEFAULT_TZ, help=f"IANA time zone days are cut in (default: {DEFAULT_TZ})")
+    parser.add_argument(
+        "--session-gap-min",
+        type=float,
+        default=DEFAULT_SESSION_GAP_MIN,
+        help="Max minutes between two updates of a book still counted as reading",
+    )
+    parser.add_argument(
+        "--lookback-min", type=float, default=DEFAULT_LOOKBACK_MIN, help="Re-read this much before the watermark"
+    )
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Rows per list request")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="report: days back from today")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="report users/books: rows listed")
+    parser.add_argument("--user", help="report user: the user id")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    try:
+        args.zone = ZoneInfo(args.tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"Error: unknown time zone {args.tz!r}", file=sys.stderr)
+        return 2
+    if args.session_gap_min < 0 or args.lookback_min < 0 or args.days <= 0 or args.top <= 0:
+        print("Error: --session-gap-min and --lookback-min must be >= 0, --days and --top > 0", file=sys.stderr)
+        return 2
+    if not 0 < args.page_size <= 1000:
+        print("Error: --page-size must be 1-1000", file=sys.stderr)
+        return 2
+    if args.command == "report" and args.report == "user" and not args.user:
+        print("Error: report user needs --user", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    if args.command == "report":
+        if not Path(args.db).exists():
+            print(f"Error: {args.db} does not exist; run sync first", file=sys.stderr)
+            return 2
+        store = Store(Path(args.db))
+        try:
+            return report(store, args)
+        finally:
+            store.close()
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+    user_email = resolve_value(args.email, "POCKETBASE_TEST_EMAIL", file_env)
+    user_password = resolve_value(args.password, "POCKETBASE_TEST_PASSWORD", file_env)
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="reading_rollups")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, _ = login(client, admin_email, admin_password, user_email, user_password)
+    if not auth_mode:
+        print(
+            "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
+            "or user creds (--email/--password).",
+            file=sys.stderr,
+        )
+        return 2
+
+    store = Store(Path(args.db))
+    stored_tz = store.timezone(args.tz)
+    if stored_tz != args.tz:
+        store.close()
+        print(f"Error: {args.db} holds days cut in {stored_tz}; sync it with --tz {stored_tz}", file=sys.stderr)
+        return 2
+    print(
+        f"Start sync: pb={base_url}, auth={auth_mode}/{client.auth_source}, db={args.db}, tz={args.tz}, "
+        f"watermarks progress={store.watermark(PROGRESS)[0]} bookmarks={store.watermark(BOOKMARKS)[0]}"
+    )
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(metrics, "reading_rollups", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        store.close()
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    syncer = Syncer(client, store, args, counters, metrics)
+    try:
+        syncer.sync_progress()
+        syncer.sync_bookmarks()
+    except KeyboardInterrupt:
+        return metrics.finish_run(
+            "Interrupted; the next sync continues from the watermark.",
+            counters,
+            130,
+            args.metrics_json,
+            script="reading_rollups",
+        )
+    except (PocketBaseError, sqlite3.Error, OSError) as exc:
+        print(f"Fatal error: {exc}", file=sys.stderr)
+        return metrics.finish_run(
+            "Failed; the next sync continues from the watermark.",
+            counters,
+            1,
+            args.metrics_json,
+            script="reading_rollups",
+        )
+    finally:
+        store.close()
+    return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="reading_rollups")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,418 @@
+"""
+Per-stage timing and throughput instrumentation for long script runs.
+
+`RunMetrics` collects:
+- a latency histogram per stage (`with metrics.stage("embed"): ...`), log-bucketed
+  so memory stays constant and p50/p95/p99 are within ~2% however long the run,
+- items/sec over sliding windows (10s and 60s by default),
+- gauges for queue depths when running concurrently (current, mean, max),
+- value distributions (e.g. upsert batch sizes), failures by reason, free-form
+  counters, probes read at export time (e.g. retry counts kept by a client)
+  and the timestamp of the last successful item,
+and prints a progress line with ETA every `progress_sec` once `set_total()`
+knows the candidate count (PocketBase `totalItems`). `write_json()` dumps it
+all at exit for later comparison; openmetrics.py exports the same data for
+Prometheus while the run is going.
+
+Stages may overlap when requests run concurrently, so their summed time can
+exceed the wall clock; `busy_sec` is per stage, not a share of the run.
+
+Usage:
+  metrics = RunMetrics(progress_sec=10)
+  metrics.set_total(int(listing["totalItems"]))
+  with metrics.stage("embed"):
+      vectors = backend.embed(texts)
+  metrics.done()
+  metrics.write_json(Path("metrics.json"), extra={"counters": asdict(counters)})
+
+The scripts share their run options and end-of-run summary through
+add_run_args() / validate_run_args() and RunMetrics.finish_run():
+  add_run_args(parser)
+  args = parser.parse_args()
+  error = validate_run_args(args)
+  ...
+  return metrics.finish_run("Done.", counters, 0, args.metrics_json, script="my_script")
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from typing import Callable, ContextManager, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+# Each histogram bucket is 4% wider than the one below it.
+BUCKET_GROWTH = 1.04
+BUCKET_MIN_MS = 0.001
+RATE_WINDOWS_SEC = (10, 60)
+# The sliding-window rate keeps one (time, done) sample per this interval.
+RATE_SAMPLE_SEC = 0.5
+QUANTILES = (0.5, 0.95, 0.99)
+
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(max(seconds, 0))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+class Histogram:
+    """Sparse log-bucketed histogram of positive values (milliseconds for stages)."""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    @staticmethod
+    def bucket_index(ms: float) -> int:
+        if ms <= BUCKET_MIN_MS:
+            return 0
+        return int(math.log(ms / BUCKET_MIN_MS) / _LOG_GROWTH) + 1
+
+    @staticmethod
+    def bucket_upper_ms(index: int) -> float:
+        return BUCKET_MIN_MS * BUCKET_GROWTH ** index
+
+    def observe(self, ms: float) -> None:
+        index = self.bucket_index(ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Geometric middle of the bucket, clamped to what was actually observed.
+                middle = self.bucket_upper_ms(index) / math.sqrt(BUCKET_GROWTH)
+                return min(max(middle, self.min_ms), self.max_ms)
+        return self.max_ms
+
+    def cumulative(self, bounds_ms: List[float]) -> List[int]:
+        """Observations per upper bound; a bucket straddling a bound is counted under it."""
+        counts = [0] * len(bounds_ms)
+        for index, n in self.buckets.items():
+            lower = self.bucket_upper_ms(index - 1) if index else 0.0
+            for i, bound in enumerate(bounds_ms):
+                if lower < bound:
+                    counts[i] += n
+        return counts
+
+    def summary(self) -> Dict[str, float]:
+        summary = {
+            "count": self.count,
+            "busy_sec": round(self.total_ms / 1000, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+        for q in QUANTILES:
+            summary[f"p{int(q * 100)}_ms"] = round(self.quantile(q), 3)
+        return summary
+
+    def value_summary(self) -> Dict[str, float]:
+        summary = {
+            "count": self.count,
+            "mean": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max": round(self.max_ms, 3),
+        }
+        for q in QUANTILES:
+            summary[f"p{int(q * 100)}"] = round(self.quantile(q), 3)
+        return summary
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+        self.max = 0.0
+        self.samples = 0
+        self.total = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+        self.max = max(self.max, value)
+        self.samples += 1
+        self.total += value
+
+    def summary(self) -> Dict[str, float]:
+        mean = self.total / self.samples if self.samples else 0.0
+        return {"current": self.value, "mean": round(mean, 2), "max": self.max}
+
+
+class RunMetrics:
+    """Stage histograms, sliding-window throughput, gauges and progress for one run."""
+
+    def __init__(self, progress_sec: float = 10.0, label: str = "progress"):
+        self.progress_sec = progress_sec
+        self.label = label
+        self.started = time.time()
+        self.total = 0
+        self.items_done = 0
+        self.stages: Dict[str, Histogram] = {}
+        self.distributions: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Gauge] = {}
+        self.counters: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.probes: Dict[str, Callable[[], float]] = {}
+        self.last_success = 0.0
+        self.exit_status: Optional[int] = None
+        self._finish_hooks: List[Callable[[], None]] = []
+        self._samples: Deque[Tuple[float, int]] = deque([(time.monotonic(), 0)])
+        self._last_report = time.monotonic()
+        self._lock = threading.Lock()
+
+    # --- recording ----------------------------------------------------------------
+
+    def set_total(self, total: int) -> None:
+        self.total = max(int(total), 0)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def observe(self, name: str, ms: float) -> None:
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram()
+            histogram.observe(ms)
+
+    def observe_value(self, name: str, value: float) -> None:
+        """Record a non-latency value, e.g. the size of an upsert batch."""
+        with self._lock:
+            histogram = self.distributions.get(name)
+            if histogram is None:
+                histogram = self.distributions[name] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = self.gauges[name] = Gauge()
+            gauge.set(value)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def failure(self, reason: str) -> None:
+        with self._lock:
+            self.failures[reason] += 1
+
+    def success(self) -> None:
+        self.last_success = time.time()
+
+    def add_probe(self, name: str, read: Callable[[], float]) -> None:
+        """Register a counter owned by someone else; it is read on every snapshot/export."""
+        self.probes[name] = read
+
+    def add_finish_hook(self, hook: Callable[[], None]) -> None:
+        self._finish_hooks.append(hook)
+
+    def finish(self, status: int) -> None:
+        """Record the exit status and run the finish hooks (final exports)."""
+        self.exit_status = status
+        for hook in self._finish_hooks:
+            hook()
+
+    def done(self, amount: int = 1) -> None:
+        """Mark items finished (processed or skipped); drives rates, ETA and progress lines."""
+        now = time.monotonic()
+        with self._lock:
+            self.items_done += amount
+            if now - self._samples[-1][0] >= RATE_SAMPLE_SEC:
+                self._samples.append((now, self.items_done))
+                while len(self._samples) > 2 and now - self._samples[1][0] > max(RATE_WINDOWS_SEC):
+                    self._samples.popleft()
+        self.maybe_report()
+
+    # --- reading ------------------------------------------------------------------
+
+    def rate(self, window_sec: float) -> float:
+        """Items/sec over roughly the last `window_sec` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            base_time, base_done = self._samples[0]
+            for sample_time, sample_done in self._samples:
+                if now - sample_time <= window_sec:
+                    break
+                base_time, base_done = sample_time, sample_done
+            done = self.items_done
+        elapsed = now - base_time
+        return (done - base_done) / elapsed if elapsed > 0 else 0.0
+
+    def eta_sec(self) -> Optional[float]:
+        if not self.total:
+            return None
+        rate = self.rate(max(RATE_WINDOWS_SEC)) or self.rate(min(RATE_WINDOWS_SEC))
+        if rate <= 0:
+            return None
+        return max(self.total - self.items_done, 0) / rate
+
+    def progress_line(self) -> str:
+        parts = [f"[{self.label}] {self.items_done}"]
+        if self.total:
+            parts[0] += f"/{self.total} ({100.0 * self.items_done / self.total:.1f}%)"
+        parts.append(" ".join(f"{self.rate(w):.1f}/s({w}s)" for w in RATE_WINDOWS_SEC))
+        eta = self.eta_sec()
+        if eta is not None:
+            parts.append(f"ETA {format_duration(eta)}")
+        if self.gauges:
+            parts.append(" ".join(f"{name}={gauge.value:g}" for name, gauge in sorted(self.gauges.items())))
+        return " | ".join(parts)
+
+    def maybe_report(self) -> None:
+        if self.progress_sec <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_report < self.progress_sec:
+            return
+        self._last_report = now
+        print(self.progress_line(), flush=True)
+
+    def snapshot(self) -> Dict[str, object]:
+        elapsed = time.time() - self.started
+        with self._lock:
+            stages = {name: histogram.summary() for name, histogram in sorted(self.stages.items())}
+            distributions = {name: h.value_summary() for name, h in sorted(self.distributions.items())}
+            gauges = {name: gauge.summary() for name, gauge in sorted(self.gauges.items())}
+            counters = dict(self.counters)
+            failures = dict(self.failures)
+        return {
+            "started_at": round(self.started, 3),
+            "elapsed_sec": round(elapsed, 3),
+            "total_hint": self.total,
+            "items_done": self.items_done,
+            "items_per_sec": round(self.items_done / elapsed, 3) if elapsed > 0 else 0.0,
+            "items_per_sec_windows": {f"{w}s": round(self.rate(w), 3) for w in RATE_WINDOWS_SEC},
+            "last_success_at": round(self.last_success, 3) if self.last_success else None,
+            "exit_status": self.exit_status,
+            "stages": stages,
+            "distributions": distributions,
+            "gauges": gauges,
+            "counters": counters,
+            "failures": failures,
+            "probes": {name: read() for name, read in sorted(self.probes.items())},
+        }
+
+    def print_stages(self) -> None:
+        snapshot = self.snapshot()
+        if snapshot["stages"]:
+            print(f"  {'stage':<16} {'count':>7} {'busy_s':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+        for name, s in snapshot["stages"].items():
+            print(
+                f"  {name:<16} {s['count']:>7} {s['busy_sec']:8.2f} {s['p50_ms']:9.2f} "
+                f"{s['p95_ms']:9.2f} {s['p99_ms']:9.2f} {s['max_ms']:9.2f}"
+            )
+        for name, g in snapshot["gauges"].items():
+            print(f"  gauge {name}: mean={g['mean']} max={g['max']:g}")
+        for name, d in snapshot["distributions"].items():
+            print(f"  {name}: count={d['count']} mean={d['mean']} p95={d['p95']} max={d['max']:g}")
+        if snapshot["failures"]:
+            print("  failures: " + ", ".join(f"{reason}={n}" for reason, n in sorted(snapshot["failures"].items())))
+
+    def write_json(self, path: Path, extra: Optional[Dict[str, object]] = None) -> None:
+        data = self.snapshot()
+        data.update(extra or {})
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    def finish_run(
+        self,
+        title: str,
+        counters: object,
+        status: int,
+        metrics_json: Optional[str],
+        script: str,
+        extra: Optional[Dict[str, object]] = None,
+        rate_of: Optional[str] = None,
+        skip_zero: bool = False,
+    ) -> int:
+        """
+        Print the end-of-run summary, write --metrics-json if given, and return `status`.
+
+        The summary is `title`, one line per counter (non-zero ones only with
+        skip_zero), elapsed time, `<rate_of>_per_sec` when asked, and the stage table.
+        """
+        values = asdict(counters) if is_dataclass(counters) else dict(counters or {})
+        elapsed = time.time() - self.started
+        print(title)
+        for name, value in values.items():
+            if value or not skip_zero:
+                print(f"  {name}={value}")
+        print(f"  elapsed_sec={elapsed:.1f}")
+        if rate_of and elapsed > 0:
+            print(f"  {rate_of}_per_sec={values.get(rate_of, 0) / elapsed:.0f}")
+        self.print_stages()
+        self.finish(status)
+        if metrics_json:
+            self.write_json(
+                Path(metrics_json),
+                extra={"script": script, "status": status, "counters": values, **(extra or {})},
+            )
+            print(f"Wrote metrics to {metrics_json}")
+        return status
+
+
+def add_run_args(parser: argparse.ArgumentParser, progress_sec: float = 10) -> None:
+    """The options every long-running script takes: progress, metrics export and HTTP trace."""
+    parser.add_argument(
+        "--progress-sec", type=float, default=progress_sec, help="Progress line interval in seconds, 0 disables"
+    )
+    parser.add_argument("--metrics-json", help="Write per-stage timings and throughput to this JSON file at exit")
+    parser.add_argument(
+        "--metrics-textfile",
+        help="Keep Prometheus metrics in this file for the node_exporter textfile collector (name it *.prom)",
+    )
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus/OpenMetrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--trace-file", help="Log every HTTP call to this JSONL file (see trace_summary.py)")
+
+
+def validate_run_args(args: argparse.Namespace) -> Optional[str]:
+    """The usage error in the add_run_args() options, or None."""
+    if args.metrics_port is not None and not 0 < args.metrics_port < 65536:
+        return "--metrics-port must be 1-65535"
+    return None
+
+
+def timed(metrics: Optional[RunMetrics], name: str) -> ContextManager[None]:
+    """metrics.stage(name), or a no-op when the caller runs without metrics."""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def failure_reason(stage: str, exc: BaseException) -> str:
+    """Short label for a failed call: <stage>_http_<status>, _timeout, _network or _error."""
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return f"{stage}_http_{status}"
+    name = type(exc).__name__
+    if isinstance(exc, TimeoutError) or "Timeout" in name:
+        return f"{stage}_timeout"
+    if isinstance(exc, OSError) or "Connection" in name:
+        return f"{stage}_network"
+    return f"{stage}_error"
@@ -17,60 +17,23 @@ import argparse
 import sys
 from typing import Dict, List, Optional, Tuple
 
-import requests
+from pb_client import PocketBaseClient
 
 
 MAIL_QUEUE_NAME = "mail_queue"
 SETTINGS_NAME = "settings"
 
 
-def authenticate_admin(base_url: str, email: str, password: str, verify_ssl: bool = True) -> str:
+def authenticate_admin(client: PocketBaseClient, email: str, password: str) -> str:
     """Authenticate as superuser/admin and return token."""
-    payloads = [{"email": email, "password": password}, {"identity": email, "password": password}]
-    endpoints = [
-        f"{base_url}/api/collections/_superusers/auth-with-password",
-        f"{base_url}/api/admins/auth-with-password",
-    ]
+    token = client.auth_admin(email, password)
+    if not token:
+        raise RuntimeError("Authentication failed with both superuser and admin endpoints")
+    return token
 
-    last_error = None
-    for endpoint in endpoints:
-        for payload in payloads:
-            try:
-                response = requests.post(
-                    endpoint,
-                    json=payload,
-                    verify=verify_ssl,
-                    headers={"Content-Type": "application/json"},
-                    timeout=20,
-                )
-            except requests.RequestException as exc:
-                last_error = str(exc)
-                continue
-
-            if response.status_code == 200:
-                data = response.json()
-                token = data.get("token") or data.get("record", {}).get("token")
-                if token:
-                    return token
-                last_error = f"auth success but token missing: {data}"
-                continue
-
-            last_error = f"{response.status_code} {response.text}"
-
-    raise RuntimeError(f"Authentication failed: {last_error}")
-
-
-def fetch_collections(base_url: str, token: str, verify_ssl: bool = True) -> List[Dict]:
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(
-        f"{base_url}/api/collections",
-        headers=headers,
-        verify=verify_ssl,
-        timeout=20,
-    )
-    response.raise_for_status()
-    data = response.json()
-    return data.get("items", data) if isinstance(data, dict) else data
+
+def fetch_collections(client: PocketBaseClient) -> List[Dict]:
+    return client.list_collections()
 
 
 def find_collection(collections: List[Dict], name: str) -> Optional[Dict]:
@@ -124,30 +87,12 @@ def normalize_fields_for_patch(
     return normalized
 
 
-def patch_collection(
-    base_url: str,
-    token: str,
-    collection_id: str,
-    patch_payload: Dict,
-    verify_ssl: bool = True,
-) -> None:
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    response = requests.patch(
-        f"{base_url}/api/collections/{collection_id}",
-        headers=headers,
-        json=patch_payload,
-        verify=verify_ssl,
-        timeout=30,
-    )
-    if not response.ok:
-        raise RuntimeError(
-            f"PATCH /api/collections/{collection_id} failed: "
-            f"{response.status_code} {response.text}"
-        )
+def patch_collection(client: PocketBaseClient, collection_id: str, patch_payload: Dict) -> None:
+    client.update_collection(collection_id, patch_payload)
 
 
-def ensure_settings_fields(base_url: str, token: str, verify_ssl: bool = True) -> None:
-    collections = fetch_collections(base_url, token, verify_ssl)
+def ensure_settings_fields(client: PocketBaseClient) -> None:
+    collections = fetch_collections(client)
     settings = find_collection(collections, SETTINGS_NAME)
     if settings is None:
         print(f"⚠️  '{SETTINGS_NAME}' collection not found, skip patching settings fields.")
@@ -177,18 +122,12 @@ def ensure_settings_fields(base_url: str, token: str, verify_ssl: bool = True) -
         return
 
     merged_fields = normalize_fields_for_patch(merged_fields)
-    patch_collection(
-        base_url,
-        token,
-        settings["id"],
-        {"fields": merged_fields},
-        verify_ssl,
-    )
+    patch_collection(client, settings["id"], {"fields": merged_fields})
     print(f"✅ settings: added {added} missing field(s)")
 
 
-def ensure_mail_queue_collection(base_url: str, token: str, verify_ssl: bool = True) -> None:
-    collections = fetch_collections(base_url, token, verify_ssl)
+def ensure_mail_queue_collection(client: PocketBaseClient) -> None:
+    collections = fetch_collections(client)
     users_collection = find_collection(collections, "users")
     if users_collection is None:
         raise RuntimeError("PocketBase auth collection 'users' not found.")
@@ -230,7 +169,6 @@ def ensure_mail_queue_collection(base_url: str, token: str, verify_ssl: bool = T
     }
 
     existing = find_collection(collections, MAIL_QUEUE_NAME)
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
 
     if existing is None:
         # Compatibility mode: create bare collection first, then patch fields/rules.
@@ -238,21 +176,10 @@ def ensure_mail_queue_collection(base_url: str, token: str, verify_ssl: bool = T
             "name": MAIL_QUEUE_NAME,
             "type": "base",
         }
-        response = requests.post(
-            f"{base_url}/api/collections",
-            headers=headers,
-            json=create_payload,
-            verify=verify_ssl,
-            timeout=30,
-        )
-        if not response.ok:
-            raise RuntimeError(
-                f"POST /api/collections failed: {response.status_code} {response.text}"
-            )
-        created = response.json()
+        created = client.create_collection(create_payload)
         collection_id = created.get("id")
         if not collection_id:
-            refreshed = fetch_collections(base_url, token, verify_ssl)
+            refreshed = fetch_collections(client)
             created_entry = find_collection(refreshed, MAIL_QUEUE_NAME)
             collection_id = created_entry.get("id") if created_entry else None
         if not collection_id:
@@ -265,7 +192,7 @@ def ensure_mail_queue_collection(base_url: str, token: str, verify_ssl: bool = T
             ),
             **rules_payload,
         }
-        patch_collection(base_url, token, collection_id, patch_payload, verify_ssl)
+        patch_collection(client, collection_id, patch_payload)
         print(f"✅ created collection: {MAIL_QUEUE_NAME}")
         return
 
@@ -278,7 +205,7 @@ def ensure_mail_queue_collection(base_url: str, token: str, verify_ssl: bool = T
         ),
         **rules_payload,
     }
-    patch_collection(base_url, token, existing["id"], patch_payload, verify_ssl)
+    patch_collection(client, existing["id"], patch_payload)
     print(
         f"✅ updated collection: {MAIL_QUEUE_NAME}"
         + (f" (added {added} missing field(s))" if added else "")
@@ -311,14 +238,15 @@ def main() -> None:
 
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+    client = PocketBaseClient(base_url, verify_ssl=verify_ssl)
     try:
         print("🔐 authenticating...")
-        token = authenticate_admin(base_url, args.email, args.password, verify_ssl)
-        print("✅ auth success")
+        authenticate_admin(client, args.email, args.password)
+        print(f"✅ auth success ({client.auth_source})")
 
-        ensure_mail_queue_collection(base_url, token, verify_ssl)
+        ensure_mail_queue_collection(client)
         if not args.skip_settings_fields:
-            ensure_settings_fields(base_url, token, verify_ssl)
+            ensure_settings_fields(client)
 
         print("✨ done")
     except Exception as exc:
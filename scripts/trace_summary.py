@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Summarize HTTP trace files written by http_trace.py (BOOX_HTTP_TRACE / --trace-file).
+
+Prints
+- totals: spans, runs, time range, errors by status / exception
+- latency per service + endpoint template (count, errors, p50/p95/p99/max,
+  busy seconds, KB sent/received, retried calls)
+- the slowest calls with their note id
+- a coarse concurrency timeline: per time bucket the average and peak number
+  of calls in flight, completions and errors
+
+Rotated siblings (trace.jsonl.4 ... trace.jsonl.1) are read before the file
+itself unless --no-rotated is given.
+
+Usage examples:
+  python3 scripts/trace_summary.py /tmp/trace.jsonl
+  python3 scripts/trace_summary.py /tmp/trace.jsonl --service embedding --rows 60
+  python3 scripts/trace_summary.py /tmp/trace.jsonl --run 3f2a9c1b7d0e --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from run_metrics import Histogram
+
+
+def trace_files(path: Path, rotated: bool) -> List[Path]:
+    files: List[Path] = []
+    if rotated:
+        index = 1
+        while path.with_name(f"{path.name}.{index}").exists():
+            index += 1
+        files.extend(path.with_name(f"{path.name}.{i}") for i in range(index - 1, 0, -1))
+    if path.exists():
+        files.append(path)
+    return files
+
+
+def read_spans(files: List[Path]) -> Iterator[Dict[str, object]]:
+    for path in files:
+        with path.open("r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    span = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a truncated last line.
+                    print(f"[warn] {path}:{line_no}: skipping malformed line", file=sys.stderr)
+                    continue
+                if isinstance(span, dict) and "start" in span and "end" in span:
+                    yield span
+
+
+def is_error(span: Dict[str, object]) -> bool:
+    status = span.get("status")
+    return bool(span.get("error")) or not isinstance(status, int) or status >= 400
+
+
+def error_key(span: Dict[str, object]) -> str:
+    if span.get("error"):
+        return str(span["error"]).split(":", 1)[0]
+    return f"HTTP {span.get('status')}"
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def add(self, span: Dict[str, object]) -> None:
+        self.latency.observe(float(span.get("ms") or 0.0))
+        if is_error(span):
+            self.errors += 1
+        if int(span.get("attempt") or 1) > 1:
+            self.retries += 1
+        self.bytes_out += int(span.get("bytes_out") or 0)
+        self.bytes_in += int(span.get("bytes_in") or 0)
+
+    def row(self) -> Dict[str, object]:
+        summary = self.latency.summary()
+        return {
+            "count": summary["count"],
+            "errors": self.errors,
+            "p50_ms": summary["p50_ms"],
+            "p95_ms": summary["p95_ms"],
+            "p99_ms": summary["p99_ms"],
+            "max_ms": summary["max_ms"],
+            "busy_sec": summary["busy_sec"],
+            "kb_out": round(self.bytes_out / 1024, 1),
+            "kb_in": round(self.bytes_in / 1024, 1),
+            "retries": self.retries,
+        }
+
+
+def concurrency_timeline(spans: List[Dict[str, object]], rows: int) -> List[Dict[str, object]]:
+    """Sweep span start/end events into `rows` equal buckets of wall time."""
+    if not spans or rows <= 0:
+        return []
+    first = min(float(s["start"]) for s in spans)
+    last = max(float(s["end"]) for s in spans)
+    width = max(last - first, 1e-6) / rows
+    buckets = [{"t": round(i * width, 3), "avg": 0.0, "max": 0, "done": 0, "errors": 0} for i in range(rows)]
+
+    def bucket_of(t: float) -> int:
+        return min(int((t - first) / width), rows - 1)
+
+    events: List[Tuple[float, int]] = []
+    for span in spans:
+        start, end = float(span["start"]), float(span["end"])
+        events.append((start, 1))
+        events.append((end, -1))
+        bucket = buckets[bucket_of(end)]
+        bucket["done"] += 1
+        if is_error(span):
+            bucket["errors"] += 1
+    # Ends sort before starts at the same instant so back-to-back calls do not count as overlapping.
+    events.sort()
+
+    in_flight = 0
+    cursor = first
+    for t, delta in events:
+        # Spread the time since the previous event over the buckets it covers.
+        while cursor < t:
+            index = bucket_of(cursor)
+            edge = min(first + (index + 1) * width, t)
+            if edge <= cursor:
+                edge = t
+            buckets[index]["avg"] += in_flight * (edge - cursor) / width
+            if in_flight:
+                buckets[index]["max"] = max(buckets[index]["max"], in_flight)
+            cursor = edge
+        in_flight += delta
+        if in_flight:
+            index = bucket_of(t)
+            buckets[index]["max"] = max(buckets[index]["max"], in_flight)
+    for bucket in buckets:
+        bucket["avg"] = round(bucket["avg"], 2)
+    return buckets
+
+
+def summarize(spans: List[Dict[str, object]], slowest: int, rows: int) -> Dict[str, object]:
+    endpoints: Dict[Tuple[str, str], EndpointStats] = {}
+    errors: Counter = Counter()
+    runs: Counter = Counter()
+    for span in spans:
+        key = (str(span.get("service")), f"{span.get('method')} {span.get('endpoint')}")
+        endpoints.setdefault(key, EndpointStats()).add(span)
+        runs[f"{span.get('run')} ({span.get('script')})"] += 1
+        if is_error(span):
+            errors[error_key(span)] += 1
+
+    first = min(float(s["start"]) for s in spans)
+    last = max(float(s["end"]) for s in spans)
+    ranked = sorted(spans, key=lambda s: float(s.get("ms") or 0.0), reverse=True)[:slowest]
+    return {
+        "spans": len(spans),
+        "runs": dict(runs),
+        "start": first,
+        "end": last,
+        "wall_sec": round(last - first, 3),
+        "errors": dict(errors.most_common()),
+        "endpoints": [
+            {"service": service, "endpoint": endpoint, **stats.row()}
+            for (service, endpoint), stats in sorted(
+                endpoints.items(), key=lambda item: item[1].latency.total_ms, reverse=True
+            )
+        ],
+        "slowest": [
+            {
+                "ms": span.get("ms"),
+                "service": span.get("service"),
+                "endpoint": f"{span.get('method')} {span.get('endpoint')}",
+                "status": span.get("status"),
+                "attempt": span.get("attempt"),
+                "note_id": span.get("note_id"),
+                "error": span.get("error"),
+            }
+            for span in ranked
+        ],
+        "timeline": concurrency_timeline(spans, rows),
+    }
+
+
+def format_time(ts: float) -> str:
+    return dt.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def print_report(report: Dict[str, object], width: int) -> None:
+    print(
+        f"[info] spans={report['spans']} runs={len(report['runs'])} "
+        f"from={format_time(report['start'])} to={format_time(report['end'])} wall={report['wall_sec']}s"
+    )
+    for run, count in report["runs"].items():
+        print(f"  run {run}: {count} spans")
+    if report["errors"]:
+        print("[warn] errors: " + ", ".join(f"{key}={n}" for key, n in report["errors"].items()))
+
+    print()
+    print(
+        f"{'service':<11} {'endpoint':<44} {'count':>7} {'err':>5} {'p50ms':>8} {'p95ms':>8} "
+        f"{'p99ms':>8} {'maxms':>8} {'busy_s':>8} {'KBout':>8} {'KBin':>8} {'retry':>5}"
+    )
+    for row in report["endpoints"]:
+        print(
+            f"{row['service']:<11} {row['endpoint'][:44]:<44} {row['count']:>7} {row['errors']:>5} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} "
+            f"{row['busy_sec']:>8.1f} {row['kb_out']:>8.1f} {row['kb_in']:>8.1f} {row['retries']:>5}"
+        )
+
+    if report["slowest"]:
+        print()
+        print("slowest calls:")
+        for span in report["slowest"]:
+            status = span["error"] or span["status"]
+            print(
+                f"  {span['ms']:>9.1f}ms {span['service']:<11} {span['endpoint']:<44} "
+                f"status={status} attempt={span['attempt']} note={span['note_id'] or '-'}"
+            )
+
+    timeline = report["timeline"]
+    if timeline:
+        peak = max(max(bucket["max"] for bucket in timeline), 1)
+        print()
+        print(f"concurrency (calls in flight, # = average, bar scale 0..{peak}):")
+        print(f"  {'+sec':>8} {'avg':>7} {'max':>5} {'done':>6} {'err':>5}")
+        for bucket in timeline:
+            bar = "#" * int(round(bucket["avg"] / peak * width))
+            print(
+                f"  {bucket['t']:>8.2f} {bucket['avg']:>7.1f} {bucket['max']:>5} "
+                f"{bucket['done']:>6} {bucket['errors']:>5} |{bar}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Summarize http_trace JSONL files")
+    parser.add_argument("traces", nargs="+", help="Trace file(s) written via BOOX_HTTP_TRACE or --trace-file")
+    parser.add_argument("--no-rotated", action="store_true", help="Do not read rotated siblings (FILE.1, FILE.2, ...)")
+    parser.add_argument("--run", default="", help="Only spans of this run id")
+    parser.add_argument("--service", default="", help="Only spans of this service (pocketbase, embedding, qdrant, ...)")
+    parser.add_argument("--slowest", type=int, default=10, help="How many slowest calls to list")
+    parser.add_argument("--rows", type=int, default=30, help="Time buckets in the concurrency timeline (0 = none)")
+    parser.add_argument("--width", type=int, default=40, help="Bar width of the timeline")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON instead of tables")
+    args = parser.parse_args()
+
+    if args.slowest < 0 or args.rows < 0 or args.width <= 0:
+        print("Error: --slowest/--rows must be >= 0 and --width > 0", file=sys.stderr)
+        return 2
+
+    files: List[Path] = []
+    for trace in args.traces:
+        found = trace_files(Path(trace), rotated=not args.no_rotated)
+        if not found:
+            print(f"Error: trace file not found: {trace}", file=sys.stderr)
+            return 2
+        files.extend(found)
+
+    spans = [
+        span
+        for span in read_spans(files)
+        if (not args.run or span.get("run") == args.run) and (not args.service or span.get("service") == args.service)
+    ]
+    if not spans:
+        print("[warn] no spans matched")
+        return 1
+
+    report = summarize(spans, slowest=args.slowest, rows=args.rows)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report, width=args.width)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+Measure and warm the LLM translation cache (the `translations` collection).
+
+A cached translation is looked up by `cache_key`. This tool builds keys from
+--key-format (default "{source_lang}:{target_lang}:{model}:{source_text_hash}",
+fields: source_lang, target_lang, model, source_text_hash, video_id, user) where
+source_text_hash is the sha256 of the caption text with whitespace collapsed.
+`analyze` reports how many stored keys match that layout; clients that build
+keys differently should pass their layout, or the warmed entries will not be
+hit.
+
+Commands:
+  analyze  Streams translations and reports:
+           - records, distinct keys and how many match --key-format
+           - source hashes stored under more than one key for the same language
+             pair (each extra key is a redundant LLM call and record), with examples
+           - entries rewritten after creation
+           - with --target-lang, for the timed_captions lines (all, or --video-id):
+             lookups per distinct key (reuse) and the share of lines whose key is
+             cached (the hit ratio interactive requests would see), plus the
+             translation_source mix the clients recorded
+  warm     For the caption sets of --video-id (or --all-videos), translates the
+           distinct lines whose key is not cached yet and stores them:
+           --lines-per-request lines per chat completion, --concurrency requests
+           in flight, at most --rps requests per second, 429/5xx retried with
+           backoff (Retry-After honored). Records are written --batch-size per
+           /api/batch request with ids derived from the key, so a rerun or a race
+           with an interactive request never creates a duplicate.
+
+The LLM is any OpenAI-compatible chat completions endpoint (DashScope
+compatible-mode by default). fake_services.py serves a local stand-in
+(TRANSLATION_API_URL in its env).
+
+Usage examples:
+  python3 scripts/translation_cache.py analyze --target-lang zh
+  python3 scripts/translation_cache.py warm --video-id dQw4w9WgXcQ --source-lang en --target-lang zh
+  python3 scripts/translation_cache.py warm --all-videos --target-lang zh --rps 5 --concurrency 8 --dry-run
+
+Optional env/.env keys:
+  POCKETBASE_URL
+  POCKETBASE_ADMIN_EMAIL
+  POCKETBASE_ADMIN_PASSWORD
+  POCKETBASE_TEST_EMAIL
+  POCKETBASE_TEST_PASSWORD
+  TRANSLATION_API_URL
+  TRANSLATION_API_KEY (falls back to DASHSCOPE_API_KEY)
+  TRANSLATION_MODEL
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+import http_trace
+from embedding_backends import ServiceError
+from openmetrics import exporter_from_args
+from pb_client import (
+    PocketBaseClient,
+    PocketBaseError,
+    load_env_file,
+    login,
+    make_session,
+    print_fatal_error,
+    quote_filter_value,
+    records_path,
+    resolve_value,
+    stable_record_id,
+)
+from run_metrics import RunMetrics, add_run_args, failure_reason, validate_run_args
+
+
+TRANSLATIONS = "translations"
+CAPTIONS = "timed_captions"
+DEFAULT_TRANSLATION_URL = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1/chat/completions"
+DEFAULT_MODEL = "qwen-plus"
+DEFAULT_KEY_FORMAT = "{source_lang}:{target_lang}:{model}:{source_text_hash}"
+KEY_FIELDS = ("source_lang", "target_lang", "model", "source_text_hash", "video_id", "user")
+DEFAULT_SOURCE_LANG = "auto"
+DEFAULT_LINES_PER_REQUEST = 20
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RPS = 2.0
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT_SEC = 120.0
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_TOP = 10
+SYSTEM_PROMPT = (
+    "You translate subtitles. The user message is JSON with source_lang, target_lang and lines. "
+    "Reply with only a JSON array holding the translation of each line, in the same order, and nothing else."
+)
+
+
+@dataclass
+class Counters:
+    translations: int = 0
+    distinct_keys: int = 0
+    key_format_matches: int = 0
+    duplicate_hash_groups: int = 0
+    redundant_records: int = 0
+    rewritten: int = 0
+    captions: int = 0
+    caption_keys: int = 0
+    caption_hits: int = 0
+    missing: int = 0
+    translated: int = 0
+    failed_lines: int = 0
+    llm_requests: int = 0
+    llm_retries: int = 0
+    written: int = 0
+    batches: int = 0
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def make_key(key_format: str, **values: str) -> str:
+    return key_format.format(**{name: values.get(name, "") for name in KEY_FIELDS})
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def parse_reply(body: dict, count: int) -> List[str]:
+    """The translations in a chat completion; ValueError when it is not a JSON array of `count` strings."""
+    choices = body.get("choices") or []
+    content = str(((choices[0] if choices else {}).get("message") or {}).get("content") or "").strip()
+    if content.startswith("```"):
+        content = content.strip("`").split("\n", 1)[-1]
+    lines = json.loads(content)
+    if not isinstance(lines, list) or len(lines) != count or not all(isinstance(line, str) for line in lines):
+        raise ValueError(f"expected a JSON array of {count} strings")
+    return lines
+
+
+class Translator:
+    def __init__(
+        self,
+        session: requests.Session,
+        args: argparse.Namespace,
+        api_key: str,
+        limiter: RateLimiter,
+        metrics: RunMetrics,
+    ):
+        self.session = session
+        self.args = args
+        self.api_key = api_key
+        self.limiter = limiter
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    def request(self, lines: List[str]) -> List[str]:
+        prompt = json.dumps(
+            {"source_lang": self.args.source_lang, "target_lang": self.args.target_lang, "lines": lines},
+            ensure_ascii=False,
+        )
+        payload = {
+            "model": self.args.model,
+            "temperature": 0,
+            "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+        }
+        for attempt in range(self.args.retries + 1):
+            self.limiter.wait()
+            with self.lock:
+                self.requests += 1
+            try:
+                with self.metrics.stage("llm"):
+                    resp = self.session.post(
+                        self.args.translation_url,
+                        headers={"Authorization": f"Bearer {self.api_key}"},
+                        json=payload,
+                        timeout=self.args.timeout,
+                        verify=not self.args.insecure,
+                    )
+                if resp.status_code == 200:
+                    return parse_reply(resp.json(), len(lines))
+                error: Exception = ServiceError(f"translation API failed: {resp.status_code} {resp.text[:300]}", resp.status_code)
+                if resp.status_code != 429 and resp.status_code < 500:
+                    raise error
+                retry_after = resp.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else min(2 ** attempt, 30)
+            except requests.RequestException as exc:
+                error, delay = exc, min(2 ** attempt, 30)
+            if attempt == self.args.retries:
+                raise error
+            self.metrics.failure(failure_reason("llm", error))
+            with self.lock:
+                self.retries += 1
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def translate(self, lines: List[str]) -> List[Optional[str]]:
+        """Translations in order; None for a line that failed. A malformed batch reply is retried line by line."""
+        try:
+            return list(self.request(lines))
+        except ValueError:
+            if len(lines) == 1:
+                return [None]
+        except (ServiceError, requests.RequestException) as exc:
+            self.metrics.failure(failure_reason("llm", exc))
+            print(f"[WARN] translating {len(lines)} lines failed: {exc}", file=sys.stderr)
+            return [None] * len(lines)
+        return [self.translate([line])[0] for line in lines]
+
+
+def iter_captions(client: PocketBaseClient, video_ids: List[str], fields: str) -> Iterator[dict]:
+    if not video_ids:
+        yield from client.iter_records(CAPTIONS, per_page=DEFAULT_PAGE_SIZE, fields=fields)
+        return
+    for video_id in video_ids:
+        yield from client.iter_records(
+            CAPTIONS,
+            per_page=DEFAULT_PAGE_SIZE,
+            filter=f"video_id = {quote_filter_value(video_id)}",
+            sort="+start_sec,+id",
+            fields=fields,
+        )
+
+
+def caption_key(args: argparse.Namespace, caption: dict, text: str) -> str:
+    return make_key(
+        args.key_format,
+        source_lang=args.source_lang,
+        target_lang=args.target_lang,
+        model=args.model,
+        source_text_hash=text_hash(text),
+        video_id=str(caption.get("video_id") or ""),
+        user=str(caption.get("user") or ""),
+    )
+
+
+def analyze(client: PocketBaseClient, args: argparse.Namespace, counters: Counters, metrics: RunMetrics) -> None:
+    keys: Set[str] = set()
+    # (source hash, source lang, target lang) -> keys holding it
+    by_hash: Dict[Tuple[str, str, str], Set[str]] = {}
+    with metrics.stage("read_translations"):
+        for record in client.iter_records(
+            TRANSLATIONS,
+            per_page=DEFAULT_PAGE_SIZE,
+            fields="cache_key,source_text_hash,source_lang,target_lang,model,video_id,user,created,updated",
+        ):
+            counters.translations += 1
+            metrics.done()
+            key = str(record.get("cache_key") or "")
+            keys.add(key)
+            source_hash = str(record.get("source_text_hash") or "")
+            values = {name: str(record.get(name) or "") for name in KEY_FIELDS}
+            if source_hash and key == make_key(args.key_format, **values):
+                counters.key_format_matches += 1
+            if source_hash:
+                group = (source_hash, values["source_lang"], values["target_lang"])
+                by_hash.setdefault(group, set()).add(key)
+            if record.get("created") and record.get("updated") and record["updated"] != record["created"]:
+                counters.rewritten += 1
+    counters.distinct_keys = len(keys)
+    duplicates = sorted(((group, found) for group, found in by_hash.items() if len(found) > 1), key=lambda g: -len(g[1]))
+    counters.duplicate_hash_groups = len(duplicates)
+    counters.redundant_records = sum(len(found) - 1 for _, found in duplicates)
+
+    share = counters.key_format_matches / counters.translations if counters.translations else 0.0
+    print(f"translations: {counters.translations} records, {counters.distinct_keys} distinct keys")
+    print(f"  key format {args.key_format!r} matches {counters.key_format_matches} ({share:.1%})")
+    print(f"  rewritten after creation: {counters.rewritten}")
+    print(
+        f"  source hashes under several keys: {counters.duplicate_hash_groups} "
+        f"({counters.redundant_records} redundant records)"
+    )
+    for (source_hash, source_lang, target_lang), found in duplicates[:args.top]:
+        print(f"    {source_hash[:12]} {source_lang or '?'}->{target_lang or '?'}: {', '.join(key[:48] for key in sorted(found)[:4])}")
+
+    if not args.target_lang:
+        print("captions: pass --target-lang to measure the hit ratio of timed_captions lines")
+        return
+    caption_keys: Counter = Counter()
+    sources: Counter = Counter()
+    with metrics.stage("read_captions"):
+        for caption in iter_captions(client, args.video_id, "video_id,user,source_text,translation_source"):
+            text = str(caption.get("source_text") or "")
+            if not text.strip():
+                continue
+            counters.captions += 1
+            caption_keys[caption_key(args, caption, text)] += 1
+            sources[str(caption.get("translation_source") or "<none>")] += 1
+    counters.caption_keys = len(caption_keys)
+    counters.caption_hits = sum(count for key, count in caption_keys.items() if key in keys)
+    cached_keys = sum(1 for key in caption_keys if key in keys)
+    reuse = counters.captions / counters.caption_keys if counters.caption_keys else 0.0
+    ratio = counters.caption_hits / counters.captions if counters.captions else 0.0
+    print(
+        f"captions: {counters.captions} lines, {counters.caption_keys} distinct keys "
+        f"({reuse:.2f} lookups per key), {cached_keys} keys cached"
+    )
+    print(f"  hit ratio: {ratio:.1%} of lines would be served from the cache ({counters.captions - counters.caption_hits} misses)")
+    print("  translation_source: " + ", ".join(f"{name}={count}" for name, count in sources.most_common()))
+
+
+def existing_keys(client: PocketBaseClient, keys: List[str]) -> Set[str]:
+    listing = client.list_records(
+        TRANSLATIONS,
+        per_page=len(keys),
+        filter=" || ".join(f"cache_key = {quote_filter_value(key)}" for key in keys),
+        fields="cache_key",
+        skip_total=True,
+    )
+    return {str(item.get("cache_key")) for item in listing.get("items") or []}
+
+
+class Writer:
+    """Buffers translation records and writes them --batch-size per /api/batch request."""
+
+    def __init__(self, client: PocketBaseClient, args: argparse.Namespace, counters: Counters, metrics: RunMetrics):
+        self.client = client
+        self.args = args
+        self.counters = counters
+        self.metrics = metrics
+        self.pending: List[dict] = []
+
+    def add(self, record: dict) -> None:
+        self.pending.append(record)
+        if len(self.pending) >= self.args.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        records, self.pending = self.pending, []
+        if not records:
+            return
+        for attempt in range(2):
+            operations = [{"method": "PUT", "url": records_path(TRANSLATIONS), "body": record} for record in records]
+            try:
+                with self.metrics.stage("pb_batch"):
+                    self.client.batch(operations, timeout=300)
+                break
+            except PocketBaseError as exc:
+                if attempt or "validation_not_unique" not in str(exc):
+                    raise
+                # An interactive request cached some of these keys meanwhile; theirs wins.
+                taken = existing_keys(self.client, [str(record["cache_key"]) for record in records])
+                records = [record for record in records if record["cache_key"] not in taken]
+                if not records:
+                    return
+        self.counters.batches += 1
+        self.counters.written += len(records)
+
+
+def warm(
+    client: PocketBaseClient,
+    args: argparse.Namespace,
+    owner: Optional[str],
+    api_key: str,
+    counters: Counters,
+    metrics: RunMetrics,
+) -> None:
+    # key -> line to translate; the first caption seen supplies video_id and user.
+    wanted: Dict[str, Dict[str, str]] = {}
+    lookups: Counter = Counter()
+    with metrics.stage("read_captions"):
+        for caption in iter_captions(client, args.video_id, "video_id,user,source_text"):
+            text = str(caption.get("source_text") or "")
+            if not text.strip():
+                continue
+            counters.captions += 1
+            key = caption_key(args, caption, text)
+            lookups[key] += 1
+            wanted.setdefault(
+                key,
+                {
+                    "text": text.strip(),
+                    "video_id": str(caption.get("video_id") or ""),
+                    "user": owner or str(caption.get("user") or ""),
+                },
+            )
+    counters.caption_keys = len(wanted)
+    keys = list(wanted)
+    missing: List[str] = []
+    with metrics.stage("lookup"):
+        for offset in range(0, len(keys), args.batch_size):
+            chunk = keys[offset:offset + args.batch_size]
+            cached = existing_keys(client, chunk)
+            counters.caption_hits += sum(lookups[key] for key in cached)
+            missing.extend(key for key in chunk if key not in cached)
+    counters.missing = len(missing)
+    print(
+        f"captions: {counters.captions} lines, {len(wanted)} distinct keys, {len(wanted) - len(missing)} cached "
+        f"({counters.caption_hits} lines), {len(missing)} to translate"
+    )
+    if args.dry_run or not missing:
+        return
+
+    metrics.set_total(len(missing))
+    session = make_session(pool_size=args.concurrency, verify_ssl=not args.insecure)
+    translator = Translator(session, args, api_key, RateLimiter(args.rps), metrics)
+    writer = Writer(client, args, counters, metrics)
+    chunks = [missing[offset:offset + args.lines_per_request] for offset in range(0, len(missing), args.lines_per_request)]
+    executor = ThreadPoolExecutor(max_workers=args.concurrency)
+    try:
+        futures = {executor.submit(translator.translate, [wanted[key]["text"] for key in chunk]): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            for key, translation in zip(chunk, future.result()):
+                if translation is None:
+                    counters.failed_lines += 1
+                    continue
+                line = wanted[key]
+                writer.add(
+                    {
+                        "id": stable_record_id(TRANSLATIONS, key),
+                        "cache_key": key,
+                        "video_id": line["video_id"],
+                        "source_lang": args.source_lang,
+                        "target_lang": args.target_lang,
+                        "model": args.model,
+                        "source_text_hash": text_hash(line["text"]),
+                        "translation": translation,
+                        "updated_at": now,
+                        "user": line["user"],
+                    }
+                )
+                counters.translated += 1
+            metrics.done(len(chunk))
+        writer.flush()
+    except BaseException:
+        # Keep what is already translated; the rest is picked up by the next run.
+        executor.shutdown(wait=False, cancel_futures=True)
+        writer.flush()
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        counters.llm_requests = translator.requests
+        counters.llm_retries = translator.retries
+        session.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Analyze and warm the translations cache.")
+    parser.add_argument("command", choices=("analyze", "warm"), help="analyze: report reuse/hits; warm: prefill missing")
+    parser.add_argument("--url", help="PocketBase base URL, e.g. https://pb.example.com")
+    parser.add_argument("--admin-email", help="PocketBase admin/superuser email")
+    parser.add_argument("--admin-password", help="PocketBase admin/superuser password")
+    parser.add_argument("--email", help="PocketBase users collection email (fallback auth: own records only)")
+    parser.add_argument("--password", help="PocketBase users collection password (fallback auth)")
+    parser.add_argument("--video-id", action="append", default=[], help="Caption set to analyze/warm (repeatable)")
+    parser.add_argument("--all-videos", action="store_true", help="warm: every caption set in timed_captions")
+    parser.add_argument("--source-lang", default=DEFAULT_SOURCE_LANG, help="Source language put in keys and prompts")
+    parser.add_argument("--target-lang", help="Target language (required by warm and the caption hit ratio)")
+    parser.add_argument("--model", help=f"LLM model (default: TRANSLATION_MODEL or {DEFAULT_MODEL})")
+    parser.add_argument("--key-format", default=DEFAULT_KEY_FORMAT, help="cache_key layout; fields: " + ", ".join(KEY_FIELDS))
+    parser.add_argument("--translation-url", help="OpenAI-compatible chat completions URL (default: TRANSLATION_API_URL or DashScope)")
+    parser.add_argument("--api-key", help="LLM API key (default: TRANSLATION_API_KEY or DASHSCOPE_API_KEY)")
+    parser.add_argument(
+        "--lines-per-request", type=int, default=DEFAULT_LINES_PER_REQUEST, help="Caption lines per chat completion"
+    )
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="LLM requests in flight")
+    parser.add_argument("--rps", type=float, default=DEFAULT_RPS, help="Max LLM requests per second, 0 = unlimited")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Retries of a throttled/failed LLM request")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SEC, help="LLM request timeout in seconds")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Records per /api/batch request")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Duplicate-hash examples listed by analyze")
+    parser.add_argument("--dry-run", action="store_true", help="warm: count what is missing, call no LLM")
+    parser.add_argument("--insecure", action="store_true", help="Disable TLS verification")
+    add_run_args(parser)
+    args = parser.parse_args()
+
+    file_env = load_env_file(Path(".env"))
+    base_url = resolve_value(args.url, "POCKETBASE_URL", file_env)
+    if not base_url:
+        print("Error: missing PocketBase URL. Use --url or POCKETBASE_URL.", file=sys.stderr)
+        return 2
+    base_url = base_url.rstrip("/")
+    admin_email = resolve_value(args.admin_email, "POCKETBASE_ADMIN_EMAIL", file_env)
+    admin_password = resolve_value(args.admin_password, "POCKETBASE_ADMIN_PASSWORD", file_env)
+    user_email = resolve_value(args.email, "POCKETBASE_TEST_EMAIL", file_env)
+    user_password = resolve_value(args.password, "POCKETBASE_TEST_PASSWORD", file_env)
+    args.model = resolve_value(args.model, "TRANSLATION_MODEL", file_env) or DEFAULT_MODEL
+    args.translation_url = resolve_value(args.translation_url, "TRANSLATION_API_URL", file_env) or DEFAULT_TRANSLATION_URL
+    api_key = resolve_value(args.api_key, "TRANSLATION_API_KEY", file_env) or resolve_value(None, "DASHSCOPE_API_KEY", file_env)
+
+    try:
+        make_key(args.key_format, source_text_hash="x")
+    except (KeyError, IndexError, ValueError) as exc:
+        print(f"Error: --key-format: unknown field or bad format ({exc}); fields: {', '.join(KEY_FIELDS)}", file=sys.stderr)
+        return 2
+    if args.command == "warm":
+        if not args.target_lang:
+            print("Error: warm needs --target-lang", file=sys.stderr)
+            return 2
+        if bool(args.video_id) == args.all_videos:
+            print("Error: warm needs --video-id (repeatable) or --all-videos", file=sys.stderr)
+            return 2
+        if not args.dry_run and not api_key:
+            print("Error: missing LLM API key. Use --api-key, TRANSLATION_API_KEY or DASHSCOPE_API_KEY.", file=sys.stderr)
+            return 2
+    if args.lines_per_request <= 0 or args.concurrency <= 0 or args.rps < 0 or args.retries < 0:
+        print("Error: --lines-per-request and --concurrency must be > 0, --rps and --retries >= 0", file=sys.stderr)
+        return 2
+    if not 0 < args.batch_size <= 1000:
+        print("Error: --batch-size must be 1-1000", file=sys.stderr)
+        return 2
+    error = validate_run_args(args)
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 2
+
+    if args.trace_file:
+        http_trace.enable(args.trace_file, script="translation_cache")
+
+    client = PocketBaseClient(base_url, verify_ssl=not args.insecure)
+    auth_mode, user_id = login(client, admin_email, admin_password, user_email, user_password)
+    if not auth_mode:
+        print(
+            "Error: auth failed. Provide admin creds (--admin-email/--admin-password) "
+            "or user creds (--email/--password).",
+            file=sys.stderr,
+        )
+        return 2
+
+    print(
+        f"Start {args.command}: pb={base_url}, auth={auth_mode}/{client.auth_source}, "
+        f"videos={','.join(args.video_id) or 'all'}, {args.source_lang}->{args.target_lang or '?'}, model={args.model}"
+        + (f", llm={args.translation_url}, rps={args.rps}, concurrency={args.concurrency}" if args.command == "warm" else "")
+    )
+    counters = Counters()
+    metrics = RunMetrics(progress_sec=args.progress_sec)
+    metrics.add_probe("pb_reauth_retries", lambda: client.retries)
+    try:
+        exporter_from_args(metrics, "translation_cache", counters, args.metrics_textfile, args.metrics_port)
+    except OSError as exc:
+        print(f"Error: cannot start metrics export: {exc}", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == "analyze":
+            analyze(client, args, counters, metrics)
+        else:
+            # A user may only own its own records; an admin files each line under the caption's owner.
+            warm(client, args, user_id if auth_mode == "user" else None, api_key or "", counters, metrics)
+    except KeyboardInterrupt:
+        return metrics.finish_run(
+            "Interrupted; rerun to continue.",
+            counters,
+            130,
+            args.metrics_json,
+            script="translation_cache",
+            skip_zero=True,
+        )
+    except Exception as exc:  # noqa: BLE001
+        print_fatal_error(exc)
+        return metrics.finish_run(
+            "Failed; rerun to continue.", counters, 1, args.metrics_json, script="translation_cache", skip_zero=True
+        )
+    return metrics.finish_run(
+        "Done.",
+        counters,
+        1 if counters.failed_lines else 0,
+        args.metrics_json,
+        script="translation_cache",
+        skip_zero=True,
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
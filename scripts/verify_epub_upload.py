@@ -9,6 +9,28 @@ What this script does:
 4) Downloads uploaded file back from PocketBase
 5) Verifies downloaded bytes hash equals local file hash
 
+The upload target (file field, MIME type, maxSize) is cached per server: the
+field/MIME the server last accepted, and the maxSize from the live schema
+(superuser tokens) or learned from a `validation_file_size_limit` rejection.
+Files larger than a known maxSize are rejected before upload. Without a cache
+entry the target comes from the live schema or, for regular users who cannot
+read it, from the local schema snapshot; the snapshot's maxSize is only a hint,
+so the server decides and its answer is cached. A rejected target fails once
+(and is forgotten) instead of probing other fields; candidate fields are only
+probed when no schema is available at all.
+
+The EPUB is read from disk once: the multipart body is streamed from a reader
+that hashes as it goes. A local hash index (path/size/mtime -> sha256, filled
+by earlier runs) finds a books record that already holds this file; its stored
+copy is then verified without uploading anything. Otherwise the record is
+created hidden (deleted=true, which device sync skips) under a provisional
+bookId and finalized with the streamed hash, so a file that changes on disk can
+never be stored under a stale bookId. Provisional records left behind by an
+interrupted run are swept on the next run.
+
+Title, author, language and cover href are read from the OPF (see
+epub_metadata.py) unless --title is given.
+
 Usage:
   python3 scripts/verify_epub_upload.py \
     --email your_user@example.com \
@@ -19,6 +41,7 @@ Optional env/.env keys:
   POCKETBASE_URL
   POCKETBASE_TEST_EMAIL
   POCKETBASE_TEST_PASSWORD
+  BOOX_CACHE_DIR (default: ~/.cache/booxreader)
 """
 
 from __future__ import annotations
@@ -26,143 +49,460 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
-import os
 import sys
 import time
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from urllib.parse import quote
 
 import requests
 
+from epub_metadata import EpubMetadata, read_epub_metadata
+from pb_client import (
+    PocketBaseClient,
+    cache_dir,
+    compact_error_text,
+    load_env_file,
+    quote_filter_value,
+    resolve_value,
+)
+
 
 FILE_FIELD_CANDIDATES = ("bookFile", "file", "epubFile", "epub", "asset", "book")
 MIME_CANDIDATES = ("application/epub+zip", "application/zip", "application/octet-stream")
+# PocketBase applies a 5MB limit when a file field's maxSize is 0/unset.
+DEFAULT_FILE_MAX_SIZE = 5242880
+DEFAULT_TITLE = "Upload Verification Book"
+UPLOAD_TARGET_CACHE_NAME = "upload_targets.json"
+HASH_INDEX_NAME = "epub_hash_index.json"
+READ_CHUNK_SIZE = 1024 * 1024
+PROVISIONAL_BOOK_ID_PREFIX = "pending-"
+# Provisional records older than this belong to a run that did not finish.
+PROVISIONAL_MAX_AGE_MS = 60 * 60 * 1000
+
+
+@dataclass
+class ReadStats:
+    bytes_read: int = 0
+    bytes_uploaded: int = 0
+    last_sha256: Optional[str] = None
+
+    @property
+    def read_per_uploaded_byte(self) -> float:
+        if self.bytes_uploaded <= 0:
+            return 0.0
+        return self.bytes_read / self.bytes_uploaded
+
+
+def sha256_of_file(path: Path, stats: Optional[ReadStats] = None) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            if stats is not None:
+                stats.bytes_read += len(chunk)
+    return digest.hexdigest()
+
+
+class HashingFileReader:
+    """File reader that tees every chunk into a sha256 digest."""
+
+    def __init__(self, f, stats: ReadStats):
+        self._f = f
+        self._stats = stats
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._f.read(size)
+        if chunk:
+            self.digest.update(chunk)
+            self._stats.bytes_read += len(chunk)
+        return chunk
+
+
+class MultipartFileBody:
+    """
+    Streaming multipart/form-data body with a known Content-Length.
+
+    `requests` buffers the whole file when using `files=`; passing this object
+    as `data=` streams it instead, hashing the file bytes on the way out.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        file_field: str,
+        file_path: Path,
+        mime: str,
+        stats: ReadStats,
+    ):
+        self.boundary = uuid.uuid4().hex
+        self._stats = stats
+        self._file_path = file_path
+        self._file_size = file_path.stat().st_size
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            )
+        parts.append(
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{file_path.name}"\r\n'
+            f"Content-Type: {mime}\r\n\r\n"
+        )
+        self._head = "".join(parts).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._file = None
+        self._reader: Optional[HashingFileReader] = None
+        self._segment = 0
+        self._offset = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self._head) + self._file_size + len(self._tail)
+
+    def __enter__(self) -> "MultipartFileBody":
+        self._file = self._file_path.open("rb")
+        self._reader = HashingFileReader(self._file, self._stats)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size: int = -1) -> bytes:
+        if self._reader is None:
+            raise RuntimeError("MultipartFileBody must be used as a context manager")
+        if size is None or size < 0:
+            size = len(self)
+        out = b""
+        while len(out) < size and self._segment < 3:
+            want = size - len(out)
+            if self._segment == 1:
+                chunk = self._reader.read(want)
+                if not chunk:
+                    self._segment += 1
+                    continue
+                self._stats.bytes_uploaded += len(chunk)
+                out += chunk
+                continue
+            data = self._head if self._segment == 0 else self._tail
+            chunk = data[self._offset:self._offset + want]
+            self._offset += len(chunk)
+            out += chunk
+            if self._offset >= len(data):
+                self._segment += 1
+                self._offset = 0
+        return out
+
+    def sha256(self) -> str:
+        if self._reader is None:
+            raise RuntimeError("body has not been streamed")
+        return self._reader.digest.hexdigest()
+
+
+def hash_index_key(path: Path) -> Tuple[str, int, int]:
+    st = path.stat()
+    return str(path.resolve()), st.st_size, st.st_mtime_ns
+
+
+@dataclass(frozen=True)
+class UploadTarget:
+    field: str
+    max_size: int  # 0: unknown
+    mime_types: Tuple[str, ...]
+    source: str = "server"
+    mime: str = ""  # the MIME type the server last accepted
+
+    def pick_mime(self) -> str:
+        if self.mime:
+            return self.mime
+        if not self.mime_types:
+            return MIME_CANDIDATES[0]
+        for mime in MIME_CANDIDATES:
+            if mime in self.mime_types:
+                return mime
+        return self.mime_types[0]
+
+    def to_json(self) -> Dict[str, object]:
+        data: Dict[str, object] = {"field": self.field, "maxSize": self.max_size, "mimeTypes": list(self.mime_types)}
+        if self.mime:
+            data["mime"] = self.mime
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict[str, object], source: str) -> Optional["UploadTarget"]:
+        field = str(data.get("field") or "").strip()
+        if not field:
+            return None
+        try:
+            max_size = int(data.get("maxSize") or 0)
+        except (TypeError, ValueError):
+            max_size = 0
+        mime_types = tuple(str(m) for m in (data.get("mimeTypes") or []) if m)
+        mime = str(data.get("mime") or "").strip()
+        return cls(field=field, max_size=max(max_size, 0), mime_types=mime_types, source=source, mime=mime)
+
+    def checks_size(self) -> bool:
+        """Whether max_size came from the server (live schema or a learned rejection)."""
+        return self.max_size > 0 and self.source != "schema-file"
+
+
+def file_field_options(field: dict) -> Tuple[int, Tuple[str, ...]]:
+    """Read maxSize/mimeTypes from both flat (v0.23+) and legacy `options` field layouts."""
+    options = field.get("options") if isinstance(field.get("options"), dict) else {}
+    raw_max = field.get("maxSize", options.get("maxSize"))
+    try:
+        max_size = int(raw_max or 0)
+    except (TypeError, ValueError):
+        max_size = 0
+    mime_types = field.get("mimeTypes")
+    if mime_types is None:
+        mime_types = options.get("mimeTypes")
+    return max_size or DEFAULT_FILE_MAX_SIZE, tuple(str(m) for m in (mime_types or []) if m)
+
+
+def upload_target_from_collection(
+    collection: dict,
+    preferred_field: Optional[str] = None,
+    source: str = "server",
+) -> Optional[UploadTarget]:
+    fields = collection.get("fields") or collection.get("schema") or []
+    file_fields = {
+        str(f.get("name")): f for f in fields if isinstance(f, dict) and f.get("type") == "file" and f.get("name")
+    }
+    if not file_fields:
+        return None
 
+    if preferred_field:
+        names: List[str] = [preferred_field] if preferred_field in file_fields else []
+    else:
+        names = [name for name in FILE_FIELD_CANDIDATES if name in file_fields]
+        # Fall back to any file field that accepts EPUB/ZIP (or anything).
+        for name, field in file_fields.items():
+            _, mimes = file_field_options(field)
+            if name not in names and (not mimes or any(m in mimes for m in MIME_CANDIDATES)):
+                names.append(name)
+    if not names:
+        return None
+
+    max_size, mime_types = file_field_options(file_fields[names[0]])
+    return UploadTarget(field=names[0], max_size=max_size, mime_types=mime_types, source=source)
 
-def load_env_file(path: Path) -> Dict[str, str]:
-    env: Dict[str, str] = {}
+
+def fetch_books_collection(client: PocketBaseClient) -> Optional[dict]:
+    """Return the books collection definition, or None when the token may not read schemas."""
+    try:
+        resp = client.request("GET", "/api/collections/books")
+    except requests.RequestException:
+        return None
+    if resp.status_code != 200:
+        return None
+    data = resp.json() if resp.text else {}
+    return data if isinstance(data, dict) else None
+
+
+def load_books_collection_from_schema_file(path: Path) -> Optional[dict]:
     if not path.exists():
-        return env
-    for raw in path.read_text(encoding="utf-8").splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#") or "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        key = key.strip()
-        value = value.strip().strip("'").strip('"')
-        if key:
-            env[key] = value
-    return env
+        return None
+    try:
+        content = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    collections = content.get("collections", []) if isinstance(content, dict) else content
+    for entry in collections or []:
+        if isinstance(entry, dict) and entry.get("name") == "books":
+            return entry
+    return None
 
 
-def resolve_value(explicit: Optional[str], env_key: str, file_env: Dict[str, str]) -> Optional[str]:
-    if explicit:
-        return explicit
-    return os.getenv(env_key) or file_env.get(env_key)
+def load_cached_upload_target(base_url: str) -> Optional[UploadTarget]:
+    path = cache_dir() / UPLOAD_TARGET_CACHE_NAME
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    entry = data.get(base_url) if isinstance(data, dict) else None
+    if not isinstance(entry, dict):
+        return None
+    return UploadTarget.from_json(entry, source="cache")
 
 
-def sha256_of_file(path: Path) -> str:
-    digest = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            digest.update(chunk)
-    return digest.hexdigest()
+def store_cached_upload_target(base_url: str, target: Optional[UploadTarget]) -> None:
+    """Persist (or with target=None, forget) the upload target for one server."""
+    path = cache_dir() / UPLOAD_TARGET_CACHE_NAME
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if not isinstance(data, dict):
+            data = {}
+    except (OSError, ValueError):
+        data = {}
+    if target is None:
+        if data.pop(base_url, None) is None:
+            return
+    else:
+        data[base_url] = target.to_json()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    except OSError as exc:
+        print(f"[warn] could not write upload target cache {path}: {exc}")
+
+
+def discover_upload_target(
+    client: PocketBaseClient,
+    preferred_field: Optional[str] = None,
+    schema_file: Optional[Path] = None,
+    use_cache: bool = True,
+) -> Optional[UploadTarget]:
+    """
+    Resolve the books file field once instead of probing it with uploads.
+
+    Order: per-server cache -> live collection schema (superuser tokens only)
+    -> local schema snapshot. Live schemas are cached here; upload_epub caches
+    the field/MIME the server accepts, so regular users skip this after one run.
+    """
+    if use_cache:
+        cached = load_cached_upload_target(client.base_url)
+        if cached and (not preferred_field or cached.field == preferred_field):
+            return cached
+
+    collection = fetch_books_collection(client)
+    if collection:
+        target = upload_target_from_collection(collection, preferred_field, source="server")
+        if target and use_cache:
+            store_cached_upload_target(client.base_url, target)
+        if target:
+            return target
+
+    if schema_file:
+        collection = load_books_collection_from_schema_file(schema_file)
+        if collection:
+            return upload_target_from_collection(collection, preferred_field, source="schema-file")
+    return None
 
 
-def auth_user(base_url: str, email: str, password: str, verify_ssl: bool) -> Tuple[str, str]:
-    endpoint = f"{base_url}/api/collections/users/auth-with-password"
-    payloads = (
-        {"identity": email, "password": password},
-        {"email": email, "password": password},
-    )
-    print(f"[info] authenticating user {email}")
-    print(f"[info] authenticating user {password}")
-    last_error = ""
-    for payload in payloads:
-        resp = requests.post(endpoint, json=payload, timeout=30, verify=verify_ssl)
-        if resp.status_code == 200:
-            data = resp.json()
-            token = data.get("token")
-            print(f"[debug] auth token: {token}")
-            user_id = ((data.get("record") or {}).get("id") or "").strip()
-            if not token or not user_id:
-                raise RuntimeError("Auth succeeded but token/user id missing in response")
-            return token, user_id
-        last_error = f"{resp.status_code} {resp.text[:400]}"
-    raise RuntimeError(f"Authentication failed: {last_error}")
-
-
-def auth_headers(token: str) -> Dict[str, str]:
-    return {"Authorization": f"Bearer {token}"}
-
-
-def query_existing_book(base_url: str, token: str, user_id: str, book_id: str, verify_ssl: bool) -> Optional[dict]:
-    endpoint = f"{base_url}/api/collections/books/records"
-    filter_value = f"(user='{user_id}'&&bookId='{book_id}')"
-    resp = requests.get(
-        endpoint,
-        params={"filter": filter_value, "perPage": 1},
-        headers=auth_headers(token),
-        timeout=30,
-        verify=verify_ssl,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"Failed to query books: {resp.status_code} {resp.text[:400]}")
-    items = (resp.json() or {}).get("items") or []
-    return items[0] if items else None
+def load_hash_index() -> Dict[str, dict]:
+    path = cache_dir() / HASH_INDEX_NAME
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def lookup_indexed_sha256(path: Path) -> Optional[str]:
+    """Return a previously computed sha256 if the file's size and mtime are unchanged."""
+    key, size, mtime_ns = hash_index_key(path)
+    entry = load_hash_index().get(key)
+    if not isinstance(entry, dict):
+        return None
+    if entry.get("size") != size or entry.get("mtimeNs") != mtime_ns:
+        return None
+    value = str(entry.get("sha256") or "").strip()
+    return value or None
+
+
+def store_indexed_sha256(index_key: Tuple[str, int, int], sha256: str) -> None:
+    """Record `sha256` for the file state `index_key` (taken before the file was read)."""
+    key, size, mtime_ns = index_key
+    data = load_hash_index()
+    data[key] = {"size": size, "mtimeNs": mtime_ns, "sha256": sha256}
+    index_path = cache_dir() / HASH_INDEX_NAME
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    except OSError as exc:
+        print(f"[warn] could not write hash index {index_path}: {exc}")
+
+
+def query_existing_book(client: PocketBaseClient, user_id: str, book_id: str) -> Optional[dict]:
+    filter_value = f"(user={quote_filter_value(user_id)}&&bookId={quote_filter_value(book_id)})"
+    return client.first_record("books", filter_value)
 
 
 def upsert_book_record(
-    base_url: str,
-    token: str,
+    client: PocketBaseClient,
     user_id: str,
     book_id: str,
     title: str,
-    verify_ssl: bool,
+    file_hash: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+    deleted: bool = False,
 ) -> str:
-    existing = query_existing_book(base_url, token, user_id, book_id, verify_ssl=verify_ssl)
+    existing = query_existing_book(client, user_id, book_id)
     payload = {
+        **(metadata or {}),
         "user": user_id,
         "bookId": book_id,
         "title": title,
-        "fileHash": book_id,
+        "fileHash": book_id if file_hash is None else file_hash,
         "updatedAt": int(time.time() * 1000),
-        "deleted": False,
+        "deleted": deleted,
     }
     if existing:
         record_id = existing.get("id")
         if not record_id:
             raise RuntimeError("Existing book record has no id")
-        endpoint = f"{base_url}/api/collections/books/records/{record_id}"
-        resp = requests.patch(
-            endpoint,
-            json=payload,
-            headers=auth_headers(token),
-            timeout=30,
-            verify=verify_ssl,
-        )
-        if resp.status_code >= 300:
-            raise RuntimeError(f"Failed to update books record: {resp.status_code} {resp.text[:400]}")
+        client.update_record("books", record_id, payload)
         return record_id
 
-    endpoint = f"{base_url}/api/collections/books/records"
-    resp = requests.post(
-        endpoint,
-        json=payload,
-        headers=auth_headers(token),
-        timeout=30,
-        verify=verify_ssl,
-    )
-    if resp.status_code >= 300:
-        raise RuntimeError(f"Failed to create books record: {resp.status_code} {resp.text[:400]}")
-    data = resp.json() or {}
+    data = client.create_record("books", payload)
     record_id = data.get("id")
     if not record_id:
         raise RuntimeError("Create books record succeeded but id missing")
     return record_id
 
 
+def finalize_book_record(client: PocketBaseClient, record_id: str, sha256: str) -> None:
+    """Second phase of a provisional create: set the real bookId/fileHash and make it visible."""
+    payload = {
+        "bookId": sha256,
+        "fileHash": sha256,
+        "updatedAt": int(time.time() * 1000),
+        "deleted": False,
+    }
+    client.update_record("books", record_id, payload)
+
+
+def delete_book_record(client: PocketBaseClient, record_id: str) -> None:
+    client.delete_record("books", record_id)
+
+
+def sweep_provisional_records(
+    client: PocketBaseClient,
+    user_id: str,
+    max_age_ms: int = PROVISIONAL_MAX_AGE_MS,
+) -> int:
+    """Delete hidden provisional records left behind by runs that never finalized them."""
+    cutoff = int(time.time() * 1000) - max_age_ms
+    filter_value = (
+        f"(user={quote_filter_value(user_id)}"
+        f"&&bookId~{quote_filter_value(PROVISIONAL_BOOK_ID_PREFIX + '%')}"
+        f"&&deleted=true&&updatedAt<{cutoff})"
+    )
+    swept = 0
+    for record in list(client.iter_records("books", filter=filter_value, fields="id,bookId")):
+        if not str(record.get("bookId") or "").startswith(PROVISIONAL_BOOK_ID_PREFIX):
+            continue
+        delete_book_record(client, str(record.get("id")))
+        swept += 1
+    return swept
+
+
 def extract_uploaded_file_name(record: dict, field_name: str) -> Optional[str]:
     value = record.get(field_name)
     if isinstance(value, str) and value.strip():
@@ -174,27 +514,6 @@ def extract_uploaded_file_name(record: dict, field_name: str) -> Optional[str]:
     return None
 
 
-def compact_error_text(resp: requests.Response) -> str:
-    text = (resp.text or "").strip()
-    if not text:
-        return "<empty>"
-    try:
-        data = resp.json()
-        if isinstance(data, dict):
-            parts = []
-            message = data.get("message")
-            if isinstance(message, str) and message.strip():
-                parts.append(message.strip())
-            details = data.get("data")
-            if details is not None:
-                parts.append(json.dumps(details, ensure_ascii=False))
-            if parts:
-                return " | ".join(parts)[:1000]
-        return text[:500]
-    except Exception:
-        return text[:500]
-
-
 def parse_pocketbase_error(resp: requests.Response) -> tuple[Optional[str], Optional[dict]]:
     try:
         payload = resp.json()
@@ -213,120 +532,179 @@ def parse_pocketbase_error(resp: requests.Response) -> tuple[Optional[str], Opti
     return None, None
 
 
-def fetch_book_record(base_url: str, token: str, record_id: str, verify_ssl: bool) -> dict:
-    endpoint = f"{base_url}/api/collections/books/records/{record_id}"
-    resp = requests.get(
-        endpoint,
-        headers=auth_headers(token),
-        timeout=30,
-        verify=verify_ssl,
+def patch_file_streaming(
+    client: PocketBaseClient,
+    record_id: str,
+    user_id: str,
+    field: str,
+    epub_path: Path,
+    mime: str,
+    stats: ReadStats,
+) -> requests.Response:
+    fields = {"user": user_id, "updatedAt": str(int(time.time() * 1000))}
+    with MultipartFileBody(fields, field, epub_path, mime, stats) as body:
+        resp = client.request(
+            "PATCH",
+            client.records_path("books", record_id),
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=120,
+        )
+        stats.last_sha256 = body.sha256()
+    return resp
+
+
+def uploaded_name_after_patch(
+    client: PocketBaseClient,
+    record_id: str,
+    field: str,
+    resp: requests.Response,
+) -> Optional[str]:
+    data = resp.json() if resp.text else {}
+    uploaded = extract_uploaded_file_name(data, field)
+    if uploaded:
+        return uploaded
+
+    # Some PocketBase setups may return sparse payloads; verify with a follow-up GET.
+    try:
+        fetched = client.get_record("books", record_id)
+        return extract_uploaded_file_name(fetched, field)
+    except Exception as e:
+        print(f"[warn] post-upload fetch failed for field '{field}': {e}")
+    return None
+
+
+def size_limit_from_error(payload: Optional[dict]) -> int:
+    """maxSize from a validation_file_size_limit error's params, 0 when absent."""
+    params = payload.get("params") if isinstance(payload, dict) else None
+    try:
+        return int((params or {}).get("maxSize") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def size_limit_error(
+    epub_path: Path, size: int, field: str, max_size: int, source: str, rejected: bool = False
+) -> RuntimeError:
+    hint = " (cached; --no-target-cache re-checks after raising it)" if source == "cache" else ""
+    return RuntimeError(
+        f"Upload {'rejected' if rejected else 'skipped'}: {epub_path.name} is {size} bytes but books.{field} "
+        f"maxSize={max_size or '?'}{hint}. Increase it in PocketBase Admin."
     )
-    if resp.status_code != 200:
-        raise RuntimeError(f"Failed to fetch record {record_id}: {resp.status_code} {compact_error_text(resp)}")
-    return resp.json() if resp.text else {}
+
+
+def upload_epub_to_target(
+    client: PocketBaseClient,
+    user_id: str,
+    record_id: str,
+    epub_path: Path,
+    target: UploadTarget,
+    stats: Optional[ReadStats] = None,
+    use_cache: bool = False,
+) -> Tuple[str, str]:
+    """
+    Upload once to `target` and return (field, stored file name).
+
+    With use_cache, the accepted field/MIME, or the maxSize a rejection reports,
+    is remembered for this server; any other rejection forgets the entry.
+    """
+    size = epub_path.stat().st_size
+    if target.checks_size() and size > target.max_size:
+        raise size_limit_error(epub_path, size, target.field, target.max_size, target.source)
+
+    mime = target.pick_mime()
+    # Only a maxSize the server reported is worth remembering; the snapshot's may be stale.
+    known_size = target.max_size if target.checks_size() else 0
+    resp = patch_file_streaming(client, record_id, user_id, target.field, epub_path, mime, stats or ReadStats())
+    if resp.status_code >= 300:
+        err_code, err_payload = parse_pocketbase_error(resp)
+        if err_code == "validation_file_size_limit":
+            limit = size_limit_from_error(err_payload)
+            if use_cache and limit:
+                learned = UploadTarget(target.field, limit, target.mime_types, source="server", mime=mime)
+                store_cached_upload_target(client.base_url, learned)
+            raise size_limit_error(epub_path, size, target.field, limit, "server", rejected=True)
+        if use_cache:
+            # The schema may have changed since it was cached; rediscover next run.
+            store_cached_upload_target(client.base_url, None)
+        raise RuntimeError(
+            f"Upload via field '{target.field}' mime='{mime}' ({target.source}) failed: "
+            f"{resp.status_code} {compact_error_text(resp)}. Use --field to pick the books file field."
+        )
+
+    uploaded = uploaded_name_after_patch(client, record_id, target.field, resp)
+    if not uploaded:
+        raise RuntimeError(f"Field '{target.field}' accepted the upload but no filename in response/record")
+    if use_cache:
+        accepted = UploadTarget(target.field, known_size, target.mime_types, source="server", mime=mime)
+        store_cached_upload_target(client.base_url, accepted)
+    return target.field, uploaded
 
 
 def upload_epub(
-    base_url: str,
-    token: str,
+    client: PocketBaseClient,
     user_id: str,
     record_id: str,
     epub_path: Path,
-    verify_ssl: bool,
     field_candidates: Iterable[str] = FILE_FIELD_CANDIDATES,
     mime_candidates: Iterable[str] = MIME_CANDIDATES,
+    target: Optional[UploadTarget] = None,
+    stats: Optional[ReadStats] = None,
+    use_cache: bool = False,
 ) -> Tuple[str, str]:
-    endpoint = f"{base_url}/api/collections/books/records/{record_id}"
-    filename = epub_path.name
-    headers = auth_headers(token)
-    last_error_code: Optional[str] = None
-    last_error_payload: Optional[dict] = None
-
+    """
+    Upload the EPUB and return (field, stored file name).
+
+    `stats` accumulates local bytes read vs bytes sent; `stats.last_sha256`
+    holds the hash of the last streamed copy.
+    """
+    stats = stats if stats is not None else ReadStats()
+    if target is not None:
+        return upload_epub_to_target(client, user_id, record_id, epub_path, target, stats=stats, use_cache=use_cache)
+
+    # Legacy probing, only used when the books schema could not be resolved at all.
+    # Each attempt is a full upload, so a size rejection ends it: no field will do better.
     for field in field_candidates:
         for mime in mime_candidates:
-            with epub_path.open("rb") as f:
-                files = {field: (filename, f, mime)}
-                resp = requests.patch(
-                    endpoint,
-                    data={
-                        "user": user_id,
-                        "updatedAt": str(int(time.time() * 1000)),
-                    },
-                    files=files,
-                    headers=headers,
-                    timeout=120,
-                    verify=verify_ssl,
-                )
+            resp = patch_file_streaming(client, record_id, user_id, field, epub_path, mime, stats)
             if resp.status_code >= 300:
                 err_code, err_payload = parse_pocketbase_error(resp)
-                if err_code:
-                    last_error_code = err_code
-                    last_error_payload = err_payload
+                if err_code == "validation_file_size_limit":
+                    limit = size_limit_from_error(err_payload)
+                    if use_cache and limit:
+                        learned = UploadTarget(field, limit, (), source="server", mime=mime)
+                        store_cached_upload_target(client.base_url, learned)
+                    raise size_limit_error(epub_path, epub_path.stat().st_size, field, limit, "server", rejected=True)
                 print(
                     f"[warn] upload field '{field}' mime='{mime}' failed: "
                     f"{resp.status_code} {compact_error_text(resp)}"
                 )
                 continue
 
-            data = resp.json() if resp.text else {}
-            uploaded = extract_uploaded_file_name(data, field)
+            uploaded = uploaded_name_after_patch(client, record_id, field, resp)
             if uploaded:
+                if use_cache:
+                    store_cached_upload_target(client.base_url, UploadTarget(field, 0, (), source="server", mime=mime))
                 return field, uploaded
 
-            # Some PocketBase setups may return sparse payloads; verify with a follow-up GET.
-            try:
-                fetched = fetch_book_record(base_url, token, record_id, verify_ssl=verify_ssl)
-                uploaded = extract_uploaded_file_name(fetched, field)
-                if uploaded:
-                    return field, uploaded
-            except Exception as e:
-                print(f"[warn] post-upload fetch failed for field '{field}': {e}")
-
             print(
                 f"[warn] field '{field}' mime='{mime}' accepted but no filename in "
                 "response/record"
             )
 
-    if last_error_code == "validation_file_size_limit":
-        max_size = None
-        if isinstance(last_error_payload, dict):
-            params = last_error_payload.get("params")
-            if isinstance(params, dict):
-                max_size = params.get("maxSize")
-        raise RuntimeError(
-            "Upload failed: books.bookFile max file size is too small "
-            f"(current maxSize={max_size}). Increase it in PocketBase Admin."
-        )
-
     raise RuntimeError(
         "Upload failed on all candidate fields. "
         "Check books collection has a File field (recommended: bookFile)."
     )
 
 
-def patch_storage_path(base_url: str, token: str, record_id: str, storage_path: str, verify_ssl: bool) -> None:
-    endpoint = f"{base_url}/api/collections/books/records/{record_id}"
+def patch_storage_path(client: PocketBaseClient, record_id: str, storage_path: str) -> None:
     payload = {"storagePath": storage_path, "updatedAt": int(time.time() * 1000)}
-    resp = requests.patch(
-        endpoint,
-        json=payload,
-        headers=auth_headers(token),
-        timeout=30,
-        verify=verify_ssl,
-    )
-    if resp.status_code >= 300:
-        raise RuntimeError(f"Failed to patch storagePath: {resp.status_code} {resp.text[:400]}")
+    client.update_record("books", record_id, payload)
 
 
-def get_file_token(base_url: str, token: str, verify_ssl: bool) -> Optional[str]:
-    endpoint = f"{base_url}/api/files/token"
-    resp = requests.post(
-        endpoint,
-        json={},
-        headers=auth_headers(token),
-        timeout=30,
-        verify=verify_ssl,
-    )
+def get_file_token(client: PocketBaseClient) -> Optional[str]:
+    resp = client.request("POST", "/api/files/token", json_body={})
     if resp.status_code != 200:
         return None
     data = resp.json() if resp.text else {}
@@ -335,29 +713,25 @@ def get_file_token(base_url: str, token: str, verify_ssl: bool) -> Optional[str]
 
 
 def verify_download(
-    base_url: str,
-    token: str,
+    client: PocketBaseClient,
     record_id: str,
     uploaded_name: str,
     local_sha256: str,
-    verify_ssl: bool,
     file_token: Optional[str] = None,
 ) -> None:
     rid = quote(record_id, safe="")
     fname = quote(uploaded_name, safe="")
-    download_url = f"{base_url}/api/files/books/{rid}/{fname}"
-    if file_token:
-        download_url = f"{download_url}?token={quote(file_token, safe='')}"
-    resp = requests.get(
-        download_url,
-        headers=auth_headers(token),
-        timeout=120,
-        verify=verify_ssl,
-    )
-    if resp.status_code != 200:
-        raise RuntimeError(f"Download verification failed: {resp.status_code} {resp.text[:400]}")
+    params = {"token": file_token} if file_token else None
+    digest = hashlib.sha256()
+    with client.request(
+        "GET", f"/api/files/books/{rid}/{fname}", params=params, timeout=120, stream=True
+    ) as resp:
+        if resp.status_code != 200:
+            raise RuntimeError(f"Download verification failed: {resp.status_code} {resp.text[:400]}")
+        for chunk in resp.iter_content(chunk_size=READ_CHUNK_SIZE):
+            digest.update(chunk)
 
-    remote_sha = hashlib.sha256(resp.content).hexdigest()
+    remote_sha = digest.hexdigest()
     if remote_sha != local_sha256:
         raise RuntimeError(
             "Hash mismatch after upload/download. "
@@ -371,8 +745,17 @@ def main() -> int:
     parser.add_argument("--email", help="PocketBase user email")
     parser.add_argument("--password", help="PocketBase user password")
     parser.add_argument("--epub", default="test.epub", help="EPUB file path (default: test.epub)")
-    parser.add_argument("--title", default="Upload Verification Book", help="Book title to store in metadata")
+    parser.add_argument("--title", help="Book title to store (default: OPF dc:title, else a placeholder)")
     parser.add_argument("--field", help="Force a specific file field name (e.g. bookFile)")
+    parser.add_argument(
+        "--schema-file",
+        default="pocketbase_collections.json",
+        help="Schema snapshot used when the books schema cannot be read from the server",
+    )
+    parser.add_argument("--no-target-cache", action="store_true", help="Ignore the per-server upload target cache")
+    parser.add_argument(
+        "--no-hash-index", action="store_true", help="Ignore the local sha256 index (always stage a fresh upload)"
+    )
     parser.add_argument("--insecure", action="store_true", help="Disable SSL verification")
     args = parser.parse_args()
 
@@ -383,6 +766,7 @@ def main() -> int:
     email = resolve_value(args.email, "POCKETBASE_TEST_EMAIL", file_env)
     password = resolve_value(args.password, "POCKETBASE_TEST_PASSWORD", file_env)
     epub_path = (repo_root / args.epub).resolve() if not Path(args.epub).is_absolute() else Path(args.epub)
+    schema_file = Path(args.schema_file) if Path(args.schema_file).is_absolute() else repo_root / args.schema_file
 
     if not base_url:
         print("ERROR: POCKETBASE_URL is required (--url or env/.env).")
@@ -399,78 +783,152 @@ def main() -> int:
 
     verify_ssl = not args.insecure
     base_url = base_url.rstrip("/")
-    local_hash = sha256_of_file(epub_path)
+    stats = ReadStats()
+    index_key = hash_index_key(epub_path)
+    indexed_hash = None if args.no_hash_index else lookup_indexed_sha256(epub_path)
     print(f"[info] base_url={base_url}")
     print(f"[info] epub={epub_path}")
-    print(f"[info] sha256={local_hash}")
+    if indexed_hash:
+        print(f"[info] sha256={indexed_hash} (hash index)")
 
     try:
-        token, user_id = auth_user(base_url, email, password, verify_ssl=verify_ssl)
-        print(f"[ok] authenticated as user={user_id}")
-
-        record_id = upsert_book_record(
-            base_url=base_url,
-            token=token,
-            user_id=user_id,
-            book_id=local_hash,
-            title=args.title,
-            verify_ssl=verify_ssl,
-        )
-        print(f"[ok] books record ready id={record_id}")
-        fetched = fetch_book_record(
-            base_url=base_url,
-            token=token,
-            record_id=record_id,
-            verify_ssl=verify_ssl,
-        )
-        has_book_file_field = "bookFile" in fetched
-        print(f"[info] books record has 'bookFile' field: {has_book_file_field}")
-        if has_book_file_field:
-            print(f"[info] current bookFile value: {fetched.get('bookFile')!r}")
-
-        field_used, uploaded_name = upload_epub(
-            base_url=base_url,
-            token=token,
-            user_id=user_id,
-            record_id=record_id,
-            epub_path=epub_path,
-            verify_ssl=verify_ssl,
-            field_candidates=(args.field,) if args.field else FILE_FIELD_CANDIDATES,
+        epub_meta = read_epub_metadata(epub_path)
+    except Exception as exc:
+        print(f"[warn] could not read EPUB metadata: {exc}")
+        epub_meta = EpubMetadata()
+    book_fields = epub_meta.to_record_fields()
+    title = args.title or epub_meta.title or DEFAULT_TITLE
+    print(f"[info] metadata title={title!r} author={epub_meta.author!r} language={epub_meta.language!r}")
+
+    client = PocketBaseClient(base_url, verify_ssl=verify_ssl)
+    record_id: Optional[str] = None
+    provisional = False
+    try:
+        _, user_id = client.auth_user(email, password)
+        print(f"[ok] authenticated as user={user_id} ({client.auth_source})")
+
+        swept = sweep_provisional_records(client, user_id)
+        if swept:
+            print(f"[ok] removed {swept} stale provisional books record(s)")
+
+        target = discover_upload_target(
+            client,
+            preferred_field=args.field,
+            schema_file=schema_file,
+            use_cache=not args.no_target_cache,
         )
-        storage_path = f"{record_id}/{uploaded_name}"
-        print(f"[ok] uploaded via field={field_used} file={uploaded_name}")
+        if target:
+            print(
+                f"[info] upload target field={target.field} maxSize={target.max_size or '?'} "
+                f"mime={target.pick_mime()} source={target.source}"
+            )
+        else:
+            print("[warn] books schema unavailable, probing candidate file fields")
+
+        field_candidates = (args.field,) if args.field else FILE_FIELD_CANDIDATES
+        stored_fields = (target.field,) if target else field_candidates
+        existing = query_existing_book(client, user_id, indexed_hash) if indexed_hash else None
+        stored_name = None
+        if existing:
+            stored_name = next(filter(None, (extract_uploaded_file_name(existing, f) for f in stored_fields)), None)
+        if existing and stored_name:
+            # Already on the server under this hash: verify that copy, nothing to upload.
+            record_id = str(existing.get("id"))
+            local_hash = indexed_hash
+            uploaded_name = stored_name
+            upsert_book_record(client, user_id=user_id, book_id=local_hash, title=title, metadata=book_fields)
+            print(f"[ok] books record for sha256 already exists id={record_id} (hash index), verifying it")
+        else:
+            record_id = upsert_book_record(
+                client,
+                user_id=user_id,
+                book_id=f"{PROVISIONAL_BOOK_ID_PREFIX}{uuid.uuid4().hex}",
+                title=title,
+                metadata=book_fields,
+                file_hash="",
+                deleted=True,
+            )
+            provisional = True
+            print(f"[ok] books record ready id={record_id} (provisional, hidden from sync)")
+
+            upload_kwargs = dict(
+                client=client,
+                user_id=user_id,
+                epub_path=epub_path,
+                field_candidates=field_candidates,
+                target=target,
+                stats=stats,
+                use_cache=not args.no_target_cache,
+            )
+            field_used, uploaded_name = upload_epub(record_id=record_id, **upload_kwargs)
+            local_hash = stats.last_sha256 or ""
+            if hash_index_key(epub_path) == index_key:
+                store_indexed_sha256(index_key, local_hash)
+            print(f"[ok] uploaded via field={field_used} file={uploaded_name}")
+            print(f"[info] sha256={local_hash}")
+
+            existing = query_existing_book(client, user_id, local_hash)
+            if existing and existing.get("id") != record_id:
+                # Book already on the server under its real hash: keep that record and
+                # drop the provisional one. Its stored copy is checked by the download
+                # verification below; only a record without a file gets a second upload.
+                print(f"[warn] books record for sha256 already exists id={existing.get('id')}, keeping it")
+                delete_book_record(client, record_id)
+                record_id = str(existing.get("id"))
+                provisional = False
+                upsert_book_record(
+                    client,
+                    user_id=user_id,
+                    book_id=local_hash,
+                    title=title,
+                    metadata=book_fields,
+                )
+                stored_name = extract_uploaded_file_name(existing, field_used)
+                if stored_name:
+                    uploaded_name = stored_name
+                else:
+                    field_used, uploaded_name = upload_epub(record_id=record_id, **upload_kwargs)
+                    if stats.last_sha256 != local_hash:
+                        raise RuntimeError(
+                            f"{epub_path.name} changed during upload "
+                            f"(first pass={local_hash} second pass={stats.last_sha256})"
+                        )
+            else:
+                finalize_book_record(client, record_id, local_hash)
+                provisional = False
+                print(f"[ok] books record finalized bookId={local_hash}")
 
-        patch_storage_path(
-            base_url=base_url,
-            token=token,
-            record_id=record_id,
-            storage_path=storage_path,
-            verify_ssl=verify_ssl,
-        )
+        storage_path = f"{record_id}/{uploaded_name}"
+        patch_storage_path(client, record_id=record_id, storage_path=storage_path)
         print(f"[ok] storagePath set to {storage_path}")
 
-        file_token = get_file_token(
-            base_url=base_url,
-            token=token,
-            verify_ssl=verify_ssl,
-        )
+        file_token = get_file_token(client)
         if file_token:
             print("[ok] acquired protected file token")
         else:
             print("[warn] could not acquire protected file token, trying download without token")
 
         verify_download(
-            base_url=base_url,
-            token=token,
+            client,
             record_id=record_id,
             uploaded_name=uploaded_name,
             local_sha256=local_hash,
-            verify_ssl=verify_ssl,
             file_token=file_token,
         )
         print("[ok] download verification passed (sha256 matched)")
+        file_size = epub_path.stat().st_size
+        print(
+            f"[metric] bytes_read={stats.bytes_read} bytes_uploaded={stats.bytes_uploaded} "
+            f"read_per_uploaded_byte={stats.read_per_uploaded_byte:.2f} "
+            f"read_per_file_byte={stats.bytes_read / max(file_size, 1):.2f}"
+        )
         return 0
     except Exception as exc:
+        if provisional and record_id:
+            try:
+                delete_book_record(client, record_id)
+            except Exception as cleanup_exc:
+                print(f"[warn] could not delete provisional record {record_id}: {cleanup_exc}")
         print(f"ERROR: {exc}")
         return 1
 
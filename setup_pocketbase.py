@@ -20,85 +20,25 @@ from pathlib import Path
 
 import requests
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from pb_client import PocketBaseClient  # noqa: E402
+
 DEFAULT_SCHEMA_FILE = "pocketbase_collections.json"
 
 
-def authenticate_admin(base_url, email, password, verify_ssl=True):
+def authenticate_admin(client, email, password):
     """Authenticate as superuser or admin and return the auth token."""
-    
-    # Try with 'email' field first (newer PocketBase versions)
-    payload_email = {
-        "email": email,
-        "password": password
-    }
-    
-    # Fallback to 'identity' field (older versions)
-    payload_identity = {
-        "identity": email,
-        "password": password
-    }
-    
-    auth_endpoints = [
-        f"{base_url}/api/collections/_superusers/auth-with-password",
-        f"{base_url}/api/admins/auth-with-password",
-    ]
-
-    for endpoint_index, auth_url in enumerate(auth_endpoints, 1):
-        print(f"   Endpoint {endpoint_index}: {auth_url}")
+    token = client.auth_admin(email, password)
+    if not token:
+        print(f"❌ Authentication failed with both superuser and admin endpoints")
+        sys.exit(1)
+    return token
 
-        # Try with 'email' field first
-        for attempt, payload in enumerate([payload_email, payload_identity], 1):
-            field_name = "email" if attempt == 1 else "identity"
-            print(f"   Attempt {attempt}: Using '{field_name}' field...")
 
-            try:
-                response = requests.post(
-                    auth_url,
-                    json=payload,
-                    verify=verify_ssl,
-                    headers={"Content-Type": "application/json"}
-                )
-
-                print(f"   Status: {response.status_code}")
-
-                if response.status_code == 200:
-                    data = response.json()
-                    token = data.get("token") or data.get("record", {}).get("token")
-
-                    if not token:
-                        print(f"❌ No token in response: {data}")
-                        sys.exit(1)
-
-                    return token
-                elif response.status_code == 400 and attempt == 1:
-                    # Try next attempt with 'identity' field
-                    print(f"   ⚠️  Failed with '{field_name}', trying alternative...")
-                    continue
-                else:
-                    # Last attempt failed or non-400 error
-                    response.raise_for_status()
-
-            except requests.exceptions.RequestException as e:
-                if attempt == 2:
-                    # Try next endpoint after identity attempt
-                    print(f"   ⚠️  Auth attempt failed: {e}")
-                    if hasattr(e, 'response') and e.response is not None:
-                        print(f"   Response: {e.response.text}")
-                    break
-
-    print(f"❌ Authentication failed with both superuser and admin endpoints")
-    sys.exit(1)
-
-
-def build_collection_map(base_url, token):
+def build_collection_map(client):
     """Build a mapping of collection names and IDs to their live PocketBase IDs."""
-    collections_url = f"{base_url}/api/collections"
-    headers = {"Authorization": f"Bearer {token}"}
     try:
-        res = requests.get(collections_url, headers=headers)
-        res.raise_for_status()
-        data = res.json()
-        items = data.get("items", data) if isinstance(data, dict) else data
+        items = client.list_collections()
         c_map = {}
         for c in items:
             cid = c.get("id")
@@ -114,15 +54,10 @@ def build_collection_map(base_url, token):
         return {}
 
 
-def create_collection(base_url, token, collection_data, collection_map=None, include_relations=True):
+def create_collection(client, collection_data, collection_map=None, include_relations=True):
     """Create or update a single collection with fields, rules, and indexes."""
-    collections_url = f"{base_url}/api/collections"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
     if collection_map is None:
-        collection_map = build_collection_map(base_url, token)
+        collection_map = build_collection_map(client)
 
     collection_name = collection_data.get("name")
     if collection_name.startswith("_") or collection_name == "users":
@@ -183,17 +118,13 @@ def create_collection(base_url, token, collection_data, collection_map=None, inc
     }
 
     def get_existing_collection():
-        response = requests.get(collections_url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        collections = data.get("items", data) if isinstance(data, dict) else data
-        for c in collections:
+        for c in client.list_collections():
             if c.get("name") == collection_name:
                 return c
         return None
 
     try:
-        response = requests.post(collections_url, headers=headers, json=collection_payload)
+        response = client.request("POST", "/api/collections", json_body=collection_payload)
 
         if response.status_code == 400:
             error_data = response.json() if response.text else {}
@@ -201,8 +132,9 @@ def create_collection(base_url, token, collection_data, collection_map=None, inc
                 existing = get_existing_collection()
                 if existing:
                     collection_id = existing.get("id")
-                    update_url = f"{collections_url}/{collection_id}"
-                    update_resp = requests.patch(update_url, headers=headers, json=collection_payload)
+                    update_resp = client.request(
+                        "PATCH", f"/api/collections/{collection_id}", json_body=collection_payload
+                    )
                     if update_resp.status_code == 200:
                         if include_relations:
                             print(f"⚠️  Updated collection: {collection_name}")
@@ -221,7 +153,7 @@ def create_collection(base_url, token, collection_data, collection_map=None, inc
             print(f"✅ Created collection: {collection_name}")
         return True
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, RuntimeError) as e:
         if include_relations:
             print(f"❌ Failed to create/update collection '{collection_name}': {e}")
             if hasattr(e, 'response') and e.response and e.response.text:
@@ -229,19 +161,10 @@ def create_collection(base_url, token, collection_data, collection_map=None, inc
         return False
 
 
-def ensure_embedding_vector_capacity(base_url, token, verify_ssl=True, min_max=200000):
+def ensure_embedding_vector_capacity(client, min_max=200000):
     """Ensure embeddings.vectorJson has enough max length for serialized vectors."""
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    collections_url = f"{base_url}/api/collections"
-
     try:
-        response = requests.get(collections_url, headers=headers, verify=verify_ssl)
-        response.raise_for_status()
-        payload = response.json()
-        items = payload.get("items", payload) if isinstance(payload, dict) else payload
+        items = client.list_collections()
         target = None
         for item in items:
             if item.get("name") == "embeddings":
@@ -270,16 +193,12 @@ def ensure_embedding_vector_capacity(base_url, token, verify_ssl=True, min_max=2
             print("   ✅ embeddings.vectorJson max is already sufficient")
             return
 
-        patch_url = f"{collections_url}/{target.get('id')}"
-        patch_resp = requests.patch(
-            patch_url,
-            headers=headers,
-            json={"fields": fields},
-            verify=verify_ssl,
+        patch_resp = client.request(
+            "PATCH", f"/api/collections/{target.get('id')}", json_body={"fields": fields}
         )
         patch_resp.raise_for_status()
         print(f"   ✅ Updated embeddings.vectorJson max to {int(min_max)}")
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, RuntimeError) as e:
         print(f"   ⚠️  Warning: failed to enforce embeddings.vectorJson max: {e}")
         if hasattr(e, "response") and e.response is not None:
             try:
@@ -288,16 +207,10 @@ def ensure_embedding_vector_capacity(base_url, token, verify_ssl=True, min_max=2
                 pass
 
 
-def fetch_remote_schema(base_url, token, verify_ssl=True):
+def fetch_remote_schema(client):
     """Return the PocketBase collections definition from the server."""
 
-    collections_url = f"{base_url}/api/collections"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(collections_url, headers=headers, verify=verify_ssl)
-    response.raise_for_status()
-
-    data = response.json()
-    items = data.get("items", data) if isinstance(data, dict) else data
+    items = client.list_collections()
 
     normalized = []
     for entry in items:
@@ -468,6 +381,9 @@ def get_default_collections_schema():
                 {"name": "createdAt", "type": "number", "required": False},
                 {"name": "updatedAt", "type": "number", "required": False}
             ],
+            "indexes": [
+                "CREATE INDEX idx_ai_notes_created_at ON ai_notes (createdAt)"
+            ],
             "listRule": "@request.auth.id != \"\" && user = @request.auth.id",
             "viewRule": "@request.auth.id != \"\" && user = @request.auth.id",
             "createRule": "@request.auth.id != \"\" && user = @request.auth.id",
@@ -510,6 +426,9 @@ def get_default_collections_schema():
                 {"name": "user", "type": "relation", "required": True, "options": {"collectionId": "_pb_users_auth_", "cascadeDelete": False, "maxSelect": 1}},
                 {"name": "bookId", "type": "text", "required": True},
                 {"name": "title", "type": "text", "required": False},
+                {"name": "author", "type": "text", "required": False},
+                {"name": "language", "type": "text", "required": False},
+                {"name": "coverHref", "type": "text", "required": False},
                 {
                     "name": "bookFile",
                     "type": "file",
@@ -545,7 +464,12 @@ def get_default_collections_schema():
                 {"name": "deviceModel", "type": "text", "required": False},
                 {"name": "stackTrace", "type": "text", "required": True},
                 {"name": "message", "type": "text", "required": False},
-                {"name": "timestamp", "type": "number", "required": True}
+                {"name": "timestamp", "type": "number", "required": True},
+                {"name": "fingerprint", "type": "text", "required": False}
+            ],
+            "indexes": [
+                "CREATE INDEX idx_crash_reports_timestamp ON crash_reports (timestamp)",
+                "CREATE INDEX idx_crash_reports_fingerprint ON crash_reports (fingerprint)"
             ],
             "listRule": None,
             "viewRule": None,
@@ -553,6 +477,64 @@ def get_default_collections_schema():
             "updateRule": None,
             "deleteRule": None
         },
+        {
+            "name": "crash_fingerprints",
+            "type": "base",
+            "fields": [
+                {"name": "fingerprint", "type": "text", "required": True},
+                {"name": "exception", "type": "text", "required": False},
+                {"name": "title", "type": "text", "required": False},
+                {"name": "signature", "type": "text", "required": False},
+                {"name": "count", "type": "number", "required": False},
+                {"name": "firstSeen", "type": "number", "required": False},
+                {"name": "lastSeen", "type": "number", "required": False},
+                {"name": "appVersions", "type": "json", "required": False},
+                {"name": "androidVersions", "type": "json", "required": False},
+                {"name": "devices", "type": "json", "required": False},
+                {"name": "sampleId", "type": "text", "required": False}
+            ],
+            "indexes": [
+                "CREATE UNIQUE INDEX idx_crash_fingerprints_fingerprint ON crash_fingerprints (fingerprint)",
+                "CREATE INDEX idx_crash_fingerprints_last_seen ON crash_fingerprints (lastSeen)"
+            ],
+            "listRule": None,
+            "viewRule": None,
+            "createRule": None,
+            "updateRule": None,
+            "deleteRule": None
+        },
+        {
+            "name": "ai_note_digests",
+            "type": "base",
+            "fields": [
+                {"name": "user", "type": "relation", "required": True, "options": {"collectionId": "_pb_users_auth_", "cascadeDelete": True, "maxSelect": 1}},
+                {"name": "day", "type": "text", "required": True},
+                {"name": "timezone", "type": "text", "required": True},
+                {"name": "subject", "type": "text", "required": False},
+                {"name": "body", "type": "text", "required": False},
+                {"name": "noteCount", "type": "number", "required": False},
+                {"name": "bookCount", "type": "number", "required": False},
+                {"name": "books", "type": "json", "required": False},
+                {"name": "projects", "type": "json", "required": False},
+                {"name": "people", "type": "json", "required": False},
+                {"name": "eras", "type": "json", "required": False},
+                {"name": "noteIds", "type": "json", "required": False},
+                {"name": "firstNoteAt", "type": "number", "required": False},
+                {"name": "lastNoteAt", "type": "number", "required": False},
+                {"name": "mailBody", "type": "text", "required": False},
+                {"name": "mailNoteCount", "type": "number", "required": False},
+                {"name": "generatedAt", "type": "number", "required": False}
+            ],
+            "indexes": [
+                "CREATE UNIQUE INDEX idx_ai_note_digests_key ON ai_note_digests (user, day, timezone)",
+                "CREATE INDEX idx_ai_note_digests_day ON ai_note_digests (day)"
+            ],
+            "listRule": "@request.auth.id != \"\" && user = @request.auth.id",
+            "viewRule": "@request.auth.id != \"\" && user = @request.auth.id",
+            "createRule": None,
+            "updateRule": None,
+            "deleteRule": None
+        },
         {
             "name": "qdrant_sync_logs",
             "type": "base",
@@ -569,6 +551,32 @@ def get_default_collections_schema():
                 {"name": "error", "type": "text", "required": False},
                 {"name": "timestamp", "type": "number", "required": True}
             ],
+            "indexes": [
+                "CREATE INDEX idx_qdrant_sync_logs_timestamp ON qdrant_sync_logs (timestamp)",
+                "CREATE INDEX idx_qdrant_sync_logs_user ON qdrant_sync_logs (user)"
+            ],
+            "listRule": None,
+            "viewRule": None,
+            "createRule": None,
+            "updateRule": None,
+            "deleteRule": None
+        },
+        {
+            "name": "qdrant_sync_log_rollups",
+            "type": "base",
+            "fields": [
+                {"name": "user", "type": "relation", "required": False, "options": {"collectionId": "_pb_users_auth_", "cascadeDelete": False, "maxSelect": 1}},
+                {"name": "day", "type": "text", "required": True},
+                {"name": "action", "type": "text", "required": True},
+                {"name": "status", "type": "text", "required": True},
+                {"name": "count", "type": "number", "required": False},
+                {"name": "firstTimestamp", "type": "number", "required": False},
+                {"name": "lastTimestamp", "type": "number", "required": False},
+                {"name": "reasons", "type": "json", "required": False}
+            ],
+            "indexes": [
+                "CREATE UNIQUE INDEX idx_qdrant_sync_log_rollups_key ON qdrant_sync_log_rollups (day, user, action, status)"
+            ],
             "listRule": None,
             "viewRule": None,
             "createRule": None,
@@ -696,13 +704,14 @@ def main():
     
     # Authenticate
     print("🔐 Authenticating as admin...")
-    token = authenticate_admin(base_url, args.email, args.password, verify_ssl)
-    print("✅ Authentication successful\n")
+    client = PocketBaseClient(base_url, verify_ssl=verify_ssl)
+    authenticate_admin(client, args.email, args.password)
+    print(f"✅ Authentication successful ({client.auth_source})\n")
     
     if args.pull_schema:
         destination = args.pull_schema or DEFAULT_SCHEMA_FILE
         print("🧭 Pulling schema from server...")
-        remote_schema = fetch_remote_schema(base_url, token, verify_ssl)
+        remote_schema = fetch_remote_schema(client)
         save_schema_to_file(remote_schema, destination)
         print(f"✅ Schema snapshot saved to {destination}")
         print(f"   Re-run without --pull-schema (and optionally --schema-file {destination}) to apply these changes.")
@@ -733,18 +742,18 @@ def main():
         print(f"   ✅ Added {auto_added} missing required collection(s) from bundled defaults")
     
     print("📦 Creating base collections (Pass 1)...")
-    collection_map = build_collection_map(base_url, token)
+    collection_map = build_collection_map(client)
     for collection_data in collections:
-        create_collection(base_url, token, collection_data, collection_map, include_relations=False)
+        create_collection(client, collection_data, collection_map, include_relations=False)
 
     print("\n📦 Updating relation fields, rules & indexes (Pass 2)...")
-    collection_map = build_collection_map(base_url, token)
+    collection_map = build_collection_map(client)
     created_count = 0
     for collection_data in collections:
-        if create_collection(base_url, token, collection_data, collection_map, include_relations=True):
+        if create_collection(client, collection_data, collection_map, include_relations=True):
             created_count += 1
 
-    ensure_embedding_vector_capacity(base_url, token, verify_ssl=verify_ssl, min_max=200000)
+    ensure_embedding_vector_capacity(client, min_max=200000)
     
     print(f"\n✨ Setup complete!")
     print(f"   Created: {created_count} new collections")